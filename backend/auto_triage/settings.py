@@ -61,6 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auto_triage.tracing.CorrelationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -277,3 +278,8 @@ CORS_ALLOW_METHODS = [
     'POST',
     'PUT',
 ]
+
+# Request tracing (spans joined to the WhatsApp bot's correlation IDs)
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'backend')
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+TRACE_COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL', '')
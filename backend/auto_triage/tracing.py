@@ -0,0 +1,130 @@
+"""
+Request spans joined to the WhatsApp bot's traces.
+
+The bot sends its correlation ID (the trace id) and calling span in the
+X-Correlation-ID and X-Parent-Span-ID headers. CorrelationMiddleware times
+each request as a span under them and echoes the correlation ID back.
+Spans are written as JSON lines (TRACE_EXPORT_PATH) and/or POSTed to a
+collector (TRACE_COLLECTOR_URL) by a background thread, in the same format
+as the bot and diagnose-bot use, so one trace covers all three services.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+
+from django.conf import settings
+
+CORRELATION_HEADER = 'X-Correlation-ID'
+PARENT_SPAN_HEADER = 'X-Parent-Span-ID'
+
+
+class SpanExporter:
+    """Writes finished spans from a daemon thread; spans are dropped when the queue is full."""
+
+    def __init__(self, path='', collector_url=''):
+        self.path = path
+        self.collector_url = collector_url
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path or self.collector_url)
+
+    def export(self, span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=1.0))
+                while len(batch) < 100:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                stopping = True
+                batch = [span for span in batch if span is not None]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(span, ensure_ascii=False, default=str) + '\n' for span in batch))
+            if self.collector_url:
+                request = urllib.request.Request(
+                    self.collector_url,
+                    data=json.dumps({'spans': batch}, default=str).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'},
+                    method='POST',
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            print(f'Failed exporting {len(batch)} spans: {e!r}')
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(5)
+
+
+exporter = SpanExporter(settings.TRACE_EXPORT_PATH, settings.TRACE_COLLECTOR_URL)
+
+
+class CorrelationMiddleware:
+    """Time every request as a span of the caller's trace (or a new one)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace_id = request.headers.get(CORRELATION_HEADER) or uuid.uuid4().hex[:16]
+        request.correlation_id = trace_id
+        start, started = time.time(), time.perf_counter()
+        status = 'ok'
+        attributes = {}
+        try:
+            response = self.get_response(request)
+            attributes['status_code'] = response.status_code
+        except Exception as e:
+            status = 'error'
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            if exporter.enabled:
+                match = getattr(request, 'resolver_match', None)
+                if match is not None:
+                    attributes['view'] = match.view_name
+                exporter.export({
+                    'trace_id': trace_id,
+                    'span_id': uuid.uuid4().hex[:16],
+                    'parent_id': request.headers.get(PARENT_SPAN_HEADER),
+                    'service': settings.TRACE_SERVICE_NAME,
+                    'name': f'{request.method} {request.path}',
+                    'start': round(start, 6),
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                    'status': status,
+                    'attributes': attributes,
+                })
+        response[CORRELATION_HEADER] = trace_id
+        return response
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from rest_framework.decorators import api_view, permission_classes
@@ -315,6 +317,7 @@ def doctor_phone_numbers(request):
     Query params:
       - status: filter by status (default: ACTIVE only)
       - is_available: filter by availability (default: true only)
+    Supports conditional requests: a matching If-None-Match returns 304.
     """
     queryset = Doctor.objects.exclude(phone_number='').exclude(phone_number__isnull=True)
     
@@ -329,11 +332,16 @@ def doctor_phone_numbers(request):
         queryset = queryset.filter(is_available=is_available.lower() == 'true')
     
     # Extract just the phone numbers
-    phone_numbers = list(queryset.values_list('phone_number', flat=True))
+    phone_numbers = list(queryset.order_by('phone_number').values_list('phone_number', flat=True))
+    
+    # Let polling clients (the WhatsApp bot cache) revalidate without the payload
+    etag = '"%s"' % hashlib.sha1('\n'.join(phone_numbers).encode('utf-8')).hexdigest()
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
     
     return Response({
         'phone_numbers': phone_numbers,
         'count': len(phone_numbers)
-    })
+    }, headers={'ETag': etag})
 
 
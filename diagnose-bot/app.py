@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from src.api import config, questions, answers
+from src.utils import tracing
 import uvicorn
 
 app = FastAPI(title="Multi-Agent Diagnostic API")
@@ -9,6 +10,17 @@ app.include_router(config.router, prefix="/config", tags=["config"])
 app.include_router(questions.router, prefix="/questions", tags=["questions"])
 app.include_router(answers.router, prefix="/answers", tags=["answers"])
 
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # Join the caller's trace when it sends a correlation ID, start one otherwise
+    trace_id = request.headers.get(tracing.CORRELATION_HEADER) or tracing.new_id()
+    parent_id = request.headers.get(tracing.PARENT_SPAN_HEADER)
+    with tracing.span(f"{request.method} {request.url.path}", trace_id, parent_id) as attributes:
+        response = await call_next(request)
+        attributes["status_code"] = response.status_code
+    response.headers[tracing.CORRELATION_HEADER] = trace_id
+    return response
+
 @app.get("/")
 def health_check():
     return {"status": "ok", "message": "Multi-Agent API is running"}
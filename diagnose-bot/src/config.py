@@ -6,4 +6,9 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 if not OPENROUTER_API_KEY:
-    raise ValueError("OPENROUTER_API_KEY not found in environment variables")
\ No newline at end of file
+    raise ValueError("OPENROUTER_API_KEY not found in environment variables")
+
+# Request tracing: spans go to a JSON-lines file and/or a collector URL (both optional)
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "diagnose-bot")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
@@ -5,6 +5,7 @@ from typing import List
 from src.model.schemas import MetaAgentOutputSchema, QuestionerSchema, AgentResponseSchema, ConsolidatorOutputSchema, CriticalAgentSchema
 from src.model.prompts import META_AGENT_PROMPT, CONSOLIDATOR_PROMPT
 from src.utils.config_manager import get_config
+from src.utils.tracing import span
 
 
 meta_parser = PydanticOutputParser(pydantic_object=MetaAgentOutputSchema)
@@ -47,7 +48,8 @@ class MetaAgent:
             num_questions=self.config['num_questions'],
             scores=self.config['decision_scores']
         )
-        response = self.llm.invoke([HumanMessage(content=prompt_text)])
+        with span("llm.meta_agent"):
+            response = self.llm.invoke([HumanMessage(content=prompt_text)])
         self.output = meta_parser.parse(response.content)
 
         self.questions_agent = self.output.questioner_prompt
@@ -62,7 +64,8 @@ class QuestionerAgent:
         self.output: QuestionerSchema | None = None
 
     def run(self) -> QuestionerSchema:
-        response = self.llm.invoke([HumanMessage(content=self.prompt)])
+        with span("llm.questioner_agent"):
+            response = self.llm.invoke([HumanMessage(content=self.prompt)])
         self.response = questioner_parser.parse(response.content)
 
 class SimpleAgent:
@@ -74,7 +77,8 @@ class SimpleAgent:
 
     def run(self, questions: str) -> AgentResponseSchema:
         full_prompt = self.prompt + f"\n\nAnd these were the questions asked to the user with the answers:\n{questions}\nPlease return strictly JSON with comments, score, and suggestions."
-        raw_response = self.llm.invoke([HumanMessage(content=full_prompt)])
+        with span("llm.simple_agent", agent=self.name):
+            raw_response = self.llm.invoke([HumanMessage(content=full_prompt)])
         self.response = agent_parser.parse(raw_response.content)
         return self.response
 
@@ -109,5 +113,6 @@ class ConsolidatorAgent:
     def run(self, doc: str) -> ConsolidatorOutputSchema:
         scores = get_config()['decision_scores']
         prompt_text = consolidator_prompt_template.format(agent_outputs=self.responses, doc=doc, scores=scores)
-        raw_response = self.llm.invoke([HumanMessage(content=prompt_text)])
+        with span("llm.consolidator_agent"):
+            raw_response = self.llm.invoke([HumanMessage(content=prompt_text)])
         self.response = consolidator_parser.parse(raw_response.content)
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Lightweight spans joined to the WhatsApp bot's traces.
+
+The bot sends its correlation ID (the trace id) and calling span in the
+X-Correlation-ID and X-Parent-Span-ID headers; the middleware in app.py
+opens a request span under them, and every agent run (one LLM call each)
+is a child span. Finished spans are written as JSON lines, in the same
+format as the bot's, by a background thread.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from src.config import TRACE_SERVICE_NAME, TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL
+
+CORRELATION_HEADER = "X-Correlation-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+
+# (trace_id, span_id) of the span running in this context
+_current: ContextVar[Optional[tuple]] = ContextVar("current_span", default=None)
+_spans: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+_exporter: Optional[threading.Thread] = None
+_exporter_lock = threading.Lock()
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def correlation_id() -> Optional[str]:
+    """
+    Correlation ID of the current request, if any
+    """
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+    """
+    Time a stage as a child of the current span, or start one under the given trace
+    """
+    current = _current.get()
+    if trace_id is None:
+        trace_id, parent_id = current if current else (new_id(), None)
+    span_id = new_id()
+    token = _current.set((trace_id, span_id))
+    start, started = time.time(), time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "error"
+        attributes["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        if TRACE_EXPORT_PATH or TRACE_COLLECTOR_URL:
+            _export({
+                "trace_id": trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "service": TRACE_SERVICE_NAME,
+                "name": name,
+                "start": round(start, 6),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "status": status,
+                "attributes": attributes
+            })
+
+
+def _export(record: Dict[str, Any]):
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = threading.Thread(target=_run_exporter, name="span-exporter", daemon=True)
+                _exporter.start()
+                atexit.register(_stop_exporter)
+    try:
+        _spans.put_nowait(record)
+    except queue.Full:
+        pass  # Tracing never slows a request down
+
+
+def _run_exporter():
+    stopping = False
+    while not stopping:
+        batch = []
+        try:
+            batch.append(_spans.get(timeout=1.0))
+            while len(batch) < 100:
+                batch.append(_spans.get_nowait())
+        except queue.Empty:
+            pass
+        if None in batch:
+            stopping = True
+            batch = [record for record in batch if record is not None]
+        if batch:
+            _write(batch)
+
+
+def _write(batch):
+    try:
+        if TRACE_EXPORT_PATH:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_EXPORT_PATH)), exist_ok=True)
+            with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch))
+        if TRACE_COLLECTOR_URL:
+            request = urllib.request.Request(
+                TRACE_COLLECTOR_URL,
+                data=json.dumps({"spans": batch}, default=str).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST"
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+    except Exception as e:
+        print(f"Failed exporting {len(batch)} spans: {e!r}")
+
+
+def _stop_exporter():
+    if _exporter is not None:
+        _spans.put(None)
+        _exporter.join(5)
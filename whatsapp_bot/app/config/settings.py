@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Relative local paths (journal, outbox, dedupe file) are resolved against this
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 
 class Settings:
     """Application settings loaded from environment variables."""
@@ -23,6 +26,126 @@ class Settings:
     DATABASE_API_URL: str = os.getenv("DATABASE_API_URL")
     DATABASE_API_TOKEN: str = os.getenv("DATABASE_API_TOKEN")
 
+    # Webhook Worker Pool Configuration
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "8"))
+    WORKER_QUEUE_MAXSIZE: int = int(os.getenv("WORKER_QUEUE_MAXSIZE", "1000"))
+    WORKER_DRAIN_TIMEOUT: float = float(os.getenv("WORKER_DRAIN_TIMEOUT", "25"))
+
+    # Inbound Message Coalescing Configuration (0 disables)
+    COALESCE_QUIET_PERIOD: float = float(os.getenv("COALESCE_QUIET_PERIOD", "0"))
+    COALESCE_MAX_WAIT: float = float(os.getenv("COALESCE_MAX_WAIT", "5"))
+
+    # Webhook Deduplication Configuration
+    DEDUPE_TTL_SECONDS: float = float(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
+    DEDUPE_MAX_ENTRIES: int = int(os.getenv("DEDUPE_MAX_ENTRIES", "100000"))
+    DEDUPE_PERSIST_PATH: str = os.getenv("DEDUPE_PERSIST_PATH", "")
+
+    # Shared HTTP Transport Configuration
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_PER_HOST_LIMIT: int = int(os.getenv("HTTP_PER_HOST_LIMIT", "20"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    # Outbound WhatsApp Send Queue Configuration
+    OUTBOUND_SEND_CONCURRENCY: int = int(os.getenv("OUTBOUND_SEND_CONCURRENCY", "8"))
+    OUTBOUND_RATE_PER_SECOND: float = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "20"))
+    OUTBOUND_BURST: int = int(os.getenv("OUTBOUND_BURST", "40"))
+    OUTBOUND_MAX_RETRIES: int = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+    OUTBOUND_RETRY_BASE_DELAY: float = float(os.getenv("OUTBOUND_RETRY_BASE_DELAY", "1.0"))
+    # Merge consecutive texts to the same recipient within one message handler
+    WHATSAPP_BATCH_SENDS: bool = os.getenv("WHATSAPP_BATCH_SENDS", "true").lower() == "true"
+
+    # Diagnosis API Resilience Configuration
+    API_MAX_RETRIES: int = int(os.getenv("API_MAX_RETRIES", "3"))
+    API_REQUEST_DEADLINE: float = float(os.getenv("API_REQUEST_DEADLINE", "90"))
+    API_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("API_BREAKER_FAILURE_THRESHOLD", "5"))
+    API_BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("API_BREAKER_RECOVERY_TIMEOUT", "30"))
+    API_HEDGE_ENABLED: bool = os.getenv("API_HEDGE_ENABLED", "false").lower() == "true"
+    API_HEDGE_PERCENTILE: float = float(os.getenv("API_HEDGE_PERCENTILE", "95"))
+    API_HEDGE_MIN_DELAY: float = float(os.getenv("API_HEDGE_MIN_DELAY", "2.0"))
+    # Only endpoints safe to send twice: /questions replaces and /answers deletes the diagnose-bot session
+    API_HEDGE_ENDPOINTS: str = os.getenv("API_HEDGE_ENDPOINTS", "")
+    API_SPECULATIVE_ENABLED: bool = os.getenv("API_SPECULATIVE_ENABLED", "false").lower() == "true"
+    API_SPECULATIVE_DEFER: str = os.getenv("API_SPECULATIVE_DEFER", "desired_outcome")
+    API_SPECULATIVE_REISSUE_KEYWORDS: str = os.getenv(
+        "API_SPECULATIVE_REISSUE_KEYWORDS",
+        "suicid,morir,matarme,hacerme daño,quitarme la vida,urgente,emergencia,hospital"
+    )
+
+    # Structured Event Logging Configuration
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")  # DEBUG | INFO | WARNING | ERROR | OFF
+    LOG_CATEGORY_LEVELS: str = os.getenv("LOG_CATEGORY_LEVELS", "")  # e.g. INBOUND=DEBUG,API_CALL=WARNING
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")  # e.g. INBOUND=0.1 (warnings and errors always kept)
+    LOG_PAYLOAD_MODE: str = os.getenv("LOG_PAYLOAD_MODE", "redact").lower()  # redact | full | truncate | hash | omit
+    LOG_PAYLOAD_MAX_CHARS: int = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "1000"))
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Request Tracing Configuration (spans are only written when a path or collector is set)
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "whatsapp_bot")
+    TRACE_EXPORT_PATH: str = os.getenv("TRACE_EXPORT_PATH", "")  # JSON lines, one span per line
+    TRACE_COLLECTOR_URL: str = os.getenv("TRACE_COLLECTOR_URL", "")  # Receives POSTed {"spans": [...]} batches
+
+    # Backend Outbox Configuration (empty path keeps the outbox in memory only)
+    BACKEND_OUTBOX_PATH: str = os.getenv("BACKEND_OUTBOX_PATH", "data/backend-outbox.jsonl")
+    BACKEND_OUTBOX_FSYNC: bool = os.getenv("BACKEND_OUTBOX_FSYNC", "true").lower() == "true"
+    BACKEND_OUTBOX_FLUSH_INTERVAL: float = float(os.getenv("BACKEND_OUTBOX_FLUSH_INTERVAL", "1.0"))
+    BACKEND_OUTBOX_BATCH_SIZE: int = int(os.getenv("BACKEND_OUTBOX_BATCH_SIZE", "20"))
+    BACKEND_OUTBOX_MAX_BACKOFF: float = float(os.getenv("BACKEND_OUTBOX_MAX_BACKOFF", "300"))
+
+    # Doctor Notification Fan-out Configuration
+    DOCTOR_FANOUT_CONCURRENCY: int = int(os.getenv("DOCTOR_FANOUT_CONCURRENCY", "10"))
+
+    # Doctor Case Assignment Configuration (DOCTOR_ASSIGN_INITIAL=0 notifies every matched doctor)
+    DOCTOR_ASSIGN_INITIAL: int = int(os.getenv("DOCTOR_ASSIGN_INITIAL", "2"))
+    DOCTOR_ASSIGN_ESCALATION_STEP: int = int(os.getenv("DOCTOR_ASSIGN_ESCALATION_STEP", "2"))
+    DOCTOR_ASSIGN_TIMEOUT: float = float(os.getenv("DOCTOR_ASSIGN_TIMEOUT", "900"))
+    DOCTOR_ASSIGN_MAX_ROUNDS: int = int(os.getenv("DOCTOR_ASSIGN_MAX_ROUNDS", "3"))
+    DOCTOR_LOAD_HALF_LIFE: float = float(os.getenv("DOCTOR_LOAD_HALF_LIFE", "3600"))
+
+    # Deadline Scheduler Configuration (0 disables a deadline)
+    DEADLINE_TICK: float = float(os.getenv("DEADLINE_TICK", "1"))
+    DOCTOR_REVIEW_TIMEOUT: float = float(os.getenv("DOCTOR_REVIEW_TIMEOUT", "7200"))
+    DOCTOR_APPROVAL_MAX_WAIT: float = float(os.getenv("DOCTOR_APPROVAL_MAX_WAIT", "86400"))
+    PATIENT_NUDGE_AFTER: float = float(os.getenv("PATIENT_NUDGE_AFTER", "1800"))
+
+    # Urgent Case Alerts Configuration
+    URGENT_ALERTS_ENABLED: bool = os.getenv("URGENT_ALERTS_ENABLED", "true").lower() == "true"
+    URGENT_EXTRA_PHRASES: str = os.getenv("URGENT_EXTRA_PHRASES", "")  # Comma-separated, matched in any answer
+
+    # Doctor Phone Directory Cache Configuration
+    DOCTOR_DIRECTORY_TTL: float = float(os.getenv("DOCTOR_DIRECTORY_TTL", "300"))
+    DOCTOR_DIRECTORY_MAX_STALE: float = float(os.getenv("DOCTOR_DIRECTORY_MAX_STALE", "3600"))
+    
+    # Session Store Configuration
+    SESSION_STORE_BACKEND: str = os.getenv("SESSION_STORE_BACKEND", "memory").lower()  # memory | redis
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    SESSION_STORE_PREFIX: str = os.getenv("SESSION_STORE_PREFIX", "wb")
+    SESSION_STORE_TTL: int = int(os.getenv("SESSION_STORE_TTL", "604800"))
+    
+    # Session Eviction Configuration
+    SESSION_MAX_ENTRIES: int = int(os.getenv("SESSION_MAX_ENTRIES", "50000"))
+    SESSION_IDLE_TTL: float = float(os.getenv("SESSION_IDLE_TTL", "86400"))
+    SESSION_STATE_TTLS: str = os.getenv(
+        "SESSION_STATE_TTLS",
+        "conversation_ended=3600,consent_declined=3600,waiting_for_doctor_approval=604800"
+    )
+    SESSION_SWEEP_INTERVAL: float = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+    
+    # Session Journal Configuration (memory backend only; empty dir disables it)
+    SESSION_JOURNAL_DIR: str = os.getenv("SESSION_JOURNAL_DIR", "")
+    SESSION_JOURNAL_FLUSH_INTERVAL: float = float(os.getenv("SESSION_JOURNAL_FLUSH_INTERVAL", "0.05"))
+    SESSION_JOURNAL_FSYNC: bool = os.getenv("SESSION_JOURNAL_FSYNC", "true").lower() == "true"
+    SESSION_SNAPSHOT_INTERVAL: float = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "300"))
+    SESSION_JOURNAL_MAX_RECORDS: int = int(os.getenv("SESSION_JOURNAL_MAX_RECORDS", "50000"))
+    
+    # Worker Sharding Configuration (shard_front.py; 1 worker runs main.py unsharded)
+    SHARD_WORKERS: int = int(os.getenv("SHARD_WORKERS", "1"))
+    SHARD_INDEX: int = int(os.getenv("SHARD_INDEX", "0"))
+    SHARD_SOCKET_DIR: str = os.getenv("SHARD_SOCKET_DIR", "/tmp/whatsapp-bot-shards")
+    SHARD_RING_REPLICAS: int = int(os.getenv("SHARD_RING_REPLICAS", "160"))
+
     # API URLs
     @property
     def GRAPH_URL(self) -> str:
@@ -37,6 +160,15 @@ class Settings:
             "Content-Type": "application/json"
         }
     
+    def shard_path(self, path: str) -> str:
+        """Resolve a local file or directory against the app directory and give each shard worker its own copy."""
+        if not path:
+            return path
+        path = os.path.join(APP_DIR, path)  # Absolute paths are kept as they are
+        if self.SHARD_WORKERS <= 1:
+            return path
+        return f"{path}.shard{self.SHARD_INDEX}"
+    
     def validate(self) -> None:
         """Validate that all required settings are present."""
         required_vars = [
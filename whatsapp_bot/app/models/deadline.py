@@ -0,0 +1,34 @@
+"""Deadline model for timers registered by the conversation services."""
+
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+# Deadline kinds; each one is handled by the service that schedules it
+CASE_ESCALATION = "case_escalation"  # Assign an undecided case to more doctors
+APPROVAL_WAIT = "approval_wait"  # Stop waiting for a specialist decision
+DOCTOR_REVIEW = "doctor_review"  # Release a doctor who never decided on a case
+PATIENT_NUDGE = "patient_nudge"  # Remind an idle patient to continue
+
+
+@dataclass(slots=True)
+class Deadline:
+    """A timer firing once at ``due_ts`` (epoch seconds).
+
+    ``key`` identifies the timer: scheduling the same key again replaces it.
+    ``kind`` selects the handler and ``subject`` is the phone number the
+    timer is about, which also decides the shard worker that owns it.
+    """
+    key: str
+    kind: str
+    subject: str
+    due_ts: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.subject = sys.intern(self.subject)
+
+    def __reduce__(self):
+        # Pickle as constructor args, like the session models (session journal)
+        return (Deadline, (self.key, self.kind, self.subject, self.due_ts, self.payload))
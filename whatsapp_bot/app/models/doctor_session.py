@@ -2,11 +2,20 @@
 Doctor session model for managing doctor registration and workflows.
 """
 
+import math
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import List, Dict, Any, Optional
 
+from .timestamps import epoch_now, from_epoch
+
+
+# Load rank of a doctor never assigned a case: below any real rank, and
+# unlike -inf still valid JSON (ranks are exchanged between shard workers)
+NO_LOAD_RANK = -1e18
+
 
 class DoctorSessionState(Enum):
     """Possible states of a doctor session."""
@@ -16,30 +25,75 @@ class DoctorSessionState(Enum):
     INACTIVE = "inactive"  # Temporarily inactive
 
 
-@dataclass
+@dataclass(slots=True)
 class DoctorSession:
-    """Represents a doctor's session and state."""
+    """Represents a doctor's session and state (slotted, epoch-second timestamps)."""
     phone_number: str
     state: DoctorSessionState = DoctorSessionState.REGISTRATION_PENDING
-    registration_date: datetime = field(default_factory=datetime.now)
-    last_activity: datetime = field(default_factory=datetime.now)
+    registration_ts: int = field(default_factory=epoch_now)
+    last_activity_ts: int = field(default_factory=epoch_now)
     cases_reviewed: List[str] = field(default_factory=list)  # Patient phone numbers
     current_reviewing_patient: Optional[str] = None
+    assignment_load: float = 0.0  # Cases assigned, decayed by half-lives since last_assigned_ts
+    last_assigned_ts: int = 0
+    
+    def __post_init__(self):
+        self.phone_number = sys.intern(self.phone_number)
+    
+    def __reduce__(self):
+        # Pickle as constructor args: much faster than slot state (session journal)
+        return (DoctorSession, (
+            self.phone_number, self.state, self.registration_ts, self.last_activity_ts,
+            self.cases_reviewed, self.current_reviewing_patient, self.assignment_load, self.last_assigned_ts
+        ))
+    
+    @property
+    def registration_date(self) -> datetime:
+        """When the doctor registered."""
+        return from_epoch(self.registration_ts)
+    
+    @property
+    def last_activity(self) -> datetime:
+        """When the doctor was last active."""
+        return from_epoch(self.last_activity_ts)
     
     def mark_activity(self):
         """Update the last activity timestamp."""
-        self.last_activity = datetime.now()
+        self.last_activity_ts = epoch_now()
     
-    def start_reviewing_case(self, patient_phone: str):
-        """Start reviewing a patient case."""
+    def recent_load(self, now: int, half_life: float) -> float:
+        """Cases assigned recently, each counting half as much per ``half_life`` seconds."""
+        return self.assignment_load * 0.5 ** ((now - self.last_assigned_ts) / half_life)
+    
+    def load_rank(self, half_life: float) -> float:
+        """Time-independent ordering of ``recent_load``: log2 of the load at epoch 0.
+        
+        Every doctor's load decays at the same rate, so comparing these is
+        the same as comparing ``recent_load`` at any moment.
+        """
+        if self.assignment_load <= 0:
+            return NO_LOAD_RANK
+        return math.log2(self.assignment_load) + self.last_assigned_ts / half_life
+    
+    def start_reviewing_case(self, patient_phone: str, half_life: float = 3600.0):
+        """Start reviewing a patient case, counting it towards the recent load."""
+        now = epoch_now()
+        self.assignment_load = self.recent_load(now, half_life) + 1
+        self.last_assigned_ts = now
         self.state = DoctorSessionState.REVIEWING_CASE
-        self.current_reviewing_patient = patient_phone
+        self.current_reviewing_patient = sys.intern(patient_phone)
         self.mark_activity()
     
     def complete_case_review(self, patient_phone: str):
         """Complete reviewing a patient case."""
         if patient_phone not in self.cases_reviewed:
-            self.cases_reviewed.append(patient_phone)
+            self.cases_reviewed.append(sys.intern(patient_phone))
+        self.current_reviewing_patient = None
+        self.state = DoctorSessionState.REGISTERED
+        self.mark_activity()
+    
+    def release_case(self):
+        """Stop reviewing the current case without counting it as reviewed."""
         self.current_reviewing_patient = None
         self.state = DoctorSessionState.REGISTERED
         self.mark_activity()
@@ -1,8 +1,11 @@
 """Question and Answer models."""
 
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from .timestamps import epoch_now, from_epoch
+
 
 @dataclass
 class Question:
@@ -12,9 +15,25 @@ class Question:
     required: bool = True
 
 
-@dataclass
+@dataclass(slots=True)
 class Answer:
-    """Represents a user's answer to a question."""
+    """Represents a user's answer to a question.
+    
+    Slotted with an epoch-second timestamp; question ids are interned so every
+    answer to the same question shares one string.
+    """
     question_id: str
     value: str
-    timestamp: datetime = field(default_factory=datetime.now)
+    answered_at: int = field(default_factory=epoch_now)
+    
+    def __post_init__(self):
+        self.question_id = sys.intern(self.question_id)
+    
+    def __reduce__(self):
+        # Pickle as constructor args: much faster than slot state, and re-interns on load
+        return (Answer, (self.question_id, self.value, self.answered_at))
+    
+    @property
+    def timestamp(self) -> datetime:
+        """When the answer was given."""
+        return from_epoch(self.answered_at)
@@ -1,11 +1,14 @@
 """User session models."""
 
-from dataclasses import dataclass, field
+import sys
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
 from datetime import datetime
 from enum import Enum
 from typing import List, Optional, Dict, Any
 
 from .question import Answer
+from .timestamps import epoch_now, from_epoch, to_epoch
 
 
 class SessionState(Enum):
@@ -20,15 +23,19 @@ class SessionState(Enum):
     CONSENT_DECLINED = "consent_declined"
 
 
-@dataclass
+@dataclass(slots=True)
 class UserSession:
-    """Represents a user's conversation session."""
+    """Represents a user's conversation session.
+    
+    Slotted, with timestamps kept as epoch seconds (``created_at`` and
+    ``last_activity`` expose them as datetimes) to keep live sessions small.
+    """
     phone_number: str
     current_question_index: int = 0
     answers: List[Answer] = field(default_factory=list)
     state: SessionState = SessionState.WAITING_FOR_CONSENT
-    created_at: datetime = field(default_factory=datetime.now)
-    last_activity: datetime = field(default_factory=datetime.now)
+    created_ts: int = field(default_factory=epoch_now)
+    last_activity_ts: int = field(default_factory=epoch_now)
     first_question_asked: bool = False  # Track if we've asked the first question
     consent_given: bool = False  # Track if user has given consent
     greeting_sent: bool = False  # Track if greeting has been sent
@@ -44,3 +51,33 @@ class UserSession:
     specialist_responses: List[Dict[str, Any]] = field(default_factory=list)  # Specialist approval responses
     final_specialist_decision: Optional[str] = None  # Final specialist decision (APROBAR/DENEGAR/MIXTO)
     patient_notified_of_decision: bool = False  # Whether patient was notified of specialist decision
+    urgent_alert_sent: bool = False  # Specialists were alerted to a high-risk answer before the diagnosis
+    
+    def __post_init__(self):
+        # The same phone is also the key in the session maps and stores
+        self.phone_number = sys.intern(self.phone_number)
+    
+    def __reduce__(self):
+        # Pickle as constructor args: much faster than slot state (session journal)
+        return (UserSession, _user_session_fields(self))
+    
+    @property
+    def created_at(self) -> datetime:
+        """When the session was created."""
+        return from_epoch(self.created_ts)
+    
+    @property
+    def last_activity(self) -> datetime:
+        """When the user was last active."""
+        return from_epoch(self.last_activity_ts)
+    
+    @last_activity.setter
+    def last_activity(self, value: datetime) -> None:
+        self.last_activity_ts = to_epoch(value)
+    
+    def mark_activity(self) -> None:
+        """Update the last activity timestamp."""
+        self.last_activity_ts = epoch_now()
+
+
+_user_session_fields = attrgetter(*(f.name for f in fields(UserSession)))
@@ -0,0 +1,19 @@
+"""Epoch-second timestamps used by the session models."""
+
+import time
+from datetime import datetime
+
+
+def epoch_now() -> int:
+    """Current time as whole epoch seconds."""
+    return int(time.time())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Local ``datetime`` for an epoch-second timestamp."""
+    return datetime.fromtimestamp(seconds)
+
+
+def to_epoch(value: datetime) -> int:
+    """Whole epoch seconds for a ``datetime``."""
+    return int(value.timestamp())
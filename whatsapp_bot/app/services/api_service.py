@@ -1,34 +1,69 @@
 """External API service for processing mental health data."""
 
-import json
+import logging
+import time
 import httpx
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.config.settings import settings
+from app.services.http_transport import HTTPTransport
+from app.utils.event_log import event_log
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.latency_window import LatencyWindow
+from app.utils.metrics import metrics
+from app.utils.settings_parsing import parse_csv
+from app.utils.tracing import tracer
 from app.models.session import UserSession
 from app.config.questions import MENTAL_HEALTH_QUESTIONS
 
 
+# Successful responses needed before the p95 is trusted as a hedge delay
+HEDGE_MIN_SAMPLES = 20
+
+DIAGNOSIS_API_SECONDS = metrics.histogram(
+    "diagnosis_api_seconds", "Diagnosis API calls including retries and hedges", ("endpoint",)
+)
+API_RETRIES = metrics.counter("retries_total", "Retried downstream calls", ("operation",)).labels("diagnosis_api")
+
+
 class ExternalAPIService:
     """Service for communicating with external mental health processing API."""
     
-    def __init__(self):
-        # Configure timeout with more specific settings
-        timeout_config = httpx.Timeout(
-            connect=10.0,  # Connection timeout
-            read=60.0,     # Read timeout (longer for processing)
-            write=10.0,    # Write timeout
-            pool=5.0       # Pool timeout
-        )
-        self.http_client = httpx.AsyncClient(timeout=timeout_config)
+    def __init__(self, transport: Optional[HTTPTransport] = None, breaker: Optional[CircuitBreaker] = None):
+        # Timeouts come from the transport's "diagnosis" profile (longer read for LLM processing)
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport.from_settings()
         self.base_url = settings.EXTERNAL_API_URL
         self.questions_endpoint = f"{self.base_url}/questions"
         self.answers_endpoint = f"{self.base_url}/answers"
-        self.max_retries = 3
+        self.max_retries = settings.API_MAX_RETRIES
+        self.deadline = settings.API_REQUEST_DEADLINE
+        self.breaker = breaker or CircuitBreaker(
+            "diagnose-bot",
+            failure_threshold=settings.API_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.API_BREAKER_RECOVERY_TIMEOUT
+        )
+        self.hedge_enabled = settings.API_HEDGE_ENABLED
+        self.hedge_percentile = settings.API_HEDGE_PERCENTILE
+        self.hedge_min_delay = settings.API_HEDGE_MIN_DELAY
+        # Endpoint names ("questions", ...) that may be sent twice
+        self.hedge_endpoints = frozenset(parse_csv(settings.API_HEDGE_ENDPOINTS))
+        self._latency: Dict[str, LatencyWindow] = {}
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "fast_failed": 0,
+            "deadline_exceeded": 0,
+            "hedged": 0,
+            "hedge_wins": 0
+        }
     
     async def _make_api_request_with_retry(self, endpoint: str, payload: Dict[str, Any], request_type: str) -> Dict[str, Any]:
-        """Make API request with retry logic and exponential backoff.
+        """Make API request with retries and exponential backoff inside one deadline.
+        
+        All attempts and backoff waits share ``self.deadline`` seconds, and
+        no attempt is made while the diagnose-bot circuit is open, so a
+        patient is never held for minutes when the service is down.
         
         Args:
             endpoint: The API endpoint to call
@@ -38,59 +73,180 @@ class ExternalAPIService:
         Returns:
             The API response or error response
         """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
         last_exception = None
+        attempts = 0
+        self.stats["requests"] += 1
         
         for attempt in range(self.max_retries):
             try:
-                print(f"[API_RETRY] Attempt {attempt + 1}/{self.max_retries} for {request_type} request")
+                probe = self.breaker.before_call()
+            except CircuitOpenError as e:
+                last_exception = e
+                self.stats["fast_failed"] += 1
+                event_log.emit("API_CALL", "circuit_open", logging.WARNING, request_type=request_type, error=str(e))
+                break
+            
+            attempts += 1
+            try:
+                event_log.emit(
+                    "API_CALL", "attempt", logging.DEBUG,
+                    request_type=request_type, attempt=attempt + 1, max_attempts=self.max_retries
+                )
                 
-                response = await self.http_client.post(
-                    endpoint,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
+                response = await asyncio.wait_for(
+                    self._post_hedged(endpoint, payload, request_type),
+                    timeout=max(0.0, deadline - loop.time())
                 )
+                # 5xx means diagnose-bot itself is failing; other statuses are answers
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
                 
                 # Enhanced logging for API response
                 result = self._log_api_response(response, request_type)
-                print(f"✅ [API_SUCCESS] {request_type} request succeeded on attempt {attempt + 1}")
+                event_log.emit("API_CALL", "succeeded", logging.DEBUG, request_type=request_type, attempt=attempt + 1)
                 return result
                 
-            except httpx.TimeoutException as e:
+            except asyncio.TimeoutError as e:
                 last_exception = e
-                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                print(f"⏰ [API_TIMEOUT] {request_type} request timed out on attempt {attempt + 1}")
-                print(f"   Timeout details: {repr(e)}")
+                self.breaker.record_failure()
+                self.stats["deadline_exceeded"] += 1
+                event_log.emit(
+                    "API_CALL", "deadline_exceeded", logging.WARNING,
+                    request_type=request_type, attempt=attempt + 1, deadline_seconds=self.deadline
+                )
+                break
                 
-                if attempt < self.max_retries - 1:  # Don't wait after the last attempt
-                    print(f"   Retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
+            except httpx.TimeoutException as e:
+                last_exception = e
+                self.breaker.record_failure()
+                event_log.emit(
+                    "API_CALL", "timeout", logging.WARNING,
+                    request_type=request_type, attempt=attempt + 1, error=repr(e)
+                )
                 
             except httpx.RequestError as e:
                 last_exception = e
-                wait_time = 2 ** attempt
-                print(f"🌐 [API_CONNECTION_ERROR] {request_type} request failed on attempt {attempt + 1}")
-                print(f"   Connection error: {repr(e)}")
+                self.breaker.record_failure()
+                event_log.emit(
+                    "API_CALL", "connection_error", logging.WARNING,
+                    request_type=request_type, attempt=attempt + 1, error=repr(e)
+                )
                 
-                if attempt < self.max_retries - 1:
-                    print(f"   Retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
+            except asyncio.CancelledError:
+                # E.g. a discarded speculative request: no outcome, so free the probe slot
+                if probe:
+                    self.breaker.release_probe()
+                raise
                 
             except Exception as e:
                 last_exception = e
-                print(f"❌ [API_UNEXPECTED_ERROR] {request_type} request failed with unexpected error: {repr(e)}")
+                if probe:
+                    self.breaker.release_probe()
+                event_log.emit("API_CALL", "unexpected_error", logging.ERROR, request_type=request_type, error=repr(e))
                 break  # Don't retry on unexpected errors
+            
+            if attempt < self.max_retries - 1:  # Don't wait after the last attempt
+                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
+                if loop.time() + wait_time >= deadline:
+                    event_log.emit(
+                        "API_CALL", "no_time_to_retry", request_type=request_type, deadline_seconds=self.deadline
+                    )
+                    break
+                event_log.emit("API_CALL", "retry", request_type=request_type, wait_seconds=wait_time)
+                API_RETRIES.inc()
+                await asyncio.sleep(wait_time)
         
         # All retries failed
-        print(f"\n❌ [API_ERROR] {request_type} connection failed after {self.max_retries} attempts")
-        print(f"   Final error: {repr(last_exception)}")
+        event_log.emit(
+            "API_CALL", "failed", logging.ERROR,
+            request_type=request_type, attempts=attempts, error=repr(last_exception)
+        )
         
         return {
-            "error": f"API connection failed after {self.max_retries} attempts: {str(last_exception)}",
+            "error": f"API connection failed after {attempts} attempts: {str(last_exception)}",
             "continue_conversation": False,
-            "retry_attempts": self.max_retries,
+            "retry_attempts": attempts,
             "final_error_type": type(last_exception).__name__
         }
     
+    async def _post(self, endpoint: str, payload: Dict[str, Any]) -> httpx.Response:
+        """Send one request and record its latency when it succeeds."""
+        started = time.perf_counter()
+        response = await self.transport.post(
+            endpoint,
+            profile="diagnosis",
+            json=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        if response.status_code == 200:
+            self._latency.setdefault(endpoint, LatencyWindow()).add(time.perf_counter() - started)
+        return response
+    
+    def _hedge_delay(self, endpoint: str) -> Optional[float]:
+        """Seconds to wait before hedging.
+        
+        None when hedging is disabled, the endpoint is not safe to repeat
+        (not in ``hedge_endpoints``) or its latency is not known yet.
+        """
+        if not self.hedge_enabled or endpoint.rsplit("/", 1)[-1] not in self.hedge_endpoints:
+            return None
+        window = self._latency.get(endpoint)
+        if window is None or len(window) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.hedge_min_delay, window.percentile(self.hedge_percentile))
+    
+    async def _post_hedged(self, endpoint: str, payload: Dict[str, Any], request_type: str) -> httpx.Response:
+        """Send the request, plus a second copy if it is slower than the usual p95.
+        
+        The first response wins and the other request is cancelled.
+        """
+        primary = asyncio.create_task(self._post(endpoint, payload))
+        delay = self._hedge_delay(endpoint)
+        if delay is None:
+            return await primary
+        
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.stats["hedged"] += 1
+                event_log.emit("API_CALL", "hedged", request_type=request_type, delay_seconds=round(delay, 3))
+                tasks.append(asyncio.create_task(self._post(endpoint, payload)))
+            
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get circuit breaker state, hedging counters and latency percentiles."""
+        return {
+            **self.stats,
+            "circuit": self.breaker.get_stats(),
+            "latency": {
+                endpoint.rsplit("/", 1)[-1]: {
+                    "samples": len(window),
+                    "p50": round(window.percentile(50), 3),
+                    "p95": round(window.percentile(95), 3)
+                }
+                for endpoint, window in self._latency.items()
+            }
+        }
+    
     def _prepare_payload(self, session: UserSession, include_followup: bool = False) -> Dict[str, Any]:
         """Prepare the payload for the external API.
         
@@ -143,13 +299,28 @@ class ExternalAPIService:
         Returns:
             The API response (may contain follow-up questions)
         """
-        payload = self._prepare_payload(session, include_followup=False)
+        return await self.send_initial_payload(self.prepare_initial_payload(session))
+    
+    def prepare_initial_payload(self, session: UserSession) -> Dict[str, Any]:
+        """Build the initial questionnaire payload from the answers collected so far."""
+        return self._prepare_payload(session, include_followup=False)
+    
+    async def send_initial_payload(self, payload: Dict[str, Any], request_type: str = "INITIAL") -> Dict[str, Any]:
+        """Send a prepared initial questionnaire payload to ``/questions``.
         
+        Args:
+            payload: Payload from ``prepare_initial_payload``
+            request_type: Label for logging
+            
+        Returns:
+            The API response (may contain follow-up questions)
+        """
         # Enhanced logging for API call
-        self._log_api_request(payload, "INITIAL", self.questions_endpoint)
+        self._log_api_request(payload, request_type, self.questions_endpoint)
         
         # Use retry logic for the API call
-        return await self._make_api_request_with_retry(self.questions_endpoint, payload, "INITIAL")
+        with DIAGNOSIS_API_SECONDS.time("questions"), tracer.span("diagnosis.questions", request_type=request_type):
+            return await self._make_api_request_with_retry(self.questions_endpoint, payload, request_type)
     
     async def send_followup_data(self, session: UserSession) -> Dict[str, Any]:
         """Send follow-up answers to external API for final diagnosis.
@@ -166,76 +337,63 @@ class ExternalAPIService:
         self._log_api_request(payload, "FOLLOWUP", self.answers_endpoint)
         
         # Use retry logic for the API call
-        return await self._make_api_request_with_retry(self.answers_endpoint, payload, "FOLLOWUP")
+        with DIAGNOSIS_API_SECONDS.time("answers"), tracer.span("diagnosis.answers", request_type="FOLLOWUP"):
+            return await self._make_api_request_with_retry(self.answers_endpoint, payload, "FOLLOWUP")
     
     def _log_api_request(self, payload: Dict[str, Any], request_type: str = "INITIAL", endpoint: str = None) -> None:
-        """Log the API request in a formatted way."""
-        if endpoint is None:
-            endpoint = self.base_url
-        
-        print("\n" + "="*60)
-        print(f"[API_CALL] SENDING {request_type} DATA TO EXTERNAL API")
-        print("="*60)
-        print(f"🎯 Endpoint: {endpoint}")
-        print(f"📱 User: {payload.get('phone_number', 'Unknown')}")
-        print(f"📊 Total Q&A Pairs: {len(payload.get('chat', []))}")
-        print(f"🔄 Request Type: {request_type}")
-        print("\n📋 COMPLETE API PAYLOAD:")
-        print("-" * 40)
-        print(json.dumps(payload, ensure_ascii=False, indent=2))
-        print("-" * 40)
-        print("🚀 Sending request...")
-        print("="*60 + "\n")
+        """Log the API request as one structured event."""
+        event_log.emit(
+            "API_CALL", "request",
+            request_type=request_type,
+            endpoint=endpoint or self.base_url,
+            user=payload.get("phone_number", "Unknown"),
+            qa_pairs=len(payload.get("chat", [])),
+            payload=payload
+        )
     
     def _log_api_response(self, response: httpx.Response, request_type: str = "INITIAL") -> Dict[str, Any]:
         """Log the API response and return parsed data."""
-        print("\n" + "="*60)
-        print(f"[API_RESPONSE] RECEIVED {request_type} RESPONSE FROM EXTERNAL API")
-        print("="*60)
-        print(f"📈 Status Code: {response.status_code}")
-        print(f"🔄 Response Type: {request_type}")
-        
-        if hasattr(response, 'elapsed'):
-            print(f"⏱️  Response Time: {response.elapsed.total_seconds():.2f}s")
-        
-        print("\n📨 RESPONSE BODY:")
-        print("-" * 40)
+        elapsed = round(response.elapsed.total_seconds(), 3) if hasattr(response, 'elapsed') else None
         
         try:
             if response.status_code == 200:
                 response_json = response.json()
-                print(json.dumps(response_json, ensure_ascii=False, indent=2))
-                print("-" * 40)
-                
-                # Different success messages based on response type
-                if request_type == "INITIAL" and "questions" in response_json:
-                    print("✅ Initial API call successful! Follow-up questions received.")
-                elif request_type == "FOLLOWUP" and ("pre-diagnosis" in response_json or "pre_diagnosis" in response_json):
-                    print("✅ Follow-up API call successful! Pre-diagnosis received.")
-                else:
-                    print("✅ API call successful!")
-                
-                print("="*60 + "\n")
+                event_log.emit(
+                    "API_CALL", "response",
+                    request_type=request_type,
+                    status_code=response.status_code,
+                    elapsed_seconds=elapsed,
+                    has_questions="questions" in response_json,
+                    has_pre_diagnosis="pre-diagnosis" in response_json or "pre_diagnosis" in response_json,
+                    payload=response_json
+                )
                 return response_json
             else:
-                print(f"❌ Error Response: {response.text}")
-                print("-" * 40)
-                print(f"🚨 API call failed with status {response.status_code}")
-                print("="*60 + "\n")
+                event_log.emit(
+                    "API_CALL", "response_error", logging.ERROR,
+                    request_type=request_type,
+                    status_code=response.status_code,
+                    elapsed_seconds=elapsed,
+                    payload=response.text
+                )
                 return {
                     "error": f"API error: {response.status_code}",
                     "continue_conversation": False
                 }
         except Exception as parse_error:
-            print(f"❌ Failed to parse response: {response.text}")
-            print(f"🚨 Parse error: {str(parse_error)}")
-            print("-" * 40)
-            print("="*60 + "\n")
+            event_log.emit(
+                "API_CALL", "response_unparseable", logging.ERROR,
+                request_type=request_type,
+                status_code=response.status_code,
+                error=str(parse_error),
+                payload=response.text
+            )
             return {
                 "error": f"API parse error: {str(parse_error)}",
                 "continue_conversation": False
             }
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.http_client.aclose()
+        """Close the HTTP transport if this service created it."""
+        if self._owns_transport:
+            await self.transport.close()
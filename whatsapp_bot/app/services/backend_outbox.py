@@ -0,0 +1,299 @@
+"""Durable outbox for diagnostic records written to the backend API."""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.config.settings import settings
+from app.services.database_service import DatabaseService
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
+
+
+# Client errors that will never succeed on retry; 409 means already stored
+PERMANENT_STATUS_CODES = {400, 401, 403, 404, 405, 413, 422}
+ALREADY_STORED_STATUS_CODES = {409}
+
+OUTBOX_RETRIES = metrics.counter("retries_total", "Retried downstream calls", ("operation",)).labels("backend_outbox")
+
+
+@dataclass
+class OutboxRecord:
+    """A backend write waiting for delivery, keyed by the payload's ``number``."""
+    key: str
+    payload: Dict[str, Any]
+    enqueued_at: float
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    trace_id: Optional[str] = None  # Correlation ID of the conversation that produced it
+
+
+class BackendOutbox:
+    """Append-only JSONL outbox drained to the backend by a background flusher.
+
+    The conversation only appends a record (one line written and flushed,
+    fsynced if enabled); delivery happens off the critical path in batches
+    of concurrent requests, with jittered exponential backoff on network
+    errors, 429 and 5xx. The backend's ``number`` field is the dedupe key:
+    a record already pending or recently delivered is not queued twice, and
+    409 from the backend counts as delivered. Records the backend rejects
+    permanently go to a ``.dead`` file instead of being retried forever.
+
+    The file holds ``put`` and ``ack`` lines; on load the pending records are
+    the puts without an ack, and the file is compacted to just those.
+    """
+
+    def __init__(
+        self,
+        database_service: DatabaseService,
+        path: str = "",
+        fsync: bool = True,
+        flush_interval: float = 1.0,
+        batch_size: int = 20,
+        max_backoff: float = 300.0,
+        compact_after: int = 1000
+    ):
+        self.database_service = database_service
+        self.path = path or None
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_backoff = max_backoff
+        self.compact_after = max(1, compact_after)
+        self._pending: "OrderedDict[str, OutboxRecord]" = OrderedDict()
+        self._delivered: "OrderedDict[str, None]" = OrderedDict()
+        self._file = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._acks_since_compact = 0
+        self.stats: Dict[str, int] = {
+            "appended": 0,
+            "duplicates_skipped": 0,
+            "delivered": 0,
+            "retries": 0,
+            "dead_lettered": 0
+        }
+
+    @classmethod
+    def from_settings(cls, database_service: DatabaseService) -> "BackendOutbox":
+        """Build the outbox from environment settings."""
+        return cls(
+            database_service,
+            path=settings.shard_path(settings.BACKEND_OUTBOX_PATH),
+            fsync=settings.BACKEND_OUTBOX_FSYNC,
+            flush_interval=settings.BACKEND_OUTBOX_FLUSH_INTERVAL,
+            batch_size=settings.BACKEND_OUTBOX_BATCH_SIZE,
+            max_backoff=settings.BACKEND_OUTBOX_MAX_BACKOFF
+        )
+
+    def load(self) -> int:
+        """Restore undelivered records from the outbox file and compact it.
+
+        Returns:
+            Number of pending records restored
+        """
+        if not self.path or not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash
+                if entry["op"] == "put":
+                    self._pending[entry["key"]] = OutboxRecord(
+                        entry["key"], entry["payload"], entry["enqueued_at"], trace_id=entry.get("trace_id")
+                    )
+                else:
+                    self._pending.pop(entry["key"], None)
+                    self._remember_delivered(entry["key"])
+
+        self._compact()
+        event_log.emit("DATABASE_CALL", "outbox_restored", undelivered=len(self._pending), path=self.path)
+        return len(self._pending)
+
+    def _open(self):
+        if self._file is None and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _write_lines(self, entries: List[Dict[str, Any]]) -> None:
+        f = self._open()
+        if f is None:
+            return
+        f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the pending records."""
+        if not self.path:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self._pending.values():
+                f.write(json.dumps(
+                    {"op": "put", "key": record.key, "payload": record.payload, "enqueued_at": record.enqueued_at,
+                     "trace_id": record.trace_id},
+                    ensure_ascii=False
+                ) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._acks_since_compact = 0
+
+    def _remember_delivered(self, key: str) -> None:
+        self._delivered[key] = None
+        self._delivered.move_to_end(key)
+        while len(self._delivered) > 10000:
+            self._delivered.popitem(last=False)
+
+    async def append(self, payload: Dict[str, Any]) -> bool:
+        """Durably queue a backend record.
+
+        Args:
+            payload: Complete diagnostic payload with its ``number`` dedupe key
+
+        Returns:
+            False if a record with the same key is pending or was delivered
+        """
+        key = str(payload["number"])
+        # Checked under the lock so two concurrent appends of one key cannot both write it
+        async with self._lock:
+            if key in self._pending or key in self._delivered:
+                self.stats["duplicates_skipped"] += 1
+                event_log.emit("DATABASE_CALL", "outbox_duplicate_skipped", logging.DEBUG, key=key)
+                return False
+
+            record = OutboxRecord(key, payload, time.time(), trace_id=tracer.correlation_id())
+            await asyncio.to_thread(
+                self._write_lines,
+                [{"op": "put", "key": key, "payload": payload, "enqueued_at": record.enqueued_at,
+                  "trace_id": record.trace_id}]
+            )
+            self._pending[key] = record
+        self.stats["appended"] += 1
+        self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        """Start the background flusher."""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run(), name="backend-outbox")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                event_log.emit("DATABASE_CALL", "outbox_flush_failed", logging.ERROR, exc_info=True, error=repr(e))
+
+    async def flush(self) -> int:
+        """Deliver due records in concurrent batches.
+
+        Returns:
+            Number of records delivered
+        """
+        delivered = 0
+        while True:
+            now = time.time()
+            batch = [record for record in self._pending.values() if record.next_attempt_at <= now][:self.batch_size]
+            if not batch:
+                return delivered
+            results = await asyncio.gather(*(self._deliver(record) for record in batch))
+            acked = [record.key for record, done in zip(batch, results) if done]
+            for key in acked:
+                self._pending.pop(key, None)
+                self._remember_delivered(key)
+            async with self._lock:
+                await asyncio.to_thread(self._write_lines, [{"op": "ack", "key": key} for key in acked])
+                self._acks_since_compact += len(acked)
+                if self._acks_since_compact >= self.compact_after:
+                    await asyncio.to_thread(self._compact)
+            delivered += len(acked)
+            if not any(results):
+                return delivered
+
+    async def _deliver(self, record: OutboxRecord) -> bool:
+        """Send one record; True when it no longer needs delivery."""
+        record.attempts += 1
+        # Continue the conversation's trace, even after a restart
+        with tracer.span("backend_outbox.deliver", trace_id=record.trace_id, key=record.key, attempt=record.attempts):
+            try:
+                result = await self.database_service.send_complete_payload(record.payload)
+            except Exception as e:
+                result = {"error": repr(e), "success": False}
+
+        status = result.get("status_code")
+        if result.get("success") or status in ALREADY_STORED_STATUS_CODES:
+            self.stats["delivered"] += 1
+            return True
+        if status in PERMANENT_STATUS_CODES:
+            self.stats["dead_lettered"] += 1
+            event_log.emit("DATABASE_CALL", "outbox_dead_lettered", logging.ERROR, key=record.key, status_code=status)
+            await asyncio.to_thread(self._dead_letter, record, result)
+            return True
+
+        self.stats["retries"] += 1
+        OUTBOX_RETRIES.inc()
+        backoff = min(self.max_backoff, 2 ** (record.attempts - 1))
+        record.next_attempt_at = time.time() + backoff * random.uniform(0.5, 1.0)
+        event_log.emit(
+            "DATABASE_CALL", "outbox_delivery_failed", logging.WARNING,
+            key=record.key, attempt=record.attempts, error=result.get("error"), retry_in_seconds=backoff
+        )
+        return False
+
+    def _dead_letter(self, record: OutboxRecord, result: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        with open(f"{self.path}.dead", "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": record.key, "payload": record.payload, "result": result}, ensure_ascii=False) + "\n")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Stop the flusher after one last delivery attempt; the rest stays on disk."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._pending:
+            try:
+                await asyncio.wait_for(self.flush(), timeout)
+            except Exception as e:
+                event_log.emit(
+                    "DATABASE_CALL", "outbox_final_flush_incomplete", logging.WARNING,
+                    undelivered=len(self._pending), error=repr(e)
+                )
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get outbox depth, age of the oldest record and delivery counters."""
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            "depth": len(self._pending),
+            "oldest_age_seconds": round(time.time() - oldest.enqueued_at, 1) if oldest else 0.0,
+            "max_attempts": max((record.attempts for record in self._pending.values()), default=0),
+            "durable": bool(self.path),
+            **self.stats
+        }
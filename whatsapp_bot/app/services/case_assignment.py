@@ -0,0 +1,109 @@
+"""How many doctors a case is assigned to, and when to widen the assignment."""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config.settings import settings
+from app.models.deadline import CASE_ESCALATION, Deadline
+from app.models.session import UserSession
+from app.services.deadline_scheduler import DeadlineScheduler
+
+
+# Called with the patient phone and the escalation level (1, 2, ...)
+Escalation = Callable[[str, int], Awaitable[None]]
+
+
+class CaseAssignment:
+    """Assigns each case to a few least loaded doctors instead of all of them.
+
+    A new case goes to ``initial`` doctors. If none of them has decided
+    after ``timeout`` seconds, the case is escalated to ``step`` more
+    doctors, up to ``max_rounds`` times or until no doctor is left.
+    Urgent cases, and every case when ``initial`` is 0, still go to every
+    matched doctor at once.
+
+    Escalations are ``CASE_ESCALATION`` deadlines of the deadline scheduler,
+    so they survive a restart when the session store is durable.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        step: int = 2,
+        timeout: float = 900.0,
+        max_rounds: int = 3,
+        deadlines: Optional[DeadlineScheduler] = None
+    ):
+        self.initial = max(0, initial)
+        self.step = max(1, step)
+        self.timeout = timeout
+        self.max_rounds = max(0, max_rounds)
+        self.deadlines = deadlines or DeadlineScheduler()
+        self._escalate: Optional[Escalation] = None
+        self.stats: Dict[str, int] = {"assigned": 0, "broadcast": 0, "escalated": 0, "exhausted": 0}
+
+    @classmethod
+    def from_settings(cls, deadlines: Optional[DeadlineScheduler] = None) -> "CaseAssignment":
+        """Build the assignment policy from environment settings."""
+        return cls(
+            initial=settings.DOCTOR_ASSIGN_INITIAL,
+            step=settings.DOCTOR_ASSIGN_ESCALATION_STEP,
+            timeout=settings.DOCTOR_ASSIGN_TIMEOUT,
+            max_rounds=settings.DOCTOR_ASSIGN_MAX_ROUNDS,
+            deadlines=deadlines
+        )
+
+    def on_escalation(self, escalate: Escalation) -> None:
+        """Set the coroutine function widening a case's assignment when its deadline comes due."""
+        self._escalate = escalate
+        self.deadlines.register(CASE_ESCALATION, self._fire)
+
+    def first_batch(self, session: UserSession) -> Optional[int]:
+        """Number of doctors to assign a new case to, None for every matched doctor."""
+        if self.initial == 0 or session.urgent_alert_sent:
+            self.stats["broadcast"] += 1
+            return None
+        self.stats["assigned"] += 1
+        return self.initial
+
+    def schedule(self, patient_phone: str, level: int) -> bool:
+        """Escalate the case after the timeout unless it is cancelled first.
+
+        Args:
+            patient_phone: Patient whose case was just assigned
+            level: Escalation level the case was just assigned at (0 for the first batch)
+
+        Returns:
+            True if an escalation was scheduled
+        """
+        self.cancel(patient_phone)
+        if level >= self.max_rounds:
+            self.stats["exhausted"] += 1
+            return False
+        self.deadlines.schedule(CASE_ESCALATION, patient_phone, self.timeout, level=level + 1)
+        return True
+
+    async def _fire(self, deadline: Deadline) -> None:
+        if self._escalate is None:
+            return
+        self.stats["escalated"] += 1
+        await self._escalate(deadline.subject, deadline.payload["level"])
+
+    def exhausted(self, patient_phone: str) -> None:
+        """Record that no doctor was left to escalate a case to."""
+        self.cancel(patient_phone)
+        self.stats["exhausted"] += 1
+
+    def cancel(self, patient_phone: str) -> None:
+        """Forget a pending escalation (e.g. once a doctor decided)."""
+        self.deadlines.cancel(CASE_ESCALATION, patient_phone)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get assignment settings, counters and pending escalations."""
+        return {
+            "initial": self.initial,
+            "step": self.step,
+            "timeout": self.timeout,
+            "max_rounds": self.max_rounds,
+            "pending_escalations": self.deadlines.pending(CASE_ESCALATION),
+            **self.stats
+        }
@@ -1,9 +1,14 @@
 """Conversation flow management service."""
 
-from typing import Dict, Any, List
+import heapq
+import logging
+import time
+from typing import Collection, Dict, Any, List, Optional
 
 from app.models.session import UserSession, SessionState
 from app.models.question import Answer, Question
+from app.models.deadline import APPROVAL_WAIT, PATIENT_NUDGE, Deadline
+from app.config.settings import settings
 from app.config.questions import MENTAL_HEALTH_QUESTIONS
 from app.config.messages import (
     GREETING_MESSAGE, 
@@ -13,10 +18,37 @@ from app.config.messages import (
     CONSENT_BUTTON_TEXT
 )
 from app.utils.session_manager import SessionManager
+from app.utils.phone_numbers import normalize_phone_number
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
 from app.services.whatsapp_service import WhatsAppService
+from app.services.outbound_dispatcher import MessagePriority
 from app.services.api_service import ExternalAPIService
 from app.services.database_service import DatabaseService
+from app.services.backend_outbox import BackendOutbox
 from app.services.doctor_service import DoctorService
+from app.services.doctor_fanout import DoctorFanout
+from app.services.shard_peers import ShardPeers
+from app.services.speculative_submission import SpeculativeSubmitter
+from app.services.risk_classifier import RiskClassifier, RiskSignal
+from app.services.case_assignment import CaseAssignment
+from app.services.deadline_scheduler import DeadlineScheduler
+
+
+BASIC_ANALYSIS_FALLBACKS = metrics.counter("fallbacks_total", "Degraded paths taken", ("kind",)).labels("basic_analysis")
+URGENT_ALERTS = metrics.counter("urgent_alerts_total", "High-risk answers alerted to doctors", ("question",))
+URGENT_ALERT_SECONDS = metrics.histogram(
+    "urgent_alert_seconds", "From a high-risk answer to every matched doctor alerted"
+)
+
+# States where the bot waits on the patient; an idle patient gets one reminder
+NUDGE_STATES = frozenset({
+    SessionState.WAITING_FOR_CONSENT,
+    SessionState.WAITING_FOR_ANSWER,
+    SessionState.WAITING_FOR_FOLLOWUP,
+    SessionState.WAITING_FOR_BASIC_ANALYSIS_CONFIRMATION
+})
 
 
 class ConversationService:
@@ -28,13 +60,32 @@ class ConversationService:
         whatsapp_service: WhatsAppService,
         api_service: ExternalAPIService,
         database_service: DatabaseService,
-        doctor_service: DoctorService
+        doctor_service: DoctorService,
+        doctor_fanout: Optional[DoctorFanout] = None,
+        shard_peers: Optional[ShardPeers] = None,
+        speculation: Optional[SpeculativeSubmitter] = None,
+        backend_outbox: Optional[BackendOutbox] = None,
+        risk_classifier: Optional[RiskClassifier] = None,
+        case_assignment: Optional[CaseAssignment] = None,
+        deadlines: Optional[DeadlineScheduler] = None
     ):
         self.session_manager = session_manager
         self.whatsapp_service = whatsapp_service
         self.api_service = api_service
         self.database_service = database_service
         self.doctor_service = doctor_service
+        self.doctor_fanout = doctor_fanout or DoctorFanout.from_settings()
+        self.shard_peers = shard_peers or ShardPeers()
+        self.speculation = speculation or SpeculativeSubmitter.from_settings(api_service)
+        self.backend_outbox = backend_outbox or BackendOutbox.from_settings(database_service)
+        self.risk_classifier = risk_classifier or RiskClassifier.from_settings()
+        self.deadlines = deadlines or DeadlineScheduler()
+        self.case_assignment = case_assignment or CaseAssignment.from_settings(self.deadlines)
+        self.nudge_after = settings.PATIENT_NUDGE_AFTER
+        self.approval_max_wait = settings.DOCTOR_APPROVAL_MAX_WAIT
+        self.case_assignment.on_escalation(self._escalate_case)
+        self.deadlines.register(PATIENT_NUDGE, self._nudge_idle_patient)
+        self.deadlines.register(APPROVAL_WAIT, self._end_unanswered_case)
     
     async def process_user_message(self, phone_number: str, message_text: str) -> None:
         """Process a user message and handle the conversation flow.
@@ -43,11 +94,18 @@ class ConversationService:
             phone_number: The user's phone number
             message_text: The text content of the message
         """
+        await self._route_user_message(phone_number, message_text)
+        self._schedule_nudge(phone_number)
+    
+    async def _route_user_message(self, phone_number: str, message_text: str) -> None:
+        """Handle a user message according to the session state."""
         session = self.session_manager.get_or_create_session(phone_number)
         
-        print(f"[SESSION] User: {phone_number}, State: {session.state.value}, "
-              f"Question: {session.current_question_index}, Answers: {len(session.answers)}")
-        print(f"[MESSAGE_RECEIVED] Text: {message_text!r}")
+        event_log.emit(
+            "CONVERSATION", "message", logging.DEBUG,
+            user=phone_number, state=session.state.value,
+            question=session.current_question_index, answers=len(session.answers), payload=message_text
+        )
         
         # Handle different session states
         if session.state == SessionState.CONVERSATION_ENDED:
@@ -84,7 +142,7 @@ class ConversationService:
     
     async def _handle_conversation_restart(self, phone_number: str, session: UserSession) -> None:
         """Handle restarting a conversation that has ended."""
-        print(f"[CONVERSATION_ENDED] Resetting session for {phone_number}")
+        event_log.emit("CONVERSATION", "restart", user=phone_number)
         
         await self.whatsapp_service.send_text_message(
             phone_number,
@@ -92,18 +150,16 @@ class ConversationService:
         )
         
         # Reset session for new conversation
+        self.speculation.discard(phone_number)
         self.session_manager.reset_session(phone_number)
         new_session = self.session_manager.get_or_create_session(phone_number)
         
-        print(f"[SESSION_RESET] New session: index={new_session.current_question_index}, "
-              f"answers={len(new_session.answers)}")
-        
         # Start the consent flow for the new conversation
         await self._start_consent_flow(new_session)
     
     async def _handle_consent_declined(self, phone_number: str, session: UserSession) -> None:
         """Handle when user has declined consent."""
-        print(f"[CONSENT_DECLINED] User declined consent, sending goodbye message")
+        event_log.emit("CONVERSATION", "consent_declined_goodbye", logging.DEBUG, user=phone_number)
         await self.whatsapp_service.send_text_message(phone_number, CONSENT_DECLINED_MESSAGE)
         session.state = SessionState.CONVERSATION_ENDED
     
@@ -111,17 +167,19 @@ class ConversationService:
         """Handle the consent flow logic."""
         # Send greeting first if not sent
         if not session.greeting_sent:
-            print("[SENDING_GREETING] Sending greeting message")
-            await self.whatsapp_service.send_text_message(session.phone_number, GREETING_MESSAGE)
+            event_log.emit("CONVERSATION", "greeting", logging.DEBUG, user=session.phone_number)
+            await self.whatsapp_service.send_text_message(
+                session.phone_number, GREETING_MESSAGE, priority=MessagePriority.LOW
+            )
             session.greeting_sent = True
             
             # Send consent message with buttons
-            print("[SENDING_CONSENT] Sending consent message with buttons")
             await self.whatsapp_service.send_interactive_message(
                 session.phone_number,
                 CONSENT_MESSAGE,
                 CONSENT_BUTTON_TEXT,
-                CONSENT_BUTTONS
+                CONSENT_BUTTONS,
+                priority=MessagePriority.LOW
             )
             return
         
@@ -130,21 +188,22 @@ class ConversationService:
     
     async def _start_consent_flow(self, session: UserSession) -> None:
         """Start the consent flow for a new session."""
-        print("[STARTING_CONSENT_FLOW] Beginning consent process")
+        event_log.emit("CONVERSATION", "greeting", logging.DEBUG, user=session.phone_number)
         session.state = SessionState.WAITING_FOR_CONSENT
         
         # Send greeting message
-        print("[SENDING_GREETING] Sending greeting message")
-        await self.whatsapp_service.send_text_message(session.phone_number, GREETING_MESSAGE)
+        await self.whatsapp_service.send_text_message(
+            session.phone_number, GREETING_MESSAGE, priority=MessagePriority.LOW
+        )
         session.greeting_sent = True
         
         # Send consent message with buttons
-        print("[SENDING_CONSENT] Sending consent message with buttons")
         await self.whatsapp_service.send_interactive_message(
             session.phone_number,
             CONSENT_MESSAGE,
             CONSENT_BUTTON_TEXT,
-            CONSENT_BUTTONS
+            CONSENT_BUTTONS,
+            priority=MessagePriority.LOW
         )
     
     async def _process_consent_response(self, session: UserSession, message_text: str) -> None:
@@ -154,7 +213,7 @@ class ConversationService:
         # Check for positive consent (button response or text)
         if (message_lower in ["sí, acepto", "si, acepto", "si acepto", "sí acepto", "acepto", "si", "sí", "yes"] or
             "consent_yes" in message_text):
-            print("[CONSENT_ACCEPTED] User accepted consent")
+            event_log.emit("CONVERSATION", "consent_accepted", user=session.phone_number)
             session.consent_given = True
             session.state = SessionState.WAITING_FOR_ANSWER
             
@@ -164,14 +223,14 @@ class ConversationService:
         # Check for negative consent
         elif (message_lower in ["no, gracias", "no gracias", "no", "decline"] or
               "consent_no" in message_text):
-            print("[CONSENT_DECLINED] User declined consent")
+            event_log.emit("CONVERSATION", "consent_declined", user=session.phone_number)
             session.consent_given = False
             session.state = SessionState.CONSENT_DECLINED
             await self.whatsapp_service.send_text_message(session.phone_number, CONSENT_DECLINED_MESSAGE)
             
         else:
             # Ask for clarification
-            print("[CONSENT_UNCLEAR] User response unclear, asking for clarification")
+            event_log.emit("CONVERSATION", "consent_unclear", logging.DEBUG, user=session.phone_number)
             await self.whatsapp_service.send_text_message(
                 session.phone_number,
                 "Por favor, responde 'Sí, acepto' para continuar o 'No, gracias' si no deseas proceder."
@@ -179,26 +238,41 @@ class ConversationService:
     
     async def _start_questionnaire(self, session: UserSession) -> None:
         """Start the mental health questionnaire."""
-        print("[STARTING_QUESTIONNAIRE] Beginning mental health questions")
         current_question = self.session_manager.get_current_question(session)
         if current_question:
-            print(f"[ASKING_FIRST_QUESTION] {current_question.text[:50]}...")
+            event_log.emit(
+                "CONVERSATION", "questionnaire_started", logging.DEBUG,
+                user=session.phone_number, question=current_question.id
+            )
             await self.whatsapp_service.send_text_message(session.phone_number, current_question.text)
             session.first_question_asked = True
     
     async def _handle_processing_state(self, phone_number: str) -> None:
         """Handle messages received while processing API call."""
-        print("[PROCESSING_API] Rejecting message while processing")
+        event_log.emit("CONVERSATION", "busy_processing", logging.DEBUG, user=phone_number)
         await self.whatsapp_service.send_text_message(
             phone_number,
             "Estoy procesando tu información, por favor espera un momento..."
         )
     
+    def is_collecting_answers(self, phone_number: str) -> bool:
+        """Whether the patient's next message is a free-text answer to a question.
+        
+        Used by the coalescing window to merge answers split over several
+        messages; consent, confirmations and waiting states are excluded.
+        """
+        session = self.session_manager.sessions.get(phone_number)
+        if session is None:
+            return False
+        if session.state == SessionState.WAITING_FOR_FOLLOWUP:
+            return True
+        return session.state == SessionState.WAITING_FOR_ANSWER and session.first_question_asked
+    
     async def _handle_conversation_flow(self, session: UserSession, message_text: str) -> None:
         """Handle the main conversation flow logic for questionnaire phase."""
         # User should have consent at this point
         if not session.consent_given:
-            print("[ERROR] User in questionnaire phase without consent!")
+            event_log.emit("CONVERSATION", "answer_without_consent", logging.ERROR, user=session.phone_number)
             return
         
         # If we haven't started the questionnaire yet, start it
@@ -207,21 +281,24 @@ class ConversationService:
             return
         
         # We're in the questionnaire, so this message is an answer
-        print(f"[PROCESSING_ANSWER] Received: {message_text}")
         current_question = self.session_manager.get_current_question(session)
         
         if current_question:
-            print(f"[SAVING_ANSWER] For question '{current_question.id}': {message_text}")
             self._save_answer(session, current_question, message_text)
-            print(f"[ANSWER_SAVED] {current_question.id}: {message_text} "
-                  f"(new index: {session.current_question_index})")
+            event_log.emit(
+                "CONVERSATION", "answer_saved", logging.DEBUG,
+                user=session.phone_number, question=current_question.id, index=session.current_question_index
+            )
+            self._screen_answer(session, current_question.id, current_question.text, message_text)
         else:
-            print("[WARNING] No current question to save answer for!")
+            event_log.emit("CONVERSATION", "no_current_question", logging.WARNING, user=session.phone_number)
         
         # Check if all questions answered
         if self.session_manager.all_questions_answered(session):
             await self._handle_all_questions_answered(session)
         else:
+            # Start on the follow-up questions while the last answers come in
+            self.speculation.maybe_start(session)
             # Ask next question
             await self._ask_next_question(session)
     
@@ -231,20 +308,47 @@ class ConversationService:
         session.answers.append(answer)
         session.current_question_index += 1
     
+    def _screen_answer(self, session: UserSession, question_id: str, question_text: str, answer_text: str) -> None:
+        """Alert specialists right away if an answer looks high-risk.
+        
+        The alert goes out in the background on the URGENT send lane while
+        the questionnaire and diagnosis carry on; the full case still follows
+        once the diagnosis is ready. Each session is alerted at most once.
+        """
+        if session.urgent_alert_sent:
+            return
+        signal = self.risk_classifier.classify(question_id, answer_text)
+        if signal is None:
+            return
+        event_log.emit(
+            "CONVERSATION", "urgent_risk", logging.WARNING,
+            user=session.phone_number, question=question_id, reason=signal.reason
+        )
+        if not self.risk_classifier.alert_doctors:
+            return
+        
+        session.urgent_alert_sent = True
+        URGENT_ALERTS.inc(1, "followup" if question_id.startswith("followup_") else question_id)
+        self.doctor_fanout.launch(
+            self._alert_specialists_urgently(session, signal, question_text, answer_text, time.perf_counter())
+        )
+    
     async def _ask_next_question(self, session: UserSession) -> None:
         """Ask the next question in the sequence."""
         next_question = self.session_manager.get_current_question(session)
         if next_question:
-            print(f"[ASKING_NEXT_QUESTION] {next_question.text[:50]}...")
+            event_log.emit(
+                "CONVERSATION", "question", logging.DEBUG, user=session.phone_number, question=next_question.id
+            )
             await self.whatsapp_service.send_text_message(
                 session.phone_number, next_question.text
             )
         else:
-            print("[ERROR] No next question available!")
+            event_log.emit("CONVERSATION", "no_next_question", logging.ERROR, user=session.phone_number)
     
     async def _handle_all_questions_answered(self, session: UserSession) -> None:
         """Handle the case when all questions have been answered."""
-        print("[ALL_QUESTIONS_ANSWERED] Processing with API and Database")
+        event_log.emit("CONVERSATION", "questionnaire_complete", user=session.phone_number)
         session.state = SessionState.PROCESSING_API
         
         await self.whatsapp_service.send_text_message(
@@ -254,8 +358,10 @@ class ConversationService:
         
         # Send to external API for processing (should return follow-up questions)
         # Note: Database storage moved to end after complete diagnostic
-        print("[PROCESSING_WITH_API] Sending initial data to external API...")
-        api_response = await self.api_service.send_data(session)
+        await self.whatsapp_service.flush()  # The patient reads this while the API thinks
+        api_response = await self.speculation.take(session)
+        if api_response is None:
+            api_response = await self.api_service.send_data(session)
         
         # Check if we received follow-up questions
         if "questions" in api_response and api_response["questions"]:
@@ -264,12 +370,16 @@ class ConversationService:
             # No follow-up questions, handle as final response
             response_message = await self._handle_api_response(session, api_response)
             await self.whatsapp_service.send_text_message(session.phone_number, response_message)
+            if "error" in api_response:
+                await self._offer_basic_analysis(session, api_response)
         
         # Continue conversation if API indicates to do so
         if session.state == SessionState.WAITING_FOR_ANSWER:
             next_question = self.session_manager.get_current_question(session)
             if next_question:
-                print(f"[CONTINUING_CONVERSATION] Next question: {next_question.text[:50]}...")
+                event_log.emit(
+                    "CONVERSATION", "question", logging.DEBUG, user=session.phone_number, question=next_question.id
+                )
                 await self.whatsapp_service.send_text_message(
                     session.phone_number, next_question.text
                 )
@@ -339,7 +449,7 @@ class ConversationService:
     
     async def _handle_followup_questions(self, session: UserSession, questions: list) -> None:
         """Handle follow-up questions received from the API."""
-        print(f"[FOLLOWUP_QUESTIONS] Received {len(questions)} follow-up questions")
+        event_log.emit("CONVERSATION", "followup_questions", user=session.phone_number, questions=len(questions))
         
         # Store follow-up questions in session
         session.followup_questions = questions
@@ -357,10 +467,13 @@ class ConversationService:
     
     async def _handle_followup_flow(self, session: UserSession, message_text: str) -> None:
         """Handle the follow-up questions flow."""
-        print(f"[FOLLOWUP_FLOW] Processing answer to follow-up question {session.current_followup_index + 1}")
-        
         # Save the current follow-up answer
+        question_index = session.current_followup_index
         self._save_followup_answer(session, message_text)
+        if question_index < len(session.followup_questions):
+            self._screen_answer(
+                session, f"followup_{question_index + 1}", session.followup_questions[question_index], message_text
+            )
         
         # Check if all follow-up questions have been answered
         if session.current_followup_index >= len(session.followup_questions):
@@ -381,7 +494,10 @@ class ConversationService:
         session.followup_answers.append(answer)
         session.current_followup_index += 1
         
-        print(f"[FOLLOWUP_ANSWER_SAVED] followup_{session.current_followup_index}: {answer_text}")
+        event_log.emit(
+            "CONVERSATION", "answer_saved", logging.DEBUG,
+            user=session.phone_number, question=answer.question_id, index=session.current_followup_index
+        )
     
     async def _ask_current_followup_question(self, session: UserSession) -> None:
         """Ask the current follow-up question."""
@@ -390,17 +506,20 @@ class ConversationService:
             question_number = session.current_followup_index + 1
             total_questions = len(session.followup_questions)
             
-            print(f"[ASKING_FOLLOWUP] Question {question_number}/{total_questions}")
+            event_log.emit(
+                "CONVERSATION", "question", logging.DEBUG,
+                user=session.phone_number, question=f"followup_{question_number}"
+            )
             await self.whatsapp_service.send_text_message(
                 session.phone_number,
                 f"Pregunta adicional {question_number}/{total_questions}:\n\n{question_text}"
             )
         else:
-            print("[ERROR] No current follow-up question available!")
+            event_log.emit("CONVERSATION", "no_next_question", logging.ERROR, user=session.phone_number)
     
     async def _handle_all_followup_answered(self, session: UserSession) -> None:
         """Handle when all follow-up questions have been answered."""
-        print("[ALL_FOLLOWUP_ANSWERED] Processing final data with API")
+        event_log.emit("CONVERSATION", "followup_complete", user=session.phone_number)
         session.state = SessionState.PROCESSING_API
         
         await self.whatsapp_service.send_text_message(
@@ -409,7 +528,7 @@ class ConversationService:
         )
         
         # Send complete data (initial + follow-up) to API for final diagnosis
-        print("[PROCESSING_FINAL_DATA] Sending complete data to external API...")
+        await self.whatsapp_service.flush()
         api_response = await self.api_service.send_followup_data(session)
         
         # Handle the pre-diagnosis response (check both possible field names)
@@ -420,27 +539,34 @@ class ConversationService:
             response_message = await self._handle_api_response(session, api_response)
             await self.whatsapp_service.send_text_message(session.phone_number, response_message)
             
-            # If it's a timeout or connection error, offer to proceed with basic analysis
-            error_type = api_response.get("final_error_type", "")
-            if "Timeout" in error_type or "RequestError" in error_type:
-                await self.whatsapp_service.send_text_message(
-                    session.phone_number,
-                    "🔄 **Opción alternativa**: Si prefieres, podemos continuar con un análisis básico "
-                    "de tus respuestas mientras solucionamos el problema técnico. "
-                    "Responde 'continuar' si quieres proceder."
-                )
-                # Set a special state to allow basic analysis
-                session.state = SessionState.WAITING_FOR_BASIC_ANALYSIS_CONFIRMATION
+            await self._offer_basic_analysis(session, api_response)
         else:
             # Fallback response for other cases
             response_message = await self._handle_api_response(session, api_response)
             await self.whatsapp_service.send_text_message(session.phone_number, response_message)
             session.state = SessionState.CONVERSATION_ENDED
     
+    async def _offer_basic_analysis(self, session: UserSession, api_response: Dict[str, Any]) -> None:
+        """Offer the local basic analysis when the diagnosis API is unreachable.
+        
+        Covers timeouts, connection errors and an open circuit breaker, where
+        the API was not even called.
+        """
+        # If it's a timeout or connection error, offer to proceed with basic analysis
+        error_type = api_response.get("final_error_type", "")
+        if "Timeout" in error_type or "RequestError" in error_type or "CircuitOpen" in error_type:
+            await self.whatsapp_service.send_text_message(
+                session.phone_number,
+                "🔄 **Opción alternativa**: Si prefieres, podemos continuar con un análisis básico "
+                "de tus respuestas mientras solucionamos el problema técnico. "
+                "Responde 'continuar' si quieres proceder."
+            )
+            # Set a special state to allow basic analysis
+            session.state = SessionState.WAITING_FOR_BASIC_ANALYSIS_CONFIRMATION
+            BASIC_ANALYSIS_FALLBACKS.inc()
+    
     async def _handle_pre_diagnosis(self, session: UserSession, api_response: dict) -> None:
         """Handle and display the pre-diagnosis to the user."""
-        print("[PRE_DIAGNOSIS] Processing and sending pre-diagnosis")
-        
         session.diagnostic_support = api_response
         
         # Handle both possible field names from API
@@ -474,121 +600,155 @@ class ConversationService:
         
         await self.whatsapp_service.send_text_message(session.phone_number, validation_message)
         
-        # Store complete diagnostic data in database
-        print("[STORING_COMPLETE_DATA] Saving complete diagnostic data to database...")
+        # Queue complete diagnostic data for the database; the outbox delivers it in the background
         try:
-            database_response = await self.database_service.store_complete_diagnostic_data(session, api_response)
-            
-            if database_response.get("success", False):
-                print("[DATABASE_SUCCESS] Complete diagnostic data stored successfully")
-            else:
-                print(f"[DATABASE_ERROR] Failed to store complete data: {database_response.get('error', 'Unknown error')}")
+            await self.backend_outbox.append(self.database_service.prepare_complete_payload(session, api_response))
         except Exception as e:
-            print(f"[DATABASE_EXCEPTION] Error storing complete data: {repr(e)}")
+            event_log.emit(
+                "CONVERSATION", "outbox_append_failed", logging.ERROR, user=session.phone_number, error=repr(e)
+            )
         
         # Notify doctors about the new pre-diagnosis
-        print("[DOCTOR_NOTIFICATION] Starting doctor notification process")
         await self.whatsapp_service.send_text_message(
             session.phone_number,
             "📤 Enviando tu apoyo diagnóstico a nuestros especialistas para validación..."
         )
         
+        # Set state to wait for doctor approval instead of ending conversation.
+        # The fan-out runs in the background so the patient flow is released now.
+        session.state = SessionState.WAITING_FOR_DOCTOR_APPROVAL
+        if self.approval_max_wait:
+            self.deadlines.schedule(APPROVAL_WAIT, session.phone_number, self.approval_max_wait)
+        await self.whatsapp_service.flush()
+        
+        try:
+            limit = self.case_assignment.first_batch(session)
+            intersection_phones = await self._find_specialists_to_notify(limit)
+        except Exception as e:
+            event_log.emit(
+                "CONVERSATION", "doctor_match_failed", logging.ERROR, user=session.phone_number, error=repr(e)
+            )
+            await self.whatsapp_service.send_text_message(
+                session.phone_number,
+                "⚠️ Hubo un problema técnico. Tu diagnóstico se ha guardado y será revisado pronto."
+            )
+            return
+        
+        self.doctor_fanout.launch(
+            self._notify_specialists(session, api_response, intersection_phones, escalate=limit is not None)
+        )
+        event_log.emit("CONVERSATION", "pre_diagnosis_delivered", user=session.phone_number)
+    
+    async def _find_specialists_to_notify(self, limit: Optional[int] = None, exclude: Collection[str] = ()) -> List[str]:
+        """Find registered WhatsApp specialists that are also present in the backend API.
+        
+        Args:
+            limit: Only the ``limit`` least loaded specialists (None for all of them)
+            exclude: Specialists already assigned the case
+        
+        Returns:
+            WhatsApp phone numbers of the specialists to notify
+        """
+        # Import doctor services at runtime to avoid circular imports
+        from main import doctor_session_manager
+        
+        # Get doctors from BOTH systems and only notify intersection.
+        # Both sides are kept normalized, so matching is one set intersection.
+        api_doctor_phones = await self.doctor_service.get_normalized_doctor_phones()
+        # Only the directory's doctors can be matched, so only they need to be current
+        await doctor_session_manager.hydrate_many(api_doctor_phones)
+        active_doctor_count = len(doctor_session_manager.active_index)
+        matched_doctors = doctor_session_manager.match_active_doctors(api_doctor_phones)
+        intersection_phones = [doctor.phone_number for doctor in matched_doctors]
+        least_loaded = [
+            (key, doctor.phone_number)
+            for key, doctor in doctor_session_manager.least_loaded_doctors(api_doctor_phones, limit or 0, exclude)
+        ]
+        
+        if self.shard_peers.enabled:
+            # Other workers own the remaining doctors' sessions
+            replies = await self.shard_peers.broadcast(
+                "/internal/doctors/match",
+                {"phones": sorted(api_doctor_phones), "limit": limit or 0, "exclude": list(exclude)}
+            )
+            for reply in replies:
+                active_doctor_count += reply["active"]
+                intersection_phones.extend(reply["matched"])
+                least_loaded.extend((tuple(key), phone) for key, phone in reply["least_loaded"])
+        
+        matched_count = len(intersection_phones)
+        if limit is not None:
+            # Each worker sent its own least loaded doctors; keep the overall best
+            intersection_phones = [phone for _, phone in heapq.nsmallest(limit, least_loaded)]
+        
+        # WhatsApp-only and API-only specialists are not notified
+        event_log.emit(
+            "DOCTOR", "matched",
+            whatsapp=active_doctor_count, directory=len(api_doctor_phones), both=matched_count,
+            limit=limit, assigned=len(intersection_phones)
+        )
+        return intersection_phones
+    
+    async def _notify_specialists(
+        self,
+        session: UserSession,
+        api_response: Dict[str, Any],
+        doctor_phones: List[str],
+        escalate: bool = False,
+        level: int = 0
+    ) -> None:
+        """Fan the case out to specialists concurrently and report back to the patient.
+        
+        Args:
+            session: Patient session
+            api_response: API response with diagnosis
+            doctor_phones: WhatsApp phone numbers of the specialists to notify
+            escalate: Assign the case to more specialists if nobody decides in time
+            level: 0 for the first assignment, then the escalation number
+        """
+        # Import doctor services at runtime to avoid circular imports
+        from main import doctor_conversation_service, doctor_session_manager
+        
         try:
-            # Import doctor services at runtime to avoid circular imports
-            from main import doctor_session_manager, doctor_conversation_service
-            
-            # Get doctors from BOTH systems and only notify intersection
-            active_doctors = doctor_session_manager.get_active_doctors()
-            api_doctor_phones = await self.doctor_service.get_doctor_phone_numbers()
-            
-            # Get phone numbers from registered WhatsApp doctors
-            whatsapp_doctor_phones = [doctor.phone_number for doctor in active_doctors]
-            
-            # Normalize phone numbers for proper comparison
-            normalized_whatsapp_phones = [self._normalize_phone_number(phone) for phone in whatsapp_doctor_phones]
-            normalized_api_phones = [self._normalize_phone_number(phone) for phone in api_doctor_phones]
-            
-            # Find intersection - doctors who are in BOTH systems (using normalized numbers)
-            normalized_intersection = list(set(normalized_whatsapp_phones) & set(normalized_api_phones))
-            
-            # Map back to original WhatsApp phone numbers for notification
-            intersection_phones = []
-            for doctor in active_doctors:
-                if self._normalize_phone_number(doctor.phone_number) in normalized_intersection:
-                    intersection_phones.append(doctor.phone_number)
-            
-            print(f"📱 Found {len(whatsapp_doctor_phones)} registered WhatsApp specialists")
-            print(f"🌐 Found {len(api_doctor_phones)} API specialist phone numbers")
-            print(f"📞 Normalized WhatsApp phones: {normalized_whatsapp_phones}")
-            print(f"📞 Normalized API phones: {normalized_api_phones}")
-            print(f"🎯 Found {len(intersection_phones)} specialists in BOTH systems")
-            
-            # Show breakdown for transparency (using normalized numbers)
-            whatsapp_only_normalized = set(normalized_whatsapp_phones) - set(normalized_api_phones)
-            api_only_normalized = set(normalized_api_phones) - set(normalized_whatsapp_phones)
-            
-            # Map back to original numbers for display
-            whatsapp_only = []
-            api_only = []
-            
-            for phone in whatsapp_doctor_phones:
-                if self._normalize_phone_number(phone) in whatsapp_only_normalized:
-                    whatsapp_only.append(phone)
-            
-            for phone in api_doctor_phones:
-                if self._normalize_phone_number(phone) in api_only_normalized:
-                    api_only.append(phone)
-            
-            if whatsapp_only:
-                print(f"   ⚠️ WhatsApp-only specialists (NOT notified): {len(whatsapp_only)}")
-                for phone in whatsapp_only:
-                    print(f"      • {phone}")
-            
-            if api_only:
-                print(f"   ⚠️ API-only specialists (NOT notified): {len(api_only)}")
-                for phone in api_only:
-                    print(f"      • {phone}")
-            
             notified_doctors = []
             
-            if intersection_phones:
-                print(f"📋 Notifying {len(intersection_phones)} specialists present in BOTH systems:")
-                for phone in intersection_phones:
-                    print(f"   🎯 {phone}")
+            if doctor_phones:
+                # Render the case once; every doctor gets the same message
+                case_message = self._render_doctor_case_message(session, api_response)
                 
-                for doctor_phone in intersection_phones:
-                    try:
-                        # Find the doctor session for this phone
-                        doctor_session = next(
-                            (d for d in active_doctors if d.phone_number == doctor_phone), 
-                            None
+                async def notify_doctor(doctor_phone: str) -> bool:
+                    # Notify doctor of new case assignment
+                    success = await doctor_conversation_service.notify_doctor_of_new_case(
+                        doctor_phone, session.phone_number
+                    )
+                    if success:
+                        # Send the diagnosis details directly
+                        await self._send_diagnosis_to_doctor(doctor_phone, session, case_message)
+                    else:
+                        event_log.emit(
+                            "DOCTOR", "assignment_failed", logging.WARNING,
+                            doctor=doctor_phone, patient=session.phone_number
                         )
-                        
-                        if doctor_session:
-                            # Notify doctor of new case assignment
-                            success = await doctor_conversation_service.notify_doctor_of_new_case(
-                                doctor_phone, session.phone_number
-                            )
-                            
-                            if success:
-                                # Send the diagnosis details directly
-                                await self._send_diagnosis_to_doctor(
-                                    doctor_phone, session, api_response
-                                )
-                                notified_doctors.append(doctor_phone)
-                                print(f"✅ Notified specialist (both systems): {doctor_phone}")
-                            else:
-                                print(f"⚠️ Failed to assign case to specialist: {doctor_phone}")
-                        else:
-                            print(f"❌ Could not find WhatsApp session for specialist: {doctor_phone}")
-                        
-                    except Exception as e:
-                        print(f"❌ Failed to notify specialist {doctor_phone}: {repr(e)}")
+                    return success
+                
+                result = await self.doctor_fanout.fan_out(doctor_phones, notify_doctor)
+                notified_doctors = result.notified
             else:
-                print("⚠️ No specialists found in BOTH systems - no notifications sent")
-                print("   💡 Specialists must be registered in WhatsApp AND present in API to receive notifications")
+                # Specialists must be registered in WhatsApp AND present in the API
+                event_log.emit("DOCTOR", "no_specialists", logging.WARNING, patient=session.phone_number)
+            
+            if level:
+                # Escalation: the patient was told about the first assignment already
+                session.specialists_notified = session.specialists_notified + notified_doctors
+                self.session_manager.mark_dirty(session.phone_number)
+                event_log.emit(
+                    "DOCTOR", "case_escalated",
+                    patient=session.phone_number, level=level, notified=len(notified_doctors)
+                )
+                return
             
             session.specialists_notified = notified_doctors
+            self.session_manager.mark_dirty(session.phone_number)
             
             if notified_doctors:
                 await self.whatsapp_service.send_text_message(
@@ -603,15 +763,88 @@ class ConversationService:
                 )
                 
         except Exception as e:
-            print(f"❌ Error notifying doctors: {repr(e)}")
+            event_log.emit("DOCTOR", "notification_failed", logging.ERROR, patient=session.phone_number, error=repr(e))
             await self.whatsapp_service.send_text_message(
                 session.phone_number,
                 "⚠️ Hubo un problema técnico. Tu diagnóstico se ha guardado y será revisado pronto."
             )
+        finally:
+            if escalate:
+                self.case_assignment.schedule(session.phone_number, level)
+            # Runs after the message handler flushed, so persist the fan-out's changes
+            await self.session_manager.flush()
+            await doctor_session_manager.flush()
+    
+    async def _escalate_case(self, patient_phone: str, level: int) -> None:
+        """Assign a case no specialist has decided on yet to the next least loaded ones.
         
-        # Set state to wait for doctor approval instead of ending conversation
-        session.state = SessionState.WAITING_FOR_DOCTOR_APPROVAL
-        print("[CONVERSATION_COMPLETE] Pre-diagnosis delivered and doctors notified, waiting for approval")
+        Args:
+            patient_phone: The patient's phone number
+            level: Escalation number (1 for the first escalation)
+        """
+        await self.session_manager.hydrate(patient_phone)
+        session = self.session_manager.get_session(patient_phone)
+        if (
+            session is None or session.state != SessionState.WAITING_FOR_DOCTOR_APPROVAL
+            or session.diagnostic_support is None
+        ):
+            return
+        
+        try:
+            doctor_phones = await self._find_specialists_to_notify(
+                self.case_assignment.step, exclude=session.specialists_notified
+            )
+        except Exception as e:
+            event_log.emit("DOCTOR", "escalation_failed", logging.ERROR, patient=patient_phone, error=repr(e))
+            return
+        if not doctor_phones:
+            event_log.emit("DOCTOR", "escalation_exhausted", logging.WARNING, patient=patient_phone, level=level)
+            self.case_assignment.exhausted(patient_phone)
+            return
+        
+        event_log.emit(
+            "DOCTOR", "escalating", patient=patient_phone, level=level, timeout_seconds=self.case_assignment.timeout
+        )
+        await self._notify_specialists(session, session.diagnostic_support, doctor_phones, escalate=True, level=level)
+    
+    async def _alert_specialists_urgently(
+        self,
+        session: UserSession,
+        signal: RiskSignal,
+        question_text: str,
+        answer_text: str,
+        started: float
+    ) -> None:
+        """Send an urgent-case alert to the matched specialists.
+        
+        Args:
+            session: Patient session
+            signal: What the risk classifier flagged
+            question_text: The question the patient was answering
+            answer_text: The patient's answer
+            started: ``time.perf_counter()`` when the answer was screened
+        """
+        try:
+            with tracer.span("urgent_alert", question=signal.question_id) as span:
+                doctor_phones = await self._find_specialists_to_notify()
+                alert_message = self._render_urgent_alert(session, signal, question_text, answer_text)
+                
+                async def alert_doctor(doctor_phone: str) -> bool:
+                    await self.whatsapp_service.send_text_message(
+                        doctor_phone, alert_message, priority=MessagePriority.URGENT
+                    )
+                    return True
+                
+                result = await self.doctor_fanout.fan_out(doctor_phones, alert_doctor)
+                span.set(doctors=len(doctor_phones), alerted=len(result.notified))
+            URGENT_ALERT_SECONDS.observe(time.perf_counter() - started)
+            
+            event_log.emit(
+                "DOCTOR", "urgent_alert", logging.INFO if result.notified else logging.WARNING,
+                patient=session.phone_number, alerted=len(result.notified)
+            )
+        except Exception as e:
+            event_log.emit("DOCTOR", "urgent_alert_failed", logging.ERROR, patient=session.phone_number, error=repr(e))
     
     async def _handle_waiting_for_doctor_approval(self, phone_number: str) -> None:
         """Handle messages from patients while waiting for doctor approval.
@@ -619,7 +852,7 @@ class ConversationService:
         Args:
             phone_number: The patient's phone number
         """
-        print(f"[WAITING_FOR_DOCTOR] Patient {phone_number} sent message while waiting for doctor approval")
+        event_log.emit("CONVERSATION", "waiting_for_doctor", logging.DEBUG, user=phone_number)
         
         waiting_message = (
             "⏳ **Tu apoyo diagnóstico está siendo revisado**\n\n"
@@ -634,12 +867,94 @@ class ConversationService:
         
         await self.whatsapp_service.send_text_message(phone_number, waiting_message)
     
+    async def _end_unanswered_case(self, deadline: Deadline) -> None:
+        """Stop waiting for a specialist decision that never came.
+        
+        The case stays with the specialists it was assigned to; the patient
+        is told to expect contact and may start a new consultation.
+        """
+        patient_phone = deadline.subject
+        await self.session_manager.hydrate(patient_phone)
+        session = self.session_manager.sessions.get(patient_phone)
+        if session is None or session.state != SessionState.WAITING_FOR_DOCTOR_APPROVAL:
+            return
+        
+        event_log.emit(
+            "CONVERSATION", "approval_timeout", logging.WARNING,
+            user=patient_phone, waited_seconds=self.approval_max_wait
+        )
+        self.case_assignment.cancel(patient_phone)
+        session = self.session_manager.get_session(patient_phone)
+        session.state = SessionState.CONVERSATION_ENDED
+        try:
+            await self.whatsapp_service.send_text_message(
+                patient_phone,
+                "⏰ **Aún no hemos recibido la validación de un especialista**\n\n"
+                "Tu apoyo diagnóstico está guardado y nuestro equipo se pondrá en "
+                "contacto contigo. Si tienes alguna urgencia, por favor contacta a "
+                "nuestro soporte.\n\n"
+                "Envía cualquier mensaje si deseas comenzar una nueva consulta.",
+                priority=MessagePriority.HIGH
+            )
+        finally:
+            await self.session_manager.flush()
+    
+    def _schedule_nudge(self, phone_number: str) -> None:
+        """Remind the patient later if the bot is now waiting on them, else forget the reminder."""
+        session = self.session_manager.sessions.get(phone_number)
+        if self.nudge_after and session is not None and session.state in NUDGE_STATES:
+            self.deadlines.schedule(
+                PATIENT_NUDGE, phone_number, self.nudge_after,
+                state=session.state.value, last_activity_ts=session.last_activity_ts
+            )
+        else:
+            self.deadlines.cancel(PATIENT_NUDGE, phone_number)
+    
+    async def _nudge_idle_patient(self, deadline: Deadline) -> None:
+        """Send one reminder to a patient who stopped answering.
+        
+        Skipped if the patient wrote again or the session moved on since the
+        reminder was scheduled.
+        """
+        patient_phone = deadline.subject
+        await self.session_manager.hydrate(patient_phone)
+        session = self.session_manager.sessions.get(patient_phone)
+        if (
+            session is None or session.state.value != deadline.payload["state"]
+            or session.last_activity_ts != deadline.payload["last_activity_ts"]
+        ):
+            return
+        
+        event_log.emit("CONVERSATION", "nudge", user=patient_phone, state=session.state.value)
+        prompt = self._pending_prompt(session)
+        await self.whatsapp_service.send_text_message(
+            patient_phone,
+            "👋 ¿Sigues ahí? Tu consulta sigue abierta; puedes continuar cuando quieras."
+            + (f"\n\n{prompt}" if prompt else ""),
+            priority=MessagePriority.LOW
+        )
+    
+    def _pending_prompt(self, session: UserSession) -> Optional[str]:
+        """What the patient was last asked and has not answered yet."""
+        if session.state == SessionState.WAITING_FOR_CONSENT:
+            return "Por favor, responde 'Sí, acepto' para continuar o 'No, gracias' si no deseas proceder."
+        if session.state == SessionState.WAITING_FOR_ANSWER:
+            question = self.session_manager.get_current_question(session)
+            return question.text if question and session.first_question_asked else None
+        if session.state == SessionState.WAITING_FOR_FOLLOWUP:
+            if session.current_followup_index < len(session.followup_questions):
+                return session.followup_questions[session.current_followup_index]
+            return None
+        if session.state == SessionState.WAITING_FOR_BASIC_ANALYSIS_CONFIRMATION:
+            return "Responde 'continuar' para proceder con el análisis básico o 'no' para esperar."
+        return None
+    
     async def _handle_basic_analysis_confirmation(self, session: UserSession, message_text: str) -> None:
         """Handle user confirmation for basic analysis when API fails."""
         message_lower = message_text.lower().strip()
         
         if message_lower in ["continuar", "continúar", "continue", "si", "sí", "yes", "1", "ok"]:
-            print(f"[BASIC_ANALYSIS] User {session.phone_number} confirmed basic analysis")
+            event_log.emit("CONVERSATION", "basic_analysis", user=session.phone_number)
             
             await self.whatsapp_service.send_text_message(
                 session.phone_number,
@@ -689,7 +1004,7 @@ class ConversationService:
         concerning_patterns = []
         
         # Check for key concerning responses
-        for answer in session.answers:
+        for answer in session.answers + session.followup_answers:
             answer_lower = answer.value.lower()
             
             if answer.question_id == "anxiety" and any(word in answer_lower for word in ["sí", "si", "frecuentemente", "mucho"]):
@@ -698,8 +1013,9 @@ class ConversationService:
             if answer.question_id == "sadness" and any(word in answer_lower for word in ["sí", "si", "deprimido", "triste"]):
                 concerning_patterns.append("Síntomas de tristeza o depresión")
             
-            if answer.question_id == "self_harm_thoughts" and any(word in answer_lower for word in ["sí", "si"]):
-                concerning_patterns.append("⚠️ URGENTE: Pensamientos de autolesión reportados")
+            signal = self.risk_classifier.classify(answer.question_id, answer.value)
+            if signal is not None and f"⚠️ URGENTE: {signal.reason}" not in concerning_patterns:
+                concerning_patterns.append(f"⚠️ URGENTE: {signal.reason}")
             
             if answer.question_id == "loss_of_interest" and any(word in answer_lower for word in ["sí", "si"]):
                 concerning_patterns.append("Pérdida de interés en actividades")
@@ -762,33 +1078,25 @@ class ConversationService:
         Returns:
             Normalized phone number without '+' and with consistent formatting
         """
-        if not phone:
-            return ""
-        
-        # Remove '+' and any whitespace
-        normalized = phone.replace("+", "").replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-        
-        # Ensure it starts with country code if it's a Colombian number
-        if len(normalized) == 10 and normalized.startswith("3"):
-            # Add Colombia country code (57) if missing
-            normalized = "57" + normalized
-        
-        return normalized
+        return normalize_phone_number(phone)
     
-    async def _send_diagnosis_to_doctor(self, doctor_phone: str, session: UserSession, api_response: Dict[str, Any]) -> None:
-        """Send diagnosis details to a specific registered doctor.
+    def _render_doctor_case_message(self, session: UserSession, api_response: Dict[str, Any]) -> str:
+        """Render the diagnosis details message sent to every notified doctor.
         
         Args:
-            doctor_phone: Doctor's phone number
             session: Patient session
             api_response: API response with diagnosis
+            
+        Returns:
+            The formatted case message
         """
         pre_diagnosis_text = api_response.get("pre-diagnosis", "") or api_response.get("pre_diagnosis", "")
         comments_text = api_response.get("comments", "")
         score_text = api_response.get("score", "")
         
         # Format diagnosis for doctor
-        diagnosis_message = (
+        diagnosis_message = "🚨 **CASO URGENTE** (alertado durante la evaluación)\n\n" if session.urgent_alert_sent else ""
+        diagnosis_message += (
             f"🏥 **DETALLES DEL PRE-DIAGNÓSTICO**\n\n"
             f"👤 **Paciente**: {session.phone_number}\n"
             f"📊 **Prioridad**: {score_text}\n"
@@ -802,9 +1110,36 @@ class ConversationService:
             diagnosis_message += f"💬 **Comentarios**:\n{comments_text}\n\n"
         
         diagnosis_message += "Por favor, valida este diagnóstico respondiendo:\n**APROBAR** / **DENEGAR** / **MIXTO**"
+        return diagnosis_message
+    
+    def _render_urgent_alert(
+        self,
+        session: UserSession,
+        signal: RiskSignal,
+        question_text: str,
+        answer_text: str
+    ) -> str:
+        """Render the alert sent to doctors when an answer is flagged as urgent."""
+        return (
+            f"🚨 **ALERTA URGENTE**\n\n"
+            f"👤 **Paciente**: {session.phone_number}\n"
+            f"⚠️ **Motivo**: {signal.reason}\n\n"
+            f"❓ **Pregunta**: {question_text}\n"
+            f"💬 **Respuesta**: {answer_text[:1000]}\n\n"
+            "El paciente sigue respondiendo la evaluación. Recibirás el pre-diagnóstico "
+            "completo para validar en cuanto esté listo; si puedes, contáctalo cuanto antes."
+        )
+    
+    async def _send_diagnosis_to_doctor(self, doctor_phone: str, session: UserSession, diagnosis_message: str) -> None:
+        """Send diagnosis details to a specific registered doctor.
         
+        Args:
+            doctor_phone: Doctor's phone number
+            session: Patient session
+            diagnosis_message: Pre-rendered case message from _render_doctor_case_message
+        """
         # Send diagnosis details
-        await self.whatsapp_service.send_text_message(doctor_phone, diagnosis_message)
+        await self.whatsapp_service.send_text_message(doctor_phone, diagnosis_message, priority=MessagePriority.HIGH)
         
         # Send interactive buttons
         buttons = [
@@ -818,8 +1153,9 @@ class ConversationService:
                 doctor_phone,
                 "Selecciona tu decisión médica:",
                 "Validación",
-                buttons
+                buttons,
+                priority=MessagePriority.HIGH
             )
         except Exception as e:
-            print(f"[ERROR] Failed to send interactive buttons to {doctor_phone}: {repr(e)}")
+            event_log.emit("DOCTOR", "buttons_failed", logging.ERROR, doctor=doctor_phone, error=repr(e))
             # Buttons were already mentioned in the text message as fallback
@@ -1,19 +1,26 @@
 """Database service for storing patient intake data."""
 
-import json
+import logging
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.config.settings import settings
+from app.services.http_transport import HTTPTransport
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
 from app.models.session import UserSession
 from app.config.questions import MENTAL_HEALTH_QUESTIONS
 
 
+BACKEND_WRITE_SECONDS = metrics.histogram("backend_write_seconds", "Backend API writes", ("record",))
+
+
 class DatabaseService:
     """Service for storing mental health intake data in the database."""
     
-    def __init__(self):
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, transport: Optional[HTTPTransport] = None):
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport.from_settings()
         self.database_url = settings.DATABASE_API_URL
         self.auth_token = settings.DATABASE_API_TOKEN
     
@@ -105,18 +112,20 @@ class DatabaseService:
                 "Content-Type": "application/json"
             }
             
-            response = await self.http_client.post(
-                self.database_url,
-                json=payload,
-                headers=headers
-            )
+            with BACKEND_WRITE_SECONDS.time("intake"):
+                response = await self.transport.post(
+                    self.database_url,
+                    profile="backend",
+                    json=payload,
+                    headers=headers
+                )
             
             # Enhanced logging for database response
             result = self._log_database_response(response)
             return result
             
         except Exception as e:
-            print(f"\n❌ [DATABASE_ERROR] Connection failed: {repr(e)}")
+            event_log.emit("DATABASE_CALL", "connection_failed", logging.ERROR, url=self.database_url, error=repr(e))
             return {
                 "error": f"Database connection failed: {str(e)}",
                 "success": False
@@ -132,112 +141,114 @@ class DatabaseService:
         Returns:
             Dictionary with success status and response data
         """
-        payload = self._prepare_complete_payload(session, diagnostic_data)
+        return await self.send_complete_payload(self.prepare_complete_payload(session, diagnostic_data))
+    
+    def prepare_complete_payload(self, session: UserSession, diagnostic_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the complete diagnostic payload; its ``number`` identifies the record."""
+        return self._prepare_complete_payload(session, diagnostic_data)
+    
+    async def send_complete_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a prepared complete diagnostic payload to the backend.
         
+        Args:
+            payload: Payload from ``prepare_complete_payload``
+            
+        Returns:
+            Dictionary with success status and response data (``status_code`` on HTTP errors)
+        """
         # Enhanced logging for database call
         self._log_complete_database_request(payload)
         
         try:
-            response = await self.http_client.post(
-                self.database_url,
-                json=payload,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.auth_token}"
-                }
-            )
+            with BACKEND_WRITE_SECONDS.time("complete"):
+                response = await self.transport.post(
+                    self.database_url,
+                    profile="backend",
+                    json=payload,
+                    headers={
+                        "Content-Type": "application/json",
+                        "Authorization": f"Bearer {self.auth_token}"
+                    }
+                )
             
             # Enhanced logging for database response
             result = self._log_database_response(response)
             return result
             
         except Exception as e:
-            print(f"\n❌ [COMPLETE_DATABASE_ERROR] Connection failed: {repr(e)}")
+            event_log.emit("DATABASE_CALL", "complete_connection_failed", logging.ERROR, url=self.database_url, error=repr(e))
             return {
                 "error": f"Complete database connection failed: {str(e)}",
                 "success": False
             }
     
     def _log_complete_database_request(self, payload: Dict[str, Any]) -> None:
-        """Log the complete database request in a formatted way."""
-        print("\n" + "="*60)
-        print("[COMPLETE_DATABASE_CALL] SENDING COMPLETE DATA TO DATABASE")
-        print("="*60)
-        print(f"🏥 Database URL: {self.database_url}")
-        print(f"🔢 Session Number: {payload.get('number', 'Unknown')}")
-        print(f"📋 Initial Questions Length: {len(payload.get('initial_questions', ''))}")
-        print(f"🤖 LLM Questions Length: {len(payload.get('llm_questions', ''))}")
-        print(f"🩺 Pre-diagnosis Length: {len(payload.get('pre_diagnosis', ''))}")
-        print(f"💬 Comments Length: {len(payload.get('comments', ''))}")
-        print(f"📊 Score: {payload.get('score', 'Unknown')}")
-        print(f"📄 Filled Doc Length: {len(payload.get('filled_doc', ''))}")
-        
-        print("\n📤 COMPLETE PAYLOAD:")
-        print("-" * 40)
-        print(json.dumps(payload, ensure_ascii=False, indent=2))
-        print("-" * 40)
+        """Log the complete database request as one structured event."""
+        event_log.emit(
+            "DATABASE_CALL", "complete_request",
+            url=self.database_url,
+            number=payload.get("number", "Unknown"),
+            score=payload.get("score", "Unknown"),
+            lengths={
+                field: len(payload.get(field, ""))
+                for field in ("initial_questions", "llm_questions", "pre_diagnosis", "comments", "filled_doc")
+            },
+            payload=payload
+        )
     
     def _log_database_request(self, payload: Dict[str, Any]) -> None:
-        """Log the database request in a formatted way."""
-        print("\n" + "="*60)
-        print("[DATABASE_CALL] STORING DATA IN DATABASE")
-        print("="*60)
-        print(f"🎯 Endpoint: {self.database_url}")
-        print(f"📱 User: {payload.get('phone_number', 'Unknown')}")
-        print(f"📊 Total Q&A Pairs: {len(payload.get('chat', []))}")
-        print(f"🔑 Auth: Bearer {self.auth_token[:20]}...{self.auth_token[-10:]}")
-        print("\n📋 COMPLETE DATABASE PAYLOAD:")
-        print("-" * 40)
-        print(json.dumps(payload, ensure_ascii=False, indent=2))
-        print("-" * 40)
-        print("🚀 Sending to database...")
-        print("="*60 + "\n")
+        """Log the database request as one structured event."""
+        event_log.emit(
+            "DATABASE_CALL", "request",
+            url=self.database_url,
+            user=payload.get("phone_number", "Unknown"),
+            qa_pairs=len(payload.get("chat", [])),
+            payload=payload
+        )
     
     def _log_database_response(self, response: httpx.Response) -> Dict[str, Any]:
         """Log the database response and return parsed data."""
-        print("\n" + "="*60)
-        print("[DATABASE_RESPONSE] RECEIVED RESPONSE FROM DATABASE")
-        print("="*60)
-        print(f"📈 Status Code: {response.status_code}")
-        
-        if hasattr(response, 'elapsed'):
-            print(f"⏱️  Response Time: {response.elapsed.total_seconds():.2f}s")
-        
-        print("\n📨 RESPONSE BODY:")
-        print("-" * 40)
+        elapsed = round(response.elapsed.total_seconds(), 3) if hasattr(response, 'elapsed') else None
         
         try:
             if response.status_code in [200, 201]:
                 try:
                     response_json = response.json()
-                    print(json.dumps(response_json, ensure_ascii=False, indent=2))
                 except:
-                    print(f"Success response (no JSON): {response.text}")
                     response_json = {"success": True, "message": "Data stored successfully"}
-                print("-" * 40)
-                print("✅ Database storage successful!")
-                print("="*60 + "\n")
+                event_log.emit(
+                    "DATABASE_CALL", "response",
+                    status_code=response.status_code,
+                    elapsed_seconds=elapsed,
+                    payload=response_json
+                )
                 return {**response_json, "success": True}
             else:
-                print(f"❌ Error Response: {response.text}")
-                print("-" * 40)
-                print(f"🚨 Database storage failed with status {response.status_code}")
-                print("="*60 + "\n")
+                event_log.emit(
+                    "DATABASE_CALL", "response_error", logging.ERROR,
+                    status_code=response.status_code,
+                    elapsed_seconds=elapsed,
+                    payload=response.text
+                )
                 return {
                     "error": f"Database error: {response.status_code}",
                     "success": False,
+                    "status_code": response.status_code,
                     "details": response.text
                 }
         except Exception as parse_error:
-            print(f"❌ Failed to parse response: {response.text}")
-            print(f"🚨 Parse error: {str(parse_error)}")
-            print("-" * 40)
-            print("="*60 + "\n")
+            event_log.emit(
+                "DATABASE_CALL", "response_unparseable", logging.ERROR,
+                status_code=response.status_code,
+                error=str(parse_error),
+                payload=response.text
+            )
             return {
                 "error": f"Database parse error: {str(parse_error)}",
                 "success": False
             }
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.http_client.aclose()
+        """Close the HTTP transport if this service created it."""
+        if self._owns_transport:
+            await self.transport.close()
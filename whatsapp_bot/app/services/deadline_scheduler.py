@@ -0,0 +1,257 @@
+"""Timers the conversation services register for doctor and patient deadlines."""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config.settings import settings
+from app.models.deadline import Deadline
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.session_store import TIMER, SessionStore
+from app.utils.timing_wheel import TimingWheel
+
+
+# Called with the deadline that came due
+DeadlineHandler = Callable[[Deadline], Awaitable[None]]
+
+DEADLINES_FIRED = metrics.counter("deadlines_fired_total", "Deadlines that came due", ("kind",))
+DEADLINE_LAG = metrics.histogram("deadline_lag_seconds", "From a deadline's due time to its handler starting")
+
+
+class DeadlineScheduler:
+    """One timing wheel holding every pending deadline of this worker.
+
+    Services ``register`` a handler per deadline kind and ``schedule`` at most
+    one deadline per kind and subject (the phone number it is about);
+    scheduling again replaces it and ``cancel`` drops it, both O(1). A
+    background task advances the wheel every ``tick`` seconds and runs the
+    handlers of due deadlines as tasks. Handlers check the session before
+    acting, since the deadline may have become moot without being cancelled.
+
+    With a durable store (journaled memory or Redis) pending deadlines are
+    saved under the ``TIMER`` kind and reloaded by ``restore``; a deadline
+    stays stored until its handler finishes, so one interrupted by a restart
+    fires again, late. Deadlines that came due while the worker was down fire
+    on the first tick. Only deadlines whose subject this worker owns
+    (``owns``) are restored.
+    """
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        tick: float = 1.0,
+        owns: Optional[Callable[[str], bool]] = None
+    ):
+        self.tick = max(0.01, tick)
+        self.wheel = TimingWheel(time.time(), self.tick)
+        self.store = store if store is not None and store.durable else None
+        self.owns = owns or (lambda subject: True)
+        self._handlers: Dict[str, DeadlineHandler] = {}
+        self._pending_by_kind: Counter = Counter()
+        # Write-back of stored deadlines: key -> deadline, or None to delete
+        self._dirty: Dict[str, Optional[Deadline]] = {}
+        self._versions: Dict[str, int] = {}
+        self._ticker: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self.stats: Counter = Counter()
+
+    @classmethod
+    def from_settings(
+        cls, store: Optional[SessionStore] = None, owns: Optional[Callable[[str], bool]] = None
+    ) -> "DeadlineScheduler":
+        """Build the scheduler from environment settings."""
+        return cls(store=store, tick=settings.DEADLINE_TICK, owns=owns)
+
+    @staticmethod
+    def key(kind: str, subject: str) -> str:
+        return f"{kind}:{subject}"
+
+    def register(self, kind: str, handler: DeadlineHandler) -> None:
+        """Set the coroutine function run when a deadline of this kind comes due."""
+        self._handlers[kind] = handler
+
+    def schedule(self, kind: str, subject: str, delay: float, **payload: Any) -> Deadline:
+        """Fire a deadline ``delay`` seconds from now, replacing any pending one.
+
+        Args:
+            kind: Deadline kind, selecting the handler
+            subject: Phone number the deadline is about
+            delay: Seconds from now
+            **payload: JSON-serializable values passed to the handler
+
+        Returns:
+            The scheduled deadline
+        """
+        deadline = Deadline(self.key(kind, subject), kind, subject, time.time() + delay, payload)
+        self._drop(deadline.key)
+        self.wheel.add(deadline)
+        self._pending_by_kind[kind] += 1
+        self.stats["scheduled"] += 1
+        if self.store is not None:
+            self._dirty[deadline.key] = deadline
+        return deadline
+
+    def cancel(self, kind: str, subject: str) -> bool:
+        """Drop a pending deadline.
+
+        Returns:
+            True if one was pending
+        """
+        key = self.key(kind, subject)
+        if not self._drop(key):
+            return False
+        self.stats["cancelled"] += 1
+        if self.store is not None:
+            self._dirty[key] = None
+        return True
+
+    def _drop(self, key: str) -> bool:
+        deadline = self.wheel.cancel(key)
+        if deadline is None:
+            return False
+        self._pending_by_kind[deadline.kind] -= 1
+        return True
+
+    def get(self, kind: str, subject: str) -> Optional[Deadline]:
+        """The pending deadline of a kind for a subject, if any."""
+        return self.wheel.get(self.key(kind, subject))
+
+    def pending(self, kind: str) -> int:
+        """Number of pending deadlines of a kind."""
+        return self._pending_by_kind[kind]
+
+    async def restore(self) -> int:
+        """Load the stored deadlines this worker owns into the wheel.
+
+        Returns:
+            Number of deadlines restored
+        """
+        if self.store is None:
+            return 0
+        restored = 0
+        for key, stored in (await self.store.load_all(TIMER)).items():
+            deadline = stored.session
+            if not self.owns(deadline.subject):
+                continue
+            self._versions[key] = stored.version
+            self._drop(key)
+            self.wheel.add(deadline)
+            self._pending_by_kind[deadline.kind] += 1
+            restored += 1
+        self.stats["restored"] += restored
+        if restored:
+            event_log.emit("SESSION", "deadlines_restored", deadlines=restored)
+        return restored
+
+    async def flush(self) -> None:
+        """Write scheduled and cancelled deadlines to the store."""
+        if self.store is None or not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        deleted = [key for key, deadline in dirty.items() if deadline is None]
+        entries = {
+            key: (deadline, self._versions.get(key, 0))
+            for key, deadline in dirty.items() if deadline is not None
+        }
+        try:
+            if deleted:
+                await self.store.delete_many(TIMER, deleted)
+                for key in deleted:
+                    self._versions.pop(key, None)
+            if entries:
+                saved, conflicts = await self.store.save_many(TIMER, entries)
+                self._versions.update(saved)
+                if conflicts:
+                    # Only the owning worker schedules a subject's deadlines, so the local one wins
+                    current = await self.store.load_many(TIMER, conflicts)
+                    saved, _ = await self.store.save_many(TIMER, {
+                        key: (entries[key][0], current[key].version if key in current else 0)
+                        for key in conflicts
+                    })
+                    self._versions.update(saved)
+        except Exception:
+            # Keep the changes (unless superseded meanwhile) so the next flush retries them
+            for key, deadline in dirty.items():
+                self._dirty.setdefault(key, deadline)
+            raise
+
+    def start(self) -> None:
+        """Start advancing the wheel."""
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._run(), name="deadline-scheduler")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.fire_due(time.time())
+                await self.flush()
+            except Exception as e:
+                event_log.emit("SESSION", "deadline_tick_failed", logging.ERROR, exc_info=True, error=repr(e))
+
+    def fire_due(self, now: float) -> List[Deadline]:
+        """Start the handlers of every deadline due by ``now``.
+
+        Returns:
+            The deadlines that came due
+        """
+        due = self.wheel.advance(now)
+        for deadline in due:
+            self._pending_by_kind[deadline.kind] -= 1
+            DEADLINES_FIRED.inc(1, deadline.kind)
+            DEADLINE_LAG.observe(max(0.0, now - deadline.due_ts))
+            handler = self._handlers.get(deadline.kind)
+            if handler is None:
+                event_log.emit("SESSION", "deadline_unhandled", logging.WARNING, kind=deadline.kind, key=deadline.key)
+                self._done(deadline)
+                continue
+            task = asyncio.create_task(self._call(handler, deadline))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return due
+
+    async def _call(self, handler: DeadlineHandler, deadline: Deadline) -> None:
+        try:
+            await handler(deadline)
+            self.stats["fired"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            event_log.emit(
+                "SESSION", "deadline_handler_failed", logging.ERROR, exc_info=True, key=deadline.key, error=repr(e)
+            )
+        # Not reached when cancelled by shutdown: the deadline stays stored and fires after the restart
+        self._done(deadline)
+
+    def _done(self, deadline: Deadline) -> None:
+        # The handler may have scheduled the same key again
+        if self.store is not None and deadline.key not in self.wheel:
+            self._dirty[deadline.key] = None
+
+    async def stop(self) -> None:
+        """Stop the wheel, cancel running handlers and save pending changes."""
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        try:
+            await self.flush()
+        except Exception as e:
+            event_log.emit("SESSION", "deadlines_save_failed", logging.ERROR, error=repr(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pending deadlines per kind and scheduling counters."""
+        return {
+            "pending": len(self.wheel),
+            "pending_by_kind": {kind: count for kind, count in self._pending_by_kind.items() if count},
+            "running": len(self._running),
+            "persistent": self.store is not None,
+            "unsaved": len(self._dirty),
+            **{name: self.stats[name] for name in ("scheduled", "cancelled", "fired", "failed", "restored")}
+        }
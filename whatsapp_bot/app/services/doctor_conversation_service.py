@@ -2,11 +2,19 @@
 Doctor conversation service for handling doctor-specific workflows.
 """
 
+import logging
+
 from typing import Optional, Dict, Any
+from app.config.settings import settings
+from app.models.deadline import APPROVAL_WAIT, DOCTOR_REVIEW, Deadline
 from app.models.doctor_session import DoctorSession, DoctorSessionState
 from app.utils.doctor_session_manager import DoctorSessionManager
 from app.services.whatsapp_service import WhatsAppService
 from app.services.doctor_service import DoctorService
+from app.services.outbound_dispatcher import MessagePriority
+from app.services.shard_peers import ShardPeers
+from app.services.deadline_scheduler import DeadlineScheduler
+from app.utils.event_log import event_log
 from app.utils.session_manager import SessionManager
 from app.config.messages import SPECIALIST_APPROVAL_MESSAGES
 
@@ -19,12 +27,19 @@ class DoctorConversationService:
         doctor_session_manager: DoctorSessionManager,
         whatsapp_service: WhatsAppService,
         doctor_service: DoctorService,
-        patient_session_manager: SessionManager
+        patient_session_manager: SessionManager,
+        shard_peers: Optional[ShardPeers] = None,
+        deadlines: Optional[DeadlineScheduler] = None,
+        review_timeout: Optional[float] = None
     ):
         self.doctor_session_manager = doctor_session_manager
         self.whatsapp_service = whatsapp_service
         self.doctor_service = doctor_service
         self.patient_session_manager = patient_session_manager
+        self.shard_peers = shard_peers or ShardPeers()
+        self.deadlines = deadlines or DeadlineScheduler()
+        self.review_timeout = settings.DOCTOR_REVIEW_TIMEOUT if review_timeout is None else review_timeout
+        self.deadlines.register(DOCTOR_REVIEW, self._release_stuck_doctor)
     
     async def process_doctor_message(self, phone_number: str, message_text: str) -> None:
         """Process a message from a doctor.
@@ -33,7 +48,7 @@ class DoctorConversationService:
             phone_number: Doctor's phone number
             message_text: The message content
         """
-        print(f"\n[DOCTOR_MESSAGE] Processing message from doctor {phone_number}: {message_text}")
+        event_log.emit("DOCTOR", "message", user=phone_number, payload={"text": message_text})
         
         # Get or create doctor session
         doctor_session = self.doctor_session_manager.get_doctor_session(phone_number)
@@ -60,9 +75,10 @@ class DoctorConversationService:
     
     async def _handle_doctor_registration(self, phone_number: str) -> None:
         """Handle initial doctor registration."""
-        print(f"[DOCTOR_REGISTRATION] Registering doctor {phone_number}")
+        event_log.emit("DOCTOR", "registration_started", user=phone_number)
         
         session = self.doctor_session_manager.register_doctor(phone_number)
+        self.doctor_service.invalidate_doctor_directory()
         
         registration_message = (
             "👨‍⚕️ **REGISTRO DE ESPECIALISTA INICIADO**\n\n"
@@ -83,6 +99,7 @@ class DoctorConversationService:
         if message_lower in ["confirmar", "confirm", "si", "sí", "yes"]:
             # Confirm registration
             self.doctor_session_manager.confirm_doctor_registration(session.phone_number)
+            self.doctor_service.invalidate_doctor_directory()
             
             success_message = (
                 "✅ **REGISTRO DE ESPECIALISTA COMPLETADO**\n\n"
@@ -99,11 +116,12 @@ class DoctorConversationService:
             )
             
             await self.whatsapp_service.send_text_message(session.phone_number, success_message)
-            print(f"[DOCTOR_CONFIRMED] Doctor {session.phone_number} registration confirmed")
+            event_log.emit("DOCTOR", "registration_confirmed", user=session.phone_number)
             
         elif message_lower in ["cancelar", "cancel", "no"]:
             # Cancel registration
             self.doctor_session_manager.deactivate_doctor(session.phone_number)
+            self.doctor_service.invalidate_doctor_directory()
             
             cancel_message = (
                 "❌ **Registro cancelado**\n\n"
@@ -113,7 +131,7 @@ class DoctorConversationService:
             )
             
             await self.whatsapp_service.send_text_message(session.phone_number, cancel_message)
-            print(f"[DOCTOR_CANCELLED] Doctor {session.phone_number} registration cancelled")
+            event_log.emit("DOCTOR", "registration_cancelled", user=session.phone_number)
             
         else:
             # Invalid response
@@ -144,7 +162,7 @@ class DoctorConversationService:
     
     async def _handle_case_review(self, session: DoctorSession, message_text: str) -> None:
         """Handle doctor responses while reviewing a case."""
-        print(f"[CASE_REVIEW] Doctor {session.phone_number} reviewing case, message: {message_text}")
+        event_log.emit("DOCTOR", "case_review_message", logging.DEBUG, user=session.phone_number)
         
         # Process the approval response, but first ensure patient phone is available
         # If no patient phone in button, use the current reviewing patient
@@ -161,12 +179,13 @@ class DoctorConversationService:
             patient_phone = doctor_response.get("patient_phone", session.current_reviewing_patient)
             if patient_phone:
                 self.doctor_session_manager.complete_case_review(session.phone_number, patient_phone)
-                print(f"[CASE_COMPLETE] Doctor {session.phone_number} completed review of {patient_phone}")
+                self.deadlines.cancel(DOCTOR_REVIEW, session.phone_number)
+                event_log.emit("DOCTOR", "case_review_completed", user=session.phone_number, patient=patient_phone)
                 
                 # Notify the patient directly
                 await self._notify_patient_of_decision(doctor_response)
             else:
-                print(f"[ERROR] No patient phone found for doctor response from {session.phone_number}")
+                event_log.emit("DOCTOR", "case_review_without_patient", logging.ERROR, user=session.phone_number)
         else:
             # Invalid response, provide guidance
             guidance_message = (
@@ -261,6 +280,7 @@ class DoctorConversationService:
     async def _set_doctor_inactive(self, session: DoctorSession) -> None:
         """Set doctor as inactive."""
         self.doctor_session_manager.deactivate_doctor(session.phone_number)
+        self.doctor_service.invalidate_doctor_directory()
         
         inactive_message = (
             "😴 **Cuenta pausada exitosamente**\n\n"
@@ -270,12 +290,12 @@ class DoctorConversationService:
         )
         
         await self.whatsapp_service.send_text_message(session.phone_number, inactive_message)
-        print(f"[DOCTOR_INACTIVE] Doctor {session.phone_number} set to inactive")
+        event_log.emit("DOCTOR", "deactivated", user=session.phone_number)
     
     async def _set_doctor_active(self, session: DoctorSession) -> None:
         """Set doctor as active."""
-        session.state = DoctorSessionState.REGISTERED
-        session.mark_activity()
+        self.doctor_session_manager.activate_doctor(session.phone_number)
+        self.doctor_service.invalidate_doctor_directory()
         
         active_message = (
             "✅ **Cuenta reactivada exitosamente**\n\n"
@@ -285,7 +305,7 @@ class DoctorConversationService:
         )
         
         await self.whatsapp_service.send_text_message(session.phone_number, active_message)
-        print(f"[DOCTOR_ACTIVE] Doctor {session.phone_number} set to active")
+        event_log.emit("DOCTOR", "activated", user=session.phone_number)
     
     async def _notify_patient_of_decision(self, doctor_response: dict) -> None:
         """Notify the patient of the doctor's decision.
@@ -298,7 +318,7 @@ class DoctorConversationService:
         patient_phone = doctor_response.get("patient_phone", "")
         
         if not patient_phone:
-            print(f"[ERROR] Cannot notify patient - no patient phone in doctor response")
+            event_log.emit("DOCTOR", "decision_without_patient", logging.ERROR)
             return
         
         # Use the new specialist approval messages
@@ -313,19 +333,55 @@ class DoctorConversationService:
             )
         
         try:
-            await self.whatsapp_service.send_text_message(patient_phone, patient_message)
-            print(f"✅ [PATIENT_NOTIFIED] Patient {patient_phone} notified of decision: {decision}")
+            # Not batched: the decision is only recorded once the patient was really told
+            await self.whatsapp_service.send_text_message(
+                patient_phone, patient_message, priority=MessagePriority.HIGH, batch=False
+            )
+            event_log.emit("DOCTOR", "patient_notified", patient=patient_phone, decision=decision)
             
             # Update patient session to mark conversation as ended
-            if patient_phone in self.patient_session_manager.user_sessions:
-                from app.models.session import SessionState
-                patient_session = self.patient_session_manager.user_sessions[patient_phone]
-                patient_session.state = SessionState.CONVERSATION_ENDED
-                patient_session.final_specialist_decision = decision
-                patient_session.patient_notified_of_decision = True
+            await self.record_patient_decision(patient_phone, decision)
                 
         except Exception as e:
-            print(f"❌ [PATIENT_NOTIFICATION_ERROR] Failed to notify patient {patient_phone}: {repr(e)}")
+            event_log.emit(
+                "DOCTOR", "patient_notification_failed", logging.ERROR, patient=patient_phone, error=repr(e)
+            )
+    
+    async def record_patient_decision(self, patient_phone: str, decision: str) -> bool:
+        """End the patient's conversation with the specialist's decision.
+        
+        Runs on the worker that owns the patient's session when sharded.
+        
+        Args:
+            patient_phone: Patient's phone number
+            decision: Specialist decision
+            
+        Returns:
+            True if the patient session was found and updated
+        """
+        if not self.shard_peers.is_local(patient_phone):
+            reply = await self.shard_peers.call(
+                patient_phone,
+                "/internal/patients/decision",
+                {"patient_phone": patient_phone, "decision": decision}
+            )
+            return bool(reply.get("updated"))
+        
+        await self.patient_session_manager.hydrate(patient_phone)
+        patient_session = self.patient_session_manager.get_session(patient_phone)
+        if not patient_session:
+            return False
+        
+        from app.models.session import SessionState
+        patient_session.state = SessionState.CONVERSATION_ENDED
+        patient_session.final_specialist_decision = decision
+        patient_session.patient_notified_of_decision = True
+        
+        # The case is decided; no need to assign it to more specialists or keep waiting
+        from main import conversation_service
+        conversation_service.case_assignment.cancel(patient_phone)
+        self.deadlines.cancel(APPROVAL_WAIT, patient_phone)
+        return True
     
     def _get_state_emoji(self, state: DoctorSessionState) -> str:
         """Get emoji for doctor state."""
@@ -347,12 +403,23 @@ class DoctorConversationService:
         Returns:
             True if notification was sent successfully
         """
+        if not self.shard_peers.is_local(doctor_phone):
+            # The doctor's session lives on another worker
+            reply = await self.shard_peers.call(
+                doctor_phone,
+                "/internal/doctors/new-case",
+                {"doctor_phone": doctor_phone, "patient_phone": patient_phone}
+            )
+            return bool(reply.get("notified"))
+        
         session = self.doctor_session_manager.get_doctor_session(doctor_phone)
         if not session or not session.is_active():
             return False
         
-        # Mark doctor as reviewing this case
+        # Mark doctor as reviewing this case, released if they never decide
         self.doctor_session_manager.start_case_review(doctor_phone, patient_phone)
+        if self.review_timeout:
+            self.deadlines.schedule(DOCTOR_REVIEW, doctor_phone, self.review_timeout, patient_phone=patient_phone)
         
         notification_message = (
             f"🚨 **NUEVO CASO ASIGNADO**\n\n"
@@ -361,5 +428,33 @@ class DoctorConversationService:
             f"Recibirás los detalles del apoyo diagnóstico a continuación..."
         )
         
-        await self.whatsapp_service.send_text_message(doctor_phone, notification_message)
+        await self.whatsapp_service.send_text_message(doctor_phone, notification_message, priority=MessagePriority.HIGH)
         return True
+    
+    async def _release_stuck_doctor(self, deadline: Deadline) -> None:
+        """Free a doctor who has not decided on their case within the review timeout.
+        
+        Undecided cases are escalated to other doctors separately; this only
+        makes the doctor assignable again.
+        """
+        doctor_phone = deadline.subject
+        patient_phone = deadline.payload["patient_phone"]
+        await self.doctor_session_manager.hydrate(doctor_phone)
+        if not self.doctor_session_manager.release_case_review(doctor_phone, patient_phone):
+            return
+        
+        event_log.emit(
+            "DOCTOR", "review_timed_out", logging.WARNING,
+            user=doctor_phone, patient=patient_phone, timeout_seconds=self.review_timeout
+        )
+        try:
+            await self.whatsapp_service.send_text_message(
+                doctor_phone,
+                f"⏰ **Revisión liberada**\n\n"
+                f"No recibimos tu decisión sobre el caso del paciente {patient_phone} a tiempo, "
+                f"por lo que se liberó tu revisión.\n\n"
+                f"Ya puedes recibir nuevos casos.",
+                priority=MessagePriority.LOW
+            )
+        finally:
+            await self.doctor_session_manager.flush()
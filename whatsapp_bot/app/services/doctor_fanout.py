@@ -0,0 +1,113 @@
+"""Concurrent fan-out of case notifications to doctors."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Set
+
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
+
+
+DoctorNotifier = Callable[[str], Awaitable[bool]]
+
+FANOUT_SECONDS = metrics.histogram("doctor_fanout_seconds", "Notifying every matched doctor of a case")
+DOCTOR_NOTIFICATIONS = metrics.counter("doctor_notifications_total", "Doctor case notifications", ("outcome",))
+
+
+@dataclass
+class FanoutResult:
+    """Per-doctor outcome of a notification fan-out."""
+    notified: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)  # Notifier returned False
+    failed: Dict[str, str] = field(default_factory=dict)  # Phone -> error
+    elapsed_seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        """Number of doctors the fan-out was attempted for."""
+        return len(self.notified) + len(self.skipped) + len(self.failed)
+
+
+class DoctorFanout:
+    """Notify many doctors concurrently with a concurrency cap.
+
+    Each doctor's own sends stay sequential (inside the notifier) so they
+    arrive in order; different doctors are notified in parallel. Fan-outs can
+    also run in the background so the patient flow is not held until every
+    doctor has been reached.
+    """
+
+    def __init__(self, max_concurrency: int = 10):
+        self.max_concurrency = max(1, max_concurrency)
+        self._background: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls) -> "DoctorFanout":
+        """Build the fan-out engine from environment settings."""
+        return cls(max_concurrency=settings.DOCTOR_FANOUT_CONCURRENCY)
+
+    async def fan_out(self, doctor_phones: List[str], notify: DoctorNotifier) -> FanoutResult:
+        """Run ``notify`` for every doctor, at most ``max_concurrency`` at a time.
+
+        Args:
+            doctor_phones: Phone numbers of the doctors to notify
+            notify: Coroutine notifying one doctor, returning True on success
+
+        Returns:
+            The per-doctor results
+        """
+        result = FanoutResult()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+
+        async def notify_one(doctor_phone: str) -> None:
+            async with slots:
+                try:
+                    if await notify(doctor_phone):
+                        result.notified.append(doctor_phone)
+                    else:
+                        result.skipped.append(doctor_phone)
+                except Exception as e:
+                    result.failed[doctor_phone] = repr(e)
+
+        with tracer.span("doctor_fanout", doctors=len(doctor_phones)) as span:
+            await asyncio.gather(*(notify_one(phone) for phone in dict.fromkeys(doctor_phones)))
+            span.set(notified=len(result.notified), failed=len(result.failed))
+        result.elapsed_seconds = time.perf_counter() - started
+        FANOUT_SECONDS.observe(result.elapsed_seconds)
+        DOCTOR_NOTIFICATIONS.inc(len(result.notified), "notified")
+        DOCTOR_NOTIFICATIONS.inc(len(result.skipped), "skipped")
+        DOCTOR_NOTIFICATIONS.inc(len(result.failed), "failed")
+
+        event_log.emit(
+            "DOCTOR", "fanout_completed", logging.WARNING if result.failed else logging.INFO,
+            notified=len(result.notified), total=result.total,
+            seconds=round(result.elapsed_seconds, 3), failed=result.failed
+        )
+        return result
+
+    def launch(self, coro: Awaitable[None]) -> asyncio.Task:
+        """Run a fan-out coroutine in the background, keeping a reference to it."""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    @property
+    def in_progress(self) -> int:
+        """Number of background fan-outs still running."""
+        return len(self._background)
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Wait for background fan-outs to finish (used on shutdown)."""
+        if not self._background:
+            return
+        done, pending = await asyncio.wait(set(self._background), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            event_log.emit("DOCTOR", "fanout_cancelled", logging.WARNING, fanouts=len(pending))
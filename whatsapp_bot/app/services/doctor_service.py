@@ -1,62 +1,124 @@
 """Doctor service for managing doctor notifications and approvals."""
 
-import httpx
-import json
-from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, FrozenSet, Optional
 
 from app.config.settings import settings
+from app.services.http_transport import HTTPTransport
+from app.services.outbound_dispatcher import MessagePriority
+from app.services.doctor_fanout import DoctorFanout
+from app.utils.event_log import event_log
+from app.utils.phone_numbers import normalize_phone_number
 from app.models.session import UserSession
 
 
 class DoctorService:
     """Service for managing doctor notifications and approval workflow."""
 
-    def __init__(self):
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, transport: Optional[HTTPTransport] = None, fanout: Optional[DoctorFanout] = None):
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport.from_settings()
+        self.fanout = fanout or DoctorFanout.from_settings()
         self.api_url = settings.DATABASE_API_URL.replace('/api/patients/intake/', '/api/doctors/phone-numbers/')
         self.auth_token = settings.DATABASE_API_TOKEN
+        
+        # Doctor phone directory cache (stale-while-revalidate)
+        self.directory_ttl = settings.DOCTOR_DIRECTORY_TTL
+        self.directory_max_stale = settings.DOCTOR_DIRECTORY_MAX_STALE
+        self._directory: List[str] = []
+        self._directory_normalized: FrozenSet[str] = frozenset()
+        self._directory_etag: Optional[str] = None
+        self._directory_fetched_at: Optional[float] = None
+        self._directory_refresh: Optional[asyncio.Task] = None
 
     async def get_doctor_phone_numbers(self) -> List[str]:
+        """Get the list of doctor phone numbers, served from a local cache.
+        
+        Fresh entries (younger than DOCTOR_DIRECTORY_TTL) are returned as is.
+        Stale entries are returned immediately while a background refresh
+        revalidates them. If there is no entry, it was invalidated, or it is
+        older than DOCTOR_DIRECTORY_MAX_STALE, the caller waits for a refresh.
+        
+        Returns:
+            List of doctor phone numbers
+        """
+        age = None
+        if self._directory_fetched_at is not None:
+            age = time.monotonic() - self._directory_fetched_at
+        
+        if age is not None and age < self.directory_ttl:
+            return list(self._directory)
+        
+        if age is not None and age < self.directory_max_stale:
+            self._start_directory_refresh()
+            return list(self._directory)
+        
+        return list(await asyncio.shield(self._start_directory_refresh()))
+    
+    async def get_normalized_doctor_phones(self) -> FrozenSet[str]:
+        """Get the cached doctor directory as a set of normalized phone numbers.
+        
+        The set is rebuilt only when the directory changes, so matching a case
+        against it is a single set intersection.
+        """
+        await self.get_doctor_phone_numbers()
+        return self._directory_normalized
+    
+    def invalidate_doctor_directory(self) -> None:
+        """Force the next lookup to revalidate the directory with the backend."""
+        self._directory_fetched_at = None
+    
+    def _start_directory_refresh(self) -> asyncio.Task:
+        """Start a directory refresh unless one is already running."""
+        if self._directory_refresh is None or self._directory_refresh.done():
+            self._directory_refresh = asyncio.create_task(self._fetch_doctor_phone_numbers())
+        return self._directory_refresh
+    
+    async def _fetch_doctor_phone_numbers(self) -> List[str]:
         """Fetch the list of doctor phone numbers from the API.
         
+        Sends If-None-Match with the last ETag so an unchanged directory costs
+        a 304 without a body. On failure the previous list is kept.
+        
         Returns:
             List of doctor phone numbers
         """
+        headers = {
+            "Authorization": f"Bearer {self.auth_token}",
+            "Content-Type": "application/json"
+        }
+        if self._directory_etag:
+            headers["If-None-Match"] = self._directory_etag
+        
         try:
-            print("\n" + "="*60)
-            print("[DOCTOR_SERVICE] FETCHING DOCTOR PHONE NUMBERS")
-            print("="*60)
-            print(f"🎯 Endpoint: {self.api_url}")
-            print(f"🔑 Auth: Bearer {self.auth_token[:20]}...{self.auth_token[-10:]}")
-            
-            response = await self.http_client.get(
+            response = await self.transport.get(
                 self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.auth_token}",
-                    "Content-Type": "application/json"
-                }
+                profile="backend",
+                headers=headers
             )
             
-            if response.status_code == 200:
+            if response.status_code == 304:
+                self._directory_fetched_at = time.monotonic()
+                event_log.emit("DOCTOR", "directory_not_modified", logging.DEBUG, doctors=len(self._directory))
+            elif response.status_code == 200:
                 data = response.json()
-                phone_numbers = data.get("phone_numbers", [])
-                count = data.get("count", len(phone_numbers))
-                
-                print(f"✅ Successfully retrieved {count} doctor phone numbers")
-                print(f"📞 Phone numbers: {phone_numbers}")
-                print("="*60 + "\n")
-                
-                return phone_numbers
+                self._directory = data.get("phone_numbers", [])
+                self._directory_normalized = frozenset(normalize_phone_number(phone) for phone in self._directory)
+                self._directory_etag = response.headers.get("ETag")
+                self._directory_fetched_at = time.monotonic()
+                event_log.emit("DOCTOR", "directory_refreshed", doctors=data.get("count", len(self._directory)))
             else:
-                print(f"❌ Failed to fetch doctor numbers: {response.status_code}")
-                print(f"📨 Response: {response.text}")
-                print("="*60 + "\n")
-                return []
+                event_log.emit(
+                    "DOCTOR", "directory_fetch_failed", logging.ERROR,
+                    status_code=response.status_code, payload=response.text
+                )
                 
         except Exception as e:
-            print(f"❌ Error fetching doctor phone numbers: {repr(e)}")
-            print("="*60 + "\n")
-            return []
+            event_log.emit("DOCTOR", "directory_fetch_failed", logging.ERROR, error=repr(e))
+        
+        return self._directory
 
     async def notify_doctors_about_diagnosis(self, session: UserSession, pre_diagnosis: Dict[str, Any], whatsapp_service) -> List[str]:
         """Notify all doctors about a new pre-diagnosis.
@@ -72,10 +134,10 @@ class DoctorService:
         doctor_numbers = await self.get_doctor_phone_numbers()
         
         if not doctor_numbers:
-            print("⚠️ No doctor phone numbers available for notification")
+            event_log.emit("DOCTOR", "no_doctors_to_notify", logging.WARNING, patient=session.phone_number)
             return []
         
-        print(f"\n[DOCTOR_NOTIFICATION] Notifying {len(doctor_numbers)} doctors about new pre-diagnosis")
+        event_log.emit("DOCTOR", "notifying", patient=session.phone_number, doctors=len(doctor_numbers))
         
         # Prepare greeting message
         greeting_message = (
@@ -96,34 +158,33 @@ class DoctorService:
             {"id": f"mixed_{session.phone_number}", "title": "MIXTO"}
         ]
         
-        notified_doctors = []
+        async def notify_doctor(doctor_number: str) -> bool:
+            # Send greeting message
+            await whatsapp_service.send_text_message(doctor_number, greeting_message, priority=MessagePriority.HIGH)
+            
+            # Send detailed diagnosis
+            await whatsapp_service.send_text_message(doctor_number, diagnosis_details, priority=MessagePriority.HIGH)
+            
+            # Send approval buttons
+            await whatsapp_service.send_interactive_message(
+                doctor_number,
+                "Por favor, revise el pre-diagnóstico y seleccione su decisión:",
+                "Decisión Médica",
+                approval_buttons,
+                priority=MessagePriority.HIGH
+            )
+            
+            event_log.emit("DOCTOR", "notified", logging.DEBUG, doctor=doctor_number, patient=session.phone_number)
+            return True
         
-        for doctor_number in doctor_numbers:
-            try:
-                print(f"📤 Notifying doctor: {doctor_number}")
-                
-                # Send greeting message
-                await whatsapp_service.send_text_message(doctor_number, greeting_message)
-                
-                # Send detailed diagnosis
-                await whatsapp_service.send_text_message(doctor_number, diagnosis_details)
-                
-                # Send approval buttons
-                await whatsapp_service.send_interactive_message(
-                    doctor_number,
-                    "Por favor, revise el pre-diagnóstico y seleccione su decisión:",
-                    "Decisión Médica",
-                    approval_buttons
-                )
-                
-                notified_doctors.append(doctor_number)
-                print(f"✅ Successfully notified doctor: {doctor_number}")
-                
-            except Exception as e:
-                print(f"❌ Failed to notify doctor {doctor_number}: {repr(e)}")
+        # Messages are rendered once above; doctors are notified concurrently
+        result = await self.fanout.fan_out(doctor_numbers, notify_doctor)
         
-        print(f"\n🎉 Notification complete: {len(notified_doctors)}/{len(doctor_numbers)} doctors notified")
-        return notified_doctors
+        event_log.emit(
+            "DOCTOR", "notification_complete",
+            patient=session.phone_number, notified=len(result.notified), doctors=len(doctor_numbers)
+        )
+        return result.notified
 
     def _format_diagnosis_for_doctors(self, session: UserSession, pre_diagnosis: Dict[str, Any]) -> str:
         """Format the pre-diagnosis information for doctors.
@@ -250,7 +311,7 @@ class DoctorService:
             await whatsapp_service.send_text_message(doctor_phone, help_message)
             return None  # Not a valid doctor response
         
-        print(f"\n[DOCTOR_RESPONSE] Doctor {doctor_phone} responded: {decision}")
+        event_log.emit("DOCTOR", "decision", doctor=doctor_phone, patient=patient_phone, decision=decision)
         
         # Send confirmation to doctor
         confirmation_message = f"✅ Su decisión '{decision}' ha sido registrada y enviada al paciente."
@@ -298,9 +359,10 @@ class DoctorService:
                 "🏥 Su caso será tratado con especial atención."
             )
         
-        print(f"[PATIENT_NOTIFICATION] Notifying patient {patient_phone} of decision: {decision}")
-        await whatsapp_service.send_text_message(patient_phone, message)
+        event_log.emit("DOCTOR", "notifying_patient", patient=patient_phone, decision=decision)
+        await whatsapp_service.send_text_message(patient_phone, message, priority=MessagePriority.HIGH)
 
     async def close(self):
-        """Close the HTTP client."""
-        await self.http_client.aclose()
+        """Close the HTTP transport if this service created it."""
+        if self._owns_transport:
+            await self.transport.close()
@@ -0,0 +1,163 @@
+"""Shared HTTP transport for all outbound API calls."""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.tracing import tracer
+
+
+try:
+    import h2  # noqa: F401  (httpx only needs it to be importable)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Timeouts per destination: Graph API sends are quick, diagnose-bot runs LLMs
+TIMEOUT_PROFILES: Dict[str, httpx.Timeout] = {
+    "whatsapp": httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0),
+    "diagnosis": httpx.Timeout(connect=10.0, read=60.0, write=10.0, pool=5.0),
+    "backend": httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0),
+    "default": httpx.Timeout(30.0),
+}
+
+# Our own services, which join the caller's trace; never sent to the Graph API
+TRACE_PROPAGATION_PROFILES = {"diagnosis", "backend"}
+
+
+@dataclass
+class HostStats:
+    """Utilisation counters for one destination host."""
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    waited: int = 0
+    total_wait_seconds: float = 0.0
+
+
+class HTTPTransport:
+    """One managed ``httpx.AsyncClient`` shared by every outbound service.
+
+    Keeps a single keep-alive pool (HTTP/2 when ``h2`` is installed), caps
+    concurrent requests per host and applies a timeout profile per
+    destination. Utilisation counters are kept per host to size the pool.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        per_host_limit: int = 20,
+        http2: bool = True,
+        timeout_profiles: Optional[Dict[str, httpx.Timeout]] = None
+    ):
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout_profiles = {**TIMEOUT_PROFILES, **(timeout_profiles or {})}
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=self.timeout_profiles["default"]
+        )
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_stats: Dict[str, HostStats] = {}
+
+    @classmethod
+    def from_settings(cls) -> "HTTPTransport":
+        """Build the transport from environment settings."""
+        return cls(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            per_host_limit=settings.HTTP_PER_HOST_LIMIT,
+            http2=settings.HTTP2_ENABLED
+        )
+
+    async def request(self, method: str, url: str, profile: str = "default", **kwargs: Any) -> httpx.Response:
+        """Send a request through the shared pool.
+
+        Args:
+            method: HTTP method
+            url: Absolute request URL
+            profile: Timeout profile name (whatsapp, diagnosis, backend, default)
+            **kwargs: Extra arguments for ``httpx.AsyncClient.request``
+
+        Returns:
+            The HTTP response
+
+        Raises:
+            httpx.RequestError: If the request fails at the transport level
+        """
+        host = httpx.URL(url).host
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+            self._host_stats[host] = HostStats()
+        stats = self._host_stats[host]
+
+        kwargs.setdefault("timeout", self.timeout_profiles.get(profile, self.timeout_profiles["default"]))
+
+        with tracer.span(f"http.{profile}", method=method, host=host) as span:
+            if profile in TRACE_PROPAGATION_PROFILES:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), **tracer.headers()}
+
+            if slot.locked():
+                stats.waited += 1
+            wait_started = time.perf_counter()
+            async with slot:
+                waited = time.perf_counter() - wait_started
+                stats.total_wait_seconds += waited
+                stats.requests += 1
+                stats.in_flight += 1
+                stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                    span.set(status_code=response.status_code, pool_wait_ms=round(waited * 1000, 3))
+                    return response
+                except httpx.RequestError:
+                    stats.errors += 1
+                    raise
+                finally:
+                    stats.in_flight -= 1
+
+    async def get(self, url: str, profile: str = "default", **kwargs: Any) -> httpx.Response:
+        """Send a GET request through the shared pool."""
+        return await self.request("GET", url, profile=profile, **kwargs)
+
+    async def post(self, url: str, profile: str = "default", **kwargs: Any) -> httpx.Response:
+        """Send a POST request through the shared pool."""
+        return await self.request("POST", url, profile=profile, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool configuration and per-host utilisation counters."""
+        return {
+            "http2": self.http2,
+            "per_host_limit": self.per_host_limit,
+            "hosts": {
+                host: {
+                    "in_flight": stats.in_flight,
+                    "peak_in_flight": stats.peak_in_flight,
+                    "utilisation": round(stats.in_flight / self.per_host_limit, 3),
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "waited_for_slot": stats.waited,
+                    "avg_wait_ms": round(1000 * stats.total_wait_seconds / stats.requests, 3) if stats.requests else 0.0
+                }
+                for host, stats in self._host_stats.items()
+            }
+        }
+
+    async def close(self):
+        """Close the shared HTTP client."""
+        await self.client.aclose()
@@ -0,0 +1,325 @@
+"""Rate-limited outbound dispatcher for WhatsApp Graph API sends."""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+
+
+class MessagePriority(IntEnum):
+    """Send lanes; lower values are dispatched first."""
+    URGENT = 0  # Urgent-case alerts to doctors
+    HIGH = 1    # Case notifications and decisions
+    NORMAL = 2  # Regular conversation replies
+    LOW = 3     # Greetings and informational messages
+
+
+SendCall = Callable[[], Awaitable[httpx.Response]]
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Graph API error codes for transient failures where the message was not sent:
+# temporary service errors (2, 131000, 131016, 133004) and rate limits (4,
+# 80007, 130429). Any other error code is a rejection that a retry repeats.
+TRANSIENT_ERROR_CODES = {2, 4, 80007, 130429, 131000, 131016, 133004}
+# Failures where the request never reached Meta; after any other transport
+# error (read timeout, dropped connection) the message may have been delivered
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+SEND_RETRIES = metrics.counter("retries_total", "Retried downstream calls", ("operation",)).labels("whatsapp_send")
+
+
+class TokenBucket:
+    """Token bucket limiting sends per WhatsApp phone-number-id."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = max(rate_per_second, 0.001)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.throttled = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a send token is available and consume it."""
+        self._refill()
+        while self.tokens < 1:
+            self.throttled += 1
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so the next sends wait (used when Meta answers 429)."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+@dataclass
+class OutboundJob:
+    """A single Graph API send waiting in a recipient's queue."""
+    recipient: str
+    priority: MessagePriority
+    send: SendCall
+    phone_number_id: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Context of the conversation that queued it (carries the trace)
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class OutboundDispatcher:
+    """Priority-laned, rate-limited send queue with per-recipient ordering.
+
+    Each recipient has a FIFO of pending sends and at most one send in flight,
+    so a user's messages always arrive in the order they were produced. The
+    ready queue orders recipients by the most urgent lane waiting for them,
+    so a doctor's urgent alert is dispatched before queued greetings.
+    Only sends known not to have been delivered are retried, so a patient
+    never gets a message twice: connection failures, 429 and 5xx responses
+    without a body. A 429 drains the phone number's token bucket for the
+    backoff, which holds back every send from that number, this retry
+    included; other retries sleep with jittered exponential backoff. The
+    final response is returned to the caller.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        rate_per_second: float = 20.0,
+        burst: int = 40,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0
+    ):
+        self.concurrency = max(1, concurrency)
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pending: Dict[str, Deque[OutboundJob]] = {}
+        self._in_flight: set = set()
+        self._ready: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._sent = 0
+        self._retries = 0
+        self._failed = 0
+
+    @classmethod
+    def from_settings(cls) -> "OutboundDispatcher":
+        """Build the dispatcher from environment settings."""
+        return cls(
+            concurrency=settings.OUTBOUND_SEND_CONCURRENCY,
+            rate_per_second=settings.OUTBOUND_RATE_PER_SECOND,
+            burst=settings.OUTBOUND_BURST,
+            max_retries=settings.OUTBOUND_MAX_RETRIES,
+            retry_base_delay=settings.OUTBOUND_RETRY_BASE_DELAY
+        )
+
+    @property
+    def is_running(self) -> bool:
+        """Whether background send workers are running."""
+        return self._ready is not None
+
+    def start(self) -> None:
+        """Spawn the send workers."""
+        if self._ready is not None:
+            return
+
+        self._ready = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"outbound-sender-{i}")
+            for i in range(self.concurrency)
+        ]
+        event_log.emit(
+            "WHATSAPP_SEND", "dispatcher_started",
+            workers=self.concurrency, rate_per_second=self.rate_per_second, burst=self.burst
+        )
+
+    def _bucket(self, phone_number_id: str) -> TokenBucket:
+        bucket = self._buckets.get(phone_number_id)
+        if bucket is None:
+            bucket = self._buckets[phone_number_id] = TokenBucket(self.rate_per_second, self.burst)
+        return bucket
+
+    async def dispatch(
+        self,
+        recipient: str,
+        send: SendCall,
+        priority: MessagePriority = MessagePriority.NORMAL,
+        phone_number_id: Optional[str] = None
+    ) -> httpx.Response:
+        """Queue a send and wait for its final response.
+
+        Args:
+            recipient: The recipient's phone number
+            send: Coroutine factory performing the Graph API request
+            priority: Send lane
+            phone_number_id: Sending WhatsApp number (rate limit key)
+
+        Returns:
+            The last HTTP response after retries
+        """
+        phone_number_id = phone_number_id or settings.PHONE_NUMBER_ID
+        job = OutboundJob(
+            recipient=recipient,
+            priority=priority,
+            send=send,
+            phone_number_id=phone_number_id,
+            future=asyncio.get_running_loop().create_future()
+        )
+
+        if self._ready is None:
+            # Not started (scripts, shutdown): send inline with the same limits
+            return await self._send_with_retry(job)
+
+        queue = self._pending.setdefault(recipient, deque())
+        queue.append(job)
+        if recipient not in self._in_flight:
+            self._schedule(recipient, priority)
+        return await job.future
+
+    def _schedule(self, recipient: str, priority: MessagePriority) -> None:
+        # Duplicate entries are harmless: stale ones are skipped by the workers
+        self._ready.put_nowait((int(priority), next(self._sequence), recipient))
+
+    async def _worker(self) -> None:
+        """Dispatch the head send of the most urgent ready recipient."""
+        while True:
+            _, _, recipient = await self._ready.get()
+            queue = self._pending.get(recipient)
+            if recipient in self._in_flight or not queue:
+                continue
+
+            job = queue.popleft()
+            self._in_flight.add(recipient)
+            try:
+                response = await self._send_with_retry(job)
+                if not job.future.done():
+                    job.future.set_result(response)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._in_flight.discard(recipient)
+                if queue:
+                    self._schedule(recipient, min(pending.priority for pending in queue))
+                else:
+                    self._pending.pop(recipient, None)
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = self.retry_base_delay * (2 ** attempt)
+        # Jitter keeps concurrent retries from hitting Meta in lockstep
+        return delay * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _retryable(response: httpx.Response) -> bool:
+        """Whether Meta did not send the message and a retry may: 429, a transient Graph API error code, or a 5xx from the gateway with no body."""
+        if response.status_code == 429:
+            return True
+        if response.status_code < 400:
+            return False
+        if not response.content:
+            return response.status_code in RETRYABLE_STATUS_CODES
+        try:
+            error = response.json().get("error")
+        except (ValueError, AttributeError):
+            return False  # A body that is not Graph API JSON: the send may have gone through
+        return isinstance(error, dict) and error.get("code") in TRANSIENT_ERROR_CODES
+
+    async def _send_with_retry(self, job: OutboundJob) -> httpx.Response:
+        bucket = self._bucket(job.phone_number_id)
+        attempt = 0
+
+        while True:
+            await bucket.acquire()
+            response = None
+            try:
+                response = await asyncio.create_task(job.send(), context=job.context)
+            except httpx.RequestError as e:
+                if not isinstance(e, NOT_SENT_ERRORS) or attempt >= self.max_retries:
+                    self._failed += 1
+                    raise
+                event_log.emit(
+                    "WHATSAPP_SEND", "retry", logging.WARNING, user=job.recipient, attempt=attempt + 1, error=repr(e)
+                )
+            else:
+                if not self._retryable(response) or attempt >= self.max_retries:
+                    if response.status_code >= 400:
+                        self._failed += 1
+                    else:
+                        self._sent += 1
+                    return response
+                event_log.emit(
+                    "WHATSAPP_SEND", "retry", logging.WARNING,
+                    user=job.recipient, attempt=attempt + 1, status_code=response.status_code
+                )
+
+            self._retries += 1
+            SEND_RETRIES.inc()
+            delay = self._retry_delay(attempt, response)
+            if response is not None and response.status_code == 429:
+                bucket.pause(delay)  # The next acquire() waits it out
+            else:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Wait for queued sends to finish, then cancel the workers."""
+        if self._ready is None:
+            return
+
+        deadline = time.monotonic() + drain_timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._ready = None
+
+        for queue in self._pending.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Outbound dispatcher stopped"))
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, object]:
+        """Get queue depth and send counters."""
+        lanes = {priority.name: 0 for priority in MessagePriority}
+        for queue in self._pending.values():
+            for job in queue:
+                lanes[job.priority.name] += 1
+
+        return {
+            "queued_by_priority": lanes,
+            "recipients_waiting": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "sent": self._sent,
+            "retries": self._retries,
+            "failed": self._failed,
+            "throttled": {number: bucket.throttled for number, bucket in self._buckets.items()}
+        }
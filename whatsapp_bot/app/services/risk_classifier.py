@@ -0,0 +1,208 @@
+"""Local keyword screening of patient answers for urgent risk."""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Match, Optional, Pattern, Tuple
+
+from app.config.settings import settings
+from app.utils.settings_parsing import parse_csv
+
+
+# Said anywhere in any answer (questionnaire or follow-up)
+CRISIS_PHRASES = (
+    "suicid", "matarme", "quitarme la vida", "acabar con mi vida", "no quiero vivir",
+    "quiero morir", "me quiero morir", "hacerme dano", "danarme", "herirme", "cortarme", "lastimarme", "sobredosis"
+)
+# Crisis phrases that do not say who they are about ("suicidio", "se suicidó")
+PERSON_NEUTRAL_PHRASES = ("suicid", "sobredosis")
+# Before a person-neutral phrase, these make it about someone else...
+OTHER_PERSON = frozenset((
+    "se", "te", "usted", "ustedes", "ella", "ellos", "ellas", "alguien", "hermano", "hermana", "madre", "padre",
+    "mama", "papa", "hijo", "hija", "amigo", "amiga", "primo", "prima", "tio", "tia", "abuelo", "abuela",
+    "esposo", "esposa", "novio", "novia", "pareja", "vecino", "vecina", "companero", "companera", "conocido"
+))
+# ...unless one of these, closer to it, makes it about the patient again
+FIRST_PERSON = frozenset((
+    "yo", "me", "pienso", "pense", "quiero", "queria", "he", "tengo", "tuve", "siento", "estoy", "intente", "hice"
+))
+
+# A clause of a self-harm answer opening with one of these is a "yes"
+AFFIRMATIVE_OPENINGS = (
+    "si", "yes", "a veces", "aveces", "frecuentemente", "seguido", "muchas veces", "todos los dias",
+    "constantemente", "casi siempre", "claro", "ultimamente", "lo he pensado", "he pensado"
+)
+
+PSYCHOSIS_PHRASES = (
+    "alucin", "voces", "veo cosas", "veo personas", "escucho cosas", "me hablan", "me persiguen", "paranoi"
+)
+STOPPED_MEDICATION_PHRASES = (
+    "deje de tomar", "deje los medicamentos", "deje la medicacion", "deje el tratamiento", "sin tomar mis"
+)
+
+NEGATIONS = frozenset(("no", "nunca", "jamas", "ni", "tampoco", "nada"))
+# Pronouns, auxiliaries and prepositions between a negation and what it negates
+# ("nunca he pensado en ...", "no me quiero ..."), not counted towards its reach
+NEGATION_FILLER = frozenset((
+    "me", "te", "se", "lo", "la", "le", "he", "has", "ha", "hemos", "han", "en", "a", "de", "con", "por", "ya", "mas"
+))
+# Words a negation may reach over, so "no quiero matarme" is negated but not
+# "no aguanto mas, quiero matarme"
+NEGATION_REACH = 2
+CLAUSE_BREAKS = re.compile(r"[,.;:!?\n]|\b(?:pero|aunque|sin embargo|y|porque|que)\b")
+# Without "que", so "claro que no" stays one clause and is read as a "no"
+OPENING_BREAKS = re.compile(r"[,.;:!?\n]|\b(?:pero|aunque|sin embargo|y|porque)\b")
+WORDS = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and drop accents so "Sí, dañarme" matches "si, danarme"."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _alternation(phrases: Tuple[str, ...]) -> Pattern[str]:
+    return re.compile("|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True)))
+
+
+@dataclass(frozen=True)
+class RiskSignal:
+    """Why an answer needs a doctor's attention right away."""
+    question_id: str
+    reason: str  # Shown to doctors and in the basic analysis
+    match: str   # The folded text that triggered it
+
+
+class RiskClassifier:
+    """Flags high-risk answers as they arrive, without calling the diagnosis API.
+
+    Every answer is checked for crisis phrases (suicidal ideation, self-harm).
+    The self-harm question also triggers on an affirmative reply (a clause
+    opening with "sí", "a veces", ... and no negation anywhere after it, so
+    "claro que no" and "a veces no" are a "no"), and the
+    hallucinations/medication question on reported psychotic symptoms or on
+    having stopped psychiatric medication; a bare "sí" there is ambiguous and
+    left to the diagnosis pipeline.
+
+    A phrase does not count when a negation ("no", "nunca", "ni", ...)
+    governs it: in the same clause and at most ``NEGATION_REACH`` words
+    before it, not counting pronouns and auxiliaries. So "nunca he pensado en
+    suicidarme" is not flagged but "no sé, pero a veces quiero morir" and "no
+    duermo y pienso en suicidarme" are. Crisis phrases that could be about
+    anyone ("suicidio", "sobredosis") only count when said of the patient or
+    of no one in particular: "mi hermano se suicidó" and "si te refieres a
+    suicidio" are left to the diagnosis pipeline rather than alerting every
+    doctor. The rules are plain regexes over the folded answer and take
+    microseconds, so they run on every answer.
+    """
+
+    def __init__(self, alert_doctors: bool = True, extra_phrases: Tuple[str, ...] = ()):
+        self.alert_doctors = alert_doctors
+        self._crisis = _alternation(CRISIS_PHRASES + tuple(fold(phrase) for phrase in extra_phrases))
+        self._person_neutral = _alternation(PERSON_NEUTRAL_PHRASES)
+        self._affirmative = re.compile(
+            r"\W*(?:" + "|".join(re.escape(opening) for opening in AFFIRMATIVE_OPENINGS) + r")\b"
+        )
+        self._question_rules: Dict[str, Tuple[Tuple[Pattern[str], str], ...]] = {
+            "hallucinations_meds": (
+                (_alternation(PSYCHOSIS_PHRASES), "Alucinaciones o síntomas psicóticos reportados"),
+                (_alternation(STOPPED_MEDICATION_PHRASES), "Suspensión de medicación psiquiátrica reportada"),
+            ),
+        }
+        self.checked = 0
+        self.flagged = 0
+
+    @classmethod
+    def from_settings(cls) -> "RiskClassifier":
+        """Build the classifier from environment settings."""
+        return cls(
+            alert_doctors=settings.URGENT_ALERTS_ENABLED,
+            extra_phrases=parse_csv(settings.URGENT_EXTRA_PHRASES)
+        )
+
+    @staticmethod
+    def _negated(preceding: str) -> bool:
+        """Whether the clause text before a match ends in a negation governing it."""
+        reach = 0
+        for word in reversed(WORDS.findall(preceding)):
+            if word in NEGATIONS:
+                return True
+            if word not in NEGATION_FILLER:
+                reach += 1
+                if reach > NEGATION_REACH:
+                    return False
+        return False
+
+    @staticmethod
+    def _about_someone_else(clause: str, match: Match[str]) -> bool:
+        """Whether a person-neutral phrase is said of a third person (or the listener)."""
+        start = clause.rfind(" ", 0, match.start()) + 1
+        word = WORDS.match(clause, start)
+        if word.group(0).endswith("me"):
+            return False  # "suicidarme"
+        if word.group(0).endswith("se"):
+            return True  # "suicidarse"
+        for preceding in reversed(WORDS.findall(clause, 0, start)):
+            if preceding in FIRST_PERSON:
+                return False
+            if preceding in OTHER_PERSON:
+                return True
+        return False
+
+    def _affirmed(self, text: str, pattern: Pattern[str]) -> Optional[str]:
+        """The first match of ``pattern`` not governed by a negation nor said of someone else."""
+        for clause in CLAUSE_BREAKS.split(text):
+            for match in pattern.finditer(clause):
+                if self._negated(clause[:match.start()]):
+                    continue
+                if self._person_neutral.fullmatch(match.group(0)) and self._about_someone_else(clause, match):
+                    continue
+                return match.group(0)
+        return None
+
+    def _affirmative_opening(self, text: str) -> Optional[str]:
+        """The first clause opening that says "yes" with no negation following it in the answer."""
+        start = 0
+        for boundary in [*OPENING_BREAKS.finditer(text), None]:
+            end = boundary.start() if boundary else len(text)
+            opening = self._affirmative.match(text, start, end)
+            if opening and NEGATIONS.isdisjoint(WORDS.findall(text, opening.end())):
+                return opening.group(0).strip()
+            start = boundary.end() if boundary else end
+        return None
+
+    def classify(self, question_id: str, answer_text: str) -> Optional[RiskSignal]:
+        """Check one answer.
+
+        Args:
+            question_id: Questionnaire question ID, or ``followup_<n>``
+            answer_text: The patient's answer as received
+
+        Returns:
+            The risk signal, or None if the answer does not look urgent
+        """
+        self.checked += 1
+        text = fold(answer_text)
+        signal = None
+
+        match = self._affirmed(text, self._crisis)
+        if match:
+            signal = RiskSignal(question_id, "Ideación suicida o de autolesión expresada", match)
+        elif question_id == "self_harm_thoughts":
+            opening = self._affirmative_opening(text)
+            if opening:
+                signal = RiskSignal(question_id, "Pensamientos de autolesión reportados", opening)
+        else:
+            for pattern, reason in self._question_rules.get(question_id, ()):
+                match = self._affirmed(text, pattern)
+                if match:
+                    signal = RiskSignal(question_id, reason, match)
+                    break
+
+        if signal is not None:
+            self.flagged += 1
+        return signal
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get classification counters."""
+        return {"alert_doctors": self.alert_doctors, "checked": self.checked, "flagged": self.flagged}
@@ -0,0 +1,132 @@
+"""Cross-shard calls between bot worker processes behind the shard front."""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.utils.hash_ring import HashRing
+from app.utils.phone_numbers import normalize_phone_number
+
+
+# Peers are local processes; a slow one should not stall a conversation
+PEER_TIMEOUT = httpx.Timeout(connect=2.0, read=30.0, write=5.0, pool=5.0)
+
+
+def shard_name(index: int) -> str:
+    """Ring node name of a worker process."""
+    return f"worker-{index}"
+
+
+def shard_socket_path(directory: str, index: int) -> str:
+    """Unix socket a worker process listens on."""
+    return os.path.join(directory, f"{shard_name(index)}.sock")
+
+
+def build_shard_ring(workers: int, replicas: int) -> HashRing:
+    """Build the ring shared by the front and every worker.
+
+    Each process builds it from the same settings, so they all agree on
+    which worker owns a phone without exchanging any state.
+    """
+    return HashRing([shard_name(index) for index in range(workers)], replicas)
+
+
+def shard_key(phone: str) -> str:
+    """Ring key for a phone, so '+57 300...' and '57300...' land together."""
+    return normalize_phone_number(phone) or phone
+
+
+class ShardPeers:
+    """Routes operations on another worker's conversations to that worker.
+
+    Every worker owns the sessions of the phones hashed to it. Doctor
+    matching, case assignment and specialist decisions touch a second phone
+    (the doctor or the patient), so they run on the worker that owns it,
+    called over its unix socket. With a single worker everything is local.
+    """
+
+    def __init__(self, index: int = 0, workers: int = 1, socket_dir: str = "", replicas: int = 160):
+        self.index = index
+        self.workers = max(1, workers)
+        self.name = shard_name(index)
+        self.ring = build_shard_ring(self.workers, replicas)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        for peer in range(self.workers):
+            if peer != index:
+                self._clients[shard_name(peer)] = httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(uds=shard_socket_path(socket_dir, peer)),
+                    base_url="http://shard",
+                    timeout=PEER_TIMEOUT
+                )
+        self.stats: Dict[str, int] = {"calls": 0, "broadcasts": 0, "errors": 0}
+
+    @classmethod
+    def from_settings(cls) -> "ShardPeers":
+        """Build the peer client from environment settings."""
+        return cls(
+            index=settings.SHARD_INDEX,
+            workers=settings.SHARD_WORKERS,
+            socket_dir=settings.SHARD_SOCKET_DIR,
+            replicas=settings.SHARD_RING_REPLICAS
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def owner(self, phone: str) -> str:
+        """Name of the worker that owns a phone."""
+        return self.ring.node_for(shard_key(phone)) if self.enabled else self.name
+
+    def is_local(self, phone: str) -> bool:
+        """Check whether this worker owns a phone's sessions."""
+        return self.owner(phone) == self.name
+
+    async def call(self, phone: str, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST to an internal endpoint on the worker that owns a phone.
+
+        Raises:
+            httpx.HTTPError: If the peer is unreachable or returns an error
+        """
+        self.stats["calls"] += 1
+        try:
+            response = await self._clients[self.owner(phone)].post(path, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError:
+            self.stats["errors"] += 1
+            raise
+
+    async def broadcast(self, path: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """POST to an internal endpoint on every other worker.
+
+        Returns:
+            Replies from the peers that answered; unreachable peers are skipped
+        """
+        self.stats["broadcasts"] += 1
+
+        async def post(name: str, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+            try:
+                response = await client.post(path, json=payload)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                event_log.emit("SYSTEM", "shard_unreachable", logging.WARNING, shard=name, path=path, error=repr(e))
+                return None
+
+        replies = await asyncio.gather(*(post(name, client) for name, client in self._clients.items()))
+        return [reply for reply in replies if reply is not None]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get this worker's shard identity and peer call counters."""
+        return {"shard": self.name, "workers": self.workers, **self.stats}
+
+    async def close(self) -> None:
+        """Close the peer connections."""
+        await asyncio.gather(*(client.aclose() for client in self._clients.values()))
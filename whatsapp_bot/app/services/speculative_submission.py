@@ -0,0 +1,169 @@
+"""Speculative early submission of questionnaire answers to diagnose-bot."""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.config.settings import settings
+from app.config.questions import MENTAL_HEALTH_QUESTIONS
+from app.models.session import UserSession
+from app.services.api_service import ExternalAPIService
+from app.utils.event_log import event_log
+from app.utils.settings_parsing import parse_csv
+
+
+@dataclass
+class Speculation:
+    """An in-flight or finished early ``/questions`` call for one patient."""
+    task: asyncio.Task
+    answers: Tuple[Tuple[str, str], ...]  # (question_id, value) sent with the request
+
+
+class SpeculativeSubmitter:
+    """Starts the follow-up questions call before the questionnaire is finished.
+
+    Once every question except the ``deferred`` ones is answered, the
+    answers so far are sent to ``/questions`` in the background while the
+    patient answers the rest. When the last answer arrives the result is
+    reused, unless a deferred answer contains one of ``reissue_keywords``
+    (it may change which follow-ups are needed) or the early call failed;
+    then the full questionnaire is sent as before. The final ``/answers``
+    diagnosis always receives every answer.
+
+    Early requests are never cancelled, only abandoned: diagnose-bot keeps
+    one agent session per phone and ``/questions`` replaces it, so a stale
+    request finishing after its replacement would leave ``/answers`` with
+    the wrong agent. A reissue therefore waits for the early request (or an
+    abandoned one for the same phone) to finish first.
+    """
+
+    def __init__(
+        self,
+        api_service: ExternalAPIService,
+        enabled: bool = False,
+        deferred: Tuple[str, ...] = ("desired_outcome",),
+        reissue_keywords: Tuple[str, ...] = (),
+        max_pending: int = 1000
+    ):
+        self.api_service = api_service
+        self.enabled = enabled
+        self.deferred: FrozenSet[str] = frozenset(deferred)
+        self.reissue_keywords = reissue_keywords
+        self.max_pending = max(1, max_pending)
+        self._pending: Dict[str, Speculation] = {}
+        # Abandoned early requests still running on diagnose-bot, by phone
+        self._abandoned: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"started": 0, "reused": 0, "reissued": 0, "discarded": 0}
+
+    @classmethod
+    def from_settings(cls, api_service: ExternalAPIService) -> "SpeculativeSubmitter":
+        """Build the submitter from environment settings."""
+        return cls(
+            api_service,
+            enabled=settings.API_SPECULATIVE_ENABLED,
+            deferred=parse_csv(settings.API_SPECULATIVE_DEFER),
+            reissue_keywords=parse_csv(settings.API_SPECULATIVE_REISSUE_KEYWORDS)
+        )
+
+    def maybe_start(self, session: UserSession) -> bool:
+        """Start the early call if only deferred questions are left unanswered.
+
+        Returns:
+            True if a speculative request was started
+        """
+        if not self.enabled or not self.deferred or session.phone_number in self._pending:
+            return False
+        if session.phone_number in self._abandoned:
+            # Would race the abandoned request for the agent session; take() waits for it
+            return False
+        answered = {answer.question_id for answer in session.answers}
+        remaining = {question.id for question in MENTAL_HEALTH_QUESTIONS} - answered
+        if not remaining or not remaining <= self.deferred:
+            return False
+
+        if len(self._pending) >= self.max_pending:
+            # Patients who never finished; drop the oldest
+            self.discard(next(iter(self._pending)))
+
+        # Build the payload now; later answers must not leak into this request
+        payload = self.api_service.prepare_initial_payload(session)
+        task = asyncio.create_task(
+            self.api_service.send_initial_payload(payload, request_type="INITIAL_SPECULATIVE"),
+            name=f"speculative-questions-{session.phone_number}"
+        )
+        self._pending[session.phone_number] = Speculation(
+            task=task,
+            answers=tuple((answer.question_id, answer.value) for answer in session.answers)
+        )
+        self.stats["started"] += 1
+        event_log.emit(
+            "API_CALL", "speculative_started", user=session.phone_number,
+            answers=len(session.answers), waiting_on=sorted(remaining)
+        )
+        return True
+
+    def _changes_plan(self, session: UserSession, speculation: Speculation) -> Optional[str]:
+        """Explain why the early result cannot be reused, None if it can."""
+        sent = len(speculation.answers)
+        current = tuple((answer.question_id, answer.value) for answer in session.answers[:sent])
+        if current != speculation.answers:
+            return "answers changed since the early request"
+        for answer in session.answers[sent:]:
+            if answer.question_id not in self.deferred:
+                return f"'{answer.question_id}' was not in the early request"
+            value = answer.value.lower()
+            keyword = next((keyword for keyword in self.reissue_keywords if keyword in value), None)
+            if keyword:
+                return f"'{answer.question_id}' mentions '{keyword}'"
+        return None
+
+    async def take(self, session: UserSession) -> Optional[Dict[str, Any]]:
+        """Get the early ``/questions`` result for a finished questionnaire.
+
+        Returns:
+            The API response to reuse, or None if the full questionnaire must be sent
+        """
+        speculation = self._pending.pop(session.phone_number, None)
+        if speculation is None:
+            await self._settle(self._abandoned.pop(session.phone_number, None))
+            return None
+
+        reason = self._changes_plan(session, speculation)
+        if reason is None:
+            try:
+                result = await speculation.task
+            except Exception as e:
+                result = {"error": repr(e)}
+            if "error" not in result:
+                self.stats["reused"] += 1
+                event_log.emit("API_CALL", "speculative_reused", user=session.phone_number)
+                return result
+            reason = f"early request failed: {result['error']}"
+
+        await self._settle(speculation.task)
+        self.stats["reissued"] += 1
+        event_log.emit("API_CALL", "speculative_reissued", user=session.phone_number, reason=reason)
+        return None
+
+    @staticmethod
+    async def _settle(task: Optional[asyncio.Task]) -> None:
+        """Wait for an early request to finish before its replacement is sent."""
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    def discard(self, phone_number: str) -> None:
+        """Forget a patient's early request (e.g. on restart); a later reissue waits for it."""
+        speculation = self._pending.pop(phone_number, None)
+        if speculation is None:
+            return
+        self.stats["discarded"] += 1
+        task = speculation.task
+        if not task.done():
+            self._abandoned[phone_number] = task
+            task.add_done_callback(
+                lambda done: self._abandoned.pop(phone_number) if self._abandoned.get(phone_number) is done else None
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get speculation counters and the number of pending early requests."""
+        return {"enabled": self.enabled, "pending": len(self._pending), **self.stats}
@@ -1,52 +1,221 @@
 """WhatsApp messaging service."""
 
-import httpx
-from typing import Dict, Any
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Any, List, Optional
 
 from app.config.settings import settings
+from app.services.http_transport import HTTPTransport
+from app.services.outbound_dispatcher import OutboundDispatcher, MessagePriority
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+
+
+GRAPH_SEND_SECONDS = metrics.histogram(
+    "graph_send_seconds", "WhatsApp Graph API sends including time queued for the rate limit", ("priority",)
+)
+INTERACTIVE_FALLBACKS = metrics.counter("fallbacks_total", "Degraded paths taken", ("kind",)).labels("interactive_as_text")
+MERGED_SENDS = metrics.counter("whatsapp_sends_merged_total", "Text messages merged into an adjacent send to the same recipient")
+
+# Graph API limit on a text message body
+MAX_TEXT_CHARS = 4096
+
+
+@dataclass
+class _PendingText:
+    to: str
+    priority: MessagePriority
+    bodies: List[str] = field(default_factory=list)
+    chars: int = 0
+
+
+@dataclass
+class SendBatch:
+    """Text sends buffered during one handler invocation.
+
+    Only the task that opened the batch buffers into it: background tasks
+    (e.g. the doctor fan-out) inherit the context but send directly, so
+    their own error handling still sees each send's outcome.
+    """
+    owner: Optional[asyncio.Task]
+    max_chars: int = MAX_TEXT_CHARS
+    separator: str = "\n\n"
+    pending: List[_PendingText] = field(default_factory=list)
+
+    def add(self, to: str, body: str, priority: MessagePriority) -> bool:
+        """Buffer a text, merging it into the previous one if that went to the same recipient.
+
+        Returns:
+            True if the text was merged into the previous send
+        """
+        last = self.pending[-1] if self.pending else None
+        if (
+            last is not None and last.to == to and last.priority == priority and
+            last.chars + len(self.separator) + len(body) <= self.max_chars
+        ):
+            last.bodies.append(body)
+            last.chars += len(self.separator) + len(body)
+            return True
+        self.pending.append(_PendingText(to, priority, [body], len(body)))
+        return False
+
+
+_current_batch: ContextVar[Optional[SendBatch]] = ContextVar("whatsapp_send_batch", default=None)
 
 
 class WhatsAppService:
-    """Service for sending messages through WhatsApp Business API."""
+    """Service for sending messages through WhatsApp Business API.
+    
+    Inside ``batching()`` consecutive text messages to the same recipient
+    are merged (up to the Graph API's text limit) and sent when the batch
+    is flushed: before an interactive message, when ``flush()`` is called
+    ahead of a slow step, and when the block exits. Order is preserved.
+    A buffered send's failure only reaches the log, so a caller that records
+    the message as delivered (e.g. a patient told of the decision) sends it
+    with ``batch=False`` to see the outcome.
+    """
     
-    def __init__(self):
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+    def __init__(
+        self,
+        transport: Optional[HTTPTransport] = None,
+        dispatcher: Optional[OutboundDispatcher] = None,
+        batch_sends: Optional[bool] = None
+    ):
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport.from_settings()
+        self.dispatcher = dispatcher or OutboundDispatcher.from_settings()
         self.graph_url = settings.GRAPH_URL
         self.headers = settings.HEADERS
+        self.batch_sends = settings.WHATSAPP_BATCH_SENDS if batch_sends is None else batch_sends
+    
+    @asynccontextmanager
+    async def batching(self) -> AsyncIterator[None]:
+        """Buffer the current task's text sends and flush them when the block exits."""
+        if not self.batch_sends or self._batch() is not None:
+            yield
+            return
+        token = _current_batch.set(SendBatch(owner=asyncio.current_task()))
+        try:
+            yield
+        finally:
+            try:
+                await self.flush()
+            finally:
+                _current_batch.reset(token)
     
-    async def send_text_message(self, to: str, body: str) -> Dict[str, Any]:
+    @staticmethod
+    def _batch() -> Optional[SendBatch]:
+        batch = _current_batch.get()
+        if batch is not None and batch.owner is asyncio.current_task():
+            return batch
+        return None
+    
+    async def flush(self) -> List[str]:
+        """Send the texts buffered by the current task, in order.
+        
+        A failed send is logged and does not stop the ones after it, as the
+        code that queued the texts has moved on already.
+        
+        Returns:
+            Recipients whose buffered texts could not be sent
+        """
+        batch = self._batch()
+        if batch is None or not batch.pending:
+            return []
+        pending, batch.pending = batch.pending, []
+        failed = []
+        for text in pending:
+            try:
+                await self._send_text(text.to, batch.separator.join(text.bodies), text.priority, merged=len(text.bodies))
+            except Exception as e:
+                if text.to not in failed:
+                    failed.append(text.to)
+                event_log.emit(
+                    "WHATSAPP_SEND", "batch_failed", logging.ERROR,
+                    to=text.to, messages=len(text.bodies), error=repr(e)
+                )
+        return failed
+    
+    async def _post(self, to: str, payload: Dict[str, Any], priority: MessagePriority):
+        """Send a Graph API payload through the rate-limited dispatcher."""
+        with GRAPH_SEND_SECONDS.time(priority.name):
+            return await self.dispatcher.dispatch(
+                to,
+                lambda: self.transport.post(
+                    self.graph_url,
+                    profile="whatsapp",
+                    headers=self.headers,
+                    json=payload
+                ),
+                priority=priority,
+                phone_number_id=settings.PHONE_NUMBER_ID
+            )
+    
+    async def send_text_message(
+        self,
+        to: str,
+        body: str,
+        priority: MessagePriority = MessagePriority.NORMAL,
+        batch: bool = True
+    ) -> Dict[str, Any]:
         """Send a text message via WhatsApp.
         
         Args:
             to: The recipient's phone number
             body: The message text
+            priority: Outbound send lane
+            batch: False to send right away (after the texts buffered before
+                it) even inside ``batching()``, so a failure raises here
             
         Returns:
-            The API response
+            The API response, or ``{"batched": True}`` when the text was
+            buffered by ``batching()``
             
         Raises:
             httpx.HTTPStatusError: If the API request fails
         """
+        current = self._batch()
+        if current is not None:
+            if not batch:
+                await self.flush()
+                return await self._send_text(to, body, priority)
+            if current.add(to, body, priority):
+                MERGED_SENDS.inc()
+            return {"batched": True}
+        return await self._send_text(to, body, priority)
+    
+    async def _send_text(self, to: str, body: str, priority: MessagePriority, merged: int = 1) -> Dict[str, Any]:
         payload = {
             "messaging_product": "whatsapp",
             "to": to,
             "text": {"body": body}
         }
         
-        print(f"[WHATSAPP_SEND] To: {to}, Message: {body[:50]}...")
-        
-        response = await self.http_client.post(
-            self.graph_url,
-            headers=self.headers,
-            json=payload
+        event_log.emit(
+            "WHATSAPP_SEND", "text", to=to, priority=priority.name, chars=len(body), merged=merged, payload=payload
         )
         
-        print(f"[WHATSAPP_RESPONSE] Status: {response.status_code}")
+        response = await self._post(to, payload, priority)
+        
+        event_log.emit(
+            "WHATSAPP_SEND", "response", logging.INFO if response.status_code < 400 else logging.ERROR,
+            to=to, status_code=response.status_code
+        )
         response.raise_for_status()
         
         return response.json()
     
-    async def send_interactive_message(self, to: str, body_text: str, button_text: str, buttons: list) -> Dict[str, Any]:
+    async def send_interactive_message(
+        self,
+        to: str,
+        body_text: str,
+        button_text: str,
+        buttons: list,
+        priority: MessagePriority = MessagePriority.NORMAL
+    ) -> Dict[str, Any]:
         """Send an interactive message with buttons via WhatsApp.
         
         Args:
@@ -54,6 +223,7 @@ class WhatsAppService:
             body_text: The main message text
             button_text: The button section text
             buttons: List of button dictionaries with 'id' and 'title'
+            priority: Outbound send lane
             
         Returns:
             The API response
@@ -61,6 +231,9 @@ class WhatsAppService:
         Raises:
             httpx.HTTPStatusError: If the API request fails
         """
+        # Buffered texts were written before this message
+        await self.flush()
+        
         payload = {
             "messaging_product": "whatsapp",
             "to": to,
@@ -79,40 +252,39 @@ class WhatsAppService:
             }
         }
         
-        print(f"[WHATSAPP_SEND_INTERACTIVE] To: {to}, Buttons: {len(buttons)}")
-        print(f"[INTERACTIVE_PAYLOAD] {payload}")
+        event_log.emit("WHATSAPP_SEND", "interactive", to=to, priority=priority.name, buttons=len(buttons), payload=payload)
         
         try:
-            response = await self.http_client.post(
-                self.graph_url,
-                headers=self.headers,
-                json=payload
-            )
-            
-            print(f"[WHATSAPP_RESPONSE] Status: {response.status_code}")
-            print(f"[WHATSAPP_RESPONSE_BODY] {response.text}")
+            response = await self._post(to, payload, priority)
             
+            event_log.emit("WHATSAPP_SEND", "response", to=to, status_code=response.status_code)
             if response.status_code != 200:
-                print(f"[ERROR] Interactive message failed: {response.text}")
+                event_log.emit(
+                    "WHATSAPP_SEND", "interactive_failed", logging.ERROR,
+                    to=to, status_code=response.status_code, payload=response.text
+                )
+                INTERACTIVE_FALLBACKS.inc()
                 # Fallback: send as regular text message with button options
                 fallback_message = f"{body_text}\n\n{button_text}\n\nOpciones disponibles:\n"
                 for i, button in enumerate(buttons, 1):
                     fallback_message += f"{i}. {button.get('title', button.get('id', 'Option'))}\n"
                 fallback_message += "\nPor favor responde con el número o el texto de tu opción."
-                return await self.send_text_message(to, fallback_message)
+                return await self.send_text_message(to, fallback_message, priority)
             
             response.raise_for_status()
             return response.json()
             
         except Exception as e:
-            print(f"[ERROR] Interactive message exception: {str(e)}")
+            event_log.emit("WHATSAPP_SEND", "interactive_failed", logging.ERROR, to=to, error=str(e))
+            INTERACTIVE_FALLBACKS.inc()
             # Fallback: send as regular text message with button options
             fallback_message = f"{body_text}\n\n{button_text}\n\nOpciones disponibles:\n"
             for i, button in enumerate(buttons, 1):
                 fallback_message += f"{i}. {button.get('title', button.get('id', 'Option'))}\n"
             fallback_message += "\nPor favor responde con el número o el texto de tu opción."
-            return await self.send_text_message(to, fallback_message)
+            return await self.send_text_message(to, fallback_message, priority)
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.http_client.aclose()
+        """Close the HTTP transport if this service created it."""
+        if self._owns_transport:
+            await self.transport.close()
@@ -0,0 +1,122 @@
+"""Circuit breaker for calls to an unreliable downstream service."""
+
+import logging
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.event_log import event_log
+
+
+class CircuitState(Enum):
+    """Circuit breaker states."""
+    CLOSED = "closed"        # Calls go through, failures are counted
+    OPEN = "open"            # Calls fail fast until the recovery timeout passes
+    HALF_OPEN = "half_open"  # A few probe calls decide whether to close again
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail immediately with ``CircuitOpenError``. Once ``recovery_timeout``
+    seconds have passed it lets ``half_open_max_calls`` probe calls through:
+    a success closes the circuit, a failure opens it again. A probe whose
+    caller gives up without an outcome (cancelled, or an error that says
+    nothing about the service) must hand its slot back with
+    ``release_probe``; slots still taken after ``half_open_timeout`` are
+    freed anyway, so a lost probe cannot hold the circuit half-open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        half_open_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.half_open_timeout = recovery_timeout if half_open_timeout is None else half_open_timeout
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started_at = 0.0
+        self.stats: Dict[str, int] = {
+            "opened": 0, "rejected": 0, "successes": 0, "failures": 0, "probes_expired": 0
+        }
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+        elif (
+            self._state == CircuitState.HALF_OPEN and self._probes >= self.half_open_max_calls
+            and self._clock() - self._probe_started_at >= self.half_open_timeout
+        ):
+            # The probes never reported back; let new ones through
+            self._probes = 0
+            self.stats["probes_expired"] += 1
+        return self._state
+
+    def before_call(self) -> bool:
+        """Check that a call may go through.
+
+        Returns:
+            True if the call took a half-open probe slot (to be released if it ends without an outcome)
+
+        Raises:
+            CircuitOpenError: If the circuit is open or the half-open probes are in use
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return False
+        if state == CircuitState.HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            self._probe_started_at = self._clock()
+            return True
+        self.stats["rejected"] += 1
+        retry_in = max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpenError(f"{self.name} circuit is {state.value}, retry in {retry_in:.1f}s")
+
+    def release_probe(self) -> None:
+        """Give back a probe slot whose call ended without a success or failure."""
+        if self._state == CircuitState.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self) -> None:
+        """Record a successful call; closes a half-open circuit."""
+        self.stats["successes"] += 1
+        self._failures = 0
+        if self._state != CircuitState.CLOSED:
+            event_log.emit("API_CALL", "circuit_closed", circuit=self.name)
+        self._state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        """Record a failed call; opens the circuit at the threshold or on a failed probe."""
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self._state == CircuitState.HALF_OPEN or (
+            self._state == CircuitState.CLOSED and self._failures >= self.failure_threshold
+        ):
+            self._state = CircuitState.OPEN
+            self._opened_at = self._clock()
+            self.stats["opened"] += 1
+            event_log.emit(
+                "API_CALL", "circuit_opened", logging.WARNING, circuit=self.name, consecutive_failures=self._failures
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the current state and transition counters."""
+        return {"state": self.state.value, "consecutive_failures": self._failures, **self.stats}
@@ -0,0 +1,112 @@
+"""Per-sender debounce window that merges message fragments into one message."""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.config.settings import settings
+
+
+# Decides whether a sender's message may be held and merged with the next ones
+CoalescePredicate = Callable[[str, str], bool]
+
+
+class CoalescingWindow:
+    """Holds a sender's messages until they stop typing.
+
+    Patients often split one answer over several WhatsApp messages. While
+    ``applies`` says a sender's messages are free-text answers, the worker
+    pool does not schedule the sender right away: a timer fires once no new
+    message arrived for ``quiet_period`` seconds, or ``max_wait`` seconds
+    after the oldest held message, whichever comes first. The fragments are
+    then handled as one message joined with ``separator``. Everything else
+    (commands, button replies, doctors) is scheduled immediately.
+
+    The timers only delay scheduling; held messages stay in the sender's
+    mailbox and count against the worker queue limit like any other.
+    """
+
+    def __init__(
+        self,
+        quiet_period: float = 0.0,
+        max_wait: float = 5.0,
+        applies: Optional[CoalescePredicate] = None,
+        separator: str = "\n"
+    ):
+        self.quiet_period = quiet_period
+        self.max_wait = max(quiet_period, max_wait)
+        self.applies: CoalescePredicate = applies or (lambda sender_phone, text: True)
+        self.separator = separator
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self.held = 0
+        self.merged = 0
+
+    @classmethod
+    def from_settings(cls, applies: Optional[CoalescePredicate] = None) -> "CoalescingWindow":
+        """Build the window from environment settings (disabled unless a quiet period is set)."""
+        return cls(
+            quiet_period=settings.COALESCE_QUIET_PERIOD,
+            max_wait=settings.COALESCE_MAX_WAIT,
+            applies=applies
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.quiet_period > 0
+
+    def holds(self, sender_phone: str, text: str) -> bool:
+        """Whether this message should wait in the window."""
+        return self.enabled and self.applies(sender_phone, text)
+
+    def is_waiting(self, sender_phone: str) -> bool:
+        return sender_phone in self._timers
+
+    def arm(self, sender_phone: str, oldest: float, newest: float, fire: Callable[[str], None]) -> None:
+        """(Re)start the sender's timer from its oldest and newest held message.
+
+        Args:
+            sender_phone: Phone number of the sender
+            oldest: ``time.monotonic()`` when the oldest held message arrived
+            newest: ``time.monotonic()`` when the newest held message arrived
+            fire: Called with the sender phone when the window closes
+        """
+        timer = self._timers.pop(sender_phone, None)
+        if timer is not None:
+            timer.cancel()
+        deadline = min(newest + self.quiet_period, oldest + self.max_wait)
+        delay = max(0.0, deadline - time.monotonic())
+        self._timers[sender_phone] = asyncio.get_running_loop().call_later(delay, self._close, sender_phone, fire)
+
+    def _close(self, sender_phone: str, fire: Callable[[str], None]) -> None:
+        self._timers.pop(sender_phone, None)
+        fire(sender_phone)
+
+    def close(self, sender_phone: str, fire: Callable[[str], None]) -> None:
+        """Close the sender's window now."""
+        timer = self._timers.pop(sender_phone, None)
+        if timer is not None:
+            timer.cancel()
+            fire(sender_phone)
+
+    def close_all(self, fire: Callable[[str], None]) -> None:
+        """Close every open window now (e.g. on shutdown)."""
+        timers, self._timers = self._timers, {}
+        for sender_phone, timer in timers.items():
+            timer.cancel()
+            fire(sender_phone)
+
+    def merge(self, texts: List[str]) -> str:
+        """Join the fragments taken from a closed window into one message."""
+        if len(texts) > 1:
+            self.merged += len(texts) - 1
+        return self.separator.join(texts)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get window settings and counters."""
+        return {
+            "quiet_period": self.quiet_period,
+            "max_wait": self.max_wait,
+            "waiting_senders": len(self._timers),
+            "held": self.held,
+            "merged": self.merged
+        }
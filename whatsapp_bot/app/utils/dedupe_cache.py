@@ -0,0 +1,160 @@
+"""Idempotency cache for WhatsApp webhook message ids."""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.utils.event_log import event_log
+
+
+class MessageDedupeCache:
+    """Bounded TTL cache of already-accepted WhatsApp message ids.
+
+    Meta redelivers webhooks it considers unanswered, so the same message id
+    can arrive several times. Entries are kept in insertion order and every
+    entry has the same TTL, which makes the oldest entry also the first to
+    expire: lookups, inserts and expiry are all O(1) amortized.
+
+    With a persistence file, every accepted id is also appended to a log next
+    to it (``<persist_path>.log``) so a crash does not forget it; ``save``
+    folds the log into the file with an atomic replace and truncates it.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 100000, persist_path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.persist_path = persist_path or None
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._log = None
+        self._log_lines = 0
+        self.duplicates_dropped = 0
+
+    @property
+    def log_path(self) -> Optional[str]:
+        return f"{self.persist_path}.log" if self.persist_path else None
+
+    def _expire(self, now: float) -> None:
+        """Drop expired entries from the front of the cache."""
+        while self._entries:
+            message_id, expires_at = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[message_id]
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """Check whether a message id was already accepted.
+
+        Args:
+            message_id: The WhatsApp message id (``wamid...``)
+
+        Returns:
+            True if the message was seen within the TTL
+        """
+        now = time.time()
+        self._expire(now)
+        expires_at = self._entries.get(message_id)
+        if expires_at is not None and expires_at > now:
+            self.duplicates_dropped += 1
+            return True
+        return False
+
+    def add(self, message_id: str) -> None:
+        """Remember a message id as accepted.
+
+        Args:
+            message_id: The WhatsApp message id
+        """
+        if message_id in self._entries:
+            return
+
+        expires_at = time.time() + self.ttl_seconds
+        self._entries[message_id] = expires_at
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self.persist_path:
+            self._append(message_id, expires_at)
+
+    def _append(self, message_id: str, expires_at: float) -> None:
+        """Append an accepted id to the log, compacting it once it outgrows the cache."""
+        if self._log_lines >= self.max_entries:
+            self.save()
+        try:
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log.write(json.dumps([message_id, expires_at]) + "\n")
+            self._log.flush()
+            self._log_lines += 1
+        except OSError as e:
+            event_log.emit("INBOUND", "dedupe_save_failed", logging.ERROR, path=self.log_path, error=repr(e))
+
+    def load(self) -> int:
+        """Restore unexpired entries from the persistence file, if configured.
+
+        Ids appended to the log after the last save are restored too; a
+        line cut short by a crash is skipped.
+
+        Returns:
+            Number of entries restored
+        """
+        if not self.persist_path:
+            return 0
+
+        stored: Dict[str, float] = {}
+        try:
+            if os.path.exists(self.persist_path):
+                with open(self.persist_path, "r", encoding="utf-8") as f:
+                    stored.update(json.load(f))
+            if os.path.exists(self.log_path):
+                with open(self.log_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            message_id, expires_at = json.loads(line)
+                        except (ValueError, TypeError):
+                            continue
+                        stored[message_id] = expires_at
+                        self._log_lines += 1
+        except (OSError, ValueError) as e:
+            event_log.emit("INBOUND", "dedupe_load_failed", logging.ERROR, path=self.persist_path, error=repr(e))
+            return 0
+        if not stored:
+            return 0
+
+        now = time.time()
+        for message_id, expires_at in sorted(stored.items(), key=lambda item: item[1]):
+            if expires_at > now:
+                self._entries[message_id] = expires_at
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        event_log.emit("INBOUND", "dedupe_restored", message_ids=len(self._entries), path=self.persist_path)
+        return len(self._entries)
+
+    def save(self) -> None:
+        """Write unexpired entries to the persistence file and truncate the log, if configured."""
+        if not self.persist_path:
+            return
+
+        self._expire(time.time())
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.persist_path)
+            # Only once the file holds every logged id is the log dropped
+            if self._log is not None:
+                self._log.close()
+            self._log = open(self.log_path, "w", encoding="utf-8")
+            self._log_lines = 0
+        except OSError as e:
+            event_log.emit("INBOUND", "dedupe_save_failed", logging.ERROR, path=self.persist_path, error=repr(e))
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache size and duplicate counters."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "duplicates_dropped": self.duplicates_dropped
+        }
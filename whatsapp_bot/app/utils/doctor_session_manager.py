@@ -2,17 +2,144 @@
 Doctor session manager for handling doctor registration and workflow.
 """
 
-from typing import Dict, List, Optional
+import heapq
+from typing import AbstractSet, Collection, Dict, Iterable, List, Optional, Tuple
+from app.config.settings import settings
 from app.models.doctor_session import DoctorSession, DoctorSessionState
+from app.models.timestamps import epoch_now
+from app.utils.phone_numbers import normalize_phone_number
+from app.utils.session_store import DOCTOR, InMemorySessionStore, SessionStore, SessionSync
+
+
+# Lower sorts first: (busy reviewing a case, recent load rank, last assigned, phone)
+LoadKey = Tuple[bool, float, int, str]
 
 
 class DoctorSessionManager:
-    """Manages doctor sessions and registration."""
+    """Manages doctor sessions and registration.
+    
+    Also picks which doctors a case is assigned to. Active doctors sit in a
+    min-heap ordered by ``LoadKey``: idle doctors before those reviewing a
+    case, then by recently assigned cases (decayed with
+    ``DOCTOR_LOAD_HALF_LIFE``), then whoever was assigned longest ago. A
+    doctor's entry is replaced (and the old one skipped lazily) whenever
+    their state or load changes.
+
+    Taking the k least loaded of m eligible doctors pops the heap until k
+    eligible ones are found. When most active doctors are eligible that is
+    O(k log n), but every ineligible doctor ahead of them is popped too, up
+    to O(n log n) when the eligible ones are the most loaded. A small
+    eligible set (m * m <= k * n) is therefore ranked directly with
+    ``heapq.nsmallest`` in O(m log k) instead.
+    """
     
-    def __init__(self):
-        # In-memory storage for doctor sessions
-        # In production, this should be moved to Redis or a database
+    def __init__(self, store: Optional[SessionStore] = None, load_half_life: Optional[float] = None):
+        # Local working copy of doctor sessions, written back to the store on flush
         self.doctor_sessions: Dict[str, DoctorSession] = {}
+        # Normalized phone -> session, for active doctors only
+        self.active_index: Dict[str, DoctorSession] = {}
+        self.load_half_life = max(1.0, load_half_life or settings.DOCTOR_LOAD_HALF_LIFE)
+        # Heap of (LoadKey, normalized phone); entries not matching _load_keys are stale
+        self._load_heap: List[Tuple[LoadKey, str]] = []
+        self._load_keys: Dict[str, LoadKey] = {}
+        self.sync: SessionSync[DoctorSession] = SessionSync(
+            store or InMemorySessionStore(), DOCTOR, self.doctor_sessions, on_load=self._reindex
+        )
+    
+    async def hydrate(self, phone_number: str) -> None:
+        """Refresh a doctor's session from the store before handling their message."""
+        await self.sync.hydrate(phone_number)
+    
+    async def hydrate_many(self, phone_numbers: Iterable[str]) -> None:
+        """Pick up changes other workers made to these doctors (e.g. the directory matched for a case).
+        
+        Doctor sessions are keyed by WhatsApp E.164 digits, so normalized
+        directory numbers are their keys.
+        """
+        await self.sync.hydrate_many(phone_numbers)
+    
+    async def refresh(self) -> None:
+        """Pick up every doctor registered or changed by other workers (startup only: it reads them all)."""
+        await self.sync.refresh_all()
+    
+    async def flush(self) -> None:
+        """Write doctor sessions changed since the last flush back to the store."""
+        await self.sync.flush()
+    
+    def _changed(self, session: DoctorSession) -> None:
+        """Reindex a doctor after a state change and schedule it for write-back."""
+        self.sync.mark_dirty(session.phone_number)
+        self._reindex(session)
+    
+    def _reindex(self, session: DoctorSession) -> None:
+        """Add or remove a doctor from the active index after a state change."""
+        normalized = normalize_phone_number(session.phone_number)
+        indexed = self.active_index.get(normalized)
+        if session.is_active():
+            self.active_index[normalized] = session
+            self._push_load(normalized, session)
+        elif indexed is not None and indexed.phone_number == session.phone_number:
+            # Also drops a stale copy replaced by a reload from the store
+            del self.active_index[normalized]
+            self._load_keys.pop(normalized, None)
+    
+    def load_key(self, session: DoctorSession) -> LoadKey:
+        """Assignment order of a doctor; lower keys get cases first."""
+        return (
+            session.current_reviewing_patient is not None,
+            session.load_rank(self.load_half_life),
+            session.last_assigned_ts,
+            session.phone_number
+        )
+    
+    def _push_load(self, normalized: str, session: DoctorSession) -> None:
+        key = self.load_key(session)
+        if self._load_keys.get(normalized) == key:
+            return
+        self._load_keys[normalized] = key
+        heapq.heappush(self._load_heap, (key, normalized))
+        if len(self._load_heap) > 2 * len(self._load_keys) + 64:
+            # Mostly stale entries; rebuild from the current keys
+            self._load_heap = [(key, phone) for phone, key in self._load_keys.items()]
+            heapq.heapify(self._load_heap)
+    
+    def least_loaded_doctors(
+        self,
+        normalized_phones: AbstractSet[str],
+        limit: int,
+        exclude: Collection[str] = ()
+    ) -> List[Tuple[LoadKey, DoctorSession]]:
+        """Get the ``limit`` least loaded active doctors in the given set.
+        
+        Args:
+            normalized_phones: Normalized phone numbers eligible for the case (e.g. the backend directory)
+            limit: Maximum number of doctors to return
+            exclude: Doctor phone numbers already assigned the case
+            
+        Returns:
+            (load key, session) pairs, least loaded first
+        """
+        excluded = {normalize_phone_number(phone) for phone in exclude}
+        if len(normalized_phones) ** 2 <= limit * len(self._load_keys):
+            eligible = (
+                (self._load_keys[normalized], normalized)
+                for normalized in normalized_phones
+                if normalized in self._load_keys and normalized not in excluded
+            )
+            return [(key, self.active_index[normalized]) for key, normalized in heapq.nsmallest(limit, eligible)]
+
+        picked: List[Tuple[LoadKey, DoctorSession]] = []
+        passed_over: List[Tuple[LoadKey, str]] = []
+        while self._load_heap and len(picked) < limit:
+            key, normalized = heapq.heappop(self._load_heap)
+            if self._load_keys.get(normalized) != key:
+                continue  # Stale entry
+            passed_over.append((key, normalized))
+            if normalized in normalized_phones and normalized not in excluded:
+                picked.append((key, self.active_index[normalized]))
+        for entry in passed_over:
+            heapq.heappush(self._load_heap, entry)
+        return picked
     
     def is_registered_doctor(self, phone_number: str) -> bool:
         """Check if a phone number belongs to a registered doctor."""
@@ -31,6 +158,7 @@ class DoctorSessionManager:
             session = DoctorSession(phone_number=phone_number)
             self.doctor_sessions[phone_number] = session
         
+        self._changed(session)
         return session
     
     def get_doctor_session(self, phone_number: str) -> Optional[DoctorSession]:
@@ -43,21 +171,31 @@ class DoctorSessionManager:
         if session and session.state == DoctorSessionState.REGISTRATION_PENDING:
             session.state = DoctorSessionState.REGISTERED
             session.mark_activity()
+            self._changed(session)
             return True
         return False
     
     def get_active_doctors(self) -> List[DoctorSession]:
         """Get all active doctors."""
-        return [
-            session for session in self.doctor_sessions.values()
-            if session.is_active()
-        ]
+        return list(self.active_index.values())
+    
+    def match_active_doctors(self, normalized_phones: AbstractSet[str]) -> List[DoctorSession]:
+        """Get active doctors whose normalized phone is in the given set.
+        
+        Args:
+            normalized_phones: Normalized phone numbers (e.g. the backend directory)
+            
+        Returns:
+            Active doctor sessions present in both systems
+        """
+        return [self.active_index[phone] for phone in self.active_index.keys() & normalized_phones]
     
     def start_case_review(self, doctor_phone: str, patient_phone: str) -> bool:
         """Mark doctor as reviewing a specific case."""
         session = self.doctor_sessions.get(doctor_phone)
         if session and session.is_active():
-            session.start_reviewing_case(patient_phone)
+            session.start_reviewing_case(patient_phone, self.load_half_life)
+            self._changed(session)
             return True
         return False
     
@@ -66,6 +204,19 @@ class DoctorSessionManager:
         session = self.doctor_sessions.get(doctor_phone)
         if session:
             session.complete_case_review(patient_phone)
+            self._changed(session)
+            return True
+        return False
+    
+    def release_case_review(self, doctor_phone: str, patient_phone: str) -> bool:
+        """Free a doctor still reviewing a case they never decided on."""
+        session = self.doctor_sessions.get(doctor_phone)
+        if (
+            session and session.state == DoctorSessionState.REVIEWING_CASE
+            and session.current_reviewing_patient == patient_phone
+        ):
+            session.release_case()
+            self._changed(session)
             return True
         return False
     
@@ -75,6 +226,17 @@ class DoctorSessionManager:
         if session:
             session.state = DoctorSessionState.INACTIVE
             session.mark_activity()
+            self._changed(session)
+            return True
+        return False
+    
+    def activate_doctor(self, phone_number: str) -> bool:
+        """Reactivate a paused doctor."""
+        session = self.doctor_sessions.get(phone_number)
+        if session:
+            session.state = DoctorSessionState.REGISTERED
+            session.mark_activity()
+            self._changed(session)
             return True
         return False
     
@@ -89,6 +251,7 @@ class DoctorSessionManager:
                 "last_activity": session.last_activity.isoformat(),
                 "cases_reviewed_count": len(session.cases_reviewed),
                 "current_reviewing": session.current_reviewing_patient,
+                "recent_load": round(session.recent_load(epoch_now(), self.load_half_life), 2),
                 "is_active": session.is_active()
             }
         return None
@@ -0,0 +1,273 @@
+"""Structured event logging written by a background thread."""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, Optional, TextIO
+
+from app.config.settings import settings
+from app.utils.tracing import tracer
+
+
+# Categories with their own level and sample rate; others use the defaults
+CATEGORIES = ("INBOUND", "API_CALL", "DATABASE_CALL", "WHATSAPP_SEND", "CONVERSATION", "DOCTOR", "SESSION", "SYSTEM")
+PAYLOAD_MODES = ("redact", "full", "truncate", "hash", "omit")
+LEVEL_OFF = logging.CRITICAL + 10
+
+_NO_PAYLOAD = object()
+
+
+def parse_level(name: str) -> int:
+    """Turn a level name (DEBUG, INFO, ..., OFF) into a logging level."""
+    name = name.strip().upper()
+    if name == "OFF":
+        return LEVEL_OFF
+    level = logging.getLevelName(name)
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name}")
+    return level
+
+
+def parse_category_map(spec: str) -> Dict[str, str]:
+    """Parse ``"INBOUND=DEBUG,API_CALL=0.5"`` into ``{"INBOUND": "DEBUG", ...}``."""
+    result = {}
+    for item in spec.split(","):
+        if "=" in item:
+            category, value = item.split("=", 1)
+            result[category.strip().upper()] = value.strip()
+    return result
+
+
+def redact(value: Any) -> Any:
+    """Replace every string in a JSON-like value with its length, keeping keys, numbers and booleans."""
+    if isinstance(value, str):
+        return f"<{len(value)} chars>"
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f"<{type(value).__name__}>"
+
+
+def render_payload(payload: Any, mode: str, max_chars: int) -> Any:
+    """Shrink a payload for the log according to ``mode``.
+
+    ``redact`` (the default) keeps the payload's shape but none of its text,
+    since payloads carry patient answers and messages. ``truncate`` keeps payloads that serialize to at most ``max_chars`` as
+    they are and cuts longer ones to a string; ``hash`` replaces the payload
+    with a digest and its size, so identical payloads can still be matched
+    across log lines without writing patient answers out.
+    """
+    if mode == "full":
+        return payload
+    if mode == "omit":
+        return None
+    if mode == "redact":
+        return redact(payload)
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    if mode == "hash":
+        data = text.encode("utf-8")
+        return {"sha256": hashlib.sha256(data).hexdigest()[:16], "bytes": len(data)}
+    if len(text) <= max_chars:
+        return payload
+    return f"{text[:max_chars]}...(+{len(text) - max_chars} chars)"
+
+
+class EventFormatter(logging.Formatter):
+    """Formats an event as one JSON line, or one ``[CATEGORY] event k=v`` line."""
+
+    def __init__(self, fmt: str = "json", payload_mode: str = "redact", payload_max_chars: int = 1000):
+        super().__init__()
+        self.fmt = fmt
+        self.payload_mode = payload_mode
+        self.payload_max_chars = payload_max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = dict(getattr(record, "fields", {}))
+        payload = getattr(record, "payload", _NO_PAYLOAD)
+        if payload is not _NO_PAYLOAD and self.payload_mode != "omit":
+            fields["payload"] = render_payload(payload, self.payload_mode, self.payload_max_chars)
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+
+        if self.fmt == "text":
+            details = " ".join(
+                f"{key}={json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else value}"
+                for key, value in fields.items()
+            )
+            return f"[{record.category}] {record.getMessage()} {details}".rstrip()
+
+        return json.dumps({
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "category": record.category,
+            "event": record.getMessage(),
+            **fields
+        }, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller and leaves formatting to the listener."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default formats here, on the event loop; the listener thread does it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLog:
+    """Category-based structured event log.
+
+    ``emit`` only checks the category's level and sample rate and puts the
+    record on a bounded queue; a ``QueueListener`` thread serializes it and
+    writes the line, so the event loop never waits on stdout. When the queue
+    is full records are dropped and counted rather than blocking. Warnings
+    and errors are never sampled out.
+
+    Payloads are passed as objects and rendered in the listener thread, so
+    callers must not mutate them after emitting.
+    """
+
+    def __init__(
+        self,
+        level: str = "INFO",
+        category_levels: Optional[Dict[str, str]] = None,
+        sample_rates: Optional[Dict[str, float]] = None,
+        payload_mode: str = "redact",
+        payload_max_chars: int = 1000,
+        fmt: str = "json",
+        queue_size: int = 10000,
+        stream: Optional[TextIO] = None
+    ):
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._handler = DroppingQueueHandler(self._queue)
+        self._sink = logging.StreamHandler(stream or sys.stdout)
+        self._root = logging.getLogger("whatsapp_bot.events")
+        self._root.propagate = False
+        self._root.handlers = [self._handler]
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._start_lock = threading.Lock()
+        self._loggers: Dict[str, logging.Logger] = {}
+        self.sample_rates: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {"emitted": 0, "sampled_out": 0}
+        self.configure(level, category_levels, sample_rates, payload_mode, payload_max_chars, fmt)
+
+    @classmethod
+    def from_settings(cls) -> "EventLog":
+        """Build the event log from environment settings."""
+        return cls(
+            level=settings.LOG_LEVEL,
+            category_levels=parse_category_map(settings.LOG_CATEGORY_LEVELS),
+            sample_rates={
+                category: float(rate) for category, rate in parse_category_map(settings.LOG_SAMPLE_RATES).items()
+            },
+            payload_mode=settings.LOG_PAYLOAD_MODE,
+            payload_max_chars=settings.LOG_PAYLOAD_MAX_CHARS,
+            fmt=settings.LOG_FORMAT,
+            queue_size=settings.LOG_QUEUE_SIZE
+        )
+
+    def configure(
+        self,
+        level: str = "INFO",
+        category_levels: Optional[Dict[str, str]] = None,
+        sample_rates: Optional[Dict[str, float]] = None,
+        payload_mode: str = "redact",
+        payload_max_chars: int = 1000,
+        fmt: str = "json"
+    ) -> None:
+        """Change levels, sampling and output format in place."""
+        if payload_mode not in PAYLOAD_MODES:
+            raise ValueError(f"LOG_PAYLOAD_MODE must be one of {', '.join(PAYLOAD_MODES)}")
+        self._root.setLevel(parse_level(level))
+        category_levels = category_levels or {}
+        for category in set(CATEGORIES) | set(category_levels) | set(self._loggers):
+            logger = self._logger(category)
+            logger.setLevel(parse_level(category_levels[category]) if category in category_levels else logging.NOTSET)
+        self.sample_rates = {category: min(1.0, max(0.0, rate)) for category, rate in (sample_rates or {}).items()}
+        self._sink.setFormatter(EventFormatter(fmt, payload_mode, payload_max_chars))
+
+    def _logger(self, category: str) -> logging.Logger:
+        logger = self._loggers.get(category)
+        if logger is None:
+            logger = self._loggers[category] = self._root.getChild(category)
+        return logger
+
+    def enabled_for(self, category: str, level: int = logging.INFO) -> bool:
+        """Whether an event at ``level`` would be logged (before sampling)."""
+        return self._logger(category).isEnabledFor(level)
+
+    def emit(
+        self,
+        category: str,
+        event: str,
+        level: int = logging.INFO,
+        payload: Any = _NO_PAYLOAD,
+        exc_info: bool = False,
+        **fields: Any
+    ) -> None:
+        """Log one event.
+
+        Args:
+            category: Event category (INBOUND, API_CALL, DATABASE_CALL, WHATSAPP_SEND, ...)
+            event: Short event name, e.g. ``request`` or ``response``
+            level: Logging level
+            payload: Request or response body, rendered per LOG_PAYLOAD_MODE
+            exc_info: Attach the exception being handled
+            **fields: Extra JSON fields
+        """
+        logger = self._logger(category)
+        if not logger.isEnabledFor(level):
+            return
+        rate = self.sample_rates.get(category, 1.0)
+        if level < logging.WARNING and rate < 1.0 and random.random() >= rate:
+            self.stats["sampled_out"] += 1
+            return
+        if self._listener is None:
+            self.start()
+        correlation_id = tracer.correlation_id()
+        if correlation_id:
+            fields["correlation_id"] = correlation_id
+        self.stats["emitted"] += 1
+        logger.log(level, event, exc_info=exc_info, extra={"category": category, "fields": fields, "payload": payload})
+
+    def start(self) -> None:
+        """Start the writer thread (done on the first event if not called)."""
+        with self._start_lock:
+            if self._listener is None:
+                self._listener = logging.handlers.QueueListener(self._queue, self._sink)
+                self._listener.start()
+                atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Write out queued events and stop the writer thread."""
+        with self._start_lock:
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+                self._sink.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get emitted, sampled-out and dropped event counts and the queue depth."""
+        return {**self.stats, "dropped": self._handler.dropped, "queued": self._queue.qsize()}
+
+
+# Global event log instance
+event_log = EventLog.from_settings()
@@ -0,0 +1,71 @@
+"""Consistent hash ring for assigning phone numbers to bot worker processes."""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing with virtual nodes.
+
+    Every node is placed on the ring ``replicas`` times; a key belongs to the
+    first node point clockwise from its hash. Adding or removing one of N
+    nodes only moves about 1/N of the keys, and virtual nodes keep the load
+    even.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 160):
+        self.replicas = max(1, replicas)
+        self._nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        """Nodes on the ring, in insertion order."""
+        return list(self._nodes)
+
+    def _rebuild(self) -> None:
+        ring = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self._nodes
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def add(self, node: str) -> None:
+        """Place a node on the ring."""
+        if node not in self._nodes:
+            self._nodes.append(node)
+            self._rebuild()
+
+    def remove(self, node: str) -> None:
+        """Take a node off the ring; its keys move to the next nodes clockwise."""
+        if node in self._nodes:
+            self._nodes.remove(node)
+            self._rebuild()
+
+    def node_for(self, key: str) -> str:
+        """Get the node that owns a key.
+
+        Raises:
+            LookupError: If the ring has no nodes
+        """
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def distribution(self, keys: Iterable[str]) -> Dict[str, int]:
+        """Count how many of the given keys each node owns."""
+        counts = {node: 0 for node in self._nodes}
+        for key in keys:
+            counts[self.node_for(key)] += 1
+        return counts
@@ -0,0 +1,26 @@
+"""Rolling latency samples for percentile estimates."""
+
+from collections import deque
+from typing import Optional
+
+
+class LatencyWindow:
+    """Keeps the most recent ``size`` latencies of one operation."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=max(1, size))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        """Record one latency."""
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Get a percentile (0-100) of the recorded latencies, None when empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
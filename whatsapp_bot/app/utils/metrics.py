@@ -0,0 +1,234 @@
+"""Prometheus-style counters, gauges and latency histograms."""
+
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.utils.event_log import event_log
+
+
+# Seconds; covers fast webhook handling up to slow LLM-backed diagnosis calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+GaugeReading = Union[float, Dict[LabelValues, float]]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        """Add ``amount`` to the series with the given label values."""
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def labels(self, *labelvalues: str) -> "_BoundCounter":
+        """Bind label values once so hot paths only add."""
+        return _BoundCounter(self, labelvalues)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+            for values, value in self._values.items()
+        ]
+
+
+class _BoundCounter:
+    __slots__ = ("_counter", "_values")
+
+    def __init__(self, counter: Counter, values: LabelValues):
+        self._counter = counter
+        self._values = values
+        counter._values.setdefault(values, 0.0)  # Export the series before its first increment
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._counter._values[self._values] += amount
+
+
+class Gauge:
+    """Value read from a callback at scrape time.
+
+    The callback returns one number, or a mapping from label values to
+    numbers, so nothing has to be updated on the request path.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, read: Callable[[], GaugeReading], labelnames: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        reading = self.read()
+        if not isinstance(reading, dict):
+            reading = {(): reading}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+            for values, value in reading.items()
+        ]
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)  # Last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Latency histogram with fixed buckets.
+
+    ``observe`` is one bisect and three additions on per-bucket (not
+    cumulative) counts; cumulative bucket values are only computed when
+    the metrics are rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def _get_series(self, labelvalues: LabelValues) -> _HistogramSeries:
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = _HistogramSeries(len(self.buckets))
+        return series
+
+    def observe(self, seconds: float, *labelvalues: str) -> None:
+        """Record one observation in the series with the given label values."""
+        series = self._get_series(labelvalues)
+        series.counts[bisect_left(self.buckets, seconds)] += 1
+        series.sum += seconds
+        series.count += 1
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        """Context manager observing the time spent inside it."""
+        return _Timer(self, labelvalues)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {series.sum!r}")
+            lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_values", "_started")
+
+    def __init__(self, histogram: Histogram, values: LabelValues):
+        self._histogram = histogram
+        self._values = values
+        self._started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, *self._values)
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """Metrics of one bot process, rendered in the Prometheus text format.
+
+    Metrics are only updated from the event loop thread, so plain integers
+    and floats are enough: no locks or atomics on the request path.
+    Registering a name twice returns the existing metric, so modules can
+    declare their metrics at import time.
+    """
+
+    def __init__(self, prefix: str = "whatsapp_bot_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str, labelnames: Iterable[str] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(self.prefix + name, description, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        description: str,
+        read: Callable[[], GaugeReading],
+        labelnames: Iterable[str] = ()
+    ) -> Gauge:
+        """Register a gauge read by ``read`` at scrape time (replaces an earlier one)."""
+        gauge = Gauge(self.prefix + name, description, read, labelnames)
+        self._metrics[gauge.name] = gauge
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Iterable[str] = (),
+        buckets: Optional[Tuple[float, ...]] = None
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(self.prefix + name, description, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                event_log.emit("SYSTEM", "metric_read_failed", logging.ERROR, metric=metric.name, error=repr(e))
+                continue
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,65 @@
+"""Cursor pagination and streamed JSON pages for the debug listings."""
+
+import heapq
+import json
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def select_page(
+    items: Iterable[Tuple[str, T]],
+    cursor: Optional[str],
+    limit: int,
+    keep: Optional[Callable[[T], bool]] = None
+) -> Tuple[List[Tuple[str, T]], Optional[str]]:
+    """Pick one page of ``(key, value)`` items in key order.
+
+    Keyset pagination: the cursor is the last key of the previous page, so
+    entries added or removed between requests never shift later pages. A
+    page is one pass over the items with a heap of ``limit + 1`` entries,
+    so nothing is sorted or copied beyond the page itself.
+
+    Args:
+        items: ``(key, value)`` pairs, e.g. ``sessions.items()``
+        cursor: Only keys after this one; ``None`` for the first page
+        limit: Page size
+        keep: Filter applied to each value
+
+    Returns:
+        The page and the cursor of the next page (``None`` on the last page)
+    """
+    candidates = (
+        (key, value) for key, value in items
+        if (cursor is None or key > cursor) and (keep is None or keep(value))
+    )
+    page = heapq.nsmallest(limit + 1, candidates, key=itemgetter(0))
+    if len(page) > limit:
+        return page[:limit], page[limit - 1][0]
+    return page, None
+
+
+async def stream_page(
+    page: List[Tuple[str, T]],
+    render: Callable[[T], Dict[str, Any]],
+    next_cursor: Optional[str],
+    chunk_size: int = 50
+) -> AsyncIterator[bytes]:
+    """Serialize a page as ``{"items": {key: ...}, "next_cursor": ...}`` in chunks.
+
+    Each chunk is rendered on the event loop (the sessions are not safe to
+    read from another thread) and handed to the server before the next one
+    is built, so a large page never exists as one dict or string.
+    """
+    yield b'{"items":{'
+    for start in range(0, len(page), chunk_size):
+        chunk = ",".join(
+            f"{json.dumps(key)}:{json.dumps(render(value), ensure_ascii=False, default=str)}"
+            for key, value in page[start:start + chunk_size]
+        )
+        yield (("," if start else "") + chunk).encode("utf-8")
+    yield f'}},"next_cursor":{json.dumps(next_cursor)}}}'.encode("utf-8")
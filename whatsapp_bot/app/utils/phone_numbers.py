@@ -0,0 +1,27 @@
+"""Phone number normalization helpers."""
+
+
+def normalize_phone_number(phone: str) -> str:
+    """Normalize phone number format for consistent comparison.
+    
+    WhatsApp sends E.164 digits without '+', while the backend may store
+    numbers with '+', spaces, dashes or without the Colombian country code.
+    
+    Args:
+        phone: Phone number in any format
+        
+    Returns:
+        Normalized phone number (E.164 digits, no '+')
+    """
+    if not phone:
+        return ""
+    
+    # Remove '+' and any whitespace
+    normalized = phone.replace("+", "").replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    
+    # Ensure it starts with country code if it's a Colombian number
+    if len(normalized) == 10 and normalized.startswith("3"):
+        # Add Colombia country code (57) if missing
+        normalized = "57" + normalized
+    
+    return normalized
@@ -0,0 +1,98 @@
+"""Per-sender mailboxes that serialize message processing for each phone."""
+
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, Generic, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class SenderMailbox(Generic[T]):
+    """Pending messages for a single sender, processed strictly in order."""
+    sender_phone: str
+    messages: Deque[T] = field(default_factory=deque)
+    created_at: datetime = field(default_factory=datetime.now)
+
+
+class MailboxRegistry(Generic[T]):
+    """Actor-style mailbox registry keyed by sender phone.
+
+    A mailbox exists only while its sender has work queued or in flight, and
+    exactly one worker owns it at a time. That gives per-sender ordering while
+    different senders run in parallel. Mailboxes are reclaimed as soon as they
+    drain, so idle senders cost nothing.
+    """
+
+    def __init__(self):
+        self.mailboxes: Dict[str, SenderMailbox[T]] = {}
+        self.pending = 0
+
+    def post(self, sender_phone: str, message: T) -> bool:
+        """Append a message to the sender's mailbox.
+
+        Args:
+            sender_phone: Phone number of the sender
+            message: The message to queue
+
+        Returns:
+            True if the mailbox is new and must be scheduled on a worker
+        """
+        mailbox = self.mailboxes.get(sender_phone)
+        is_new = mailbox is None
+        if is_new:
+            mailbox = SenderMailbox(sender_phone=sender_phone)
+            self.mailboxes[sender_phone] = mailbox
+
+        mailbox.messages.append(message)
+        self.pending += 1
+        return is_new
+
+    def take(self, sender_phone: str) -> Optional[T]:
+        """Pop the oldest message from the sender's mailbox."""
+        mailbox = self.mailboxes.get(sender_phone)
+        if not mailbox or not mailbox.messages:
+            return None
+
+        self.pending -= 1
+        return mailbox.messages.popleft()
+
+    def take_while(self, sender_phone: str, predicate: Callable[[T], bool]) -> List[T]:
+        """Pop the oldest message and the run of messages after it that match ``predicate``."""
+        mailbox = self.mailboxes.get(sender_phone)
+        if not mailbox or not mailbox.messages:
+            return []
+
+        taken = [mailbox.messages.popleft()]
+        while mailbox.messages and predicate(mailbox.messages[0]):
+            taken.append(mailbox.messages.popleft())
+        self.pending -= len(taken)
+        return taken
+
+    def ends(self, sender_phone: str) -> Optional[Tuple[T, T]]:
+        """Oldest and newest message waiting for a sender, without removing them."""
+        mailbox = self.mailboxes.get(sender_phone)
+        if not mailbox or not mailbox.messages:
+            return None
+        return mailbox.messages[0], mailbox.messages[-1]
+
+    def release(self, sender_phone: str) -> bool:
+        """Finish a processing turn for a sender.
+
+        Returns:
+            True if more messages are waiting and the sender must be rescheduled,
+            False if the mailbox drained and was reclaimed
+        """
+        mailbox = self.mailboxes.get(sender_phone)
+        if mailbox and mailbox.messages:
+            return True
+
+        self.mailboxes.pop(sender_phone, None)
+        return False
+
+    def depth(self, sender_phone: str) -> int:
+        """Number of messages waiting for a sender."""
+        mailbox = self.mailboxes.get(sender_phone)
+        return len(mailbox.messages) if mailbox else 0
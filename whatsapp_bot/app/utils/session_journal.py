@@ -0,0 +1,334 @@
+"""Write-ahead log and snapshots that make the in-memory session store crash safe."""
+
+import asyncio
+import gc
+import logging
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.utils.session_store import DOCTOR, PATIENT, TIMER, InMemorySessionStore, StoredSession
+
+
+# Frame: payload length and CRC32, then a pickled payload. A frame that is
+# short or fails its CRC marks the torn end of a log written during a crash.
+FRAME_HEADER = struct.Struct("<II")
+SNAPSHOT_MAGIC = b"WBSNAP1\n"
+
+PUT = 0
+DELETE = 1
+
+JournalRecord = Tuple[int, str, str, Any]  # (op, kind, key, session or None)
+
+
+def encode_frame(payload: Any) -> bytes:
+    """Pickle a payload into one checksummed frame."""
+    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    return FRAME_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def read_frames(data: bytes) -> Tuple[List[Any], int]:
+    """Decode consecutive frames.
+
+    Returns:
+        The payloads, and the offset just after the last intact frame
+    """
+    payloads = []
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        chunk = data[start:start + length]
+        if len(chunk) < length or zlib.crc32(chunk) != crc:
+            break
+        payloads.append(pickle.loads(chunk))
+        offset = start + length
+    return payloads, offset
+
+
+class SessionJournal:
+    """Append-only log of session writes with periodic compacted snapshots.
+
+    Writes are buffered and a background task writes (and optionally fsyncs)
+    them every ``flush_interval`` seconds, so saves never wait on the disk
+    unless the interval is 0. Each snapshot starts a new log generation, and
+    older generations are deleted once the snapshot is durable. A restart
+    therefore replays at most ``max_records`` log records on top of the
+    snapshot.
+
+    Files are written by this process only and are trusted (pickle).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 0.05,
+        fsync: bool = True,
+        snapshot_interval: float = 300.0,
+        max_records: int = 50000
+    ):
+        self.directory = directory
+        self.flush_interval = max(0.0, flush_interval)
+        self.fsync = fsync
+        self.snapshot_interval = snapshot_interval
+        self.max_records = max(1, max_records)
+        self.generation = 0
+        self._file = None
+        self._buffer: List[bytes] = []
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_snapshot = time.monotonic()
+        self.records_since_snapshot = 0
+        self.stats: Dict[str, float] = {
+            "restored_sessions": 0,
+            "replayed_records": 0,
+            "restore_seconds": 0.0,
+            "torn_bytes_dropped": 0,
+            "snapshots": 0,
+            "last_snapshot_seconds": 0.0,
+            "fsyncs": 0
+        }
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, "sessions.snapshot")
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"sessions.wal.{generation}")
+
+    def _log_generations(self) -> List[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            prefix, _, suffix = name.rpartition(".")
+            if prefix == "sessions.wal" and suffix.isdigit():
+                generations.append(int(suffix))
+        return sorted(generations)
+
+    def restore(self) -> Dict[str, Dict[str, Any]]:
+        """Rebuild the stored sessions from the snapshot and log, then open the log.
+
+        Returns:
+            Kind -> key -> session
+        """
+        # Unpickling builds millions of container objects; generational GC
+        # passes over them would dominate the restore time. They are long
+        # lived, so they are then frozen out of future collections too.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._restore()
+        finally:
+            gc.freeze()
+            if gc_was_enabled:
+                gc.enable()
+
+    def _restore(self) -> Dict[str, Dict[str, Any]]:
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        state: Dict[str, Dict[str, Any]] = {PATIENT: {}, DOCTOR: {}, TIMER: {}}
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+            if data.startswith(SNAPSHOT_MAGIC):
+                payloads, _ = read_frames(memoryview(data)[len(SNAPSHOT_MAGIC):])
+                if payloads:
+                    self.generation = payloads[0]
+                    for kind, key, session in (item for chunk in payloads[1:] for item in chunk):
+                        state[kind][key] = session
+            else:
+                event_log.emit("SESSION", "journal_snapshot_unreadable", logging.WARNING, path=self.snapshot_path)
+
+        for generation in self._log_generations():
+            if generation < self.generation:
+                continue
+            path = self._log_path(generation)
+            with open(path, "rb") as f:
+                data = f.read()
+            records, intact = read_frames(data)
+            for op, kind, key, session in records:
+                if op == PUT:
+                    state[kind][key] = session
+                else:
+                    state[kind].pop(key, None)
+            self.stats["replayed_records"] += len(records)
+            self.records_since_snapshot += len(records)
+            self.generation = generation
+            if intact < len(data):
+                # Torn write from a crash: keep the intact prefix
+                self.stats["torn_bytes_dropped"] += len(data) - intact
+                with open(path, "r+b") as f:
+                    f.truncate(intact)
+
+        self._file = open(self._log_path(self.generation), "ab")
+        self.stats["restored_sessions"] = sum(len(sessions) for sessions in state.values())
+        self.stats["restore_seconds"] = round(time.perf_counter() - started, 3)
+        event_log.emit(
+            "SESSION", "journal_restored", sessions=self.stats["restored_sessions"],
+            log_records=self.stats["replayed_records"], seconds=self.stats["restore_seconds"]
+        )
+        return state
+
+    def append(self, records: Iterable[JournalRecord]) -> None:
+        """Buffer records for the next write."""
+        for record in records:
+            self._buffer.append(encode_frame(record))
+            self.records_since_snapshot += 1
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    async def write_pending(self) -> None:
+        """Write buffered records to the log (fsynced if enabled)."""
+        async with self._lock:
+            if not self._buffer or self._file is None:
+                return
+            data, self._buffer = b"".join(self._buffer), []
+            await asyncio.to_thread(self._write, data)
+            if self.fsync:
+                self.stats["fsyncs"] += 1
+
+    def start(self, store: "JournaledSessionStore") -> None:
+        """Start the background writer and snapshotter."""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run(store), name="session-journal")
+
+    async def _run(self, store: "JournaledSessionStore") -> None:
+        interval = self.flush_interval or 1.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.write_pending()
+                due = time.monotonic() - self._last_snapshot >= self.snapshot_interval
+                if self.records_since_snapshot >= self.max_records or (due and self.records_since_snapshot):
+                    await self.snapshot(store)
+            except Exception as e:
+                event_log.emit("SESSION", "journal_write_failed", logging.ERROR, exc_info=True, error=repr(e))
+
+    async def snapshot(self, store: "JournaledSessionStore", chunk_size: int = 2000) -> None:
+        """Write a compacted snapshot and drop the log generations it covers.
+
+        The log is rotated first, so every write made while the snapshot is
+        being pickled also lands in the new generation and wins on replay.
+        """
+        started = time.perf_counter()
+        async with self._lock:
+            if self._buffer:
+                data, self._buffer = b"".join(self._buffer), []
+                await asyncio.to_thread(self._write, data)
+            self._file.close()
+            self.generation += 1
+            self._file = open(self._log_path(self.generation), "ab")
+            self.records_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+
+        frames = [SNAPSHOT_MAGIC, encode_frame(self.generation)]
+        chunk = []
+        for kind, sessions in store.snapshot_items():
+            for key, stored in list(sessions.items()):
+                chunk.append((kind, key, stored.session))
+                if len(chunk) >= chunk_size:
+                    frames.append(encode_frame(chunk))
+                    chunk = []
+                    await asyncio.sleep(0)  # Let message handling run between chunks
+        if chunk:
+            frames.append(encode_frame(chunk))
+
+        await asyncio.to_thread(self._write_snapshot, b"".join(frames), self.generation)
+        self.stats["snapshots"] += 1
+        self.stats["last_snapshot_seconds"] = round(time.perf_counter() - started, 3)
+
+    def _write_snapshot(self, data: bytes, generation: int) -> None:
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        for old in self._log_generations():
+            if old < generation:
+                os.remove(self._log_path(old))
+
+    async def close(self, store: Optional["JournaledSessionStore"] = None) -> None:
+        """Stop the background task, write pending records and snapshot for a fast restart."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._file is None:
+            return
+        await self.write_pending()
+        if store is not None and self.records_since_snapshot:
+            await self.snapshot(store)
+        self._file.close()
+        self._file = None
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get restore, snapshot and log counters."""
+        return {
+            **self.stats,
+            "generation": self.generation,
+            "records_since_snapshot": self.records_since_snapshot,
+            "buffered_records": len(self._buffer)
+        }
+
+
+class JournaledSessionStore(InMemorySessionStore):
+    """In-memory session store that survives restarts through a ``SessionJournal``."""
+
+    durable = True
+
+    def __init__(self, journal: SessionJournal):
+        super().__init__()
+        self.journal = journal
+
+    @classmethod
+    def from_settings(cls) -> "JournaledSessionStore":
+        """Build the store and its journal from environment settings."""
+        return cls(SessionJournal(
+            directory=settings.shard_path(settings.SESSION_JOURNAL_DIR),
+            flush_interval=settings.SESSION_JOURNAL_FLUSH_INTERVAL,
+            fsync=settings.SESSION_JOURNAL_FSYNC,
+            snapshot_interval=settings.SESSION_SNAPSHOT_INTERVAL,
+            max_records=settings.SESSION_JOURNAL_MAX_RECORDS
+        ))
+
+    def restore(self) -> int:
+        """Load sessions from disk and start journaling.
+
+        Returns:
+            Number of sessions restored
+        """
+        for kind, sessions in self.journal.restore().items():
+            self._data[kind] = {key: StoredSession(session, 1) for key, session in sessions.items()}
+        self.journal.start(self)
+        return int(self.journal.stats["restored_sessions"])
+
+    def snapshot_items(self) -> Iterable[Tuple[str, Dict[str, StoredSession]]]:
+        """Stored sessions per kind, for snapshots."""
+        return self._data.items()
+
+    async def save_many(self, kind: str, entries: Dict[str, Tuple[Any, int]]) -> Tuple[Dict[str, int], List[str]]:
+        saved, conflicts = await super().save_many(kind, entries)
+        self.journal.append((PUT, kind, key, entries[key][0]) for key in saved)
+        if not self.journal.flush_interval:
+            await self.journal.write_pending()
+        return saved, conflicts
+
+    async def delete_many(self, kind: str, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        await super().delete_many(kind, keys)
+        self.journal.append((DELETE, kind, key, None) for key in keys)
+        if not self.journal.flush_interval:
+            await self.journal.write_pending()
+
+    async def close(self) -> None:
+        await self.journal.close(self)
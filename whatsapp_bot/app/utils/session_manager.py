@@ -1,17 +1,257 @@
 """Session management utilities."""
 
-from datetime import datetime
-from typing import Dict, Optional
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-from app.models.session import UserSession
+from app.models.session import UserSession, SessionState
 from app.config.questions import MENTAL_HEALTH_QUESTIONS
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.session_store import PATIENT, InMemorySessionStore, SessionStore, SessionSync
+
+
+# Finished conversations; evicted before any other session when over the cap
+TERMINAL_STATES = frozenset({SessionState.CONVERSATION_ENDED, SessionState.CONSENT_DECLINED})
+
+SESSIONS_EVICTED = metrics.counter(
+    "sessions_evicted_total", "Sessions dropped from memory, by idle TTL (expired) or the cap (lru)", ("reason", "state")
+)
+
+
+def parse_state_ttls(spec: str) -> Dict[SessionState, float]:
+    """Parse ``"state=seconds,state=seconds"`` into per-state TTLs.
+    
+    Args:
+        spec: Comma separated ``SessionState`` values and TTLs in seconds
+        
+    Returns:
+        TTL in seconds per session state
+        
+    Raises:
+        ValueError: If a state or TTL is not valid
+    """
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        state, _, seconds = item.partition("=")
+        ttls[SessionState(state.strip().lower())] = float(seconds)
+    return ttls
 
 
 class SessionManager:
-    """Manages user sessions and conversation state."""
+    """Manages user sessions and conversation state.
+    
+    Sessions are worked on in the local ``sessions`` dict and written back to
+    the session store by ``flush``; ``hydrate`` picks up changes made by other
+    workers sharing the store.
+    
+    Memory is bounded two ways. Idle sessions expire after a TTL that depends
+    on their state; deadlines sit in a min-heap, so the sweeper only looks at
+    sessions that are actually due. Above ``max_sessions`` the least recently
+    used session is evicted, finished conversations first. A session with
+    unflushed changes (i.e. being handled right now) is never evicted.
+    """
+    
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        max_sessions: int = 0,
+        idle_ttl: float = 0,
+        state_ttls: Optional[Dict[SessionState, float]] = None
+    ):
+        # Ordered by last use, least recent first
+        self.sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self.sync: SessionSync[UserSession] = SessionSync(
+            store or InMemorySessionStore(), PATIENT, self.sessions, on_load=self._track
+        )
+        self.max_sessions = max_sessions  # 0 means unbounded
+        self.idle_ttl = idle_ttl  # 0 means sessions never expire
+        self.state_ttls = state_ttls or {}
+        self._ended: "OrderedDict[str, None]" = OrderedDict()  # Terminal sessions, by last use
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}  # Deadline of each session's live heap entry
+        self._sweeper: Optional[asyncio.Task] = None
+        self.expired_by_state: Counter = Counter()
+        self.evicted_ended = 0
+        self.evicted_active = 0
+    
+    @classmethod
+    def from_settings(cls, store: Optional[SessionStore] = None) -> "SessionManager":
+        """Build the manager with eviction limits from environment settings."""
+        return cls(
+            store=store,
+            max_sessions=settings.SESSION_MAX_ENTRIES,
+            idle_ttl=settings.SESSION_IDLE_TTL,
+            state_ttls=parse_state_ttls(settings.SESSION_STATE_TTLS)
+        )
+    
+    async def hydrate(self, phone_number: str) -> None:
+        """Refresh a user's session from the store before handling their message."""
+        await self.sync.hydrate(phone_number)
+    
+    async def refresh(self) -> None:
+        """Load every stored session (e.g. after restoring the store on startup)."""
+        await self.sync.refresh_all()
+    
+    async def flush(self) -> None:
+        """Write sessions changed since the last flush back to the store."""
+        # Handlers change state directly on the session; re-file them before saving
+        for phone_number in self.sync.dirty_keys():
+            session = self.sessions.get(phone_number)
+            if session:
+                self._track(session)
+        await self.sync.flush()
+    
+    def _ttl(self, session: UserSession) -> float:
+        return self.state_ttls.get(session.state, self.idle_ttl)
+    
+    def _track(self, session: UserSession) -> None:
+        """Mark a session as most recently used and (re)schedule its expiry."""
+        phone_number = session.phone_number
+        self.sessions.move_to_end(phone_number)
+        if session.state in TERMINAL_STATES:
+            self._ended[phone_number] = None
+            self._ended.move_to_end(phone_number)
+        else:
+            self._ended.pop(phone_number, None)
+        
+        ttl = self._ttl(session)
+        if ttl:
+            deadline = session.last_activity_ts + ttl
+            # Later deadlines are picked up when the earlier entry pops
+            scheduled = self._deadlines.get(phone_number)
+            if scheduled is None or deadline < scheduled:
+                self._deadlines[phone_number] = deadline
+                heapq.heappush(self._expiry_heap, (deadline, phone_number))
+        
+        self._enforce_cap()
+    
+    def _evict(self, phone_number: str, expired: bool) -> None:
+        """Drop a session from memory.
+        
+        Expired sessions are deleted from the store too. Sessions evicted for
+        space stay in a shared store and are reloaded by ``hydrate``; with the
+        in-memory store that would keep them alive, so they are deleted.
+        """
+        session = self.sessions.pop(phone_number, None)
+        if session is not None:
+            SESSIONS_EVICTED.inc(1, "expired" if expired else "lru", session.state.value)
+        self._ended.pop(phone_number, None)
+        self._deadlines.pop(phone_number, None)
+        if expired or not self.sync.store.shared:
+            self.sync.mark_deleted(phone_number)
+        else:
+            self.sync.forget(phone_number)
+    
+    def _enforce_cap(self) -> None:
+        """Evict least recently used sessions, finished ones first, down to the cap."""
+        while self.max_sessions and len(self.sessions) > self.max_sessions:
+            victim = next((phone for phone in self._ended if not self.sync.is_dirty(phone)), None)
+            if victim is not None:
+                self.evicted_ended += 1
+            else:
+                victim = next((phone for phone in self.sessions if not self.sync.is_dirty(phone)), None)
+                if victim is None:
+                    return
+                self.evicted_active += 1
+            self._evict(victim, expired=False)
+    
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict sessions whose idle TTL has passed.
+        
+        Only heap entries that are due are visited; entries for sessions that
+        were active since are rescheduled to their new deadline.
+        
+        Args:
+            now: Current epoch time (defaults to ``time.time()``)
+            
+        Returns:
+            Number of sessions evicted
+        """
+        now = time.time() if now is None else now
+        heap = self._expiry_heap
+        expired = 0
+        while heap and heap[0][0] <= now:
+            deadline, phone_number = heapq.heappop(heap)
+            if self._deadlines.get(phone_number) != deadline:
+                continue  # Superseded entry
+            
+            session = self.sessions.get(phone_number)
+            ttl = self._ttl(session) if session else 0
+            if not ttl or self.sync.is_dirty(phone_number):
+                # Gone, never expires, or in use: flush() schedules it again
+                del self._deadlines[phone_number]
+                continue
+            
+            current = session.last_activity_ts + ttl
+            if current > now:
+                self._deadlines[phone_number] = current
+                heapq.heappush(heap, (current, phone_number))
+                continue
+            
+            self.expired_by_state[session.state.value] += 1
+            self._evict(phone_number, expired=True)
+            expired += 1
+        
+        # Superseded entries pile up if deadlines keep moving earlier
+        if len(heap) > 2 * len(self._deadlines) + 1024:
+            self._expiry_heap = [(deadline, phone) for phone, deadline in self._deadlines.items()]
+            heapq.heapify(self._expiry_heap)
+        return expired
+    
+    def start_sweeper(self, interval: float = 30.0) -> None:
+        """Run ``sweep`` in the background every ``interval`` seconds."""
+        if self._sweeper is None and (self.idle_ttl or self.state_ttls):
+            self._sweeper = asyncio.create_task(self._sweep_loop(interval), name="session-sweeper")
+    
+    async def _sweep_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.sweep():
+                    await self.sync.flush_deleted()
+            except Exception as e:
+                event_log.emit("SESSION", "sweep_failed", logging.ERROR, exc_info=True, error=repr(e))
+    
+    async def stop_sweeper(self) -> None:
+        """Cancel the background sweeper."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
     
-    def __init__(self):
-        self.sessions: Dict[str, UserSession] = {}
+    def get_stats(self) -> Dict[str, object]:
+        """Get cache size, eviction and write-back counters."""
+        return {
+            **self.sync.get_stats(),
+            "max_sessions": self.max_sessions,
+            "ended_cached": len(self._ended),
+            "scheduled_expiries": len(self._deadlines),
+            "evicted_lru": {"ended": self.evicted_ended, "active": self.evicted_active},
+            "expired_by_state": dict(self.expired_by_state)
+        }
+    
+    def mark_dirty(self, phone_number: str) -> None:
+        """Record that a session was changed outside the manager's methods."""
+        self.sync.mark_dirty(phone_number)
+    
+    def get_session(self, phone_number: str) -> Optional[UserSession]:
+        """Get an existing session for update, without creating one.
+        
+        Args:
+            phone_number: The user's phone number
+            
+        Returns:
+            The user's session, or None if there is none
+        """
+        session = self.sessions.get(phone_number)
+        if session:
+            self.sync.mark_dirty(phone_number)
+        return session
     
     def get_or_create_session(self, phone_number: str) -> UserSession:
         """Get existing session or create a new one for the user.
@@ -22,12 +262,15 @@ class SessionManager:
         Returns:
             The user's session
         """
-        if phone_number not in self.sessions:
-            self.sessions[phone_number] = UserSession(phone_number=phone_number)
+        session = self.sessions.get(phone_number)
+        if session is None:
+            session = self.sessions[phone_number] = UserSession(phone_number=phone_number)
         else:
-            self.sessions[phone_number].last_activity = datetime.now()
+            session.mark_activity()
         
-        return self.sessions[phone_number]
+        self.sync.mark_dirty(phone_number)
+        self._track(session)
+        return session
     
     def reset_session(self, phone_number: str) -> Optional[UserSession]:
         """Reset a user's session.
@@ -41,6 +284,8 @@ class SessionManager:
         old_session = self.sessions.get(phone_number)
         if old_session:
             self.sessions[phone_number] = UserSession(phone_number=phone_number)
+            self.sync.mark_dirty(phone_number)
+            self._track(self.sessions[phone_number])
         return old_session
     
     def delete_session(self, phone_number: str) -> bool:
@@ -54,6 +299,9 @@ class SessionManager:
         """
         if phone_number in self.sessions:
             del self.sessions[phone_number]
+            self._ended.pop(phone_number, None)
+            self._deadlines.pop(phone_number, None)
+            self.sync.mark_deleted(phone_number)
             return True
         return False
     
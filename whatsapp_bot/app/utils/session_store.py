@@ -0,0 +1,467 @@
+"""Pluggable storage for patient and doctor sessions."""
+
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from app.config.settings import settings
+from app.utils.event_log import event_log
+from app.models.deadline import Deadline
+from app.models.doctor_session import DoctorSession, DoctorSessionState
+from app.models.question import Answer
+from app.models.session import SessionState, UserSession
+
+
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import WatchError
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    WatchError = None
+    REDIS_AVAILABLE = False
+
+
+# Session kinds; also used as the key namespace in shared stores
+PATIENT = "p"
+DOCTOR = "d"
+TIMER = "t"  # Pending deadlines of the deadline scheduler
+
+S = TypeVar("S")
+
+
+@dataclass
+class StoredSession:
+    """A session as loaded from the store, with the version it was saved at."""
+    session: Any
+    version: int
+
+
+# --- Compact serialization ---------------------------------------------------
+#
+# Sessions are written as positional JSON arrays (no field names), timestamps
+# as epoch seconds, enums as their values and booleans packed into one int.
+
+def _dumps(record: list) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _encode_answers(answers: List[Answer]) -> list:
+    return [[answer.question_id, answer.value, answer.answered_at] for answer in answers]
+
+
+def _decode_answers(rows: list) -> List[Answer]:
+    return [Answer(question_id, value, int(answered_at)) for question_id, value, answered_at in rows]
+
+
+def encode_user_session(session: UserSession) -> bytes:
+    """Serialize a patient session."""
+    flags = (
+        session.first_question_asked
+        | session.consent_given << 1
+        | session.greeting_sent << 2
+        | session.patient_notified_of_decision << 3
+        | session.urgent_alert_sent << 4
+    )
+    return _dumps([
+        session.phone_number,
+        session.state.value,
+        session.current_question_index,
+        session.created_ts,
+        session.last_activity_ts,
+        flags,
+        _encode_answers(session.answers),
+        session.followup_questions,
+        session.current_followup_index,
+        _encode_answers(session.followup_answers),
+        session.diagnostic_support,
+        session.specialists_notified,
+        session.specialist_responses,
+        session.final_specialist_decision
+    ])
+
+
+def decode_user_session(data: bytes) -> UserSession:
+    """Deserialize a patient session written by ``encode_user_session``."""
+    (phone_number, state, question_index, created_ts, last_activity_ts, flags, answers,
+     followup_questions, followup_index, followup_answers, diagnostic_support,
+     specialists_notified, specialist_responses, final_decision) = json.loads(data)
+    return UserSession(
+        phone_number=phone_number,
+        current_question_index=question_index,
+        answers=_decode_answers(answers),
+        state=SessionState(state),
+        created_ts=int(created_ts),
+        last_activity_ts=int(last_activity_ts),
+        first_question_asked=bool(flags & 1),
+        consent_given=bool(flags & 2),
+        greeting_sent=bool(flags & 4),
+        followup_questions=followup_questions,
+        current_followup_index=followup_index,
+        followup_answers=_decode_answers(followup_answers),
+        diagnostic_support=diagnostic_support,
+        specialists_notified=specialists_notified,
+        specialist_responses=specialist_responses,
+        final_specialist_decision=final_decision,
+        patient_notified_of_decision=bool(flags & 8),
+        urgent_alert_sent=bool(flags & 16)
+    )
+
+
+def encode_doctor_session(session: DoctorSession) -> bytes:
+    """Serialize a doctor session."""
+    return _dumps([
+        session.phone_number,
+        session.state.value,
+        session.registration_ts,
+        session.last_activity_ts,
+        session.cases_reviewed,
+        session.current_reviewing_patient,
+        session.assignment_load,
+        session.last_assigned_ts
+    ])
+
+
+def decode_doctor_session(data: bytes) -> DoctorSession:
+    """Deserialize a doctor session written by ``encode_doctor_session``."""
+    phone_number, state, registration_ts, last_activity_ts, cases_reviewed, reviewing, *load = json.loads(data)
+    assignment_load, last_assigned_ts = load or (0.0, 0)  # Written before load balancing
+    return DoctorSession(
+        phone_number=phone_number,
+        state=DoctorSessionState(state),
+        registration_ts=int(registration_ts),
+        last_activity_ts=int(last_activity_ts),
+        cases_reviewed=cases_reviewed,
+        current_reviewing_patient=reviewing,
+        assignment_load=float(assignment_load),
+        last_assigned_ts=int(last_assigned_ts)
+    )
+
+
+def encode_deadline(deadline: Deadline) -> bytes:
+    """Serialize a pending deadline."""
+    return _dumps([deadline.key, deadline.kind, deadline.subject, deadline.due_ts, deadline.payload])
+
+
+def decode_deadline(data: bytes) -> Deadline:
+    """Deserialize a deadline written by ``encode_deadline``."""
+    key, kind, subject, due_ts, payload = json.loads(data)
+    return Deadline(key, kind, subject, float(due_ts), payload)
+
+
+CODECS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    PATIENT: (encode_user_session, decode_user_session),
+    DOCTOR: (encode_doctor_session, decode_doctor_session),
+    TIMER: (encode_deadline, decode_deadline),
+}
+
+
+# --- Stores ------------------------------------------------------------------
+
+class SessionStore(ABC):
+    """Storage backend behind the session managers.
+
+    Every session carries a version. ``save_many`` only writes a session whose
+    stored version still equals the version it was loaded at (0 for a session
+    that was never saved), so two workers can't overwrite each other's changes;
+    the losing keys are reported back as conflicts.
+    """
+
+    # Whether the store is shared with other processes (and so outlives the local cache)
+    shared = False
+    # Whether stored entries survive a restart of this process
+    durable = False
+
+    @abstractmethod
+    async def load_many(self, kind: str, keys: Iterable[str]) -> Dict[str, StoredSession]:
+        """Load the given sessions; missing keys are left out of the result."""
+
+    async def load(self, kind: str, key: str) -> Optional[StoredSession]:
+        """Load one session, or None if it is not stored."""
+        return (await self.load_many(kind, [key])).get(key)
+
+    @abstractmethod
+    async def load_all(self, kind: str) -> Dict[str, StoredSession]:
+        """Load every stored session of a kind."""
+
+    @abstractmethod
+    async def save_many(self, kind: str, entries: Dict[str, Tuple[Any, int]]) -> Tuple[Dict[str, int], List[str]]:
+        """Save sessions if their stored versions still match.
+
+        Args:
+            kind: Session kind (``PATIENT``, ``DOCTOR`` or ``TIMER``)
+            entries: Key -> (session, version it was loaded at)
+
+        Returns:
+            The new version of every saved key, and the keys that conflicted
+        """
+
+    @abstractmethod
+    async def delete_many(self, kind: str, keys: Iterable[str]) -> None:
+        """Delete sessions regardless of their version."""
+
+    async def close(self) -> None:
+        """Release backend connections."""
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store holding the session objects themselves.
+
+    Nothing is serialized, so this is the zero-cost default for a single
+    worker; it follows the same versioning rules as the shared stores.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, StoredSession]] = {PATIENT: {}, DOCTOR: {}, TIMER: {}}
+
+    async def load_many(self, kind: str, keys: Iterable[str]) -> Dict[str, StoredSession]:
+        stored = self._data[kind]
+        return {key: stored[key] for key in keys if key in stored}
+
+    async def load_all(self, kind: str) -> Dict[str, StoredSession]:
+        return dict(self._data[kind])
+
+    async def save_many(self, kind: str, entries: Dict[str, Tuple[Any, int]]) -> Tuple[Dict[str, int], List[str]]:
+        stored = self._data[kind]
+        saved: Dict[str, int] = {}
+        conflicts: List[str] = []
+        for key, (session, version) in entries.items():
+            current = stored.get(key)
+            if (current.version if current else 0) != version:
+                conflicts.append(key)
+                continue
+            stored[key] = StoredSession(session, version + 1)
+            saved[key] = version + 1
+        return saved, conflicts
+
+    async def delete_many(self, kind: str, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._data[kind].pop(key, None)
+
+
+class RedisSessionStore(SessionStore):
+    """Store shared by every worker and replica through a Redis-protocol server.
+
+    Each session is one string key ``{prefix}:{kind}:{phone}`` holding
+    ``b"<version>:<record>"``, plus a set of keys per kind for ``load_all``.
+    Reads are a single MGET; writes WATCH the keys, check their versions with
+    one MGET and apply every SET in one MULTI/EXEC transaction.
+    """
+
+    shared = True
+    durable = True
+
+    def __init__(self, client: Any, prefix: str = "wb", ttl_seconds: int = 0, max_attempts: int = 3):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds or None
+        self.max_attempts = max(1, max_attempts)
+
+    @classmethod
+    def from_settings(cls) -> "RedisSessionStore":
+        """Build the store from environment settings."""
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("SESSION_STORE_BACKEND=redis requires the 'redis' package")
+        return cls(
+            client=redis_asyncio.from_url(settings.REDIS_URL),
+            prefix=settings.SESSION_STORE_PREFIX,
+            ttl_seconds=settings.SESSION_STORE_TTL
+        )
+
+    def _key(self, kind: str, key: str) -> str:
+        return f"{self.prefix}:{kind}:{key}"
+
+    def _index(self, kind: str) -> str:
+        return f"{self.prefix}:{kind}:index"
+
+    @staticmethod
+    def _split(raw: Optional[bytes]) -> Tuple[int, Optional[bytes]]:
+        if raw is None:
+            return 0, None
+        version, _, record = raw.partition(b":")
+        return int(version), record
+
+    async def load_many(self, kind: str, keys: Iterable[str]) -> Dict[str, StoredSession]:
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        decode = CODECS[kind][1]
+        values = await self.client.mget([self._key(kind, key) for key in keys])
+        loaded = {}
+        for key, raw in zip(keys, values):
+            version, record = self._split(raw)
+            if record is not None:
+                loaded[key] = StoredSession(decode(record), version)
+        return loaded
+
+    async def load_all(self, kind: str) -> Dict[str, StoredSession]:
+        members = await self.client.smembers(self._index(kind))
+        return await self.load_many(kind, sorted(member.decode("utf-8") for member in members))
+
+    async def save_many(self, kind: str, entries: Dict[str, Tuple[Any, int]]) -> Tuple[Dict[str, int], List[str]]:
+        encode = CODECS[kind][0]
+        pending = dict(entries)
+        conflicts: List[str] = []
+
+        for _ in range(self.max_attempts):
+            if not pending:
+                break
+            keys = list(pending)
+            redis_keys = [self._key(kind, key) for key in keys]
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(*redis_keys)
+                    current = await pipe.mget(redis_keys)
+                    for key, raw in zip(keys, current):
+                        if self._split(raw)[0] != pending[key][1]:
+                            conflicts.append(key)
+                            del pending[key]
+                    if not pending:
+                        break
+
+                    pipe.multi()
+                    saved = {}
+                    for key, (session, version) in pending.items():
+                        saved[key] = version + 1
+                        pipe.set(self._key(kind, key), b"%d:" % saved[key] + encode(session), ex=self.ttl_seconds)
+                    pipe.sadd(self._index(kind), *pending)
+                    await pipe.execute()
+                    return saved, conflicts
+                except WatchError:
+                    # Another worker wrote one of the keys; recheck versions
+                    continue
+
+        # Still contended after every attempt
+        return {}, conflicts + list(pending)
+
+    async def delete_many(self, kind: str, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(*(self._key(kind, key) for key in keys))
+            pipe.srem(self._index(kind), *keys)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class SessionSync(Generic[S]):
+    """Keeps a manager's local session dict in step with a ``SessionStore``.
+
+    The manager keeps working on its dict; sessions it touches are marked
+    dirty and written back by ``flush``. ``hydrate`` pulls a session another
+    worker saved since we last saw it. A conflicting save means another worker
+    won the race, so the stored session replaces the local one.
+    """
+
+    def __init__(self, store: SessionStore, kind: str, sessions: Dict[str, S],
+                 on_load: Optional[Callable[[S], None]] = None):
+        self.store = store
+        self.kind = kind
+        self.sessions = sessions
+        self.on_load = on_load
+        self._versions: Dict[str, int] = {}
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self.conflicts = 0
+
+    def mark_dirty(self, key: str) -> None:
+        """Schedule a session to be written on the next flush."""
+        self._deleted.discard(key)
+        self._dirty.add(key)
+
+    def mark_deleted(self, key: str) -> None:
+        """Schedule a session to be deleted on the next flush."""
+        self._dirty.discard(key)
+        self._versions.pop(key, None)
+        self._deleted.add(key)
+
+    def forget(self, key: str) -> None:
+        """Drop a key from the local cache bookkeeping, leaving the store untouched."""
+        self._dirty.discard(key)
+        self._versions.pop(key, None)
+
+    def is_dirty(self, key: str) -> bool:
+        """Whether a session has changes waiting for the next flush."""
+        return key in self._dirty
+
+    def dirty_keys(self) -> List[str]:
+        """Keys with changes waiting for the next flush."""
+        return list(self._dirty)
+
+    def _adopt(self, key: str, stored: StoredSession) -> None:
+        if self._versions.get(key) == stored.version and key in self.sessions:
+            return
+        self.sessions[key] = stored.session
+        self._versions[key] = stored.version
+        if self.on_load:
+            self.on_load(stored.session)
+
+    async def hydrate(self, key: str) -> None:
+        """Refresh one session from the store (before handling its message)."""
+        if key in self._dirty:
+            return
+        stored = await self.store.load(self.kind, key)
+        if stored is not None:
+            self._adopt(key, stored)
+
+    async def hydrate_many(self, keys: Iterable[str]) -> None:
+        """Refresh the given sessions from the store in one read."""
+        keys = [key for key in keys if key not in self._dirty]
+        if keys:
+            for key, stored in (await self.store.load_many(self.kind, keys)).items():
+                self._adopt(key, stored)
+
+    async def refresh_all(self) -> None:
+        """Refresh every stored session of this kind."""
+        for key, stored in (await self.store.load_all(self.kind)).items():
+            if key not in self._dirty:
+                self._adopt(key, stored)
+
+    async def flush_deleted(self) -> None:
+        """Apply pending deletes to the store."""
+        if not self._deleted:
+            return
+        deleted, self._deleted = self._deleted, set()
+        try:
+            await self.store.delete_many(self.kind, deleted)
+        except Exception:
+            self._deleted |= deleted
+            raise
+
+    async def flush(self) -> None:
+        """Write dirty sessions and pending deletes back to the store."""
+        await self.flush_deleted()
+        dirty, self._dirty = self._dirty, set()
+        entries = {
+            key: (self.sessions[key], self._versions.get(key, 0))
+            for key in dirty if key in self.sessions
+        }
+        if not entries:
+            return
+
+        try:
+            saved, conflicts = await self.store.save_many(self.kind, entries)
+        except Exception:
+            # Keep the changes so the next flush retries them
+            self._dirty |= dirty
+            raise
+
+        self._versions.update(saved)
+        if conflicts:
+            self.conflicts += len(conflicts)
+            event_log.emit("SESSION", "store_conflicts_reloaded", kind=self.kind, sessions=len(conflicts))
+            for key, stored in (await self.store.load_many(self.kind, conflicts)).items():
+                self._adopt(key, stored)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get local cache size and write-back counters."""
+        return {
+            "cached": len(self.sessions),
+            "dirty": len(self._dirty),
+            "conflicts": self.conflicts
+        }
@@ -0,0 +1,8 @@
+"""Parsing helpers for list-valued environment settings."""
+
+from typing import Tuple
+
+
+def parse_csv(spec: str) -> Tuple[str, ...]:
+    """Split a comma-separated setting into trimmed, non-empty lowercase items."""
+    return tuple(item.strip().lower() for item in spec.split(",") if item.strip())
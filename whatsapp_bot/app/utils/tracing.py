@@ -0,0 +1,246 @@
+"""Correlation IDs and lightweight spans shared with diagnose-bot and the backend."""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config.settings import settings
+
+
+# Headers understood by diagnose-bot and the backend as well
+CORRELATION_HEADER = "X-Correlation-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+
+
+def new_id() -> str:
+    """Random 16-hex-digit identifier for traces and spans."""
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class Span:
+    """One timed stage of a request; ``trace_id`` is the correlation ID."""
+    trace_id: str
+    name: str
+    parent_id: Optional[str] = None
+    span_id: str = field(default_factory=new_id)
+    start: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self, service: str) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": service,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """Writes finished spans from a background thread.
+
+    Spans go as JSON lines to ``path`` and/or as ``{"spans": [...]}`` batches
+    POSTed to ``collector_url``. The queue is bounded; spans that do not fit
+    are dropped and counted so tracing never slows the bot down.
+    """
+
+    def __init__(
+        self,
+        path: str = "",
+        collector_url: str = "",
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000
+    ):
+        self.path = path
+        self.collector_url = collector_url
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"exported": 0, "dropped": 0, "failed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.collector_url)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        """Queue a finished span without blocking."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Dict[str, Any]] = []
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            if self.path:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in batch))
+            if self.collector_url:
+                request = urllib.request.Request(
+                    self.collector_url,
+                    data=json.dumps({"spans": batch}, default=str).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+            self.stats["exported"] += len(batch)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            # Imported here: the event log itself depends on the tracer
+            from app.utils.event_log import event_log
+            event_log.emit("SYSTEM", "span_export_failed", logging.WARNING, spans=len(batch), error=repr(e))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write out queued spans and stop the exporter thread."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+class Tracer:
+    """Creates spans in the current context and propagates them over HTTP.
+
+    The webhook starts a trace for every inbound message; the span in the
+    current context is inherited by the worker task handling the message,
+    its outgoing calls and background fan-outs. The correlation ID (the
+    trace id) and the calling span go to diagnose-bot and the backend as
+    headers so their spans join the same trace. Without an export path or
+    collector, spans are still created (the IDs appear in the event log)
+    but not written anywhere.
+    """
+
+    def __init__(self, service: str = "whatsapp_bot", exporter: Optional[SpanExporter] = None):
+        self.service = service
+        self.exporter = exporter or SpanExporter()
+
+    @classmethod
+    def from_settings(cls) -> "Tracer":
+        """Build the tracer from environment settings."""
+        return cls(
+            service=settings.TRACE_SERVICE_NAME,
+            exporter=SpanExporter(
+                path=settings.shard_path(settings.TRACE_EXPORT_PATH),
+                collector_url=settings.TRACE_COLLECTOR_URL
+            )
+        )
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """Time a stage as a child of the current span.
+
+        Args:
+            name: Stage name, e.g. ``diagnosis.questions``
+            trace_id: Start a new trace with this correlation ID instead
+            **attributes: Span attributes
+
+        Yields:
+            The span, current until the block exits
+        """
+        parent = _current_span.get()
+        if trace_id is None and parent is not None:
+            span = Span(parent.trace_id, name, parent_id=parent.span_id, attributes=attributes)
+        else:
+            span = Span(trace_id or new_id(), name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - span._started) * 1000
+            _current_span.reset(token)
+            if self.exporter.enabled:
+                self.exporter.export(span.to_dict(self.service))
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        """The span of the current context, if any."""
+        return _current_span.get()
+
+    @staticmethod
+    def correlation_id() -> Optional[str]:
+        """The correlation ID of the current context, if any."""
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    @staticmethod
+    def headers() -> Dict[str, str]:
+        """Headers carrying the current trace to another service."""
+        span = _current_span.get()
+        if span is None:
+            return {}
+        return {CORRELATION_HEADER: span.trace_id, PARENT_SPAN_HEADER: span.span_id}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get exporter destination and counters."""
+        return {
+            "service": self.service,
+            "path": self.exporter.path or None,
+            "collector": self.exporter.collector_url or None,
+            **self.exporter.stats
+        }
+
+
+# Global tracer instance
+tracer = Tracer.from_settings()
@@ -0,0 +1,212 @@
+"""Background worker pool for processing inbound WhatsApp messages."""
+
+import asyncio
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.utils.sender_mailbox import MailboxRegistry
+from app.utils.coalescing_window import CoalescingWindow
+from app.utils.event_log import event_log
+
+
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+@dataclass
+class InboundMessage:
+    """A parsed inbound message waiting to be processed."""
+    sender_phone: str
+    text_content: str
+    received_at: float = field(default_factory=time.monotonic)
+    # Context of the webhook that queued it (carries the trace)
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class MessageWorkerPool:
+    """Bounded in-process queue drained by a fixed number of worker tasks.
+
+    The webhook only parses and enqueues messages so it can acknowledge Meta
+    immediately; the workers run the (slow) conversation handlers.
+
+    Messages are held in per-sender mailboxes and the worker queue carries
+    sender phones, not messages. A sender is scheduled on at most one worker
+    at a time, so each phone's messages run strictly in order while different
+    phones run in parallel.
+
+    With a coalescing window, a sender whose messages are answer fragments
+    is only scheduled once they stop typing, and the fragments waiting at
+    that point are handled as one message.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        concurrency: int = 8,
+        max_queue_size: int = 1000,
+        window: Optional[CoalescingWindow] = None
+    ):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_queue_size = max(1, max_queue_size)
+        self.window = window or CoalescingWindow()
+        self._queue: Optional[asyncio.Queue] = None
+        self.mailboxes: MailboxRegistry[InboundMessage] = MailboxRegistry()
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._busy = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the pool is accepting and processing messages."""
+        return self._accepting
+
+    def start(self) -> None:
+        """Create the queue and spawn the worker tasks."""
+        if self._accepting:
+            return
+
+        # Holds each sender at most once; depth is bounded by pending messages
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"message-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._accepting = True
+        event_log.emit("INBOUND", "workers_started", workers=self.concurrency, queue_limit=self.max_queue_size)
+
+    def submit(self, sender_phone: str, text_content: str) -> bool:
+        """Enqueue a message for background processing.
+
+        Args:
+            sender_phone: Phone number of the sender
+            text_content: The message content
+
+        Returns:
+            True if the message was queued, False if the pool is stopped or full
+        """
+        if not self._accepting or self._queue is None:
+            self._rejected += 1
+            return False
+
+        if self.mailboxes.pending >= self.max_queue_size:
+            self._rejected += 1
+            event_log.emit(
+                "INBOUND", "queue_full", logging.WARNING, user=sender_phone, queue_limit=self.max_queue_size
+            )
+            return False
+
+        is_new = self.mailboxes.post(sender_phone, InboundMessage(sender_phone, text_content))
+        if self.window.holds(sender_phone, text_content):
+            self.window.held += 1
+            # A sender already queued or being handled is re-windowed on release
+            if is_new or self.window.is_waiting(sender_phone):
+                self._schedule(sender_phone)
+        elif self.window.is_waiting(sender_phone):
+            # A command or button reply closes the window; held fragments go first
+            self.window.close(sender_phone, self._queue.put_nowait)
+        elif is_new:
+            self._queue.put_nowait(sender_phone)
+        return True
+
+    def _schedule(self, sender_phone: str) -> None:
+        """Queue a sender with waiting messages, or hold it in the coalescing window."""
+        ends = self.mailboxes.ends(sender_phone)
+        if ends and self._accepting and self.window.holds(sender_phone, ends[0].text_content):
+            oldest, newest = ends
+            self.window.arm(sender_phone, oldest.received_at, newest.received_at, self._queue.put_nowait)
+        else:
+            self._queue.put_nowait(sender_phone)
+
+    def _take(self, sender_phone: str) -> Optional[InboundMessage]:
+        """Take the sender's next message, merged with the fragments held after it."""
+        ends = self.mailboxes.ends(sender_phone)
+        if ends is None:
+            return None
+        merging = self.window.holds(sender_phone, ends[0].text_content)
+        batch = self.mailboxes.take_while(
+            sender_phone, lambda message: merging and self.window.holds(sender_phone, message.text_content)
+        )
+        if len(batch) == 1:
+            return batch[0]
+        # Runs in the first fragment's context, continuing its trace
+        first = batch[0]
+        return InboundMessage(
+            sender_phone,
+            self.window.merge([message.text_content for message in batch]),
+            received_at=first.received_at,
+            context=first.context
+        )
+
+    async def _worker(self, worker_id: int) -> None:
+        """Take one message per scheduled sender and run the handler until cancelled."""
+        while True:
+            sender_phone = await self._queue.get()
+            self._busy += 1
+            try:
+                message = self._take(sender_phone)
+                if message is not None:
+                    # Run in the webhook's context so the handler continues its trace
+                    await asyncio.create_task(
+                        self.handler(message.sender_phone, message.text_content),
+                        context=message.context
+                    )
+                    self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                event_log.emit(
+                    "INBOUND", "handler_failed", logging.ERROR, exc_info=True,
+                    worker=worker_id, user=sender_phone, error=repr(e)
+                )
+            finally:
+                self._busy -= 1
+                # Requeue at the back so one chatty sender can't starve the others
+                if self.mailboxes.release(sender_phone):
+                    self._schedule(sender_phone)
+                self._queue.task_done()
+
+    async def stop(self, drain_timeout: float = 25.0) -> None:
+        """Stop accepting messages, drain the queue and cancel the workers.
+
+        Args:
+            drain_timeout: Seconds to wait for queued messages to finish
+        """
+        if self._queue is None:
+            return
+
+        self._accepting = False
+        self.window.close_all(self._queue.put_nowait)
+        pending = self.mailboxes.pending + self._busy
+        event_log.emit("INBOUND", "workers_draining", pending=pending, timeout_seconds=drain_timeout)
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            event_log.emit(
+                "INBOUND", "drain_timed_out", logging.WARNING, abandoned=self.mailboxes.pending + self._busy
+            )
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, throughput counters and coalescing window stats."""
+        return {
+            "concurrency": self.concurrency,
+            "max_queue_size": self.max_queue_size,
+            "queue_depth": self.mailboxes.pending,
+            "active_senders": len(self.mailboxes.mailboxes),
+            "busy_workers": self._busy,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            **({"coalescing": self.window.get_stats()} if self.window.enabled else {})
+        }
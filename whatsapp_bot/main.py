@@ -5,18 +5,40 @@ A conversational bot that conducts mental health triage through WhatsApp
 by asking predefined questions and integrating with external APIs.
 """
 
-import json
+import asyncio
+import logging
+from datetime import datetime
 from typing import Optional
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+
+from app.models.session import SessionState
+from app.models.doctor_session import DoctorSessionState
+from app.models.deadline import APPROVAL_WAIT, CASE_ESCALATION, DOCTOR_REVIEW, PATIENT_NUDGE
+from app.models.timestamps import from_epoch, to_epoch
 
 from app.config.settings import settings
 from app.utils.session_manager import SessionManager
 from app.utils.doctor_session_manager import DoctorSessionManager
 from app.utils.message_parser import MessageParser
+from app.utils.dedupe_cache import MessageDedupeCache
+from app.utils.worker_pool import MessageWorkerPool
+from app.utils.coalescing_window import CoalescingWindow
+from app.utils.event_log import event_log
+from app.utils.metrics import metrics
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, select_page, stream_page
+from app.utils.tracing import tracer, new_id
+from app.utils.session_store import InMemorySessionStore, RedisSessionStore
+from app.utils.session_journal import JournaledSessionStore
+from app.services.http_transport import HTTPTransport
+from app.services.outbound_dispatcher import OutboundDispatcher
 from app.services.whatsapp_service import WhatsAppService
+from app.services.doctor_fanout import DoctorFanout
+from app.services.shard_peers import ShardPeers
+from app.services.deadline_scheduler import DeadlineScheduler
 from app.services.api_service import ExternalAPIService
 from app.services.database_service import DatabaseService
+from app.services.backend_outbox import BackendOutbox
 from app.services.doctor_service import DoctorService
 from app.services.conversation_service import ConversationService
 from app.services.doctor_conversation_service import DoctorConversationService
@@ -26,24 +48,46 @@ from app.services.doctor_conversation_service import DoctorConversationService
 settings.validate()
 
 # Initialize services
-session_manager = SessionManager()
-doctor_session_manager = DoctorSessionManager()
-whatsapp_service = WhatsAppService()
-api_service = ExternalAPIService()
-database_service = DatabaseService()
-doctor_service = DoctorService()
+# Redis lets several workers/replicas share sessions; memory is single-process,
+# journaled to disk when SESSION_JOURNAL_DIR is set so restarts keep sessions
+if settings.SESSION_STORE_BACKEND == "redis":
+    session_store = RedisSessionStore.from_settings()
+elif settings.SESSION_JOURNAL_DIR:
+    session_store = JournaledSessionStore.from_settings()
+else:
+    session_store = InMemorySessionStore()
+session_manager = SessionManager.from_settings(store=session_store)
+doctor_session_manager = DoctorSessionManager(store=session_store)
+http_transport = HTTPTransport.from_settings()
+outbound_dispatcher = OutboundDispatcher.from_settings()
+whatsapp_service = WhatsAppService(transport=http_transport, dispatcher=outbound_dispatcher)
+api_service = ExternalAPIService(transport=http_transport)
+database_service = DatabaseService(transport=http_transport)
+backend_outbox = BackendOutbox.from_settings(database_service)
+doctor_fanout = DoctorFanout.from_settings()
+doctor_service = DoctorService(transport=http_transport, fanout=doctor_fanout)
+# Set by shard_front.py when this process is one of several sharded workers
+shard_peers = ShardPeers.from_settings()
+# Case escalations, review timeouts and reminders; kept in the session store when it is durable
+deadline_scheduler = DeadlineScheduler.from_settings(store=session_store, owns=shard_peers.is_local)
 conversation_service = ConversationService(
     session_manager=session_manager,
     whatsapp_service=whatsapp_service,
     api_service=api_service,
     database_service=database_service,
-    doctor_service=doctor_service
+    doctor_service=doctor_service,
+    doctor_fanout=doctor_fanout,
+    shard_peers=shard_peers,
+    backend_outbox=backend_outbox,
+    deadlines=deadline_scheduler
 )
 doctor_conversation_service = DoctorConversationService(
     doctor_session_manager=doctor_session_manager,
     whatsapp_service=whatsapp_service,
     doctor_service=doctor_service,
-    patient_session_manager=session_manager
+    patient_session_manager=session_manager,
+    shard_peers=shard_peers,
+    deadlines=deadline_scheduler
 )
 
 # Initialize FastAPI app
@@ -54,6 +98,10 @@ app = FastAPI(
 )
 
 
+WEBHOOK_SECONDS = metrics.histogram("webhook_seconds", "Webhook request handling until Meta gets its reply")
+MESSAGE_SECONDS = metrics.histogram("message_handling_seconds", "Processing of one inbound message by a worker")
+
+
 async def route_message(sender_phone: str, text_content: str) -> None:
     """Route incoming messages to the appropriate service (doctor or patient).
     
@@ -63,28 +111,124 @@ async def route_message(sender_phone: str, text_content: str) -> None:
     """
     # Check if this is a doctor registration attempt
     if text_content.lower().strip() == "doctor":
-        print(f"[DOCTOR_REGISTRATION] Processing doctor registration for {sender_phone}")
+        event_log.emit("INBOUND", "route", logging.DEBUG, user=sender_phone, to="doctor_registration")
         await doctor_conversation_service.process_doctor_message(sender_phone, text_content)
         return
     
     # Check if sender is already a registered doctor
     if doctor_session_manager.is_registered_doctor(sender_phone):
-        print(f"[DOCTOR_MESSAGE] Processing message from registered doctor {sender_phone}")
+        event_log.emit("INBOUND", "route", logging.DEBUG, user=sender_phone, to="doctor")
         await doctor_conversation_service.process_doctor_message(sender_phone, text_content)
         return
     
     # Check if sender has a pending doctor registration
     doctor_session = doctor_session_manager.get_doctor_session(sender_phone)
     if doctor_session:
-        print(f"[DOCTOR_PENDING] Processing message from pending doctor {sender_phone}")
+        event_log.emit("INBOUND", "route", logging.DEBUG, user=sender_phone, to="pending_doctor")
         await doctor_conversation_service.process_doctor_message(sender_phone, text_content)
         return
     
     # Default to patient flow
-    print(f"[PATIENT_MESSAGE] Processing message from patient {sender_phone}")
+    event_log.emit("INBOUND", "route", logging.DEBUG, user=sender_phone, to="patient")
     await conversation_service.process_user_message(sender_phone, text_content)
 
 
+async def handle_message(sender_phone: str, text_content: str) -> None:
+    """Route a message with the sender's sessions synced to the session store.
+    
+    Args:
+        sender_phone: Phone number of the sender
+        text_content: The message content
+    """
+    await asyncio.gather(
+        session_manager.hydrate(sender_phone),
+        doctor_session_manager.hydrate(sender_phone)
+    )
+    try:
+        with MESSAGE_SECONDS.time(), tracer.span("message.handle"):
+            # Replies to one message go out merged per recipient
+            async with whatsapp_service.batching():
+                await route_message(sender_phone, text_content)
+    finally:
+        await session_manager.flush()
+        await doctor_session_manager.flush()
+        await deadline_scheduler.flush()
+
+
+def is_answer_fragment(sender_phone: str, text_content: str) -> bool:
+    """Whether a message may be held and merged with the sender's next ones.
+    
+    Only patients' questionnaire answers are; doctor registration and
+    doctors' messages are routed as they arrive.
+    """
+    if text_content.lower().strip() == "doctor" or doctor_session_manager.get_doctor_session(sender_phone):
+        return False
+    return conversation_service.is_collecting_answers(sender_phone)
+
+
+# Background workers that run handle_message off the webhook request path
+worker_pool = MessageWorkerPool(
+    handler=handle_message,
+    concurrency=settings.WORKER_CONCURRENCY,
+    max_queue_size=settings.WORKER_QUEUE_MAXSIZE,
+    window=CoalescingWindow.from_settings(applies=is_answer_fragment)
+)
+
+
+# Drops webhook redeliveries before any session or outbound work happens
+dedupe_cache = MessageDedupeCache(
+    ttl_seconds=settings.DEDUPE_TTL_SECONDS,
+    max_entries=settings.DEDUPE_MAX_ENTRIES,
+    persist_path=settings.shard_path(settings.DEDUPE_PERSIST_PATH)
+)
+
+
+def count_sessions_by_state():
+    """Count this worker's cached patient sessions per state."""
+    counts = {(state.value,): 0 for state in SessionState}
+    for session in session_manager.sessions.values():
+        counts[(session.state.value,)] += 1
+    return counts
+
+
+# Gauges are read when /metrics is scraped; nothing is updated per request
+metrics.gauge("sessions", "Patient sessions held by this worker", count_sessions_by_state, ("state",))
+metrics.gauge("active_doctors", "Active doctors held by this worker", lambda: len(doctor_session_manager.active_index))
+metrics.gauge("worker_queue_depth", "Messages waiting for a worker", lambda: worker_pool.mailboxes.pending)
+metrics.gauge(
+    "outbound_queued", "WhatsApp sends waiting in the dispatcher",
+    lambda: {(lane,): depth for lane, depth in outbound_dispatcher.get_stats()["queued_by_priority"].items()},
+    ("priority",)
+)
+metrics.gauge(
+    "deadlines_pending", "Deadlines waiting to fire",
+    lambda: {(kind,): count for kind, count in deadline_scheduler.get_stats()["pending_by_kind"].items()},
+    ("kind",)
+)
+metrics.gauge("backend_outbox_depth", "Diagnostic records not yet stored", lambda: backend_outbox.get_stats()["depth"])
+metrics.gauge(
+    "backend_outbox_oldest_age_seconds", "Age of the oldest undelivered diagnostic record",
+    lambda: backend_outbox.get_stats()["oldest_age_seconds"]
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Restore sessions, deadlines, the dedupe cache and the backend outbox, then start the background tasks and message workers."""
+    if isinstance(session_store, JournaledSessionStore):
+        session_store.restore()
+        await session_manager.refresh()
+        await doctor_session_manager.refresh()
+    await deadline_scheduler.restore()
+    deadline_scheduler.start()
+    dedupe_cache.load()
+    backend_outbox.load()
+    backend_outbox.start()
+    session_manager.start_sweeper(settings.SESSION_SWEEP_INTERVAL)
+    outbound_dispatcher.start()
+    worker_pool.start()
+
+
 @app.get("/")
 @app.get("/webhook")
 async def verify_webhook(
@@ -104,34 +248,103 @@ async def verify_webhook(
 @app.post("/")
 @app.post("/webhook")
 async def receive_webhook(request: Request):
-    """Receive and process WhatsApp webhook messages."""
-    data = await request.json()
-    print("[INBOUND]", json.dumps(data, ensure_ascii=False))
+    """Receive WhatsApp webhook messages and queue them for processing.
+
+    Messages are handled by the background worker pool so Meta gets its 200
+    right away instead of waiting on the diagnosis API and backend calls.
+    """
+    with WEBHOOK_SECONDS.time():
+        data = await request.json()
+        event_log.emit("INBOUND", "webhook", payload=data)
     
-    try:
-        for entry in data.get("entry", []):
-            for change in entry.get("changes", []):
-                value = change.get("value", {})
-                messages = value.get("messages", [])
+        rejected = 0
+        try:
+            for entry in data.get("entry", []):
+                for change in entry.get("changes", []):
+                    value = change.get("value", {})
+                    messages = value.get("messages", [])
                 
-                if not messages:
-                    continue
+                    if not messages:
+                        continue
                 
-                for message in messages:
-                    sender_phone = message.get("from")
-                    text_content = MessageParser.extract_text_from_message(message)
+                    for message in messages:
+                        message_id = message.get("id")
+                        if message_id and dedupe_cache.is_duplicate(message_id):
+                            event_log.emit("INBOUND", "duplicate", logging.DEBUG, message_id=message_id)
+                            continue
+                    
+                        sender_phone = message.get("from")
+                        text_content = MessageParser.extract_text_from_message(message)
+                    
+                        if text_content:  # Only process if we have text
+                            # Each message starts a trace that the worker handling it continues
+                            with tracer.span("webhook.message", trace_id=new_id(), message_id=message_id):
+                                queued = worker_pool.submit(sender_phone, text_content)
+                            if not queued:
+                                # Not remembered, so Meta's redelivery gets processed
+                                rejected += 1
+                                continue
                     
-                    if text_content:  # Only process if we have text
-                        print(f"[MESSAGE] from={sender_phone} text={text_content!r}")
-                        
-                        # Route message to appropriate service
-                        await route_message(sender_phone, text_content)
+                        if message_id:
+                            dedupe_cache.add(message_id)
         
-        return PlainTextResponse("OK", status_code=200)
+            if rejected:
+                # Ask Meta to redeliver later instead of silently dropping messages
+                return PlainTextResponse("BUSY", status_code=503)
+            return PlainTextResponse("OK", status_code=200)
     
-    except Exception as e:
-        print("[ERROR]", repr(e))
-        return PlainTextResponse("ERROR", status_code=200)
+        except Exception as e:
+            event_log.emit("INBOUND", "webhook_failed", logging.ERROR, error=repr(e))
+            return PlainTextResponse("ERROR", status_code=200)
+
+
+if shard_peers.enabled:
+    # Calls from peer workers for conversations this worker owns. Only
+    # registered when sharded, where workers listen on unix sockets only.
+
+    @app.post("/internal/doctors/match")
+    async def match_shard_doctors(request: Request):
+        """Match this worker's active doctors against the backend directory."""
+        data = await request.json()
+        phones = frozenset(data.get("phones", []))
+        await doctor_session_manager.hydrate_many(phones)
+        matched = doctor_session_manager.match_active_doctors(phones)
+        least_loaded = doctor_session_manager.least_loaded_doctors(
+            phones, data.get("limit", 0), data.get("exclude", ())
+        )
+        return {
+            "active": len(doctor_session_manager.active_index),
+            "matched": [doctor.phone_number for doctor in matched],
+            "least_loaded": [[key, doctor.phone_number] for key, doctor in least_loaded]
+        }
+
+    @app.post("/internal/doctors/new-case")
+    async def assign_shard_case(request: Request):
+        """Assign a case to a doctor owned by this worker."""
+        data = await request.json()
+        doctor_phone = data["doctor_phone"]
+        await doctor_session_manager.hydrate(doctor_phone)
+        try:
+            notified = await doctor_conversation_service.notify_doctor_of_new_case(
+                doctor_phone, data["patient_phone"]
+            )
+        finally:
+            await doctor_session_manager.flush()
+            await deadline_scheduler.flush()
+        return {"notified": notified}
+
+    @app.post("/internal/patients/decision")
+    async def record_shard_decision(request: Request):
+        """Record a specialist decision on a patient owned by this worker."""
+        data = await request.json()
+        try:
+            updated = await doctor_conversation_service.record_patient_decision(
+                data["patient_phone"], data["decision"]
+            )
+        finally:
+            await session_manager.flush()
+            await deadline_scheduler.flush()
+        return {"updated": updated}
 
 
 @app.get("/send-test")
@@ -144,32 +357,83 @@ async def send_test_message(to: str, text: str = "Hola desde FastAPI 👋"):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/sessions")
-async def get_all_sessions():
-    """Get all active sessions (for debugging)."""
-    sessions = session_manager.get_all_sessions()
+def listing_filter(state_enum, state: Optional[str], active_since: Optional[datetime], active_before: Optional[datetime]):
+    """Build the ``keep`` predicate of a debug listing from its query filters."""
+    states = None
+    if state:
+        try:
+            states = {state_enum(value.strip()) for value in state.split(",") if value.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown state in {state!r}")
+    since = to_epoch(active_since) if active_since else None
+    before = to_epoch(active_before) if active_before else None
+
+    def keep(session) -> bool:
+        return (
+            (states is None or session.state in states) and
+            (since is None or session.last_activity_ts >= since) and
+            (before is None or session.last_activity_ts < before)
+        )
+    return keep
+
+
+def render_session(session) -> dict:
     return {
-        phone: {
-            "current_question": session.current_question_index,
-            "state": session.state.value,
-            "answers_count": len(session.answers),
-            "last_activity": session.last_activity.isoformat(),
-            "first_question_asked": session.first_question_asked,
-            "consent_given": session.consent_given,
-            "greeting_sent": session.greeting_sent,
-            "followup_questions_count": len(session.followup_questions),
-            "current_followup_index": session.current_followup_index,
-            "followup_answers_count": len(session.followup_answers),
-            "has_diagnostic_support": session.diagnostic_support is not None,
-            "specialists_notified_count": len(session.specialists_notified),
-            "specialist_responses_count": len(session.specialist_responses),
-            "final_specialist_decision": session.final_specialist_decision,
-            "patient_notified_of_decision": session.patient_notified_of_decision
-        }
-        for phone, session in sessions.items()
+        "current_question": session.current_question_index,
+        "state": session.state.value,
+        "answers_count": len(session.answers),
+        "last_activity": session.last_activity.isoformat(),
+        "first_question_asked": session.first_question_asked,
+        "consent_given": session.consent_given,
+        "greeting_sent": session.greeting_sent,
+        "followup_questions_count": len(session.followup_questions),
+        "current_followup_index": session.current_followup_index,
+        "followup_answers_count": len(session.followup_answers),
+        "has_diagnostic_support": session.diagnostic_support is not None,
+        "specialists_notified_count": len(session.specialists_notified),
+        "specialist_responses_count": len(session.specialist_responses),
+        "final_specialist_decision": session.final_specialist_decision,
+        "patient_notified_of_decision": session.patient_notified_of_decision,
+        "urgent_alert_sent": session.urgent_alert_sent
     }
 
 
+def render_doctor(session) -> dict:
+    return {
+        "state": session.state.value,
+        "registration_date": session.registration_date.isoformat(),
+        "last_activity": session.last_activity.isoformat(),
+        "cases_reviewed_count": len(session.cases_reviewed),
+        "current_reviewing": session.current_reviewing_patient,
+        "is_active": session.is_active()
+    }
+
+
+@app.get("/healthz")
+async def health_check():
+    """Liveness check for container health checks; constant time."""
+    if not worker_pool.is_running:
+        return JSONResponse({"status": "stopped"}, status_code=503)
+    return {"status": "ok"}
+
+
+@app.get("/sessions")
+async def get_all_sessions(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    state: Optional[str] = Query(None, description="Comma-separated session states"),
+    active_since: Optional[datetime] = None,
+    active_before: Optional[datetime] = None
+):
+    """Get one page of sessions ordered by phone number (for debugging).
+
+    Pass ``next_cursor`` from the response as ``cursor`` to get the next page.
+    """
+    keep = listing_filter(SessionState, state, active_since, active_before)
+    page, next_cursor = select_page(session_manager.sessions.items(), cursor, limit, keep)
+    return StreamingResponse(stream_page(page, render_session, next_cursor), media_type="application/json")
+
+
 @app.get("/sessions/{phone_number}")
 async def get_session_details(phone_number: str):
     """Get detailed information about a specific session."""
@@ -180,19 +444,17 @@ async def get_session_details(phone_number: str):
 
 
 @app.get("/doctors")
-async def get_all_doctors():
-    """Get all registered doctors and their status."""
-    doctors = {}
-    for phone, session in doctor_session_manager.doctor_sessions.items():
-        doctors[phone] = {
-            "state": session.state.value,
-            "registration_date": session.registration_date.isoformat(),
-            "last_activity": session.last_activity.isoformat(),
-            "cases_reviewed_count": len(session.cases_reviewed),
-            "current_reviewing": session.current_reviewing_patient,
-            "is_active": session.is_active()
-        }
-    return doctors
+async def get_all_doctors(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    state: Optional[str] = Query(None, description="Comma-separated doctor states"),
+    active_since: Optional[datetime] = None,
+    active_before: Optional[datetime] = None
+):
+    """Get one page of registered doctors and their status, ordered by phone number."""
+    keep = listing_filter(DoctorSessionState, state, active_since, active_before)
+    page, next_cursor = select_page(doctor_session_manager.doctor_sessions.items(), cursor, limit, keep)
+    return StreamingResponse(stream_page(page, render_doctor, next_cursor), media_type="application/json")
 
 
 @app.get("/doctors/{phone_number}")
@@ -222,10 +484,81 @@ async def get_active_doctors():
     }
 
 
+@app.get("/worker-pool")
+async def get_worker_pool_stats():
+    """Get background worker pool queue depth and counters."""
+    return {
+        **worker_pool.get_stats(),
+        "dedupe": dedupe_cache.get_stats(),
+        "shard": shard_peers.get_stats(),
+        "session_store": {
+            "backend": settings.SESSION_STORE_BACKEND,
+            "patients": session_manager.get_stats(),
+            "doctors": doctor_session_manager.sync.get_stats(),
+            **({"journal": session_store.journal.get_stats()}
+               if isinstance(session_store, JournaledSessionStore) else {})
+        }
+    }
+
+
+@app.get("/http-pool")
+async def get_http_pool_stats():
+    """Get shared HTTP connection pool utilisation per destination host."""
+    return {
+        **http_transport.get_stats(),
+        "diagnosis_api": {
+            **api_service.get_stats(),
+            "speculation": conversation_service.speculation.get_stats()
+        }
+    }
+
+
+@app.get("/outbound")
+async def get_outbound_stats():
+    """Get outbound send queue depth per priority lane, retry counters, doctor alerts and assignment, and the backend outbox."""
+    return {
+        **outbound_dispatcher.get_stats(),
+        "urgent_alerts": conversation_service.risk_classifier.get_stats(),
+        "case_assignment": conversation_service.case_assignment.get_stats(),
+        "backend_outbox": backend_outbox.get_stats()
+    }
+
+
+@app.get("/deadlines")
+async def get_deadlines(subject: Optional[str] = None):
+    """Get pending deadlines per kind and scheduler counters, or the deadlines pending for one phone number."""
+    if subject is None:
+        return deadline_scheduler.get_stats()
+    pending = [
+        deadline_scheduler.get(kind, subject)
+        for kind in (CASE_ESCALATION, APPROVAL_WAIT, DOCTOR_REVIEW, PATIENT_NUDGE)
+    ]
+    return {
+        "subject": subject,
+        "deadlines": [
+            {
+                "kind": deadline.kind,
+                "due": from_epoch(deadline.due_ts).isoformat(),
+                "payload": deadline.payload
+            }
+            for deadline in pending if deadline is not None
+        ]
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get latency histograms, gauges and counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.delete("/sessions/{phone_number}")
 async def reset_session(phone_number: str):
     """Reset a user's session."""
+    await session_manager.hydrate(phone_number)
+    conversation_service.speculation.discard(phone_number)
     old_session = session_manager.reset_session(phone_number)
+    await session_manager.flush()
     if old_session:
         return {
             "status": f"Session reset for {phone_number}",
@@ -241,10 +574,25 @@ async def reset_session(phone_number: str):
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
+    # Finish queued conversations before closing the HTTP clients they use
+    await worker_pool.stop(drain_timeout=settings.WORKER_DRAIN_TIMEOUT)
+    dedupe_cache.save()
+    await deadline_scheduler.stop()
+    await doctor_fanout.drain()
+    await session_manager.stop_sweeper()
+    await session_manager.flush()
+    await doctor_session_manager.flush()
+    await session_store.close()
+    await backend_outbox.stop()
+    await outbound_dispatcher.stop()
     await whatsapp_service.close()
     await api_service.close()
     await database_service.close()
     await doctor_service.close()
+    await shard_peers.close()
+    await http_transport.close()
+    event_log.stop()
+    tracer.exporter.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for patient sessions.
+
+Builds the same 100k completed sessions twice, once with the previous plain
+dataclass models (datetime timestamps, per-instance __dict__, un-interned
+question ids) and once with the current slotted models, and reports the
+bytes allocated per session for each.
+
+Usage: python scripts/benchmark-session-memory.py [SESSIONS]
+"""
+
+import gc
+import sys
+import os
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.questions import MENTAL_HEALTH_QUESTIONS
+from app.models.question import Answer
+from app.models.session import SessionState, UserSession
+
+
+# --- Previous representation (kept here only for comparison) -----------------
+
+@dataclass
+class LegacyAnswer:
+    question_id: str
+    value: str
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class LegacyUserSession:
+    phone_number: str
+    current_question_index: int = 0
+    answers: List[LegacyAnswer] = field(default_factory=list)
+    state: SessionState = SessionState.WAITING_FOR_CONSENT
+    created_at: datetime = field(default_factory=datetime.now)
+    last_activity: datetime = field(default_factory=datetime.now)
+    first_question_asked: bool = False
+    consent_given: bool = False
+    greeting_sent: bool = False
+    followup_questions: List[str] = field(default_factory=list)
+    current_followup_index: int = 0
+    followup_answers: List[LegacyAnswer] = field(default_factory=list)
+    diagnostic_support: Optional[Dict[str, Any]] = None
+    specialists_notified: List[str] = field(default_factory=list)
+    specialist_responses: List[Dict[str, Any]] = field(default_factory=list)
+    final_specialist_decision: Optional[str] = None
+    patient_notified_of_decision: bool = False
+
+
+FOLLOWUP_QUESTIONS = [
+    "¿Desde hace cuánto tiempo te sientes así?",
+    "¿Cómo ha afectado esto tu sueño y tu apetito?",
+    "¿Cuentas con una red de apoyo cercana?"
+]
+
+
+def build_session(index: int, session_cls, answer_cls):
+    """Build one session that went through the whole questionnaire."""
+    # Phones and answers arrive as fresh strings from each webhook payload
+    phone = f"5730{index:08d}"
+    session = session_cls(phone_number=phone)
+    session.state = SessionState.WAITING_FOR_DOCTOR_APPROVAL
+    session.consent_given = session.greeting_sent = session.first_question_asked = True
+
+    for question in MENTAL_HEALTH_QUESTIONS:
+        session.answers.append(answer_cls(question_id=question.id, value=f"respuesta {index} a {question.id}"))
+        session.current_question_index += 1
+
+    session.followup_questions = list(FOLLOWUP_QUESTIONS)
+    for followup_index in range(len(FOLLOWUP_QUESTIONS)):
+        session.followup_answers.append(
+            answer_cls(question_id=f"followup_{followup_index + 1}", value=f"seguimiento {index}-{followup_index}")
+        )
+        session.current_followup_index += 1
+
+    session.diagnostic_support = {
+        "pre-diagnosis": f"Posible trastorno de ansiedad ({index})",
+        "comments": "Se recomienda valoración por especialista.",
+        "score": "MEDIA"
+    }
+    session.specialists_notified = ["573000000001", "573000000002"]
+    return session
+
+
+def measure(count: int, session_cls, answer_cls) -> int:
+    """Return the bytes allocated to keep ``count`` sessions alive."""
+    gc.collect()
+    tracemalloc.start()
+    sessions = {}
+    for index in range(count):
+        session = build_session(index, session_cls, answer_cls)
+        sessions[session.phone_number] = session
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return allocated
+
+
+def main():
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print("🧠 SESSION MEMORY BENCHMARK")
+    print("=" * 50)
+    print(f"Sessions: {count:,} (9 answers, 3 follow-ups, diagnosis each)")
+
+    before = measure(count, LegacyUserSession, LegacyAnswer)
+    after = measure(count, UserSession, Answer)
+
+    print(f"\n{'':<22}{'total MB':>12}{'bytes/session':>16}")
+    print(f"{'Before (dataclasses)':<22}{before / 2**20:>12.1f}{before / count:>16,.0f}")
+    print(f"{'After (slotted)':<22}{after / 2**20:>12.1f}{after / count:>16,.0f}")
+    print(f"\n✅ {100 * (1 - after / before):.1f}% less memory per session")
+
+
+if __name__ == "__main__":
+    main()
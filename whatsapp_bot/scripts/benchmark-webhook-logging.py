@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Webhook throughput benchmark with structured logging on and off.
+
+Posts WhatsApp delivery-status webhooks (the bulk of Meta's traffic, and
+each one logged as an INBOUND event) to the app in-process and reports
+requests per second for each logging setup, best of ROUNDS. Log lines go
+to a temporary file, as they would to a container log pipe. It also times
+the caller-side cost of one event against the previous
+``print(json.dumps(..., indent=2))``.
+
+Needs the usual WHATSAPP_TOKEN, PHONE_NUMBER_ID and VERIFY_TOKEN settings.
+
+Usage: python scripts/benchmark-webhook-logging.py [REQUESTS]
+"""
+
+import asyncio
+import contextlib
+import json
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from main import app
+from app.utils.event_log import event_log
+
+
+CONCURRENCY = 50
+ROUNDS = 3  # Setups are interleaved per round and the best rate is kept
+
+SETUPS = [
+    ("logging off", {"level": "OFF"}),
+    ("json, payload redacted", {"payload_mode": "redact"}),
+    ("json, payload truncated", {"payload_mode": "truncate"}),
+    ("json, payload hashed", {"payload_mode": "hash"}),
+    ("json, full payload", {"payload_mode": "full"}),
+    ("json, INBOUND sampled 10%", {"sample_rates": {"INBOUND": 0.1}}),
+]
+
+
+def status_webhook(i: int) -> dict:
+    """A delivery receipt webhook like Meta sends for every outbound message."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                    "statuses": [{
+                        "id": f"wamid.HBgLMTY1MDM4Nzk0MzkVAgARGBI{i:012d}",
+                        "status": "delivered",
+                        "timestamp": "1750263773",
+                        "recipient_id": f"5730{i % 10000:08d}",
+                        "conversation": {"id": "b1b9a1e5c8e2f3f4", "origin": {"type": "service"}},
+                        "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+async def run_requests(client: httpx.AsyncClient, requests: int) -> float:
+    """Post ``requests`` webhooks with CONCURRENCY in flight; returns requests per second."""
+    payloads = [status_webhook(i) for i in range(requests)]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def post(payload: dict) -> None:
+        async with semaphore:
+            response = await client.post("/webhook", json=payload)
+            assert response.status_code == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(post(payload) for payload in payloads))
+    return requests / (time.perf_counter() - started)
+
+
+def time_per_event(emit, events: int = 2000) -> float:
+    """Microseconds the caller spends per logged event."""
+    payload = status_webhook(0)
+    started = time.perf_counter()
+    for _ in range(events):
+        emit(payload)
+    return (time.perf_counter() - started) * 1e6 / events
+
+
+async def main():
+    """Main benchmark function."""
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print("📊 WEBHOOK LOGGING BENCHMARK")
+    print("=" * 60)
+    print(f"Requests: {requests}, concurrency: {CONCURRENCY}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "events.log")
+        with open(log_path, "w", encoding="utf-8") as log_file:
+            event_log._sink.setStream(log_file)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+                await run_requests(client, 200)  # Warm up
+                rates = {name: 0.0 for name, _ in SETUPS}
+                sizes = {}
+                for _ in range(ROUNDS):
+                    for name, options in SETUPS:
+                        event_log.configure(**options)
+                        log_file.truncate(0)
+                        log_file.seek(0)
+                        rates[name] = max(rates[name], await run_requests(client, requests))
+                        event_log.stop()  # Wait for the writer so sizes are complete
+                        sizes[name] = os.path.getsize(log_path) / 1e6
+
+                print(f"\n{'Setup':<30} {'req/s':>10} {'log MB':>10}")
+                print("-" * 52)
+                for name, _ in SETUPS:
+                    print(f"{name:<30} {rates[name]:>10.0f} {sizes[name]:>10.2f}")
+
+            print("\n⏱️  Caller-side cost per event (event loop time):")
+            event_log.configure()
+            with contextlib.redirect_stdout(log_file):
+                legacy = time_per_event(lambda payload: print("[INBOUND]", json.dumps(payload, ensure_ascii=False, indent=2)))
+            structured = time_per_event(lambda payload: event_log.emit("INBOUND", "webhook", payload=payload))
+            event_log.stop()
+            print(f"   print(json.dumps(indent=2)): {legacy:.1f}µs")
+            print(f"   event_log.emit:              {structured:.1f}µs")
+            print(f"   dropped on full queue:       {event_log.get_stats()['dropped']}")
+
+    print("\n" + "=" * 60)
+    print("✅ Benchmark complete")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test script for the diagnosis API circuit breaker, deadline and hedging.
+
+Runs ExternalAPIService against a fake diagnose-bot and checks that:
+- a down service opens the circuit and later requests fail fast
+- the circuit half-opens after the recovery timeout and closes on success
+- a cancelled half-open probe frees its slot, and a lost one expires
+- retries stop at the overall deadline
+- a slow request is hedged once p95 latency is known, but only to endpoints
+  allowed to be sent twice
+
+Usage: python scripts/test-api-circuit-breaker.py
+"""
+
+import asyncio
+import datetime
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from app.models.session import UserSession
+from app.services.api_service import HEDGE_MIN_SAMPLES, ExternalAPIService
+from app.services.http_transport import HTTPTransport
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+class FakeDiagnoseBot:
+    """Mock transport handler whose behaviour can be switched per test."""
+
+    def __init__(self):
+        self.mode = "up"
+        self.delays = []
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.mode == "down":
+            raise httpx.ConnectError("connection refused", request=request)
+        delay = self.delays.pop(0) if self.delays else 0.0
+        await asyncio.sleep(delay)
+        response = httpx.Response(200, json={"questions": ["¿Cómo dormiste?"]})
+        response.elapsed = datetime.timedelta(seconds=delay)  # Set by the network stream in real use
+        return response
+
+
+def build_service(bot: FakeDiagnoseBot, **options) -> ExternalAPIService:
+    transport = HTTPTransport()
+    transport.client = httpx.AsyncClient(transport=httpx.MockTransport(bot))
+    service = ExternalAPIService(
+        transport=transport,
+        breaker=CircuitBreaker("diagnose-bot", failure_threshold=3, recovery_timeout=0.5)
+    )
+    for name, value in options.items():
+        setattr(service, name, value)
+    return service
+
+
+async def test_circuit_opens_and_recovers():
+    print("\n🔹 Circuit opens when diagnose-bot is down")
+    bot = FakeDiagnoseBot()
+    service = build_service(bot)
+    session = UserSession(phone_number="573001112233")
+    bot.mode = "down"
+
+    first = await service.send_data(session)
+    assert first["final_error_type"] == "ConnectError" and first["retry_attempts"] == 3
+    assert service.breaker.state == CircuitState.OPEN
+
+    started = time.perf_counter()
+    calls = bot.calls
+    second = await service.send_data(session)
+    elapsed = time.perf_counter() - started
+    assert second["final_error_type"] == "CircuitOpenError" and bot.calls == calls
+    print(f"   ✅ Next patient failed fast in {elapsed * 1000:.1f}ms without calling the API")
+
+    bot.mode = "up"
+    await asyncio.sleep(0.6)
+    assert service.breaker.state == CircuitState.HALF_OPEN
+    result = await service.send_data(session)
+    assert "questions" in result and service.breaker.state == CircuitState.CLOSED
+    print("   ✅ Half-open probe succeeded and closed the circuit")
+    await service.close()
+
+
+async def test_cancelled_probe():
+    print("\n🔹 Cancelled half-open probe")
+    bot = FakeDiagnoseBot()
+    service = build_service(bot)
+    session = UserSession(phone_number="573001112233")
+    bot.mode = "down"
+    await service.send_data(session)
+    assert service.breaker.state == CircuitState.OPEN
+
+    bot.mode = "up"
+    await asyncio.sleep(0.6)
+    bot.delays = [5.0]
+    probe = asyncio.create_task(service.send_data(session))
+    await asyncio.sleep(0.05)
+    probe.cancel()  # Like a discarded speculative /questions request
+    await asyncio.gather(probe, return_exceptions=True)
+    assert service.breaker.state == CircuitState.HALF_OPEN
+
+    result = await service.send_data(session)
+    assert "questions" in result and service.breaker.state == CircuitState.CLOSED, result
+    print("   ✅ Cancelled probe gave its slot back; the next request closed the circuit")
+
+    # A probe that never reports back at all expires after the half-open timeout
+    now = [0.0]
+    breaker = CircuitBreaker("lost-probe", failure_threshold=1, recovery_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10
+    assert breaker.before_call() is True and breaker.state == CircuitState.HALF_OPEN
+    try:
+        breaker.before_call()
+        assert False, "only one probe at a time"
+    except CircuitOpenError:
+        pass
+    now[0] = 20
+    assert breaker.before_call() is True and breaker.get_stats()["probes_expired"] == 1
+    print("   ✅ Lost probe expired after the half-open timeout")
+    await service.close()
+
+
+async def test_overall_deadline():
+    print("\n🔹 Overall deadline")
+    bot = FakeDiagnoseBot()
+    service = build_service(bot, deadline=0.3)
+    bot.delays = [5.0]
+
+    started = time.perf_counter()
+    result = await service.send_data(UserSession(phone_number="573001112233"))
+    elapsed = time.perf_counter() - started
+    assert "Timeout" in result["final_error_type"] and elapsed < 1.0, (result, elapsed)
+    print(f"   ✅ Gave up after {elapsed:.2f}s instead of retrying for minutes")
+    await service.close()
+
+
+async def test_hedged_request():
+    print("\n🔹 Hedged requests")
+    bot = FakeDiagnoseBot()
+    service = build_service(bot, hedge_enabled=True, hedge_min_delay=0.05)
+    session = UserSession(phone_number="573001112233")
+    bot.delays = [0.01] * HEDGE_MIN_SAMPLES
+    for _ in range(HEDGE_MIN_SAMPLES):
+        await service.send_data(session)
+
+    bot.delays = [0.3]
+    calls = bot.calls
+    result = await service.send_data(session)
+    assert "questions" in result and bot.calls == calls + 1 and service.stats["hedged"] == 0
+    print("   ✅ /questions is never hedged by default (a second copy would replace the session)")
+
+    service.hedge_endpoints = frozenset({"questions"})
+    bot.delays = [2.0, 0.01]  # Primary stalls, the hedge is fast
+    started = time.perf_counter()
+    result = await service.send_data(session)
+    elapsed = time.perf_counter() - started
+    assert "questions" in result and service.stats["hedge_wins"] == 1 and elapsed < 0.5
+    print(f"   ✅ Stalled request to an allowed endpoint hedged after p95, answered in {elapsed:.2f}s")
+    await service.close()
+
+
+async def main():
+    """Main test function."""
+    print("⚡ DIAGNOSIS API RESILIENCE TEST")
+    print("=" * 50)
+
+    await test_circuit_opens_and_recovers()
+    await test_cancelled_probe()
+    await test_overall_deadline()
+    await test_hedged_request()
+
+    print("\n" + "=" * 50)
+    print("🎉 DIAGNOSIS API RESILIENCE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -24,7 +24,7 @@ def test_timeout_configuration():
     api_service = ExternalAPIService()
     
     print("📋 TIMEOUT SETTINGS:")
-    timeout_config = api_service.http_client.timeout
+    timeout_config = api_service.transport.timeout_profiles["diagnosis"]
     print(f"   • Connect timeout: {timeout_config.connect}s")
     print(f"   • Read timeout: {timeout_config.read}s")
     print(f"   • Write timeout: {timeout_config.write}s")
@@ -33,6 +33,9 @@ def test_timeout_configuration():
     print(f"\n🔄 RETRY CONFIGURATION:")
     print(f"   • Max retries: {api_service.max_retries}")
     print(f"   • Exponential backoff: 1s, 2s, 4s")
+    print(f"   • Overall deadline: {api_service.deadline}s (all attempts and waits)")
+    print(f"   • Circuit breaker: opens after {api_service.breaker.failure_threshold} failures, "
+          f"probes again after {api_service.breaker.recovery_timeout}s")
     
     return api_service
 
@@ -118,7 +121,9 @@ def test_basic_analysis_logic():
     print("\n🔍 BASIC ANALYSIS LOGIC TEST")
     print("=" * 40)
     
+    from datetime import datetime
     from app.models.session import UserSession, Answer
+    from app.models.timestamps import to_epoch
     from app.models.session import SessionState
     
     # Create mock session with concerning answers
@@ -126,10 +131,10 @@ def test_basic_analysis_logic():
     
     # Add concerning answers
     concerning_answers = [
-        Answer(question_id="anxiety", value="Sí, frecuentemente", timestamp="2024-01-01T12:00:00"),
-        Answer(question_id="sadness", value="Sí, me siento deprimido", timestamp="2024-01-01T12:01:00"),
-        Answer(question_id="self_harm_thoughts", value="No", timestamp="2024-01-01T12:02:00"),
-        Answer(question_id="loss_of_interest", value="Sí, en algunas actividades", timestamp="2024-01-01T12:03:00")
+        Answer(question_id="anxiety", value="Sí, frecuentemente", answered_at=to_epoch(datetime.fromisoformat("2024-01-01T12:00:00"))),
+        Answer(question_id="sadness", value="Sí, me siento deprimido", answered_at=to_epoch(datetime.fromisoformat("2024-01-01T12:01:00"))),
+        Answer(question_id="self_harm_thoughts", value="No", answered_at=to_epoch(datetime.fromisoformat("2024-01-01T12:02:00"))),
+        Answer(question_id="loss_of_interest", value="Sí, en algunas actividades", answered_at=to_epoch(datetime.fromisoformat("2024-01-01T12:03:00")))
     ]
     
     mock_session.answers = concerning_answers
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the durable backend outbox.
+
+Runs BackendOutbox against a fake backend and checks that records survive
+a crash, are retried with backoff until the backend recovers, are delivered
+once per ``number`` (even when the same record is appended concurrently)
+and that rejected records are dead-lettered. Also checks that the default
+relative outbox path is resolved against the app directory.
+
+Usage: python scripts/test-backend-outbox.py
+"""
+
+import asyncio
+import datetime
+import json
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from app.config.settings import APP_DIR, settings
+from app.services.backend_outbox import BackendOutbox
+from app.services.database_service import DatabaseService
+from app.services.http_transport import HTTPTransport
+
+
+class FakeBackend:
+    """Stores records by ``number``; can be switched down or to reject some."""
+
+    def __init__(self):
+        self.down = False
+        self.stored = {}
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        payload = json.loads(request.content)
+        if self.down:
+            response = httpx.Response(503, text="maintenance")
+        elif not payload.get("pre_diagnosis"):
+            response = httpx.Response(422, json={"pre_diagnosis": ["required"]})
+        elif payload["number"] in self.stored:
+            response = httpx.Response(409, json={"number": ["already exists"]})
+        else:
+            self.stored[payload["number"]] = payload
+            response = httpx.Response(201, json={"id": len(self.stored)})
+        response.elapsed = datetime.timedelta(0)  # Set by the network stream in real use
+        return response
+
+
+def build_outbox(backend: FakeBackend, path: str) -> BackendOutbox:
+    transport = HTTPTransport()
+    transport.client = httpx.AsyncClient(transport=httpx.MockTransport(backend))
+    return BackendOutbox(DatabaseService(transport=transport), path=path, flush_interval=0.05, max_backoff=0.2)
+
+
+def record(number: str, pre_diagnosis: str = "Ansiedad moderada") -> dict:
+    return {"number": number, "initial_questions": "Q: ...", "llm_questions": "", "pre_diagnosis": pre_diagnosis,
+            "comments": "", "score": "MEDIA", "filled_doc": ""}
+
+
+async def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def main():
+    """Main test function."""
+    print("📮 BACKEND OUTBOX TEST")
+    print("=" * 50)
+
+    print("\n🔹 Outbox path")
+    assert settings.shard_path(settings.BACKEND_OUTBOX_PATH) == os.path.join(APP_DIR, "data", "backend-outbox.jsonl")
+    assert settings.shard_path("/var/lib/bot/outbox.jsonl") == "/var/lib/bot/outbox.jsonl"
+    print("   ✅ The default relative path is resolved against the app directory, not the working directory")
+    backend = FakeBackend()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "backend-outbox.jsonl")
+
+        print("\n🔹 Append is local and survives a crash")
+        backend.down = True
+        outbox = build_outbox(backend, path)
+        started = time.perf_counter()
+        for i in range(49):
+            await outbox.append(record(f"5730{i:08d}_20250101_120000"))
+        append_ms = (time.perf_counter() - started) * 1000 / 49
+        assert not await outbox.append(record("573000000000_20250101_120000"))
+        results = await asyncio.gather(*(outbox.append(record("573000000049_20250101_120000")) for _ in range(5)))
+        assert results.count(True) == 1, results
+        with open(path, encoding="utf-8") as f:
+            assert sum('"573000000049_20250101_120000"' in line for line in f) == 1
+        outbox._file.close()  # Crash before anything was delivered
+        print(f"   ✅ {append_ms:.2f}ms per append (fsynced), duplicate number skipped, concurrent duplicates written once")
+
+        print("\n🔹 Restart with the backend down, then recovery")
+        outbox = build_outbox(backend, path)
+        assert outbox.load() == 50
+        outbox.start()
+        await wait_for(lambda: outbox.stats["retries"] >= 50)
+        stats = outbox.get_stats()
+        assert stats["depth"] == 50 and stats["oldest_age_seconds"] >= 0
+        print(f"   Backend down: depth={stats['depth']}, oldest={stats['oldest_age_seconds']}s, retries={stats['retries']}")
+        backend.down = False
+        await wait_for(lambda: outbox.get_stats()["depth"] == 0)
+        assert len(backend.stored) == 50
+        print(f"   ✅ All 50 records delivered after recovery ({backend.requests} requests)")
+
+        print("\n🔹 Dedupe and dead letters")
+        backend.stored["573999999999_20250101_120000"] = record("573999999999_20250101_120000")
+        await outbox.append(record("573999999999_20250101_120000"))   # Backend already has it (409)
+        await outbox.append(record("573888888888_20250101_120000", pre_diagnosis=""))  # 422
+        await wait_for(lambda: outbox.get_stats()["depth"] == 0)
+        assert outbox.stats["dead_lettered"] == 1
+        with open(f"{path}.dead", encoding="utf-8") as f:
+            assert json.loads(f.readline())["key"] == "573888888888_20250101_120000"
+        print("   ✅ 409 counted as delivered, 422 moved to the dead-letter file")
+
+        await outbox.stop()
+        reloaded = build_outbox(backend, path)
+        assert reloaded.load() == 0
+        assert not await reloaded.append(record("573000000001_20250101_120000"))
+        print("   ✅ Nothing replayed after a clean restart; delivered numbers stay deduped")
+        await reloaded.stop()
+
+    print("\n" + "=" * 50)
+    print("🎉 BACKEND OUTBOX TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,6 +10,7 @@ from datetime import datetime
 from app.services.database_service import DatabaseService
 from app.models.session import UserSession
 from app.models.question import Answer
+from app.models.timestamps import to_epoch
 
 async def test_database_integration():
     """Test the database integration with sample data."""
@@ -19,7 +20,7 @@ async def test_database_integration():
     
     # Create a mock session with sample data
     session = UserSession(phone_number="+573213754760")
-    session.created_at = datetime.now()
+    session.created_ts = to_epoch(datetime.now())
     
     # Add sample answers (matching your mental health questions)
     sample_answers = [
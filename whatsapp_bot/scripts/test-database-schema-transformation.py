@@ -14,13 +14,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from datetime import datetime
 from app.models.session import UserSession, Answer
+from app.models.timestamps import to_epoch
 from app.services.database_service import DatabaseService
 
 def create_mock_session():
     """Create a mock session with the provided example data."""
     session = UserSession(
         phone_number="573226235226",
-        created_at=datetime(2024, 1, 15, 14, 30, 0)
+        created_ts=to_epoch(datetime(2024, 1, 15, 14, 30, 0))
     )
     
     # Add initial answers based on the provided example
@@ -28,47 +29,47 @@ def create_mock_session():
         Answer(
             question_id="name",
             value="Juan Garzon",
-            timestamp="2024-01-15T14:30:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:30:00"))
         ),
         Answer(
             question_id="age", 
             value="34",
-            timestamp="2024-01-15T14:31:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:31:00"))
         ),
         Answer(
             question_id="main_concern",
             value="El estrés de estar ya en los 30",
-            timestamp="2024-01-15T14:32:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:32:00"))
         ),
         Answer(
             question_id="anxiety",
             value="Últimamente si",
-            timestamp="2024-01-15T14:33:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:33:00"))
         ),
         Answer(
             question_id="sadness",
             value="Realmente las cosas que me divierten cada vez pierden más sentido y no logro animarme por nada",
-            timestamp="2024-01-15T14:34:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:34:00"))
         ),
         Answer(
             question_id="loss_of_interest",
             value="Patinar, montar a caballo, jugar fútbol, ya nada es lo mismo",
-            timestamp="2024-01-15T14:35:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:35:00"))
         ),
         Answer(
             question_id="hallucinations_meds",
             value="No todavía",
-            timestamp="2024-01-15T14:36:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:36:00"))
         ),
         Answer(
             question_id="self_harm_thoughts",
             value="No realmente",
-            timestamp="2024-01-15T14:37:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:37:00"))
         ),
         Answer(
             question_id="desired_outcome",
             value="Tener más paz con las cosas que vienen",
-            timestamp="2024-01-15T14:38:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:38:00"))
         )
     ]
     
@@ -84,12 +85,12 @@ def create_mock_session():
         Answer(
             question_id="followup_1",
             value="Aproximadamente desde hace 6 meses",
-            timestamp="2024-01-15T14:40:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:40:00"))
         ),
         Answer(
             question_id="followup_2", 
             value="Especialmente por las noches y cuando estoy solo",
-            timestamp="2024-01-15T14:41:00"
+            answered_at=to_epoch(datetime.fromisoformat("2024-01-15T14:41:00"))
         )
     ]
     
@@ -197,7 +198,7 @@ def test_unique_identifier():
     session1 = create_mock_session()
     session2 = create_mock_session()
     session2.phone_number = "573226235227"  # Different phone
-    session2.created_at = datetime(2024, 1, 15, 15, 30, 0)  # Different time
+    session2.created_ts = to_epoch(datetime(2024, 1, 15, 15, 30, 0))  # Different time
     
     db_service = DatabaseService()
     diagnostic_data = create_mock_diagnostic_data()
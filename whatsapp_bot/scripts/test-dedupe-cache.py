@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the webhook message id dedupe cache.
+
+Checks that a redelivered message id is dropped within the TTL and accepted
+again once it expires, that the cache forgets its oldest ids beyond its
+size limit, that unexpired ids survive a restart through the persistence
+file while expired ones do not, and that ids accepted since the last save
+survive a crash that never saved.
+"""
+
+import json
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.dedupe_cache import MessageDedupeCache
+
+
+def test_ttl():
+    cache = MessageDedupeCache(ttl_seconds=0.2)
+    assert not cache.is_duplicate("wamid.1")
+    cache.add("wamid.1")
+    assert cache.is_duplicate("wamid.1") and cache.is_duplicate("wamid.1")
+    assert not cache.is_duplicate("wamid.2")
+    time.sleep(0.25)
+    assert not cache.is_duplicate("wamid.1"), "expired ids are accepted again"
+    stats = cache.get_stats()
+    assert stats["entries"] == 0 and stats["duplicates_dropped"] == 2, stats
+    print("✅ Redeliveries within the TTL are dropped; expired ids are forgotten")
+
+
+def test_max_entries():
+    cache = MessageDedupeCache(ttl_seconds=60, max_entries=3)
+    for i in range(5):
+        cache.add(f"wamid.{i}")
+    assert [cache.is_duplicate(f"wamid.{i}") for i in range(5)] == [False, False, True, True, True]
+    assert cache.get_stats()["entries"] == 3
+    print("✅ Beyond max_entries the oldest ids are forgotten first")
+
+
+def test_persistence():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dedupe.json")
+        cache = MessageDedupeCache(ttl_seconds=60, persist_path=path)
+        cache.add("wamid.kept")
+        cache.save()
+
+        # An id that expired while the bot was down
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        stored["wamid.stale"] = time.time() - 1
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+
+        restarted = MessageDedupeCache(ttl_seconds=60, persist_path=path)
+        assert restarted.load() == 1
+        assert restarted.is_duplicate("wamid.kept") and not restarted.is_duplicate("wamid.stale")
+        assert MessageDedupeCache(persist_path=os.path.join(directory, "missing.json")).load() == 0
+    print("✅ Unexpired ids survive a restart; expired ones are not restored")
+
+
+def test_crash_without_save():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dedupe.json")
+        cache = MessageDedupeCache(ttl_seconds=60, max_entries=4, persist_path=path)
+        cache.add("wamid.saved")
+        cache.save()
+        for i in range(6):
+            cache.add(f"wamid.{i}")
+        # Killed mid-write: the last log line is cut short, and save() never runs
+        with open(cache.log_path, "a", encoding="utf-8") as f:
+            f.write('["wamid.torn", 17')
+
+        restarted = MessageDedupeCache(ttl_seconds=60, max_entries=4, persist_path=path)
+        assert restarted.load() == 4
+        assert all(restarted.is_duplicate(f"wamid.{i}") for i in range(2, 6))
+        assert not restarted.is_duplicate("wamid.torn")
+        with open(cache.log_path, "r", encoding="utf-8") as f:
+            assert len(f.readlines()) <= 5, "the log is compacted once it outgrows the cache"
+        assert not os.path.exists(f"{path}.tmp")
+    print("✅ Ids accepted since the last save survive a crash; a torn log line is skipped")
+
+
+def main():
+    """Main test function."""
+    print("🧪 DEDUPE CACHE TEST")
+    print("=" * 60)
+    test_ttl()
+    test_max_entries()
+    test_persistence()
+    test_crash_without_save()
+    print("\n" + "=" * 60)
+    print("✅ All dedupe cache tests passed")
+
+
+if __name__ == "__main__":
+    main()
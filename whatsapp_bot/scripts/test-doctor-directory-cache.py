@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test the stale-while-revalidate cache of the doctor phone directory.
+
+Runs DoctorService against a fake backend and checks that fresh lookups
+never reach the backend, that concurrent cold lookups share one request,
+that stale lookups answer from the cache while a background refresh
+revalidates it with If-None-Match (a 304 keeps the list), that a changed
+directory replaces the list and its normalized index, and that a failing
+backend keeps the last known list.
+
+Usage: python scripts/test-doctor-directory-cache.py
+"""
+
+import asyncio
+import datetime
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from app.services.doctor_service import DoctorService
+from app.services.http_transport import HTTPTransport
+
+
+class FakeDirectory:
+    """Serves the doctor directory with an ETag; can be changed or switched down."""
+
+    def __init__(self, phone_numbers):
+        self.phone_numbers = phone_numbers
+        self.version = 1
+        self.down = False
+        self.delay = 0.0
+        self.requests = []  # If-None-Match header of each request
+
+    def change(self, phone_numbers) -> None:
+        self.phone_numbers = phone_numbers
+        self.version += 1
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/doctors/phone-numbers/", request.url
+        self.requests.append(request.headers.get("If-None-Match"))
+        await asyncio.sleep(self.delay)
+        etag = f'"v{self.version}"'
+        if self.down:
+            response = httpx.Response(503, text="maintenance")
+        elif request.headers.get("If-None-Match") == etag:
+            response = httpx.Response(304)
+        else:
+            body = {"phone_numbers": self.phone_numbers, "count": len(self.phone_numbers)}
+            response = httpx.Response(200, json=body, headers={"ETag": etag})
+        response.elapsed = datetime.timedelta(0)  # Set by the network stream in real use
+        return response
+
+
+def build_service(directory: FakeDirectory, ttl: float, max_stale: float) -> DoctorService:
+    transport = HTTPTransport()
+    transport.client = httpx.AsyncClient(transport=httpx.MockTransport(directory))
+    service = DoctorService(transport=transport)
+    service.directory_ttl = ttl
+    service.directory_max_stale = max_stale
+    return service
+
+
+async def settle(service: DoctorService) -> None:
+    """Wait for a background refresh, if one is running."""
+    if service._directory_refresh is not None:
+        await service._directory_refresh
+
+
+async def test_cold_and_fresh():
+    print("\n🔹 Cold and fresh lookups")
+    directory = FakeDirectory(["+57 300 000 0001", "3000000002"])
+    directory.delay = 0.05
+    service = build_service(directory, ttl=60, max_stale=600)
+
+    results = await asyncio.gather(*(service.get_doctor_phone_numbers() for _ in range(10)))
+    assert all(result == ["+57 300 000 0001", "3000000002"] for result in results)
+    assert directory.requests == [None], directory.requests
+    print("   ✅ 10 concurrent cold lookups shared one backend request")
+
+    assert await service.get_normalized_doctor_phones() == frozenset({"573000000001", "573000000002"})
+    await service.get_doctor_phone_numbers()
+    assert len(directory.requests) == 1
+    print("   ✅ Fresh lookups are served from the cache, normalized once")
+
+
+async def test_stale_revalidation():
+    print("\n🔹 Stale-while-revalidate")
+    directory = FakeDirectory(["573000000001"])
+    service = build_service(directory, ttl=0.1, max_stale=600)
+    await service.get_doctor_phone_numbers()
+
+    await asyncio.sleep(0.15)
+    directory.delay = 0.2
+    started = time.perf_counter()
+    assert await service.get_doctor_phone_numbers() == ["573000000001"]
+    assert time.perf_counter() - started < 0.05, "a stale lookup must not wait for the backend"
+    await settle(service)
+    assert directory.requests == [None, '"v1"'], directory.requests
+    fetched_at = service._directory_fetched_at
+    assert time.monotonic() - fetched_at < 0.1, "a 304 renews the entry"
+    print("   ✅ Stale entry served at once; revalidated in the background with If-None-Match (304)")
+
+    directory.delay = 0.0
+    directory.change(["573000000001", "573000000003"])
+    await asyncio.sleep(0.15)
+    await service.get_doctor_phone_numbers()
+    await settle(service)
+    assert await service.get_doctor_phone_numbers() == ["573000000001", "573000000003"]
+    assert "573000000003" in await service.get_normalized_doctor_phones()
+    assert service._directory_etag == '"v2"'
+    print("   ✅ A changed directory replaces the list, its index and the ETag")
+
+
+async def test_max_stale_and_failures():
+    print("\n🔹 Max staleness and backend failures")
+    directory = FakeDirectory(["573000000001"])
+    service = build_service(directory, ttl=0.05, max_stale=0.1)
+    await service.get_doctor_phone_numbers()
+
+    directory.change(["573000000004"])
+    await asyncio.sleep(0.15)
+    assert await service.get_doctor_phone_numbers() == ["573000000004"], "too stale: the caller waits"
+    print("   ✅ Entries older than the max staleness are refreshed before answering")
+
+    directory.down = True
+    service.invalidate_doctor_directory()
+    assert await service.get_doctor_phone_numbers() == ["573000000004"]
+    assert len(directory.requests) == 3
+    print("   ✅ A failing backend keeps the last known directory")
+
+
+async def main():
+    """Main test function."""
+    print("📇 DOCTOR DIRECTORY CACHE TEST")
+    print("=" * 50)
+
+    await test_cold_and_fresh()
+    await test_stale_revalidation()
+    await test_max_stale_and_failures()
+
+    print("\n" + "=" * 50)
+    print("🎉 DOCTOR DIRECTORY CACHE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test the concurrent doctor notification fan-out.
+
+Checks that doctors are notified in parallel but never more than the
+concurrency cap at once, that each doctor is notified once even if listed
+twice, that a failing or declined notification does not stop the others,
+and that background fan-outs are drained (or cancelled) on shutdown.
+"""
+
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.doctor_fanout import DoctorFanout
+
+
+async def test_concurrency_cap():
+    print("\n🔹 Concurrency cap")
+    fanout = DoctorFanout(max_concurrency=5)
+    running = 0
+    peak = 0
+
+    async def notify(doctor_phone: str) -> bool:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return True
+
+    doctors = [f"5730000000{i:02d}" for i in range(20)]
+    result = await fanout.fan_out(doctors + doctors[:3], notify)
+    assert sorted(result.notified) == doctors and result.total == 20, result
+    assert peak == 5, peak
+    # 20 doctors 5 at a time: four rounds of 50ms, not twenty
+    assert 0.2 <= result.elapsed_seconds < 0.4, result.elapsed_seconds
+    print(f"   ✅ 20 doctors notified at most 5 at a time in {result.elapsed_seconds:.2f}s, duplicates dropped")
+
+
+async def test_failures_isolated():
+    print("\n🔹 Failures")
+    fanout = DoctorFanout(max_concurrency=2)
+
+    async def notify(doctor_phone: str) -> bool:
+        if doctor_phone.endswith("1"):
+            raise RuntimeError("send failed")
+        return not doctor_phone.endswith("2")
+
+    result = await fanout.fan_out(["573000000001", "573000000002", "573000000003"], notify)
+    assert result.notified == ["573000000003"] and result.skipped == ["573000000002"], result
+    assert result.failed == {"573000000001": "RuntimeError('send failed')"}, result.failed
+    print("   ✅ A failed or declined doctor is reported without stopping the others")
+
+
+async def test_background_drain():
+    print("\n🔹 Background fan-outs")
+    fanout = DoctorFanout()
+    finished = []
+
+    async def slow(seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        finished.append(seconds)
+
+    fanout.launch(slow(0.05))
+    stuck = fanout.launch(slow(5))
+    assert fanout.in_progress == 2
+    await fanout.drain(timeout=0.2)
+    await asyncio.gather(stuck, return_exceptions=True)
+    await asyncio.sleep(0)  # Done callbacks run on the next loop iteration
+    assert finished == [0.05] and stuck.cancelled() and fanout.in_progress == 0
+    print("   ✅ Shutdown waits for running fan-outs and cancels those past the timeout")
+
+
+async def main():
+    """Main test function."""
+    print("📣 DOCTOR FAN-OUT TEST")
+    print("=" * 50)
+
+    await test_concurrency_cap()
+    await test_failures_isolated()
+    await test_background_drain()
+
+    print("\n" + "=" * 50)
+    print("🎉 DOCTOR FAN-OUT TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test the structured event log's payload rendering.
+
+Checks that payloads are redacted by default, so patient answers sent to
+the diagnosis API never reach the log, and that the other payload modes
+still behave as documented.
+"""
+
+import io
+import json
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.event_log import EventLog, render_payload
+
+
+ANSWER = "No duermo y pienso en suicidarme"
+PAYLOAD = {"phone_number": "573001112233", "chat": [{"question": "¿Cómo dormiste?", "answer": ANSWER}], "age": 34}
+
+
+def main():
+    """Main test function."""
+    print("🧪 EVENT LOG TEST")
+    print("=" * 60)
+
+    stream = io.StringIO()
+    log = EventLog(stream=stream)
+    log.emit("API_CALL", "request", request_type="INITIAL", payload=PAYLOAD)
+    log.stop()
+    line = json.loads(stream.getvalue())
+    assert ANSWER not in stream.getvalue() and "573001112233" not in json.dumps(line["payload"])
+    assert line["payload"] == {
+        "phone_number": "<12 chars>", "chat": [{"question": "<15 chars>", "answer": f"<{len(ANSWER)} chars>"}], "age": 34
+    }, line["payload"]
+    print("✅ Payloads are redacted by default: shape kept, no patient text")
+
+    assert render_payload(PAYLOAD, "full", 1000) == PAYLOAD
+    assert render_payload(PAYLOAD, "omit", 1000) is None
+    assert render_payload(PAYLOAD, "truncate", 20).endswith("chars)")
+    assert set(render_payload(PAYLOAD, "hash", 1000)) == {"sha256", "bytes"}
+    print("✅ full, omit, truncate and hash modes unchanged")
+
+    stream = io.StringIO()
+    log = EventLog(stream=stream, category_levels={"CONVERSATION": "WARNING"})
+    log.emit("CONVERSATION", "answer_saved", user="573001112233")
+    log.emit("CONVERSATION", "approval_timeout", logging.WARNING, user="573001112233")
+    log.stop()
+    assert [json.loads(line)["event"] for line in stream.getvalue().splitlines()] == ["approval_timeout"]
+    print("✅ Conversation events follow their category level")
+
+    print("\n" + "=" * 60)
+    print("✅ All event log tests passed")
+
+
+if __name__ == "__main__":
+    main()
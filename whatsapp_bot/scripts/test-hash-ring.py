@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test script for consistent-hash sharding of conversations.
+
+Checks that phones spread evenly over the workers, that adding or removing
+a worker only moves about 1/N of them, and that every worker agrees with
+the front on which worker owns a phone.
+
+Usage: python scripts/test-hash-ring.py [PHONES]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.shard_peers import ShardPeers, build_shard_ring, shard_key, shard_name
+
+
+def moved_fraction(before, after, phones) -> float:
+    """Fraction of phones whose owner differs between two rings."""
+    return sum(before.node_for(phone) != after.node_for(phone) for phone in phones) / len(phones)
+
+
+def test_distribution(phones):
+    """Virtual nodes keep every worker within a few percent of an even share."""
+    print("\n🔹 Distribution over 4 workers")
+    counts = build_shard_ring(4, 160).distribution(phones)
+    even = len(phones) / 4
+    for name, count in sorted(counts.items()):
+        print(f"   {name}: {count:,} ({100 * count / len(phones):.1f}%)")
+    assert all(abs(count - even) / even < 0.15 for count in counts.values()), counts
+    print("   ✅ Every worker within 15% of an even share")
+
+
+def test_rebalance(phones):
+    """Adding a worker moves ~1/N phones, all of them to the new worker."""
+    print("\n🔹 Rebalancing")
+    four = build_shard_ring(4, 160)
+    five = build_shard_ring(5, 160)
+    moved = [phone for phone in phones if four.node_for(phone) != five.node_for(phone)]
+    assert all(five.node_for(phone) == shard_name(4) for phone in moved)
+    fraction = len(moved) / len(phones)
+    print(f"   4 → 5 workers: {100 * fraction:.1f}% of phones moved (ideal 20%, modulo hashing ~80%)")
+    assert 0.14 < fraction < 0.26, fraction
+
+    three = build_shard_ring(4, 160)
+    three.remove(shard_name(2))
+    moved = [phone for phone in phones if four.node_for(phone) != three.node_for(phone)]
+    assert all(four.node_for(phone) == shard_name(2) for phone in moved)
+    print(f"   Removing worker-2: {100 * moved_fraction(four, three, phones):.1f}% moved, only its own phones")
+    print("   ✅ Only a fraction of conversations change workers")
+
+
+def test_front_and_workers_agree(phones):
+    """Workers route cross-shard calls with the same ring as the front."""
+    print("\n🔹 Front/worker agreement")
+    front = build_shard_ring(4, 160)
+    workers = [ShardPeers(index=index, workers=4, socket_dir="/tmp") for index in range(4)]
+    for phone in phones[:5000]:
+        owners = [worker for worker in workers if worker.is_local(phone)]
+        assert len(owners) == 1 and owners[0].name == front.node_for(shard_key(phone))
+    assert shard_key("+57 300 111 2233") == shard_key("573001112233")
+    assert ShardPeers().is_local("573001112233")  # Unsharded: everything is local
+    print("   ✅ Exactly one worker owns each phone, formatting does not matter")
+
+
+def main():
+    """Main test function."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    phones = [f"5730{index:08d}" for index in range(count)]
+    print("💍 HASH RING SHARDING TEST")
+    print("=" * 50)
+
+    test_distribution(phones)
+    test_rebalance(phones)
+    test_front_and_workers_agree(phones)
+
+    print("\n" + "=" * 50)
+    print("🎉 HASH RING TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
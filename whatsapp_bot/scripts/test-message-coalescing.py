@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test the inbound message coalescing window in front of the worker pool.
+
+Checks that answer fragments sent in quick succession reach the handler as
+one message, that the max wait bounds how long a sender who keeps typing
+is held, that commands and senders outside the window are not delayed,
+and that shutdown handles held messages instead of dropping them.
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.coalescing_window import CoalescingWindow
+from app.utils.worker_pool import MessageWorkerPool
+
+
+QUIET = 0.2
+MAX_WAIT = 0.8
+
+
+def make_pool(handled: list, max_queue_size: int = 1000) -> MessageWorkerPool:
+    async def handler(sender_phone: str, text: str) -> None:
+        handled.append((sender_phone, text, time.monotonic()))
+
+    window = CoalescingWindow(
+        quiet_period=QUIET,
+        max_wait=MAX_WAIT,
+        applies=lambda sender_phone, text: sender_phone.startswith("57") and text != "doctor"
+    )
+    pool = MessageWorkerPool(handler, concurrency=4, max_queue_size=max_queue_size, window=window)
+    pool.start()
+    return pool
+
+
+async def test_fragments_merged():
+    handled = []
+    pool = make_pool(handled)
+    started = time.monotonic()
+    for fragment in ("Me siento", "muy cansado", "desde hace semanas"):
+        assert pool.submit("573001", fragment)
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(QUIET + 0.1)
+    await pool.stop()
+
+    assert [text for _, text, _ in handled] == ["Me siento\nmuy cansado\ndesde hace semanas"], handled
+    waited = handled[0][2] - started
+    assert 0.1 + QUIET - 0.05 <= waited < 0.1 + QUIET + 0.1, waited
+    assert pool.window.merged == 2
+    print(f"✅ 3 fragments handled as one message after the quiet period ({waited * 1000:.0f}ms)")
+
+
+async def test_max_wait():
+    handled = []
+    pool = make_pool(handled)
+    started = time.monotonic()
+    while time.monotonic() - started < 2 * MAX_WAIT:
+        pool.submit("573002", "sigo escribiendo")
+        await asyncio.sleep(QUIET / 2)
+    await asyncio.sleep(QUIET + 0.1)
+    await pool.stop()
+
+    first_wait = handled[0][2] - started
+    assert MAX_WAIT - 0.05 <= first_wait < MAX_WAIT + 0.1, first_wait
+    assert 2 <= len(handled) <= 4, len(handled)
+    print(f"✅ Continuous typing flushed after max wait ({first_wait * 1000:.0f}ms), {len(handled)} merged messages")
+
+
+async def test_not_held():
+    handled = []
+    pool = make_pool(handled)
+    pool.submit("15550001", "hola")  # Outside the window (e.g. a doctor)
+    await asyncio.sleep(0.02)
+    assert [text for _, text, _ in handled] == ["hola"]
+
+    pool.submit("573003", "parte uno")
+    pool.submit("573003", "parte dos")
+    pool.submit("573003", "doctor")  # A command closes the window at once
+    await asyncio.sleep(0.02)
+    await pool.stop()
+    assert [text for sender, text, _ in handled if sender == "573003"] == ["parte uno\nparte dos", "doctor"], handled
+    print("✅ Commands and senders outside the window are handled immediately, after held fragments")
+
+
+async def test_stop_and_limit():
+    handled = []
+    pool = make_pool(handled, max_queue_size=3)
+    for i in range(3):
+        assert pool.submit(f"57300{i}", "respuesta")
+    assert not pool.submit("573009", "respuesta"), "held messages count against the queue limit"
+    assert pool.get_stats()["coalescing"]["waiting_senders"] == 3
+
+    started = time.monotonic()
+    await pool.stop()
+    assert len(handled) == 3 and time.monotonic() - started < QUIET
+    print("✅ Held messages count against the queue limit and are handled on shutdown")
+
+
+async def main():
+    """Main test function."""
+    print("🧪 MESSAGE COALESCING TEST")
+    print("=" * 60)
+    await test_fragments_merged()
+    await test_max_wait()
+    await test_not_held()
+    await test_stop_and_limit()
+    print("\n" + "=" * 60)
+    print("✅ All coalescing tests passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus-style metrics.
+
+Checks histogram bucketing, counters and the text exposition format, that
+evicted sessions are counted by reason and state, and measures what one
+observation costs on the request path.
+
+Usage: python scripts/test-metrics.py
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.session import SessionState
+from app.utils.metrics import MetricsRegistry, metrics
+from app.utils.session_manager import SessionManager
+
+
+def test_histogram():
+    """Observations land in the first bucket whose bound is >= the value."""
+    print("\n🔹 Histogram buckets")
+    registry = MetricsRegistry(prefix="test_")
+    histogram = registry.histogram("call_seconds", "Calls", ("endpoint",), buckets=(0.1, 1.0, 10.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0, 30.0):
+        histogram.observe(seconds, "questions")
+    with histogram.time("answers"):
+        pass
+
+    text = registry.render()
+    expected = [
+        'test_call_seconds_bucket{endpoint="questions",le="0.1"} 2',
+        'test_call_seconds_bucket{endpoint="questions",le="1"} 3',
+        'test_call_seconds_bucket{endpoint="questions",le="10"} 4',
+        'test_call_seconds_bucket{endpoint="questions",le="+Inf"} 5',
+        'test_call_seconds_count{endpoint="questions"} 5',
+        'test_call_seconds_count{endpoint="answers"} 1',
+    ]
+    for line in expected:
+        assert line in text, line
+    assert "test_call_seconds_sum{endpoint=\"questions\"} 33.65" in text
+    print("   ✅ Cumulative buckets, sum and count rendered per label set")
+
+
+def test_counters_and_gauges():
+    """Bound counters are exported at zero; gauges are read at render time."""
+    print("\n🔹 Counters and gauges")
+    registry = MetricsRegistry(prefix="test_")
+    retries = registry.counter("retries_total", "Retries", ("operation",))
+    api_retries = retries.labels("diagnosis_api")
+    assert registry.counter("retries_total", "Retries", ("operation",)) is retries
+    assert 'test_retries_total{operation="diagnosis_api"} 0' in registry.render()
+    api_retries.inc()
+    api_retries.inc(2)
+
+    depth = [3]
+    registry.gauge("queue_depth", "Queued", lambda: depth[0])
+    registry.gauge("sessions", "Sessions", lambda: {("active",): 2, ("ended",): 5}, ("state",))
+    depth[0] = 7
+    text = registry.render()
+    assert 'test_retries_total{operation="diagnosis_api"} 3' in text
+    assert "test_queue_depth 7" in text
+    assert 'test_sessions{state="ended"} 5' in text
+    assert "# TYPE test_retries_total counter" in text and "# TYPE test_sessions gauge" in text
+    print("   ✅ Counter series pre-created, shared by name; gauges read on scrape")
+
+
+async def test_session_evictions():
+    """Expired and LRU-evicted sessions show up in sessions_evicted_total."""
+    print("\n🔹 Session evictions")
+    manager = SessionManager(max_sessions=2, idle_ttl=60)
+    for phone in ("573100000001", "573100000002"):
+        manager.get_or_create_session(phone)
+    manager.get_session("573100000001").state = SessionState.CONVERSATION_ENDED
+    await manager.flush()
+    manager.get_or_create_session("573100000003")  # Over the cap: the ended session goes first
+    await manager.flush()
+    manager.sweep(time.time() + 120)
+
+    text = metrics.render()
+    assert 'sessions_evicted_total{reason="lru",state="conversation_ended"} 1' in text, text
+    assert 'sessions_evicted_total{reason="expired",state="waiting_for_consent"} 2' in text, text
+    print("   ✅ One LRU eviction and two expiries counted with their session state")
+
+
+def test_observe_cost():
+    """One observation should cost about a microsecond."""
+    print("\n🔹 Cost per observation")
+    registry = MetricsRegistry(prefix="test_")
+    histogram = registry.histogram("webhook_seconds", "Webhook")
+    counter = registry.counter("retries_total", "Retries", ("operation",)).labels("x")
+    rounds = 200000
+
+    started = time.perf_counter()
+    for i in range(rounds):
+        histogram.observe(0.003)
+    observe_ns = (time.perf_counter() - started) * 1e9 / rounds
+
+    started = time.perf_counter()
+    for i in range(rounds):
+        with histogram.time():
+            pass
+    timer_ns = (time.perf_counter() - started) * 1e9 / rounds
+
+    started = time.perf_counter()
+    for i in range(rounds):
+        counter.inc()
+    inc_ns = (time.perf_counter() - started) * 1e9 / rounds
+
+    print(f"   histogram.observe: {observe_ns:.0f}ns, with histogram.time(): {timer_ns:.0f}ns, counter.inc: {inc_ns:.0f}ns")
+    assert observe_ns < 5000
+    print("   ✅ Cheap enough for every request")
+
+
+def main():
+    """Main test function."""
+    print("📈 METRICS TEST")
+    print("=" * 50)
+    test_histogram()
+    test_counters_and_gauges()
+    asyncio.run(test_session_evictions())
+    test_observe_cost()
+    print("\n" + "=" * 50)
+    print("🎉 METRICS TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the rate-limited outbound WhatsApp dispatcher.
+
+Checks that the token bucket holds sends to the configured rate, that the
+most urgent lane is dispatched first while each recipient's messages keep
+their order, that a 429 is waited out once (Retry-After) rather than twice,
+that only sends Meta never accepted are retried (classified by the Graph
+API error code), and that the last attempt's response is returned.
+
+Usage: python scripts/test-outbound-dispatcher.py
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.services.outbound_dispatcher import MessagePriority, OutboundDispatcher, TokenBucket
+
+
+REQUEST = httpx.Request("POST", "https://graph.facebook.com/v18.0/123/messages")
+
+
+def scripted(*outcomes):
+    """A send that returns (or raises) the given outcomes in turn, recording each call."""
+    calls = []
+
+    async def send() -> httpx.Response:
+        calls.append(time.perf_counter())
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+async def test_token_bucket():
+    print("\n🔹 Token bucket")
+    bucket = TokenBucket(rate_per_second=50, burst=5)
+    started = time.perf_counter()
+    for _ in range(15):
+        await bucket.acquire()
+    elapsed = time.perf_counter() - started
+    # 5 from the burst, then 10 at 50/s
+    assert 0.18 <= elapsed < 0.4 and bucket.throttled > 0, elapsed
+    print(f"   ✅ 15 sends with burst 5 at 50/s took {elapsed:.2f}s")
+
+
+async def test_priority_and_order():
+    print("\n🔹 Priority lanes and per-recipient order")
+    dispatcher = OutboundDispatcher(concurrency=1, rate_per_second=1000, burst=1000)
+    dispatcher.start()
+    order = []
+    gate = asyncio.Event()
+
+    def send(label: str):
+        async def call() -> httpx.Response:
+            if label == "busy":
+                await gate.wait()
+            order.append(label)
+            return httpx.Response(200, request=REQUEST)
+        return call
+
+    sends = [asyncio.create_task(dispatcher.dispatch("573100000000", send("busy")))]
+    await asyncio.sleep(0.01)  # The only worker is now busy
+    for recipient, label, priority in [
+        ("573100000001", "greeting", MessagePriority.LOW),
+        ("573100000002", "reply-1", MessagePriority.NORMAL),
+        ("573100000002", "reply-2", MessagePriority.URGENT),
+        ("573000000009", "alert", MessagePriority.URGENT),
+    ]:
+        sends.append(asyncio.create_task(dispatcher.dispatch(recipient, send(label), priority)))
+    await asyncio.sleep(0.01)
+    gate.set()
+    await asyncio.gather(*sends)
+    await dispatcher.stop()
+
+    # The urgent lane goes first, but reply-2 still waits for reply-1 to the same patient
+    assert order == ["busy", "reply-1", "alert", "reply-2", "greeting"], order
+    print(f"   ✅ Dispatched {order[1:]}")
+
+
+async def test_429_waits_once():
+    print("\n🔹 429 backoff")
+    dispatcher = OutboundDispatcher(rate_per_second=1000, burst=1000, retry_base_delay=0.01)
+    send, calls = scripted(
+        httpx.Response(429, headers={"Retry-After": "0.3"}, request=REQUEST),
+        httpx.Response(200, request=REQUEST)
+    )
+    response = await dispatcher.dispatch("573100000001", send, phone_number_id="123")
+    waited = calls[1] - calls[0]
+    assert response.status_code == 200 and 0.3 <= waited < 0.5, waited
+    print(f"   ✅ Retried after {waited:.2f}s for Retry-After 0.3s (not doubled)")
+
+
+async def test_retries_only_unsent():
+    print("\n🔹 Retries only when the message was not delivered")
+    dispatcher = OutboundDispatcher(rate_per_second=1000, burst=1000, retry_base_delay=0.01)
+    ok = httpx.Response(200, request=REQUEST)
+
+    send, calls = scripted(httpx.ConnectError("refused", request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 200 and len(calls) == 2
+    send, calls = scripted(httpx.Response(503, request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 200 and len(calls) == 2
+    send, calls = scripted(httpx.Response(500, json={"error": {"code": 131000}}, request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 200 and len(calls) == 2
+    send, calls = scripted(httpx.Response(400, json={"error": {"code": 130429}}, request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 200 and len(calls) == 2
+    print("   ✅ Connection errors, empty 503s and transient Graph API errors (131000, 130429) retried")
+
+    send, calls = scripted(httpx.ReadTimeout("no answer", request=REQUEST), ok)
+    try:
+        await dispatcher.dispatch("573100000001", send)
+        assert False, "a read timeout must not be retried"
+    except httpx.ReadTimeout:
+        pass
+    assert len(calls) == 1
+    send, calls = scripted(httpx.Response(500, json={"error": {"code": 131026}}, request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 500 and len(calls) == 1
+    send, calls = scripted(httpx.Response(502, text="<html>Bad Gateway</html>", request=REQUEST), ok)
+    assert (await dispatcher.dispatch("573100000001", send)).status_code == 502 and len(calls) == 1
+    print("   ✅ Read timeouts, permanent Graph API errors and unknown 5xx bodies not retried")
+
+    stats = dispatcher.get_stats()
+    assert stats["retries"] == 4 and stats["sent"] == 4 and stats["failed"] == 3, stats
+
+    gave_up = OutboundDispatcher(rate_per_second=1000, burst=1000, max_retries=1, retry_base_delay=0.01)
+    send, calls = scripted(httpx.Response(503, request=REQUEST), httpx.Response(503, request=REQUEST), ok)
+    assert (await gave_up.dispatch("573100000001", send)).status_code == 503 and len(calls) == 2
+    assert gave_up.get_stats()["failed"] == 1
+    await gave_up.stop()
+    print("   ✅ Once the retries are used up the last response is returned")
+
+
+async def main():
+    """Main test function."""
+    print("📤 OUTBOUND DISPATCHER TEST")
+    print("=" * 50)
+
+    await test_token_bucket()
+    await test_priority_and_order()
+    await test_429_waits_once()
+    await test_retries_only_unsent()
+
+    print("\n" + "=" * 50)
+    print("🎉 OUTBOUND DISPATCHER TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,8 +6,10 @@ This tests:
 - Phone number normalization with different formats
 - Intersection logic with normalized numbers
 - Proper matching of equivalent phone numbers
+- The active doctor index matched against the backend directory
 """
 
+import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -195,6 +197,56 @@ def test_real_world_scenarios():
     
     return all_passed
 
+def test_active_doctor_index():
+    """Test matching a case against the normalized active doctor index."""
+    print("\n🗂️  ACTIVE DOCTOR INDEX TEST")
+    print("=" * 35)
+    
+    from app.utils.doctor_session_manager import DoctorSessionManager
+    from app.utils.phone_numbers import normalize_phone_number
+    from app.utils.session_store import InMemorySessionStore
+    
+    store = InMemorySessionStore()
+    manager = DoctorSessionManager(store=store)
+    for phone in ("573000000001", "573000000002", "573000000003", "573000000004"):
+        manager.register_doctor(phone)
+        manager.confirm_doctor_registration(phone)
+    manager.register_doctor("573000000005")  # Registration never confirmed
+    manager.start_case_review("573000000002", "573100000001")  # Busy doctors stay active
+    manager.deactivate_doctor("573000000004")
+    
+    # The backend stores numbers with '+', spaces or without the country code
+    directory = ["+57 300 000 0001", "3000000002", "+573000000004", "573000000005", "+573009999999"]
+    normalized_directory = frozenset(normalize_phone_number(phone) for phone in directory)
+    matched = sorted(session.phone_number for session in manager.match_active_doctors(normalized_directory))
+    print(f"🎯 Matched: {matched}")
+    all_passed = matched == ["573000000001", "573000000002"]
+    
+    manager.activate_doctor("573000000004")
+    matched = sorted(session.phone_number for session in manager.match_active_doctors(normalized_directory))
+    print(f"🎯 Matched after reactivating 573000000004: {matched}")
+    all_passed = all_passed and matched == ["573000000001", "573000000002", "573000000004"]
+    
+    async def other_worker_changes() -> list:
+        # Another worker's copy picks up the changes through the shared store
+        await manager.flush()
+        other = DoctorSessionManager(store=store)
+        await other.hydrate_many(normalized_directory)
+        before = sorted(session.phone_number for session in other.match_active_doctors(normalized_directory))
+        manager.deactivate_doctor("573000000001")
+        await manager.flush()
+        await other.hydrate_many(normalized_directory)
+        after = sorted(session.phone_number for session in other.match_active_doctors(normalized_directory))
+        return [before, after]
+    
+    before, after = asyncio.run(other_worker_changes())
+    print(f"🔄 Other worker before/after a deactivation: {before} / {after}")
+    all_passed = all_passed and before == ["573000000001", "573000000002", "573000000004"]
+    all_passed = all_passed and after == ["573000000002", "573000000004"]
+    
+    print("✅ Index matches active doctors only, in any directory format" if all_passed else "❌ Index mismatch")
+    return all_passed
+
 def main():
     """Main test function."""
     print("📞 PHONE NUMBER NORMALIZATION TEST SUITE")
@@ -203,9 +255,10 @@ def main():
     normalization_passed = test_phone_normalization()
     intersection_passed = test_intersection_logic()
     scenarios_passed = test_real_world_scenarios()
+    index_passed = test_active_doctor_index()
     
     print("\n" + "=" * 50)
-    if normalization_passed and intersection_passed and scenarios_passed:
+    if normalization_passed and intersection_passed and scenarios_passed and index_passed:
         print("🎉 ALL TESTS PASSED!")
         print()
         print("✅ PHONE NORMALIZATION WORKING:")
@@ -215,7 +268,8 @@ def main():
             "Removes formatting characters (spaces, dashes, etc.) ✓",
             "Preserves non-Colombian numbers as-is ✓",
             "Finds matches regardless of input format ✓",
-            "Fixes user's specific issue (+57 vs 57 prefix) ✓"
+            "Fixes user's specific issue (+57 vs 57 prefix) ✓",
+            "Matches the directory against active doctors only ✓"
         ]
         
         for feature in features:
@@ -231,6 +285,7 @@ def main():
     else:
         print("❌ SOME TESTS FAILED!")
         print("   Check individual test results above for details")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test outbound send batching in WhatsAppService.
+
+Checks that texts sent to one recipient within a batching block go out as
+one Graph API call, in order, split at the text size limit; that other
+recipients and interactive messages keep their place; that background
+tasks started in the block send directly; that a failed send does not
+lose the messages queued after it and is reported by flush(); and that an
+unbatched send raises its own failure.
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.services.whatsapp_service import WhatsAppService, MAX_TEXT_CHARS
+
+
+ROUND_TRIP = 0.05
+
+
+class FakeTransport:
+    """Records Graph API payloads; answers after a fixed round-trip."""
+
+    def __init__(self, fail_to: str = ""):
+        self.posts = []
+        self.fail_to = fail_to
+
+    async def post(self, url, profile=None, headers=None, json=None):
+        await asyncio.sleep(ROUND_TRIP)
+        self.posts.append(json)
+        status = 500 if json["to"] == self.fail_to else 200
+        return httpx.Response(status, json={"messages": [{"id": "wamid"}]}, request=httpx.Request("POST", url))
+
+
+class DirectDispatcher:
+    async def dispatch(self, to, send, priority=None, phone_number_id=None):
+        return await send()
+
+
+def make_service(**kwargs):
+    transport = FakeTransport(**kwargs)
+    return WhatsAppService(transport=transport, dispatcher=DirectDispatcher(), batch_sends=True), transport
+
+
+def bodies(transport):
+    return [(post["to"], post.get("text", {}).get("body") or post["type"]) for post in transport.posts]
+
+
+async def test_merge_and_order():
+    service, transport = make_service()
+    async with service.batching():
+        await service.send_text_message("A", "uno")
+        await service.send_text_message("A", "dos")
+        await service.send_text_message("B", "otro")
+        await service.send_text_message("A", "tres")
+        assert transport.posts == [], "nothing is sent before the flush"
+    assert bodies(transport) == [("A", "uno\n\ndos"), ("B", "otro"), ("A", "tres")], bodies(transport)
+    print("✅ Adjacent texts to the same recipient merged, order kept across recipients")
+
+
+async def test_interactive_and_limit():
+    service, transport = make_service()
+    async with service.batching():
+        await service.send_text_message("A", "saludo")
+        await service.send_interactive_message("A", "¿Aceptas?", "Elige", [{"type": "reply", "reply": {"id": "si", "title": "Sí"}}])
+        await service.send_text_message("A", "x" * (MAX_TEXT_CHARS // 2))
+        await service.send_text_message("A", "y" * (MAX_TEXT_CHARS // 2))
+    assert [body[:6] for _, body in bodies(transport)] == ["saludo", "intera", "xxxxxx", "yyyyyy"], bodies(transport)
+    assert all(len(post.get("text", {}).get("body", "")) <= MAX_TEXT_CHARS for post in transport.posts)
+    print("✅ Interactive messages flush earlier texts first; merged texts stay within the size limit")
+
+
+async def test_background_tasks_send_directly():
+    service, transport = make_service()
+    async with service.batching():
+        await service.send_text_message("A", "paciente")
+        await asyncio.create_task(service.send_text_message("D", "doctor"))
+        assert bodies(transport) == [("D", "doctor")], "tasks started in the block are not batched"
+    assert bodies(transport) == [("D", "doctor"), ("A", "paciente")]
+    print("✅ Background tasks started inside the block send immediately")
+
+
+async def test_failure_isolated():
+    service, transport = make_service(fail_to="B")
+    async with service.batching():
+        await service.send_text_message("B", "falla")
+        await service.send_text_message("A", "llega")
+        await service.send_text_message("B", "otra vez")
+        assert await service.flush() == ["B"]
+    assert bodies(transport) == [("B", "falla"), ("A", "llega"), ("B", "otra vez")]
+    print("✅ A failed send is reported by flush() and the texts queued after it still go out")
+
+
+async def test_unbatched_send_raises():
+    service, transport = make_service(fail_to="P")
+    raised = False
+    async with service.batching():
+        await service.send_text_message("P", "antes")
+        try:
+            await service.send_text_message("P", "decisión", batch=False)
+        except httpx.HTTPStatusError:
+            raised = True
+        await service.send_text_message("D", "confirmación")
+    assert raised, "a send the caller records as delivered must surface its failure"
+    assert bodies(transport) == [("P", "antes"), ("P", "decisión"), ("D", "confirmación")]
+    print("✅ batch=False sends after the buffered texts and raises when it fails")
+
+
+async def test_latency():
+    timings = {}
+    for batched in (False, True):
+        transport = FakeTransport()
+        service = WhatsAppService(transport=transport, dispatcher=DirectDispatcher(), batch_sends=batched)
+        started = time.perf_counter()
+        async with service.batching():
+            for text in ("diagnóstico", "validación", "estado"):
+                await service.send_text_message("A", text)
+        timings[batched] = (time.perf_counter() - started, len(transport.posts))
+    (plain, plain_calls), (batched, batched_calls) = timings[False], timings[True]
+    assert batched_calls == 1 and plain_calls == 3
+    print(f"⏱️  3 consecutive texts: {plain_calls} calls {plain * 1000:.0f}ms unbatched, "
+          f"{batched_calls} call {batched * 1000:.0f}ms batched")
+
+
+async def main():
+    """Main test function."""
+    print("🧪 SEND BATCHING TEST")
+    print("=" * 60)
+    await test_merge_and_order()
+    await test_interactive_and_limit()
+    await test_background_tasks_send_directly()
+    await test_failure_isolated()
+    await test_unbatched_send_raises()
+    await test_latency()
+    print("\n" + "=" * 60)
+    print("✅ All send batching tests passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the session TTL sweeper and the LRU cap of the session manager.
+
+Checks that idle sessions expire after the TTL of their state and are
+deleted from the store, that activity moves a session's expiry back, that
+a session being handled is never evicted, that over the cap finished
+conversations go before the least recently used active ones, and that a
+sweep with nothing due does not scan the sessions.
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.session import SessionState
+from app.utils.session_manager import SessionManager, parse_state_ttls
+from app.utils.session_store import PATIENT, InMemorySessionStore
+
+
+def test_parse_state_ttls():
+    ttls = parse_state_ttls("conversation_ended=60, WAITING_FOR_ANSWER=3600,")
+    assert ttls == {SessionState.CONVERSATION_ENDED: 60.0, SessionState.WAITING_FOR_ANSWER: 3600.0}, ttls
+    for spec in ("finished=60", "conversation_ended=soon"):
+        try:
+            parse_state_ttls(spec)
+            assert False, f"{spec} should be rejected"
+        except ValueError:
+            pass
+    print("✅ Per-state TTLs parsed; unknown states and bad TTLs rejected")
+
+
+async def test_sweep():
+    store = InMemorySessionStore()
+    manager = SessionManager(store=store, idle_ttl=3600, state_ttls={SessionState.CONVERSATION_ENDED: 60})
+    for phone in ("573100000001", "573100000002", "573100000003"):
+        manager.get_or_create_session(phone)
+    manager.get_session("573100000002").state = SessionState.CONVERSATION_ENDED
+    await manager.flush()
+    started = manager.get_session("573100000001").last_activity_ts
+    manager.get_session("573100000003").last_activity_ts = started + 1000  # Active again later
+    await manager.flush()
+    manager.get_or_create_session("573100000004")  # Being handled, not flushed yet
+
+    assert manager.sweep(started + 30) == 0
+    assert manager.sweep(started + 120) == 1 and "573100000002" not in manager.sessions
+    await manager.sync.flush_deleted()
+    assert await store.load(PATIENT, "573100000002") is None, "expired sessions are deleted from the store"
+    print("✅ A finished conversation expires after its own 60s TTL and is deleted from the store")
+
+    assert manager.sweep(started + 3700) == 1 and "573100000001" not in manager.sessions
+    assert "573100000003" in manager.sessions, "activity moves the expiry back"
+    assert manager.sweep(started + 4700) == 1 and "573100000003" not in manager.sessions
+    print("✅ Idle sessions expire after the default TTL, counted from their last activity")
+
+    assert manager.sweep(started + 100000) == 0 and "573100000004" in manager.sessions
+    stats = manager.get_stats()
+    assert stats["expired_by_state"] == {"conversation_ended": 1, "waiting_for_consent": 2}, stats
+    print("✅ A session with unflushed changes is never expired")
+
+
+async def test_lru_cap():
+    store = InMemorySessionStore()
+    manager = SessionManager(store=store, max_sessions=3)
+    for phone in ("573100000001", "573100000002", "573100000003"):
+        manager.get_or_create_session(phone)
+    await manager.flush()
+    manager.get_session("573100000001").state = SessionState.CONVERSATION_ENDED
+    await manager.flush()
+    manager.get_or_create_session("573100000002")  # Least recently used is now 573100000003
+    await manager.flush()
+
+    manager.get_or_create_session("573100000004")
+    await manager.flush()
+    assert list(manager.sessions) == ["573100000003", "573100000002", "573100000004"], list(manager.sessions)
+    manager.get_or_create_session("573100000005")
+    await manager.flush()
+    assert list(manager.sessions) == ["573100000002", "573100000004", "573100000005"], list(manager.sessions)
+    assert manager.get_stats()["evicted_lru"] == {"ended": 1, "active": 1}
+    assert await store.load(PATIENT, "573100000003") is None, "the in-memory store would keep it alive"
+    print("✅ Over the cap the finished conversation goes first, then the least recently used")
+
+    busy = SessionManager(max_sessions=1)
+    busy.get_or_create_session("573100000001")
+    busy.get_or_create_session("573100000002")
+    assert len(busy.sessions) == 2
+    await busy.flush()
+    busy.get_or_create_session("573100000003")
+    assert list(busy.sessions) == ["573100000003"], list(busy.sessions)
+    print("✅ Sessions being handled are kept over the cap until they are flushed")
+
+
+async def test_sweep_cost():
+    count = 20000
+    manager = SessionManager(idle_ttl=3600)
+    for i in range(count):
+        manager.get_or_create_session(f"57310{i:07d}")
+    await manager.flush()
+    now = time.time()
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        assert manager.sweep(now) == 0
+    sweep_us = (time.perf_counter() - started) * 1e6 / 1000
+    assert sweep_us < 50, sweep_us
+    assert manager.sweep(now + 3601) == count and not manager.sessions
+    print(f"⏱️  Sweep with nothing due over {count} sessions: {sweep_us:.1f}µs; all expired in one later sweep")
+
+
+def main():
+    """Main test function."""
+    print("🧪 SESSION EVICTION TEST")
+    print("=" * 60)
+    test_parse_state_ttls()
+    asyncio.run(test_sweep())
+    asyncio.run(test_lru_cap())
+    asyncio.run(test_sweep_cost())
+    print("\n" + "=" * 60)
+    print("✅ All session eviction tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the session write-ahead log and snapshots.
+
+Simulates crashes (no clean shutdown), a torn final write, snapshot
+compaction and measures restore time for 100k sessions.
+
+Usage: python scripts/test-session-journal.py [SESSIONS]
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.doctor_session import DoctorSessionState
+from app.models.question import Answer
+from app.models.session import SessionState
+from app.utils.doctor_session_manager import DoctorSessionManager
+from app.utils.session_journal import JournaledSessionStore, SessionJournal
+from app.utils.session_manager import SessionManager
+
+
+async def open_bot(directory: str, **journal_options):
+    """Start managers on a journaled store, as main.py does on startup."""
+    store = JournaledSessionStore(SessionJournal(directory, **journal_options))
+    store.restore()
+    patients, doctors = SessionManager(store), DoctorSessionManager(store)
+    await patients.refresh()
+    await doctors.refresh()
+    return store, patients, doctors
+
+
+def crash(store: JournaledSessionStore):
+    """Drop the process state without a clean shutdown."""
+    store.journal._flusher.cancel()
+    store.journal._file.close()
+
+
+async def test_crash_recovery(directory: str):
+    """A mid-questionnaire patient and a reviewing doctor survive a crash."""
+    print("\n🔹 Crash recovery")
+    store, patients, doctors = await open_bot(directory)
+
+    session = patients.get_or_create_session("573001112233")
+    session.consent_given = True
+    session.state = SessionState.WAITING_FOR_ANSWER
+    session.answers.append(Answer("name", "Ana"))
+    session.current_question_index = 1
+    doctors.register_doctor("573100000001")
+    doctors.confirm_doctor_registration("573100000001")
+    doctors.start_case_review("573100000001", "573001112233")
+    await patients.flush()
+    await doctors.flush()
+    await store.journal.write_pending()
+    crash(store)
+
+    store, patients, doctors = await open_bot(directory)
+    restored = patients.sessions["573001112233"]
+    assert restored.state == SessionState.WAITING_FOR_ANSWER and restored.current_question_index == 1
+    assert restored.answers[0].value == "Ana"
+    assert doctors.get_doctor_session("573100000001").state == DoctorSessionState.REVIEWING_CASE
+    assert len(doctors.get_active_doctors()) == 1
+    print("   ✅ Patient resumes at question 2, doctor still reviewing the case")
+    crash(store)
+
+
+async def test_torn_write(directory: str):
+    """A half-written final record is dropped, earlier records are kept."""
+    print("\n🔹 Torn final write")
+    store, patients, _ = await open_bot(directory)
+    patients.get_or_create_session("573009998877").current_question_index = 4
+    await patients.flush()
+    await store.journal.write_pending()
+    log_path = store.journal._log_path(store.journal.generation)
+    crash(store)
+
+    with open(log_path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    store, patients, _ = await open_bot(directory)
+    assert patients.sessions["573009998877"].current_question_index == 4
+    assert store.journal.stats["torn_bytes_dropped"] == 11
+    print("   ✅ Torn tail truncated, committed sessions restored")
+    await store.close()
+
+
+async def test_snapshot_compaction(directory: str):
+    """Snapshots replace the log, and later writes still win on replay."""
+    print("\n🔹 Snapshot compaction")
+    store, patients, _ = await open_bot(directory)
+    for i in range(500):
+        patients.get_or_create_session(f"57320000{i:04d}")
+        await patients.flush()
+    await store.journal.snapshot(store)
+    patients.get_or_create_session("573200000007").state = SessionState.CONVERSATION_ENDED
+    patients.delete_session("573200000008")
+    await patients.flush()
+    await store.journal.write_pending()
+    logs = store.journal._log_generations()
+    crash(store)
+
+    store, patients, _ = await open_bot(directory)
+    assert len(logs) == 1, logs
+    assert store.journal.stats["replayed_records"] == 2
+    assert patients.sessions["573200000007"].state == SessionState.CONVERSATION_ENDED
+    assert "573200000008" not in patients.sessions
+    print(f"   ✅ One log generation left, {store.journal.stats['replayed_records']} records replayed on top of the snapshot")
+    await store.close()
+
+
+async def test_restore_time(directory: str, count: int):
+    """Restore time with a snapshot plus a full log."""
+    print(f"\n🔹 Restore time ({count:,} sessions)")
+    store, patients, _ = await open_bot(directory, max_records=count)
+    for i in range(count):
+        session = patients.get_or_create_session(f"5730{i:08d}")
+        session.answers.extend(Answer(f"q{n}", f"respuesta {i}-{n}") for n in range(9))
+        session.diagnostic_support = {"pre-diagnosis": f"dx {i}", "score": "MEDIA"}
+        if i % 1000 == 999:
+            await patients.flush()
+    await patients.flush()
+    await store.journal.snapshot(store)
+    print(f"   Snapshot written in {store.journal.stats['last_snapshot_seconds']}s "
+          f"({os.path.getsize(store.journal.snapshot_path) / 2**20:.1f} MB)")
+    for i in range(0, count, 2):
+        patients.get_or_create_session(f"5730{i:08d}").current_question_index = 3
+    await patients.flush()
+    await store.journal.write_pending()
+    crash(store)
+    del store, patients, session  # The crashed process's memory is gone too
+    gc.collect()
+
+    started = time.perf_counter()
+    store, patients, _ = await open_bot(directory, max_records=count)
+    elapsed = time.perf_counter() - started
+    assert len(patients.sessions) == count
+    assert patients.sessions["573000000000"].current_question_index == 3
+    print(f"   ✅ {count:,} sessions + {store.journal.stats['replayed_records']:,} log records "
+          f"restored in {elapsed:.2f}s (journal {store.journal.stats['restore_seconds']}s)")
+    await store.close()
+
+
+async def main():
+    """Main test function."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print("💾 SESSION JOURNAL TEST")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        await test_crash_recovery(os.path.join(directory, "crash"))
+        await test_torn_write(os.path.join(directory, "torn"))
+        await test_snapshot_compaction(os.path.join(directory, "snapshot"))
+        await test_restore_time(os.path.join(directory, "restore"), count)
+
+    print("\n" + "=" * 50)
+    print("🎉 SESSION JOURNAL TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
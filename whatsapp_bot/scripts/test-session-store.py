@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test script for the pluggable session store.
+
+Checks that a store missing part of the interface cannot be built, then
+runs the doctor checks against the in-memory store and every check against
+the Redis store. The Redis checks use REDIS_URL when set, otherwise a local fakeredis server
+(pip install fakeredis) so no real Redis is needed.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.doctor_session import DoctorSessionState
+from app.models.question import Answer
+from app.models.session import SessionState
+from app.utils.doctor_session_manager import DoctorSessionManager
+from app.utils.session_manager import SessionManager
+from app.utils.session_store import (
+    PATIENT, InMemorySessionStore, RedisSessionStore, SessionStore,
+    decode_user_session, encode_user_session
+)
+
+
+def start_fake_redis() -> str:
+    """Start a fakeredis TCP server in a background thread and return its URL."""
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}/0"
+
+
+def test_codec():
+    """Sessions survive a serialization round trip."""
+    print("\n🔹 Compact serialization round trip")
+    manager = SessionManager()
+    session = manager.get_or_create_session("573001112233")
+    session.state = SessionState.WAITING_FOR_FOLLOWUP
+    session.consent_given = True
+    session.greeting_sent = True
+    session.answers.append(Answer("age", "30"))
+    session.followup_questions = ["¿Duermes bien?"]
+    session.diagnostic_support = {"score": "ALTA", "pre-diagnosis": "ansiedad"}
+
+    data = encode_user_session(session)
+    restored = decode_user_session(data)
+    assert restored.state == session.state
+    assert restored.consent_given and restored.greeting_sent and not restored.first_question_asked
+    assert restored.answers[0].question_id == "age" and restored.answers[0].value == "30"
+    assert restored.followup_questions == session.followup_questions
+    assert restored.diagnostic_support == session.diagnostic_support
+    print(f"   ✅ {len(data)} bytes")
+
+
+def test_abstract_interface():
+    """Stores must implement the whole interface."""
+    print("\n🔹 Abstract store interface")
+
+    class LoadOnlyStore(SessionStore):
+        async def load_many(self, kind, keys):
+            return {}
+
+    for store_class in (SessionStore, LoadOnlyStore):
+        try:
+            store_class()
+            assert False, f"{store_class.__name__} should not be instantiable"
+        except TypeError as e:
+            assert "save_many" in str(e), e
+    assert SessionStore.__abstractmethods__ == {"load_many", "load_all", "save_many", "delete_many"}
+    print("   ✅ A store missing save_many, load_all or delete_many fails when built, not on first use")
+
+
+async def test_two_workers(store_a, store_b, label: str):
+    """Two managers (one per worker) see each other's writes and conflicts are detected."""
+    print(f"\n🔹 Shared sessions between two workers ({label})")
+    worker_a, worker_b = SessionManager(store_a), SessionManager(store_b)
+    phone = "573004445566"
+
+    session = worker_a.get_or_create_session(phone)
+    session.consent_given = True
+    await worker_a.flush()
+
+    await worker_b.hydrate(phone)
+    assert phone in worker_b.sessions and worker_b.sessions[phone].consent_given
+    print("   ✅ Worker B loads the session saved by worker A")
+
+    # Both change the session from the same version; the second write loses
+    worker_a.get_or_create_session(phone).current_question_index = 1
+    worker_b.get_or_create_session(phone).current_question_index = 5
+    await worker_a.flush()
+    await worker_b.flush()
+    assert worker_b.sync.conflicts == 1
+    assert worker_b.sessions[phone].current_question_index == 1
+    print("   ✅ Concurrent update detected, worker B reloaded worker A's version")
+
+    worker_b.delete_session(phone)
+    await worker_b.flush()
+    assert await store_a.load(PATIENT, phone) is None
+    print("   ✅ Deletes reach the store")
+
+
+async def test_doctor_directory(store_a, store_b, label: str):
+    """Doctors registered on one worker are matched on another."""
+    print(f"\n🔹 Doctor registrations across workers ({label})")
+    worker_a, worker_b = DoctorSessionManager(store_a), DoctorSessionManager(store_b)
+
+    for phone in ["573100000001", "573100000002", "573100000003"]:
+        worker_a.register_doctor(phone)
+        worker_a.confirm_doctor_registration(phone)
+    worker_a.deactivate_doctor("573100000003")
+    await worker_a.flush()
+
+    await worker_b.refresh()
+    active = sorted(doctor.phone_number for doctor in worker_b.get_active_doctors())
+    assert active == ["573100000001", "573100000002"], active
+    print(f"   ✅ Worker B sees {len(active)} active doctors after refresh")
+
+    worker_a.activate_doctor("573100000003")
+    await worker_a.flush()
+    await worker_b.hydrate("573100000003")
+    assert worker_b.get_doctor_session("573100000003").state == DoctorSessionState.REGISTERED
+    assert len(worker_b.match_active_doctors({"573100000003"})) == 1
+    print("   ✅ Reactivation on worker A updates worker B's active index")
+
+    worker_a.start_case_review("573100000001", "573200000001")
+    worker_a.register_doctor("573100000004")
+    worker_a.confirm_doctor_registration("573100000004")
+    await worker_a.flush()
+    await worker_b.hydrate_many({"573100000001", "573100000002"})
+    assert worker_b.get_doctor_session("573100000001").current_reviewing_patient == "573200000001"
+    assert worker_b.get_doctor_session("573100000004") is None
+    print("   ✅ Hydrating a case's matched doctors reads only those doctors")
+
+
+async def main():
+    """Main test function."""
+    print("🗄️ SESSION STORE TEST")
+    print("=" * 50)
+
+    test_codec()
+    test_abstract_interface()
+
+    # The in-memory store shares session objects, so only Redis can conflict
+    memory = InMemorySessionStore()
+    await test_doctor_directory(memory, memory, "memory")
+
+    import redis.asyncio as redis
+
+    url = os.getenv("REDIS_URL") or start_fake_redis()
+    prefix = f"wb-test-{os.getpid()}"  # Never touches real bot keys
+    worker_a = RedisSessionStore(redis.from_url(url), prefix=prefix)
+    worker_b = RedisSessionStore(redis.from_url(url), prefix=prefix)
+    await test_two_workers(worker_a, worker_b, f"redis {url}")
+    await test_doctor_directory(worker_a, worker_b, f"redis {url}")
+    await worker_a.close()
+    await worker_b.close()
+
+    print("\n" + "=" * 50)
+    print("🎉 SESSION STORE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for speculative early submission to diagnose-bot.
+
+Simulates a patient answering the questionnaire against a fake /questions
+endpoint and measures the wait after the last answer with and without the
+early request, plus the reissue paths. A reissue must reach diagnose-bot
+only after the early request finished there, since each /questions call
+replaces the phone's agent session.
+
+Usage: python scripts/test-speculative-submission.py
+"""
+
+import asyncio
+import datetime
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from app.config.questions import MENTAL_HEALTH_QUESTIONS
+from app.models.question import Answer
+from app.models.session import UserSession
+from app.services.api_service import ExternalAPIService
+from app.services.http_transport import HTTPTransport
+from app.services.speculative_submission import SpeculativeSubmitter
+
+API_LATENCY = 0.4    # Seconds diagnose-bot takes to plan follow-ups
+TYPING_TIME = 0.5    # Seconds the patient takes to answer the last question
+
+
+def build_submitter(enabled: bool = True, fail: bool = False):
+    sent = []
+    server = []  # ("start" | "end", answers) as diagnose-bot sees them
+
+    async def diagnose_bot(request: httpx.Request) -> httpx.Response:
+        answers = len(httpx.Response(200, content=request.content).json()["chat"])
+        sent.append(answers)
+        server.append(("start", answers))
+        await asyncio.sleep(API_LATENCY)
+        server.append(("end", answers))
+        response = httpx.Response(500 if fail else 200, json={"questions": ["¿Desde cuándo?"]})
+        response.elapsed = datetime.timedelta(seconds=API_LATENCY)
+        return response
+
+    transport = HTTPTransport()
+    transport.client = httpx.AsyncClient(transport=httpx.MockTransport(diagnose_bot))
+    api_service = ExternalAPIService(transport=transport)
+    submitter = SpeculativeSubmitter(
+        api_service,
+        enabled=enabled,
+        deferred=("desired_outcome",),
+        reissue_keywords=("suicid", "urgente")
+    )
+    submitter.server = server
+    return submitter, sent
+
+
+async def run_patient(submitter: SpeculativeSubmitter, last_answer: str, typing_time: float = TYPING_TIME) -> float:
+    """Answer every question; return the wait after the last answer."""
+    session = UserSession(phone_number="573001112233")
+    for question in MENTAL_HEALTH_QUESTIONS[:-1]:
+        session.answers.append(Answer(question.id, f"respuesta a {question.id}"))
+        session.current_question_index += 1
+        submitter.maybe_start(session)
+
+    await asyncio.sleep(typing_time)
+    session.answers.append(Answer(MENTAL_HEALTH_QUESTIONS[-1].id, last_answer))
+    started = time.perf_counter()
+    result = await submitter.take(session)
+    if result is None:
+        result = await submitter.api_service.send_data(session)
+    assert result["questions"] == ["¿Desde cuándo?"], result
+    return time.perf_counter() - started
+
+
+async def main():
+    """Main test function."""
+    print("🏃 SPECULATIVE SUBMISSION TEST")
+    print("=" * 50)
+
+    print("\n🔹 Perceived latency after the last answer")
+    submitter, sent = build_submitter(enabled=False)
+    baseline = await run_patient(submitter, "Sentirme mejor")
+    submitter, sent = build_submitter()
+    speculative = await run_patient(submitter, "Sentirme mejor")
+    assert sent == [8] and submitter.stats["reused"] == 1
+    print(f"   Without speculation: {baseline * 1000:.0f}ms, with speculation: {speculative * 1000:.0f}ms")
+    print("   ✅ Early result reused, one /questions call with 8 answers")
+
+    print("\n🔹 Plan-changing final answer")
+    submitter, sent = build_submitter()
+    await run_patient(submitter, "Es urgente, no puedo más")
+    assert sent == [8, 9] and submitter.stats["reissued"] == 1
+    print("   ✅ Early request discarded, full questionnaire sent again")
+
+    print("\n🔹 Reissue while the early request is still running")
+    submitter, sent = build_submitter()
+    await run_patient(submitter, "Es urgente, no puedo más", typing_time=0.1)
+    assert sent == [8, 9] and submitter.server == [("start", 8), ("end", 8), ("start", 9), ("end", 9)], submitter.server
+    print("   ✅ The reissue waits for the early request, so it cannot overwrite the agent session")
+
+    submitter, sent = build_submitter()
+    session = UserSession(phone_number="573001112233")
+    for question in MENTAL_HEALTH_QUESTIONS[:-1]:
+        session.answers.append(Answer(question.id, "respuesta"))
+        submitter.maybe_start(session)
+    submitter.discard(session.phone_number)  # e.g. the conversation restarted
+    assert not submitter.maybe_start(session), "no second early request while the first still runs"
+    assert await submitter.take(session) is None and submitter.server[-1] == ("end", 8)
+    await asyncio.sleep(0)
+    assert submitter.get_stats()["discarded"] == 1 and not submitter._abandoned
+    print("   ✅ A discarded early request is waited for, not cancelled")
+
+    print("\n🔹 Failed early request")
+    submitter, sent = build_submitter(fail=True)
+    session = UserSession(phone_number="573001112233")
+    for question in MENTAL_HEALTH_QUESTIONS:
+        session.answers.append(Answer(question.id, "respuesta"))
+        if question.id != "desired_outcome":
+            submitter.maybe_start(session)
+    assert await submitter.take(session) is None and submitter.stats["reissued"] == 1
+    print("   ✅ Errors are not reused; the normal request (and its fallback) runs")
+
+    print("\n" + "=" * 50)
+    print("🎉 SPECULATIVE SUBMISSION TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the local urgent-risk classifier used for the doctor alert fast path.
+
+Checks high-risk answers to the self-harm and hallucinations/medication
+questions and crisis phrases in any answer are flagged, that negated and
+ambiguous answers and crisis phrases about someone else are not, that the alert flag survives the session store
+and that classifying an answer is cheap enough to run on every message.
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.session import UserSession
+from app.services.risk_classifier import RiskClassifier
+from app.utils.session_store import decode_user_session, encode_user_session
+
+
+FLAGGED = [
+    ("self_harm_thoughts", "Sí"),
+    ("self_harm_thoughts", "si, a veces"),
+    ("self_harm_thoughts", "No, aunque últimamente lo he pensado"),
+    ("main_concern", "No sé, pero a veces quiero morir"),
+    ("desired_outcome", "Ya no quiero vivir"),
+    ("followup_2", "He pensado en suicidarme"),
+    ("followup_1", "Desde que murió mi papá pienso en el suicidio"),
+    ("main_concern", "Tuve una sobredosis el mes pasado"),
+    ("main_concern", "No aguanto más y quiero matarme"),
+    ("desired_outcome", "Ya no puedo con esto y me quiero morir"),
+    ("sadness", "No duermo y pienso en suicidarme"),
+    ("hallucinations_meds", "Escucho voces por la noche"),
+    ("hallucinations_meds", "Dejé de tomar la quetiapina hace una semana"),
+]
+
+NOT_FLAGGED = [
+    ("self_harm_thoughts", "No"),
+    ("self_harm_thoughts", "no sé si es normal"),
+    ("self_harm_thoughts", "Claro que no"),
+    ("self_harm_thoughts", "Últimamente no"),
+    ("self_harm_thoughts", "a veces no"),
+    ("self_harm_thoughts", "Si te refieres a suicidio, no"),
+    ("main_concern", "Mi hermano se suicidó el año pasado"),
+    ("followup_1", "Mi mejor amiga intentó suicidarse"),
+    ("sadness", "Mi papá tuvo una sobredosis"),
+    ("self_harm_thoughts", "Nunca he pensado en hacerme daño"),
+    ("main_concern", "No quiero matarme, solo descansar"),
+    ("followup_1", "Jamás me he querido hacer daño"),
+    ("hallucinations_meds", "Sí, tomo sertralina"),
+    ("hallucinations_meds", "No escucho voces ni veo cosas"),
+    ("sadness", "Sí, me siento triste por el trabajo"),
+    ("name", "Ana Silvia"),
+]
+
+
+def main():
+    """Main test function."""
+    print("🧪 URGENT RISK CLASSIFIER TEST")
+    print("=" * 60)
+    classifier = RiskClassifier()
+
+    for question_id, answer in FLAGGED:
+        signal = classifier.classify(question_id, answer)
+        assert signal is not None, f"{question_id}: {answer!r} should be flagged"
+        print(f"   🚨 {question_id}: {answer!r} -> {signal.reason}")
+    print(f"✅ {len(FLAGGED)} high-risk answers flagged")
+
+    for question_id, answer in NOT_FLAGGED:
+        assert classifier.classify(question_id, answer) is None, f"{question_id}: {answer!r} should not be flagged"
+    print(f"✅ {len(NOT_FLAGGED)} negated or ambiguous answers not flagged")
+
+    custom = RiskClassifier(extra_phrases=("Tengo un plan",))
+    assert custom.classify("main_concern", "Ya tengo un plan") is not None
+    print("✅ Extra crisis phrases from settings are matched accent- and case-insensitively")
+
+    session = UserSession(phone_number="573001112233", urgent_alert_sent=True)
+    assert decode_user_session(encode_user_session(session)).urgent_alert_sent
+    assert not decode_user_session(encode_user_session(UserSession(phone_number="573001112234"))).urgent_alert_sent
+    print("✅ The alert flag survives the session store, so a session is alerted once")
+
+    answer = "No, pero me siento muy cansado todo el tiempo, no duermo bien y no tengo ganas de salir"
+    rounds = 20000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        classifier.classify("self_harm_thoughts", answer)
+    print(f"⏱️  {(time.perf_counter() - started) * 1e6 / rounds:.1f}µs per answer")
+
+    print("\n" + "=" * 60)
+    print("✅ All urgent risk classifier tests passed")
+
+
+if __name__ == "__main__":
+    main()
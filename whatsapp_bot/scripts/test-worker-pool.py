@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test the background worker pool behind the webhook.
+
+Checks that a full or stopped pool rejects messages instead of growing
+without bound, that the webhook answers 503 for a message it could not
+queue and does not remember its id (so Meta's redelivery is processed),
+that stopping the pool drains the messages already queued, and that each
+sender's messages are handled one at a time and in order while different
+senders are handled in parallel.
+"""
+
+import asyncio
+import random
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder settings so the script runs without a configured environment
+os.environ.setdefault("WHATSAPP_TOKEN", "test-token")
+os.environ.setdefault("PHONE_NUMBER_ID", "123456789")
+os.environ.setdefault("VERIFY_TOKEN", "test-verify-token")
+os.environ.setdefault("EXTERNAL_API_URL", "http://diagnose-bot.test")
+os.environ.setdefault("DATABASE_API_URL", "http://backend.test/api/patients/intake/")
+
+import httpx
+
+from app.utils.worker_pool import MessageWorkerPool
+
+
+def text_webhook(message_id: str, sender_phone: str, text: str) -> dict:
+    """An inbound text message webhook as Meta sends it."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                    "contacts": [{"profile": {"name": "Paciente"}, "wa_id": sender_phone}],
+                    "messages": [{
+                        "from": sender_phone,
+                        "id": message_id,
+                        "timestamp": "1750263773",
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+async def test_backpressure():
+    print("\n🔹 Bounded queue")
+    gate = asyncio.Event()
+    handled = []
+
+    async def handler(sender_phone: str, text: str) -> None:
+        await gate.wait()
+        handled.append(text)
+
+    pool = MessageWorkerPool(handler, concurrency=1, max_queue_size=3)
+    assert not pool.submit("573100000001", "hola"), "a pool that was never started accepts nothing"
+
+    pool.start()
+    assert all(pool.submit(f"57310000000{i}", f"m{i}") for i in range(3))
+    assert not pool.submit("573100000009", "m9"), "queue limit reached"
+    await asyncio.sleep(0.01)  # The only worker takes m0, freeing one place
+    assert pool.submit("573100000009", "m9")
+    assert not pool.submit("573100000008", "m8")
+    stats = pool.get_stats()
+    assert stats["queue_depth"] == 3 and stats["busy_workers"] == 1 and stats["rejected"] == 3, stats
+    print("   ✅ Messages beyond the queue limit are rejected, not buffered")
+
+    gate.set()
+    await pool.stop(drain_timeout=5)
+    assert handled == ["m0", "m1", "m2", "m9"], handled
+    assert not pool.submit("573100000001", "late") and pool.get_stats()["processed"] == 4
+    print("   ✅ Stopping drains queued messages, then rejects new ones")
+
+
+async def test_per_sender_order():
+    print("\n🔹 Per-sender ordering")
+    rng = random.Random(3)
+    handled = {}
+    running = set()
+    overlaps = []
+    peak = 0
+
+    async def handler(sender_phone: str, text: str) -> None:
+        nonlocal peak
+        if sender_phone in running:
+            overlaps.append(sender_phone)
+        running.add(sender_phone)
+        peak = max(peak, len(running))
+        # Uneven handler times would reorder a sender's messages across workers
+        await asyncio.sleep(rng.uniform(0, 0.01))
+        handled.setdefault(sender_phone, []).append(int(text))
+        running.discard(sender_phone)
+
+    pool = MessageWorkerPool(handler, concurrency=8, max_queue_size=1000)
+    pool.start()
+    senders = [f"5731000000{i:02d}" for i in range(20)]
+    for n in range(10):
+        for sender_phone in senders:
+            assert pool.submit(sender_phone, str(n))
+        await asyncio.sleep(0.002)
+    await pool.stop(drain_timeout=10)
+
+    assert not overlaps, f"senders handled on two workers at once: {set(overlaps)}"
+    assert all(handled[sender_phone] == list(range(10)) for sender_phone in senders), handled
+    assert peak > 1, "different senders should run in parallel"
+    assert pool.get_stats()["active_senders"] == 0, "drained mailboxes are reclaimed"
+    print(f"   ✅ 20 senders x 10 messages each handled in order, up to {peak} senders at once")
+
+
+async def test_webhook_503():
+    print("\n🔹 Webhook backpressure")
+    import main
+
+    handled = []
+
+    async def handler(sender_phone: str, text: str) -> None:
+        handled.append((sender_phone, text))
+
+    main.worker_pool = MessageWorkerPool(handler, concurrency=2, max_queue_size=10)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bot.test") as client:
+        payload = text_webhook("wamid.busy-1", "573100000001", "Hola")
+        response = await client.post("/webhook", json=payload)
+        assert response.status_code == 503 and response.text == "BUSY", response
+        assert not main.dedupe_cache.is_duplicate("wamid.busy-1"), "a rejected message must not be remembered"
+        print("   ✅ 503 BUSY when the message could not be queued")
+
+        main.worker_pool.start()
+        response = await client.post("/webhook", json=payload)
+        assert response.status_code == 200 and response.text == "OK", response
+        await main.worker_pool.stop(drain_timeout=5)
+        assert handled == [("573100000001", "Hola")], handled
+        assert (await client.post("/webhook", json=payload)).status_code == 200 and len(handled) == 1
+        print("   ✅ Meta's redelivery is processed once the pool has room, and only once")
+
+
+async def main():
+    """Main test function."""
+    print("🧵 WORKER POOL TEST")
+    print("=" * 50)
+
+    await test_backpressure()
+    await test_per_sender_order()
+    await test_webhook_503()
+
+    print("\n" + "=" * 50)
+    print("🎉 WORKER POOL TESTS PASSED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Critical paths of the slowest triages.
+
+Reads span files written by the bot, diagnose-bot and the backend
+(TRACE_EXPORT_PATH, one JSON span per line), joins them by correlation ID
+and prints the slowest traces as trees. In each tree the critical path --
+from every span, the child whose subtree finished last -- is marked with
+``*``. Work handed to worker tasks can outlive the span that queued it, so
+subtree end times are used rather than span durations. The summary adds up
+the time each stage spends on the critical path (its subtree time minus
+that of its critical child) over the traces shown.
+
+Usage: python scripts/trace-critical-path.py SPANS.jsonl [MORE.jsonl ...] [--top N] [--name SPAN_NAME]
+
+``--name`` only keeps traces with a span of that name, e.g.
+``diagnosis.answers`` for the final questionnaire submissions.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+def load_traces(paths: List[str]) -> Dict[str, List[dict]]:
+    """Group spans from all files by trace id."""
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    span = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A partly written last line
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def end_of(span: dict) -> float:
+    return span["start"] + span["duration_ms"] / 1000
+
+
+def trace_duration(spans: List[dict]) -> float:
+    """Wall-clock milliseconds from the first span's start to the last span's end."""
+    return (max(end_of(span) for span in spans) - min(span["start"] for span in spans)) * 1000
+
+
+def build_tree(spans: List[dict]):
+    """Children by parent span id; spans whose parent is missing become roots."""
+    ids = {span["span_id"] for span in spans}
+    children: Dict[Optional[str], List[dict]] = defaultdict(list)
+    for span in sorted(spans, key=lambda s: s["start"]):
+        parent = span.get("parent_id")
+        children[parent if parent in ids else None].append(span)
+    return children
+
+
+def subtree_ends(children: Dict[Optional[str], List[dict]]) -> Dict[str, float]:
+    """Latest end time within each span's subtree, by span id."""
+    ends: Dict[str, float] = {}
+
+    def visit(span: dict) -> float:
+        end = max([end_of(span)] + [visit(kid) for kid in children.get(span["span_id"], [])])
+        ends[span["span_id"]] = end
+        return end
+
+    for root in children.get(None, []):
+        visit(root)
+    return ends
+
+
+def print_trace(trace_id: str, spans: List[dict], self_times: Dict[str, float]):
+    children = build_tree(spans)
+    ends = subtree_ends(children)
+    origin = min(span["start"] for span in spans)
+    print(f"\n🔎 Trace {trace_id}: {trace_duration(spans):.0f}ms, {len(spans)} spans")
+
+    def walk(span: dict, depth: int, critical: bool):
+        kids = children.get(span["span_id"], [])
+        child = max(kids, key=lambda kid: ends[kid["span_id"]]) if kids else None
+        if critical:
+            own = ends[span["span_id"]] - span["start"]
+            if child is not None:
+                own -= ends[child["span_id"]] - child["start"]
+            self_times[f"{span['service']}:{span['name']}"] += max(0.0, own * 1000)
+        marker = "*" if critical else " "
+        status = "" if span.get("status", "ok") == "ok" else f" [{span['status']}]"
+        details = " ".join(f"{key}={value}" for key, value in span.get("attributes", {}).items() if key != "error")
+        print(
+            f"  {marker} {'  ' * depth}{span['name']} ({span['service']}) "
+            f"+{(span['start'] - origin) * 1000:.0f}ms {span['duration_ms']:.0f}ms{status} {details}".rstrip()
+        )
+        for kid in kids:
+            walk(kid, depth + 1, critical and kid is child)
+
+    roots = children.get(None, [])
+    last_root = max(roots, key=lambda root: ends[root["span_id"]]) if roots else None
+    for root in roots:
+        walk(root, 0, root is last_root)
+
+
+def main():
+    """Print the slowest traces and where their time went."""
+    parser = argparse.ArgumentParser(description="Critical paths of the slowest traces")
+    parser.add_argument("paths", nargs="+", help="Span files (JSON lines)")
+    parser.add_argument("--top", type=int, default=5, help="Number of traces to show")
+    parser.add_argument("--name", help="Only traces containing a span with this name")
+    args = parser.parse_args()
+
+    traces = load_traces(args.paths)
+    if args.name:
+        traces = {tid: spans for tid, spans in traces.items() if any(s["name"] == args.name for s in spans)}
+    if not traces:
+        print("❌ No traces found")
+        sys.exit(1)
+
+    slowest = sorted(traces.items(), key=lambda item: trace_duration(item[1]), reverse=True)[:args.top]
+    print("🐢 SLOWEST TRACES")
+    print("=" * 60)
+    print(f"Traces: {len(traces)}, showing {len(slowest)} (* = critical path)")
+
+    self_times: Dict[str, float] = defaultdict(float)
+    for trace_id, spans in slowest:
+        print_trace(trace_id, spans, self_times)
+
+    total = sum(self_times.values()) or 1.0
+    print("\n📊 Critical path time by stage:")
+    for stage, ms in sorted(self_times.items(), key=lambda item: item[1], reverse=True):
+        print(f"   {stage:<45} {ms:>9.0f}ms {ms * 100 / total:>5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Sharding front for the WhatsApp Mental Health Triage Bot
+
+Receives the WhatsApp webhook and forwards each message to one of
+SHARD_WORKERS bot worker processes (main.py), chosen by consistent hashing
+of the sender phone. Every worker keeps its phones' sessions in its own
+memory, so all cores are used without a shared session store, and adding
+or removing a worker only moves about 1/N of the phones.
+
+Run instead of main.py:  uvicorn shard_front:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import PlainTextResponse, JSONResponse
+
+from app.config.settings import settings
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.shard_peers import build_shard_ring, shard_key, shard_name, shard_socket_path
+
+
+# Validate configuration before starting any worker
+settings.validate()
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_TIMEOUT = httpx.Timeout(connect=2.0, read=10.0, write=5.0, pool=5.0)
+WORKER_START_TIMEOUT = 30.0
+
+
+class ShardWorker:
+    """One supervised bot worker process listening on a unix socket."""
+
+    def __init__(self, index: int, workers: int, socket_dir: str):
+        self.index = index
+        self.name = shard_name(index)
+        self.socket_path = shard_socket_path(socket_dir, index)
+        self.env = {
+            **os.environ,
+            "SHARD_INDEX": str(index),
+            "SHARD_WORKERS": str(workers),
+            "SHARD_SOCKET_DIR": socket_dir
+        }
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+            base_url="http://shard",
+            timeout=WORKER_TIMEOUT
+        )
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats: Dict[str, int] = {"forwarded": 0, "busy": 0, "errors": 0, "restarts": 0}
+
+    def start(self) -> None:
+        """Start the worker and restart it whenever it exits."""
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise(), name=f"shard-{self.name}")
+
+    async def _supervise(self) -> None:
+        while not self._stopping:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)  # Left behind by a crashed worker
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "uvicorn", "main:app", "--uds", self.socket_path,
+                cwd=APP_DIR,
+                env=self.env
+            )
+            print(f"[SHARD] Started {self.name} (pid {self.process.pid})")
+            code = await self.process.wait()
+            if self._stopping:
+                break
+            self.stats["restarts"] += 1
+            print(f"[SHARD] {self.name} exited with {code}, restarting")
+            await asyncio.sleep(1.0)
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Wait until the worker accepts connections on its socket."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            if os.path.exists(self.socket_path):
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def stop(self, timeout: float) -> None:
+        """Stop the worker, letting it drain its queue first."""
+        self._stopping = True
+        if self.process and self.process.returncode is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                print(f"[SHARD] {self.name} did not drain in {timeout}s, killing")
+                self.process.kill()
+                await self.process.wait()
+        if self._supervisor is not None:
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+        await self.client.aclose()
+
+    @property
+    def is_alive(self) -> bool:
+        return bool(self.process and self.process.returncode is None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pid": self.process.pid if self.process else None,
+            "alive": self.is_alive,
+            **self.stats
+        }
+
+
+ring = build_shard_ring(settings.SHARD_WORKERS, settings.SHARD_RING_REPLICAS)
+os.makedirs(settings.SHARD_SOCKET_DIR, exist_ok=True)
+shard_workers: Dict[str, ShardWorker] = {
+    shard_name(index): ShardWorker(index, settings.SHARD_WORKERS, settings.SHARD_SOCKET_DIR)
+    for index in range(settings.SHARD_WORKERS)
+}
+
+app = FastAPI(
+    title="WhatsApp Mental Health Triage Bot (shard front)",
+    description="Routes WhatsApp webhook messages to sharded bot workers",
+    version="1.0.0"
+)
+
+
+def owner_of(phone: str) -> ShardWorker:
+    """Worker that owns a phone's conversations."""
+    return shard_workers[ring.node_for(shard_key(phone))]
+
+
+def split_by_shard(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Split a webhook payload into one payload per owning worker.
+
+    Each worker gets the same entry/change structure holding only the
+    messages from its own senders. Changes without messages (delivery
+    statuses) are not forwarded; the bot ignores them.
+    """
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            owned: Dict[str, List[Dict[str, Any]]] = {}
+            for message in value.get("messages", []):
+                owned.setdefault(owner_of(message.get("from", "")).name, []).append(message)
+            for name, messages in owned.items():
+                payload = payloads.setdefault(name, {"object": data.get("object"), "entry": []})
+                payload["entry"].append({**entry, "changes": [{**change, "value": {**value, "messages": messages}}]})
+    return payloads
+
+
+async def forward(worker: ShardWorker, payload: Dict[str, Any]) -> bool:
+    """Forward a payload to a worker's webhook.
+
+    Returns:
+        False if the worker was busy or unreachable, so Meta should redeliver
+    """
+    try:
+        response = await worker.client.post("/webhook", json=payload)
+    except httpx.HTTPError as e:
+        worker.stats["errors"] += 1
+        print(f"[SHARD] Failed forwarding to {worker.name}: {repr(e)}")
+        return False
+    if response.status_code == 503:
+        worker.stats["busy"] += 1
+        return False
+    worker.stats["forwarded"] += 1
+    return True
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the worker processes and wait for their sockets."""
+    for worker in shard_workers.values():
+        worker.start()
+    for worker in shard_workers.values():
+        if not await worker.wait_ready(WORKER_START_TIMEOUT):
+            print(f"[SHARD] {worker.name} not ready after {WORKER_START_TIMEOUT}s")
+
+
+@app.get("/")
+@app.get("/webhook")
+async def verify_webhook(
+    hub_mode: Optional[str] = Query(None, alias="hub.mode"),
+    hub_verify_token: Optional[str] = Query(None, alias="hub.verify_token"),
+    hub_challenge: Optional[str] = Query(None, alias="hub.challenge"),
+):
+    """Verify WhatsApp webhook."""
+    if (
+        (hub_mode or "").strip() == "subscribe" and
+        (hub_verify_token or "").strip() == (settings.VERIFY_TOKEN or "").strip()
+    ):
+        return PlainTextResponse(hub_challenge or "", status_code=200)
+    return PlainTextResponse("Verificación fallida", status_code=403)
+
+
+@app.post("/")
+@app.post("/webhook")
+async def receive_webhook(request: Request):
+    """Forward each sender's messages to the worker that owns the sender.
+
+    Workers deduplicate message ids themselves, so when any worker is busy
+    the whole delivery is answered 503 and Meta's redelivery only gets
+    processed by the workers that missed it.
+    """
+    data = await request.json()
+    try:
+        payloads = split_by_shard(data)
+    except Exception as e:
+        print("[ERROR]", repr(e))
+        return PlainTextResponse("ERROR", status_code=200)
+
+    results = await asyncio.gather(*(
+        forward(shard_workers[name], payload) for name, payload in payloads.items()
+    ))
+    if not all(results):
+        return PlainTextResponse("BUSY", status_code=503)
+    return PlainTextResponse("OK", status_code=200)
+
+
+async def merge_pages(path: str, request: Request, limit: int) -> JSONResponse:
+    """Merge one page of a per-phone debug listing from every worker.
+
+    Each worker answers with its first ``limit`` phones after the cursor, so
+    the first ``limit`` phones of their union are the page across all
+    workers, and its last phone is the cursor of the next page.
+    """
+    async def fetch(worker: ShardWorker) -> Optional[httpx.Response]:
+        try:
+            return await worker.client.get(path, params=request.query_params)
+        except httpx.HTTPError as e:
+            print(f"[SHARD] Failed reading {path} from {worker.name}: {repr(e)}")
+            return None
+
+    responses = await asyncio.gather(*(fetch(worker) for worker in shard_workers.values()))
+    for response in responses:
+        if response is not None and 400 <= response.status_code < 500:
+            return JSONResponse(response.json(), status_code=response.status_code)  # Bad filter or cursor
+
+    items: Dict[str, Any] = {}
+    more = False
+    for worker, response in zip(shard_workers.values(), responses):
+        if response is None or response.status_code != 200:
+            if response is not None:
+                print(f"[SHARD] Failed reading {path} from {worker.name}: HTTP {response.status_code}")
+            continue
+        listing = response.json()
+        items.update(listing["items"])
+        more = more or listing["next_cursor"] is not None
+
+    page = sorted(items)[:limit]
+    next_cursor = page[-1] if page and (more or len(items) > limit) else None
+    return JSONResponse({"items": {phone: items[phone] for phone in page}, "next_cursor": next_cursor})
+
+
+async def proxy_to_owner(request: Request, phone_number: str) -> JSONResponse:
+    """Send a per-phone debug request to the worker that owns the phone."""
+    worker = owner_of(phone_number)
+    response = await worker.client.request(request.method, request.url.path)
+    return JSONResponse(response.json(), status_code=response.status_code)
+
+
+@app.get("/healthz")
+async def health_check():
+    """Liveness check: every worker process is running; constant time."""
+    if not all(worker.is_alive for worker in shard_workers.values()):
+        return JSONResponse({"status": "degraded"}, status_code=503)
+    return {"status": "ok"}
+
+
+@app.get("/sessions")
+async def get_all_sessions(request: Request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Get one page of sessions across workers (same filters as a worker's /sessions)."""
+    return await merge_pages("/sessions", request, limit)
+
+
+@app.get("/doctors")
+async def get_all_doctors(request: Request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Get one page of registered doctors across workers."""
+    return await merge_pages("/doctors", request, limit)
+
+
+@app.get("/sessions/{phone_number}")
+@app.delete("/sessions/{phone_number}")
+@app.get("/doctors/{phone_number}")
+async def proxy_phone_endpoint(request: Request, phone_number: str):
+    """Session and doctor details live on the worker that owns the phone."""
+    return await proxy_to_owner(request, phone_number)
+
+
+def label_worker_metrics(expositions: Dict[str, str]) -> str:
+    """Merge the workers' metrics, adding a ``shard`` label to every sample.
+
+    Samples are regrouped per metric family so each family appears once,
+    as the Prometheus text format requires.
+    """
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for name, text in expositions.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split()[2]
+                family_headers = headers.setdefault(family, [])
+                if len(family_headers) < 2:
+                    family_headers.append(line)
+                samples.setdefault(family, [])
+            elif line and family is not None:
+                series, value = line.rsplit(" ", 1)
+                if "{" in series:
+                    series = series.replace("{", f'{{shard="{name}",', 1)
+                else:
+                    series = f'{series}{{shard="{name}"}}'
+                samples[family].append(f"{series} {value}")
+    lines = []
+    for family, family_headers in headers.items():
+        lines.extend(family_headers)
+        lines.extend(samples[family])
+    return "\n".join(lines) + "\n"
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get every worker's metrics, labelled by shard."""
+    async def fetch(worker: ShardWorker) -> str:
+        try:
+            response = await worker.client.get("/metrics")
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            print(f"[SHARD] Failed reading /metrics from {worker.name}: {repr(e)}")
+            return ""
+
+    texts = await asyncio.gather(*(fetch(worker) for worker in shard_workers.values()))
+    return PlainTextResponse(
+        label_worker_metrics(dict(zip(shard_workers, texts))),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/shards")
+async def get_shard_stats():
+    """Get worker processes, forwarding counters and ring placement."""
+    return {
+        "workers": {name: worker.get_stats() for name, worker in shard_workers.items()},
+        "ring_replicas": ring.replicas
+    }
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the workers, giving each its drain timeout."""
+    await asyncio.gather(*(
+        worker.stop(timeout=settings.WORKER_DRAIN_TIMEOUT + 5) for worker in shard_workers.values()
+    ))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)